@@ -0,0 +1,44 @@
+from django.db.models import CASCADE
+from django.db.models import DO_NOTHING
+from django.db.models import SET_NULL
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+
+def raw_delete_cascade(model, pks, handle_relation=None):
+    """
+    Deletes the rows of `model` with primary keys in `pks`, a list or a values queryset,
+    along with the rows that cascade from them, setting references to them to null,
+    without loading any model instances or sending any signals. The relations come from
+    the same list the ORM's collector uses, so rows of models added later are included.
+
+    :param handle_relation: Called with each relation to `model`, and a queryset of the
+        rows referencing the deleted ones through it, returning True when it has handled
+        them itself, such as for relations of a model to itself
+    """
+    for related in get_candidate_relations_to_delete(model._meta):
+        field = related.field
+        on_delete = field.remote_field.on_delete
+        if on_delete is DO_NOTHING:
+            continue
+        related_rows = related.related_model._base_manager.filter(
+            **{"{}__in".format(field.name): pks}
+        )
+        if handle_relation is not None and handle_relation(related, related_rows):
+            continue
+        if on_delete is SET_NULL:
+            related_rows.update(**{field.name: None})
+        elif on_delete is CASCADE:
+            raw_delete_cascade(
+                related.related_model,
+                related_rows.values_list("pk", flat=True),
+                handle_relation=handle_relation,
+            )
+        else:
+            raise NotImplementedError(
+                "Cannot delete {} referenced by {}.{}".format(
+                    model.__name__, related.related_model.__name__, field.name
+                )
+            )
+
+    rows = model._base_manager.filter(pk__in=pks)
+    rows._raw_delete(rows.db)
@@ -16,7 +16,6 @@ from mptt.signals import node_moved
 from contentcuration.constants.locking import TREE_LOCK
 from contentcuration.db.advisory_lock import advisory_lock
 from contentcuration.db.models.query import CustomTreeQuerySet
-from contentcuration.utils.cache import ResourceSizeCache
 
 
 logging = logger.getLogger(__name__)
@@ -198,6 +197,44 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
                 for k, v in values.items():
                     setattr(node, k, v)
 
+    def bulk_create_children(self, parent, nodes):
+        """
+        Inserts nodes, that don't have descendants, as the last children of the parent in the
+        order given. The space in the tree for all of the nodes is made at once, rather than
+        once per node, as saving each node would.
+
+        :param parent: The node to insert the nodes under
+        :param nodes: A list of unsaved nodes
+        :return: The created nodes
+        """
+        from contentcuration.models import ContentNodeTreeMetadata
+
+        if not nodes:
+            return []
+
+        opts = self.model._mptt_meta
+        with self.lock_mptt(parent.tree_id):
+            self._mptt_refresh(parent)
+            cursor = getattr(parent, opts.right_attr)
+            for node in nodes:
+                node.parent = parent
+                setattr(node, opts.tree_id_attr, getattr(parent, opts.tree_id_attr))
+                setattr(node, opts.level_attr, getattr(parent, opts.level_attr) + 1)
+                setattr(node, opts.left_attr, cursor)
+                setattr(node, opts.right_attr, cursor + 1)
+                cursor += 2
+            self._create_space(
+                2 * len(nodes),
+                getattr(parent, opts.right_attr) - 1,
+                getattr(parent, opts.tree_id_attr),
+            )
+            nodes = self.bulk_create(nodes)
+        setattr(parent, opts.right_attr, cursor)
+
+        self.filter(pk=parent.pk).update(changed=True)
+        ContentNodeTreeMetadata.invalidate(self.filter(pk=parent.pk), include_self=True)
+        return nodes
+
     def move_node(self, node, target, position="last-child"):
         """
         Vendored from mptt - by default mptt moves then saves
@@ -221,7 +258,12 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         ``MPTTMeta.order_insertion_by``.  In most cases you should just
         move the node yourself by setting node.parent.
         """
-        old_parent = node.parent
+        from contentcuration.utils.nodes import increment_resource_sizes
+        from contentcuration.utils.user import get_storage_deltas
+        from contentcuration.utils.user import increment_user_storage
+
+        resource_size_deltas = {}
+        storage_deltas = {}
         with self.lock_mptt(node.tree_id, target.tree_id):
             # Call _mptt_refresh to ensure that the mptt fields on
             # these nodes are up to date once we have acquired a lock
@@ -229,24 +271,33 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             # will remain fresh until the lock is released at the end
             # of the context manager.
             self._mptt_refresh(node, target)
+            # when moving to a new tree, like trash, the files of the node and its descendants
+            # stop counting towards the resource size of the old tree, and start counting
+            # towards the new one
+            if node.tree_id != target.tree_id:
+                resource_size_deltas = node.get_resource_size_deltas(
+                    tree_id=target.tree_id
+                )
+                removed = node.get_storage_states()
+                storage_deltas = get_storage_deltas(
+                    removed=removed,
+                    added=[
+                        (file_id, user_id, target.tree_id, checksum, file_size)
+                        for file_id, user_id, _, checksum, file_size in removed
+                    ],
+                )
             # N.B. this only calls save if we are running inside a
             # delay MPTT updates context
             self._move_node(node, target, position=position)
             node.save(skip_lock=True)
+            increment_user_storage(storage_deltas)
         node_moved.send(
             sender=node.__class__,
             instance=node,
             target=target,
             position=position,
         )
-        # when moving to a new tree, like trash, we'll blanket reset the modified for the
-        # new root and the old root nodes
-        if old_parent.tree_id != target.tree_id:
-            for size_cache in [
-                ResourceSizeCache(target.get_root()),
-                ResourceSizeCache(old_parent.get_root()),
-            ]:
-                size_cache.reset_modified(None)
+        increment_resource_sizes(resource_size_deltas)
 
     def get_source_attributes(self, source):
         """
@@ -666,6 +717,8 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
         excluded_descendants,
         can_edit_source_channel,
     ):
+        from contentcuration.models import ContentNodeTreeMetadata
+
         # lock mptt source tree with shared advisory lock
         with self.lock_mptt(node.tree_id, shared_tree_ids=[node.tree_id]):
             nodes_to_copy = list(self._all_nodes_to_copy(node, excluded_descendants))
@@ -707,6 +760,9 @@ class CustomContentNodeTreeManager(TreeManager.from_queryset(CustomTreeQuerySet)
             new_nodes = self.bulk_create(nodes_to_create)
         if target:
             self.filter(pk=target.pk).update(changed=True)
+            ContentNodeTreeMetadata.invalidate(
+                self.filter(pk=target.pk), include_self=True
+            )
 
         self._copy_associated_objects(source_copy_id_map)
 
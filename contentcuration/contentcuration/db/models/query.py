@@ -12,7 +12,34 @@ RIGHT_JOIN = "RIGHT JOIN"
 
 
 class CustomTreeQuerySet(TreeQuerySet, CTEQuerySet):
-    pass
+    def update(self, **kwargs):
+        """
+        Invalidates the tree metadata of the ancestors of the updated nodes, when updating
+        fields it is derived from, and the tracked resource sizes of the trees of nodes whose
+        completeness changes, which `bulk_update` also relies on
+        """
+        from contentcuration.models import ContentNodeTreeMetadata
+        from contentcuration.utils.nodes import invalidate_resource_sizes
+
+        if self.query.is_sliced:
+            return super(CustomTreeQuerySet, self).update(**kwargs)
+
+        ContentNodeTreeMetadata.invalidate_for_fields(self, kwargs.keys())
+        # the files of nodes only count towards the resource size of their tree while the
+        # nodes are complete, so the sizes of the trees of the nodes that change are no
+        # longer known
+        tree_ids = []
+        if "complete" in kwargs:
+            tree_ids = list(
+                self.exclude(complete=kwargs["complete"])
+                .order_by()
+                .values_list("tree_id", flat=True)
+                .distinct()
+            )
+        result = super(CustomTreeQuerySet, self).update(**kwargs)
+        if tree_ids:
+            invalidate_resource_sizes(tree_ids)
+        return result
 
 
 class With(CTEWith):
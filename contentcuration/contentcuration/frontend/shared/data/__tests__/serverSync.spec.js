@@ -1,4 +1,4 @@
-import { queueChange, debouncedSyncChanges } from '../serverSync';
+import { queueChange, debouncedSyncChanges, startSyncing, stopSyncing } from '../serverSync';
 import { CreatedChange } from '../changes';
 import db from '../db';
 import { Channel, Session, Task } from 'shared/data/resources';
@@ -259,3 +259,45 @@ describe('ServerSync tests', () => {
     await Channel.table.delete(channelId);
   });
 });
+
+describe('Waiting for changes', () => {
+  beforeEach(async () => {
+    await Session.table.put({ id: 0, CURRENT_USER });
+    client.post.mockReset();
+    await mockChannelScope('test-123');
+  });
+
+  afterEach(async () => {
+    stopSyncing();
+    await resetMockChannelScope();
+    await db[CHANGES_TABLE].clear();
+  });
+
+  it('should sync once the wait returns changes', async () => {
+    let waits = 0;
+    const synced = new Promise(resolve => {
+      client.post.mockImplementation(url => {
+        if (url === 'sync_wait') {
+          waits++;
+          // Only the first wait returns, any later ones are left waiting
+          return waits === 1
+            ? Promise.resolve({ data: { changes: [{ server_rev: 1 }], tasks: [] } })
+            : new Promise(() => {});
+        }
+        resolve();
+        return Promise.resolve({ data: {} });
+      });
+    });
+
+    startSyncing();
+    await synced;
+
+    expect(client.post).toHaveBeenCalledWith('sync_wait', {
+      changes: [],
+      channel_revs: { 'test-123': 0 },
+      user_rev: 0,
+      unapplied_revs: [],
+    });
+    expect(client.post).toHaveBeenLastCalledWith('sync', expect.any(Object));
+  });
+});
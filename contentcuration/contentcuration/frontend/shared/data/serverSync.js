@@ -19,7 +19,8 @@ import urls from 'shared/urls';
 const SYNC_IF_NO_CHANGES_FOR = 2;
 
 // When this many seconds pass, repoll the backend to
-// check for any updates to active channels, or the user and sync any current changes
+// check for any updates to active channels, or the user and sync any current changes,
+// while changes made here are still to be applied, or waiting on the backend fails
 const SYNC_POLL_INTERVAL = 5;
 
 const commonFields = ['type', 'key', 'table', 'rev', 'channel_id', 'user_id'];
@@ -387,7 +388,67 @@ if (process.env.NODE_ENV !== 'production' && typeof window !== 'undefined') {
   window.forceServerSync = forceServerSync;
 }
 
-let intervalTimer;
+function sleep(seconds) {
+  return new Promise(resolve => setTimeout(resolve, seconds * 1000));
+}
+
+// Incremented whenever syncing starts or stops, so that only the latest wait loop carries on
+let waitGeneration = 0;
+
+/**
+ * Waits on the backend for new changes to the channel or the user, or task updates, and
+ * syncs once there are any, so that idle clients don't poll the backend.
+ * The backend only reports whether changes made here have been applied when asked about
+ * them, and doesn't wait when it is, so the sync endpoint is polled while there are any.
+ * @param {number} generation
+ */
+async function waitForChanges(generation) {
+  while (generation === waitGeneration) {
+    try {
+      const user = await Session.getSession();
+      if (!user) {
+        throw new Error(noUserError);
+      }
+
+      const pendingChanges = await db[CHANGES_TABLE]
+        .filter(c => !c.errors && !c.disallowed)
+        .count();
+      if (pendingChanges) {
+        await sleep(SYNC_POLL_INTERVAL);
+        if (generation === waitGeneration) {
+          await debouncedSyncChanges();
+        }
+        continue;
+      }
+
+      const channel_revs = {};
+      if (channelScope.id) {
+        channel_revs[channelScope.id] = get(user, [MAX_REV_KEY, channelScope.id], 0);
+      }
+      // The response has the same format as the sync endpoint's
+      const response = await client.post(urls['sync_wait'](), {
+        changes: [],
+        channel_revs,
+        user_rev: user.user_rev || 0,
+        unapplied_revs: [],
+      });
+      if (generation !== waitGeneration) {
+        break;
+      }
+      await handleTasks(response);
+      if (['changes', 'errors', 'successes'].some(key => get(response, ['data', key], []).length)) {
+        // Receive the changes through a sync, so that they are handled in the same
+        // way, and under the same locks, as changes synced from here
+        await debouncedSyncChanges(true);
+      }
+    } catch (err) {
+      if (err.message !== noUserError) {
+        logging.error(err);
+      }
+      await sleep(SYNC_POLL_INTERVAL);
+    }
+  }
+}
 
 const vueInstance = new Vue();
 
@@ -396,12 +457,12 @@ export function syncOnChanges() {
 }
 
 export function startSyncing() {
-  // Start the sync interval
-  intervalTimer = setInterval(debouncedSyncChanges, SYNC_POLL_INTERVAL * 1000);
+  waitGeneration++;
+  waitForChanges(waitGeneration);
 }
 
 export function stopSyncing() {
-  clearInterval(intervalTimer);
+  waitGeneration++;
   debouncedSyncChanges(true);
 }
 
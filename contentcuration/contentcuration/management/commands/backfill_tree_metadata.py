@@ -0,0 +1,52 @@
+import logging as logmodule
+import time
+
+from django.core.management.base import BaseCommand
+
+from contentcuration.models import Channel
+from contentcuration.models import ContentNode
+from contentcuration.node_metadata.tree import BATCH_SIZE
+from contentcuration.node_metadata.tree import update_tree_metadata
+
+logging = logmodule.getLogger("command")
+
+
+class Command(BaseCommand):
+    help = (
+        "Calculates the tree metadata of topics that have none, or that is out of date"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--channel-id",
+            action="append",
+            dest="channel_ids",
+            help="Only calculate the tree metadata of these channels",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.time()
+
+        channels = Channel.objects.filter(deleted=False, main_tree__isnull=False)
+        if options["channel_ids"]:
+            channels = channels.filter(pk__in=options["channel_ids"])
+
+        total = 0
+        for channel_id, tree_id in channels.values_list("id", "main_tree__tree_id"):
+            count = update_tree_metadata(
+                ContentNode.objects.filter(tree_id=tree_id),
+                batch_size=options["batch_size"],
+            )
+            total += count
+            logging.info(
+                "Calculated tree metadata of {} topic(s) of channel {}".format(
+                    count, channel_id
+                )
+            )
+
+        logging.info(
+            "Finished calculating the tree metadata of {} topic(s) in {} seconds".format(
+                total, time.time() - start
+            )
+        )
@@ -0,0 +1,79 @@
+import logging as logmodule
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from contentcuration.models import Channel
+from contentcuration.utils.cache import ResourceSizeCache
+from contentcuration.utils.nodes import ResourceSizeHelper
+
+logging = logmodule.getLogger("command")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the tracked resource sizes of channels against the size calculated "
+        "from their files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--channel-id",
+            action="append",
+            dest="channel_ids",
+            help="Only check the resource sizes of these channels",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            default=False,
+            help="Set the tracked resource sizes that differ to the calculated size",
+        )
+
+    def handle(self, *args, **options):
+        start = time.time()
+
+        channels = Channel.objects.filter(
+            deleted=False, main_tree__isnull=False
+        ).select_related("main_tree")
+        if options["channel_ids"]:
+            channels = channels.filter(pk__in=options["channel_ids"])
+
+        checked = 0
+        mismatched = 0
+        for channel in channels.iterator():
+            cache = ResourceSizeCache(channel.main_tree)
+            if not cache.is_tracked():
+                continue
+
+            changes = cache.get_changes()
+            now = timezone.now()
+            size = ResourceSizeHelper(channel.main_tree).get_size() or 0
+            tracked_size = cache.get_size()
+            if cache.get_changes() != changes:
+                logging.info(
+                    "Skipping channel {} as its files changed while checking it".format(
+                        channel.id
+                    )
+                )
+                continue
+
+            checked += 1
+            if tracked_size == size:
+                continue
+
+            mismatched += 1
+            logging.warning(
+                "Tracked resource size of channel {} is {}, but its files add up to {}".format(
+                    channel.id, tracked_size, size
+                )
+            )
+            if options["fix"]:
+                cache.set_tracked_size(size, now, changes)
+
+        logging.info(
+            "Finished checking the resource sizes of {} channel(s) in {} seconds, {} differed".format(
+                checked, time.time() - start, mismatched
+            )
+        )
@@ -2,7 +2,11 @@
 
 - ContentNodes older than 2 weeks, whose parents are in the designated "garbage
 tree" (i.e. `settings.ORPHANAGE_ROOT_ID`). Also delete the associated Files in the
-database and in object storage.
+database.
+
+With `--sweep-storage`, objects in storage no longer referenced by any checksum in the
+database or in published channel databases are deleted too, or only reported with
+`--dry-run`.
 """
 import logging as logmodule
 
@@ -14,12 +18,28 @@ from contentcuration.utils.garbage_collect import clean_up_feature_flags
 from contentcuration.utils.garbage_collect import clean_up_soft_deleted_users
 from contentcuration.utils.garbage_collect import clean_up_stale_files
 from contentcuration.utils.garbage_collect import clean_up_tasks
+from contentcuration.utils.garbage_collect import clean_up_user_exports
+from contentcuration.utils.garbage_collect import sweep_storage
 
 
 logging = logmodule.getLogger("command")
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sweep-storage",
+            action="store_true",
+            default=False,
+            help="Delete the objects in storage that are no longer referenced",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only report the objects the storage sweep would delete",
+        )
+
     def handle(self, *args, **options):
         """
         Actual logic for garbage collection.
@@ -47,3 +67,10 @@ class Command(BaseCommand):
 
         logging.info("Cleaning up tasks")
         clean_up_tasks()
+
+        logging.info("Cleaning up expired exports of user data")
+        clean_up_user_exports()
+
+        if options["sweep_storage"]:
+            logging.info("Sweeping unreferenced objects from storage")
+            sweep_storage(dry_run=options["dry_run"])
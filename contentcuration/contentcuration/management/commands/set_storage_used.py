@@ -3,21 +3,54 @@ import logging
 from django.core.management.base import BaseCommand
 
 from contentcuration.models import User
+from contentcuration.utils.user import reconcile_user_storage
 
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
+    help = (
+        "Reconciles the storage ledgers of users with their files, building the ledgers "
+        "of users that don't have one yet"
+    )
+
     def add_arguments(self, parser):
-        parser.add_argument("--force", action="store_true", dest="force", default=False)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            dest="force",
+            default=False,
+            help="Verify the ledgers of all users, not just users without one",
+        )
+        parser.add_argument(
+            "--user-id",
+            action="append",
+            dest="user_ids",
+            help="Only reconcile the storage ledgers of these users",
+        )
 
     def handle(self, *args, **options):
         users = (
             User.objects.all()
             if options["force"]
-            else User.objects.filter(disk_space_used=0)
+            else User.objects.filter(storage_ledger__isnull=True)
         )
-        for index, user in enumerate(users):
-            user.set_space_used()
+        if options["user_ids"]:
+            users = users.filter(pk__in=options["user_ids"])
+
+        mismatched = 0
+        for index, user in enumerate(users.order_by("pk").iterator()):
+            previous_space_used, space_used = reconcile_user_storage(user)
+            if previous_space_used is not None and previous_space_used != space_used:
+                mismatched += 1
+                logger.warning(
+                    "Storage ledger of user {} recorded {} bytes used, but their files add up to {}".format(
+                        user.pk, previous_space_used, space_used
+                    )
+                )
             logger.info("Updated storage used for {} user(s)".format(index + 1))
+
+        logger.info(
+            "Finished reconciling storage ledgers, {} differed".format(mismatched)
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.24 on 2026-10-18 19:58
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contentcuration", "0170_merge_20260717_0136"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentNodeTreeMetadata",
+            fields=[
+                (
+                    "contentnode",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="tree_metadata",
+                        serialize=False,
+                        to="contentcuration.contentnode",
+                    ),
+                ),
+                ("tree_id", models.IntegerField()),
+                ("lft", models.IntegerField()),
+                ("rght", models.IntegerField()),
+                ("resource_count", models.IntegerField(default=0)),
+                ("coach_count", models.IntegerField(default=0)),
+                ("error_count", models.IntegerField(default=0)),
+                ("has_updated_descendants", models.BooleanField(default=False)),
+                ("has_new_descendants", models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.24 on 2026-10-19 00:37
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contentcuration", "0171_contentnodetreemetadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStorageLedger",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="storage_ledger",
+                        serialize=False,
+                        to="contentcuration.user",
+                    ),
+                ),
+                ("space_used", models.BigIntegerField(default=0)),
+                ("reconciled", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="UserStorageChecksum",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("checksum", models.CharField(max_length=400)),
+                ("file_size", models.BigIntegerField(default=0)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="storage_checksums",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "checksum")},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.24 on 2026-10-19 09:12
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contentcuration", "0172_user_storage_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="user_data_export_token",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="user_data_exported",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
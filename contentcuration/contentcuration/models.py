@@ -27,8 +27,10 @@ from django.core.validators import MinValueValidator
 from django.db import connection
 from django.db import IntegrityError
 from django.db import models
+from django.db import transaction
 from django.db.models import Count
 from django.db.models import Exists
+from django.db.models import ExpressionWrapper
 from django.db.models import F
 from django.db.models import Index
 from django.db.models import JSONField
@@ -91,12 +93,11 @@ from contentcuration.constants.organization_roles import (
 )
 from contentcuration.constants.organization_roles import ORGANIZATION_VIEWER
 from contentcuration.db.dual_write import mirror_field
-from contentcuration.db.models.expressions import Array
-from contentcuration.db.models.functions import ArrayRemove
-from contentcuration.db.models.functions import Unnest
 from contentcuration.db.models.manager import CustomContentNodeTreeManager
 from contentcuration.db.models.manager import CustomManager
 from contentcuration.utils.cache import delete_public_channel_cache_keys
+from contentcuration.utils.cache import forget_stored_file
+from contentcuration.utils.change_feed import notify_changes
 from contentcuration.utils.parser import load_json_string
 from contentcuration.viewsets.sync.constants import ALL_CHANGES
 from contentcuration.viewsets.sync.constants import ALL_TABLES
@@ -256,10 +257,16 @@ class User(AbstractBaseUser, PermissionsMixin):
     newest_notification_date = models.DateTimeField(null=True, blank=True)
     last_read_notification_date = models.DateTimeField(null=True, blank=True)
 
+    # The export of the user's data is stored under this random token, rather than their
+    # id, as exports are in a bucket that can be read without logging in
+    user_data_export_token = models.CharField(max_length=64, null=True, blank=True)
+    user_data_exported = models.DateTimeField(null=True, blank=True)
+
     _field_updates = FieldTracker(
         fields=[
             # Field to watch for changes
             "disk_space",
+            "email",
         ]
     )
 
@@ -359,11 +366,17 @@ class User(AbstractBaseUser, PermissionsMixin):
         if self.is_admin:
             return True
 
-        active_files = self.get_user_active_files()
-        if active_files.filter(checksum=checksum).exists():
-            return True
+        ledger = self.get_storage_ledger()
+        if ledger is not None:
+            if self.storage_checksums.filter(checksum=checksum).exists():
+                return True
+            space = float(max(self.disk_space - ledger.space_used, 0))
+        else:
+            active_files = self.get_user_active_files()
+            if active_files.filter(checksum=checksum).exists():
+                return True
+            space = self.get_available_space(active_files=active_files)
 
-        space = self.get_available_space(active_files=active_files)
         if space < size:
             raise PermissionDenied(
                 _("Not enough space. Check your storage under Settings page.")
@@ -488,7 +501,21 @@ class User(AbstractBaseUser, PermissionsMixin):
         )
 
     def get_user_active_files(self):
+        base_files_qs = self.get_user_storage_files()
 
+        unique_file_ids = (
+            base_files_qs.order_by("checksum", "id").distinct("checksum").values("id")
+        )
+
+        files_qs = base_files_qs.filter(id__in=Subquery(unique_file_ids))
+
+        return files_qs
+
+    def get_user_storage_files(self):
+        """
+        The files uploaded by the user that count towards their storage, including
+        files with the same checksum
+        """
         tree_cte = With(self.get_user_active_trees().distinct(), name="trees")
 
         user_files_cte = With(
@@ -519,15 +546,7 @@ class User(AbstractBaseUser, PermissionsMixin):
             )
         )
 
-        base_files_qs = self._filter_storage_billable_files(base_files_qs)
-
-        unique_file_ids = (
-            base_files_qs.order_by("checksum", "id").distinct("checksum").values("id")
-        )
-
-        files_qs = base_files_qs.filter(id__in=Subquery(unique_file_ids))
-
-        return files_qs
+        return self._filter_storage_billable_files(base_files_qs)
 
     def _filter_storage_billable_files(self, queryset):
         """
@@ -539,14 +558,28 @@ class User(AbstractBaseUser, PermissionsMixin):
             file_format_id=file_formats.PERSEUS
         )
 
+    def get_storage_ledger(self):
+        """
+        :return: The UserStorageLedger of the user, or None when it hasn't been built yet
+        """
+        return UserStorageLedger.objects.filter(user_id=self.pk).first()
+
     def get_space_used(self, active_files=None):
+        if active_files is None:
+            ledger = self.get_storage_ledger()
+            if ledger is not None:
+                return float(ledger.space_used)
         active_files = active_files or self.get_user_active_files()
         files = active_files.aggregate(total_used=Sum("file_size"))
         return float(files["total_used"] or 0)
 
     def set_space_used(self):
-        self.disk_space_used = self.get_space_used()
-        self.save()
+        """
+        Reconciles the storage ledger of the user with their files, and sets the space used
+        """
+        from contentcuration.utils.user import reconcile_user_storage
+
+        reconcile_user_storage(self)
         return self.disk_space_used
 
     def get_space_used_by_kind(self):
@@ -606,11 +639,18 @@ class User(AbstractBaseUser, PermissionsMixin):
     def save(self, *args, **kwargs):
         from contentcuration.utils.user import calculate_user_storage
 
+        # Pending invitations are matched by email, and a new user may reuse the id of one
+        # whose permissions were cached
+        email_changed = "email" in self._field_updates.changed()
+
         super(User, self).save(*args, **kwargs)
 
         if "disk_space" in self._field_updates.changed():
             calculate_user_storage(self.pk)
 
+        if email_changed:
+            UserPermissionSet.invalidate([self.pk])
+
         changed = False
 
         if not self.content_defaults:
@@ -777,6 +817,42 @@ class UserSubscription(models.Model):
         return f"Subscription for {self.user.email}: {self.stripe_subscription_status}"
 
 
+class UserStorageLedger(models.Model):
+    """
+    The storage used by a user, kept up to date as their files are attached to, detached
+    from or moved between trees, so that it doesn't have to be calculated from their files.
+    A user's storage is only tracked once their ledger has been reconciled with their files.
+    """
+
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="storage_ledger",
+    )
+    space_used = models.BigIntegerField(default=0)
+    reconciled = models.DateTimeField(default=timezone.now)
+
+
+class UserStorageChecksum(models.Model):
+    """
+    The number of a user's files with a checksum that count towards their storage, which
+    only counts once for all of them
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="storage_checksums",
+    )
+    checksum = models.CharField(max_length=400)
+    file_size = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ["user", "checksum"]
+
+
 class UUIDField(models.CharField):
     def __init__(self, *args, **kwargs):
         kwargs["max_length"] = 32
@@ -1002,36 +1078,183 @@ def boolean_val(val):
     return Value(val, output_field=models.BooleanField())
 
 
-class PermissionCTE(With):
+def in_filter_val(values, *field_names):
+    """
+    An annotation of whether any of the fields is one of the values, which avoids an empty
+    `IN` clause when there are no values
+    """
+    if not values:
+        return boolean_val(False)
+    q = Q()
+    for field_name in field_names:
+        q |= Q(**{"{}__in".format(field_name): values})
+    return ExpressionWrapper(q, output_field=models.BooleanField())
+
+
+USER_PERMISSIONS_CACHE_KEY = "user_permissions:{user_id}"
+USER_PERMISSIONS_VERSION_CACHE_KEY = "user_permissions_version:{user_id}"
+USER_PERMISSIONS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class UserPermissionSet(object):
+    """
+    The ids of the channels that a user can edit or view, and of the trees of those
+    channels, cached per user so that permission filters can use plain `IN` filters
+    instead of subqueries against the editors and viewers tables.
+
+    Each user has a version token that is replaced whenever their permissions change. The
+    token is read before the permissions are queried and cached along with them, so
+    permissions queried while they were being changed are never read from the cache.
+    """
+
     tree_id_fields = [
         "channel__{}__tree_id".format(tree_name) for tree_name in CHANNEL_TREES
     ]
 
-    def __init__(self, model, user_id, **kwargs):
-        queryset = model.objects.filter(user_id=user_id).annotate(
-            tree_id=Unnest(
-                ArrayRemove(Array(*self.tree_id_fields), None),
-                output_field=models.IntegerField(),
-            )
+    def __init__(
+        self,
+        edit_channel_ids=(),
+        view_channel_ids=(),
+        edit_tree_ids=(),
+        view_tree_ids=(),
+        pending_channel_ids=(),
+    ):
+        self.edit_channel_ids = list(edit_channel_ids)
+        self.view_channel_ids = list(view_channel_ids)
+        self.edit_tree_ids = list(edit_tree_ids)
+        self.view_tree_ids = list(view_tree_ids)
+        self.pending_channel_ids = list(pending_channel_ids)
+
+    def to_dict(self):
+        return {
+            "edit_channel_ids": self.edit_channel_ids,
+            "view_channel_ids": self.view_channel_ids,
+            "edit_tree_ids": self.edit_tree_ids,
+            "view_tree_ids": self.view_tree_ids,
+            "pending_channel_ids": self.pending_channel_ids,
+        }
+
+    @classmethod
+    def _get_channels(cls, through_model, user_id):
+        channel_ids = []
+        tree_ids = set()
+        for channel_id, *channel_tree_ids in through_model.objects.filter(
+            user_id=user_id
+        ).values_list("channel_id", *cls.tree_id_fields):
+            channel_ids.append(channel_id)
+            tree_ids.update(tree_id for tree_id in channel_tree_ids if tree_id)
+        return channel_ids, sorted(tree_ids)
+
+    @classmethod
+    def calculate(cls, user):
+        edit_channel_ids, edit_tree_ids = cls._get_channels(
+            User.editable_channels.through, user.id
         )
-        super(PermissionCTE, self).__init__(
-            queryset=queryset.values("user_id", "channel_id", "tree_id"), **kwargs
+        view_channel_ids, view_tree_ids = cls._get_channels(
+            User.view_only_channels.through, user.id
+        )
+        pending_channel_ids = Invitation.objects.filter(
+            email=user.email,
+            channel__isnull=False,
+            revoked=False,
+            declined=False,
+            accepted=False,
+        ).values_list("channel_id", flat=True)
+        return cls(
+            edit_channel_ids=edit_channel_ids,
+            view_channel_ids=view_channel_ids,
+            edit_tree_ids=edit_tree_ids,
+            view_tree_ids=view_tree_ids,
+            pending_channel_ids=pending_channel_ids,
         )
 
     @classmethod
-    def editable_channels(cls, user_id):
-        return PermissionCTE(
-            User.editable_channels.through, user_id, name="editable_channels_cte"
-        )
+    def for_user(cls, user):
+        key = USER_PERMISSIONS_CACHE_KEY.format(user_id=user.id)
+        version_key = USER_PERMISSIONS_VERSION_CACHE_KEY.format(user_id=user.id)
+
+        # Permissions changed by the current transaction are only cached once it's
+        # committed, as they may still be rolled back
+        if user.id in cls._get_uncommitted_user_ids():
+            return cls.calculate(user)
+
+        cached = cache.get_many([key, version_key])
+        version = cached.get(version_key)
+        permissions = cached.get(key)
+        if version is not None and permissions and permissions["version"] == version:
+            del permissions["version"]
+            return cls(**permissions)
+
+        if version is None:
+            cache.add(version_key, uuid.uuid4().hex, None)
+            version = cache.get(version_key)
+        permission_set = cls.calculate(user)
+        permissions = permission_set.to_dict()
+        permissions["version"] = version
+        cache.set(key, permissions, USER_PERMISSIONS_CACHE_TIMEOUT)
+        return permission_set
+
+    @classmethod
+    def _get_uncommitted_user_ids(cls):
+        if not connection.in_atomic_block:
+            connection.uncommitted_permission_user_ids = set()
+        elif not hasattr(connection, "uncommitted_permission_user_ids"):
+            connection.uncommitted_permission_user_ids = set()
+        return connection.uncommitted_permission_user_ids
+
+    @classmethod
+    def invalidate(cls, user_ids):
+        """
+        Replaces the version tokens of users whose permissions changed, straight away and
+        again once the current transaction is committed, so that permissions queried from
+        before the transaction was committed aren't cached.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+
+        def invalidate():
+            cache.set_many(
+                {
+                    USER_PERMISSIONS_VERSION_CACHE_KEY.format(
+                        user_id=user_id
+                    ): uuid.uuid4().hex
+                    for user_id in user_ids
+                },
+                None,
+            )
+
+        invalidate()
+        if connection.in_atomic_block:
+            uncommitted_user_ids = cls._get_uncommitted_user_ids()
+            uncommitted_user_ids.update(user_ids)
+
+            def on_commit():
+                uncommitted_user_ids.difference_update(user_ids)
+                invalidate()
+
+            transaction.on_commit(on_commit)
 
     @classmethod
-    def view_only_channels(cls, user_id):
-        return PermissionCTE(
-            User.view_only_channels.through, user_id, name="view_only_channels_cte"
+    def invalidate_channels(cls, channel_ids):
+        user_ids = set(
+            User.editable_channels.through.objects.filter(
+                channel_id__in=channel_ids
+            ).values_list("user_id", flat=True)
+        )
+        user_ids.update(
+            User.view_only_channels.through.objects.filter(
+                channel_id__in=channel_ids
+            ).values_list("user_id", flat=True)
         )
+        cls.invalidate(user_ids)
 
-    def exists(self, *filters):
-        return Exists(self.queryset().filter(*filters).values("user_id"))
+    @classmethod
+    def invalidate_email(cls, email):
+        if email:
+            cls.invalidate(
+                User.objects.filter(email__iexact=email).values_list("id", flat=True)
+            )
 
 
 class ChannelModelQuerySet(CTEQuerySet):
@@ -1212,6 +1435,11 @@ class Channel(models.Model):
         ]
     )
 
+    # The trees that editors and viewers of the channel have permissions on
+    _tree_updates = FieldTracker(
+        fields=["{}_id".format(tree_name) for tree_name in CHANNEL_TREES]
+    )
+
     objects = ChannelModelManager()
 
     @classmethod
@@ -1226,12 +1454,10 @@ class Channel(models.Model):
         if not user_id:
             return queryset.none()
 
-        edit = Exists(
-            User.editable_channels.through.objects.filter(
-                user_id=user_id, channel_id=OuterRef("id")
-            )
+        permissions = UserPermissionSet.for_user(user)
+        queryset = queryset.annotate(
+            edit=in_filter_val(permissions.edit_channel_ids, "id")
         )
-        queryset = queryset.annotate(edit=edit)
         if user.is_admin:
             return queryset
 
@@ -1240,20 +1466,11 @@ class Channel(models.Model):
     @classmethod
     def filter_view_queryset(cls, queryset, user):
         user_id = not user.is_anonymous and user.id
-        user_email = not user.is_anonymous and user.email
 
         if user_id:
-            filters = dict(user_id=user_id, channel_id=OuterRef("id"))
-            edit = Exists(
-                User.editable_channels.through.objects.filter(**filters).values(
-                    "user_id"
-                )
-            )
-            view = Exists(
-                User.view_only_channels.through.objects.filter(**filters).values(
-                    "user_id"
-                )
-            )
+            permissions = UserPermissionSet.for_user(user)
+            edit = in_filter_val(permissions.edit_channel_ids, "id")
+            view = in_filter_val(permissions.view_channel_ids, "id")
         else:
             edit = boolean_val(False)
             view = boolean_val(False)
@@ -1268,11 +1485,10 @@ class Channel(models.Model):
 
         permission_filter = Q()
         if user_id:
-            pending_channels = Invitation.objects.filter(
-                email=user_email, revoked=False, declined=False, accepted=False
-            ).values_list("channel_id", flat=True)
             permission_filter = (
-                Q(view=True) | Q(edit=True) | Q(deleted=False, id__in=pending_channels)
+                Q(view=True)
+                | Q(edit=True)
+                | Q(deleted=False, id__in=permissions.pending_channel_ids)
             )
 
         return queryset.filter(permission_filter | Q(deleted=False, public=True))
@@ -1376,8 +1592,9 @@ class Channel(models.Model):
             filename, ext = os.path.splitext(original_values["thumbnail"])
             delete_empty_file_reference(filename, ext[1:])
 
-        # Refresh storage for all editors on the channel
-        if "deleted" in original_values:
+        # Refresh storage for all editors on the channel, when the files in its main tree
+        # start or stop counting towards it
+        if "deleted" in original_values or "main_tree_id" in original_values:
             for editor in self.editors.all():
                 calculate_user_storage(editor.pk)
 
@@ -1427,12 +1644,16 @@ class Channel(models.Model):
         else:
             self.on_update()
 
+        trees_changed = bool(self._tree_updates.changed())
+
         super(Channel, self).save(*args, **kwargs)
 
         if creating:
             self.history.create(
                 actor_id=self._actor_id, action=channel_history.CREATION
             )
+        elif trees_changed:
+            UserPermissionSet.invalidate_channels([self.id])
 
     def get_thumbnail(self):
         return get_channel_thumbnail(self)
@@ -2183,7 +2404,7 @@ class ContentNode(MPTTModel, models.Model):
     # when we check for changes
     _field_updates = FieldTracker()
 
-    _permission_filter = Q(tree_id=OuterRef("tree_id"))
+    _permission_tree_id_fields = ("tree_id",)
 
     @classmethod
     def _annotate_channel_id(cls, queryset):
@@ -2236,10 +2457,12 @@ class ContentNode(MPTTModel, models.Model):
         if not user_id:
             return queryset.none()
 
-        edit_cte = PermissionCTE.editable_channels(user_id)
+        permissions = UserPermissionSet.for_user(user)
 
-        queryset = queryset.with_cte(edit_cte).annotate(
-            edit=edit_cte.exists(cls._permission_filter),
+        queryset = queryset.annotate(
+            edit=in_filter_val(
+                permissions.edit_tree_ids, *cls._permission_tree_id_fields
+            ),
         )
 
         if user.is_admin:
@@ -2264,16 +2487,15 @@ class ContentNode(MPTTModel, models.Model):
                 edit=boolean_val(False), view=boolean_val(False)
             ).filter(public=True)
 
-        edit_cte = PermissionCTE.editable_channels(user_id)
-        view_cte = PermissionCTE.view_only_channels(user_id)
+        permissions = UserPermissionSet.for_user(user)
 
-        queryset = (
-            queryset.with_cte(edit_cte)
-            .with_cte(view_cte)
-            .annotate(
-                edit=edit_cte.exists(cls._permission_filter),
-                view=view_cte.exists(cls._permission_filter),
-            )
+        queryset = queryset.annotate(
+            edit=in_filter_val(
+                permissions.edit_tree_ids, *cls._permission_tree_id_fields
+            ),
+            view=in_filter_val(
+                permissions.view_tree_ids, *cls._permission_tree_id_fields
+            ),
         )
 
         if user.is_admin:
@@ -2724,12 +2946,6 @@ class ContentNode(MPTTModel, models.Model):
         original_values = self._field_updates.changed()
         return any((True for field in original_values if field not in blacklist))
 
-    def recalculate_editors_storage(self):
-        from contentcuration.utils.user import calculate_user_storage
-
-        for editor in self.files.values_list("uploaded_by_id", flat=True).distinct():
-            calculate_user_storage(editor)
-
     def mark_complete(self):  # noqa C901
         errors = []
         # Is complete if title is falsy but only if not a root node.
@@ -2818,24 +3034,20 @@ class ContentNode(MPTTModel, models.Model):
 
     def on_create(self):
         self.changed = True
-        self.recalculate_editors_storage()
         self.set_default_learning_activity()
 
     def on_update(self):
         self.changed = self.changed or self.has_changes()
 
     def move_to(self, target, *args, **kwargs):
-        parent_was_trashtree = self.parent.channel_trash.exists()
+        # Moving the node to or from the trash tree updates the storage ledgers of its
+        # editors in the tree manager's move_node
         super(ContentNode, self).move_to(target, *args, **kwargs)
         self.save()
 
         # Update tree_id cache when node is moved to another tree
         cache.set(CONTENTNODE_TREE_ID_CACHE_KEY.format(pk=self.id), self.tree_id, None)
 
-        # Recalculate storage if node was moved to or from the trash tree
-        if target.channel_trash.exists() or parent_was_trashtree:
-            self.recalculate_editors_storage()
-
     def set_default_learning_activity(self):
         if self.learning_activities is None:
             if self.kind in kind_activity_map:
@@ -2858,7 +3070,8 @@ class ContentNode(MPTTModel, models.Model):
         # be triggered - meaning updates to contentnode metadata should only rarely
         # trigger a write lock on mptt fields.
 
-        old_parent_id = self._field_updates.changed().get("parent_id")
+        changed_fields = self._field_updates.changed()
+        old_parent_id = changed_fields.get("parent_id")
         if self._state.adding and (self.parent_id or self.parent):
             same_order = False
         elif old_parent_id is DeferredAttribute:
@@ -2873,6 +3086,16 @@ class ContentNode(MPTTModel, models.Model):
         else:
             changed_ids = []
 
+        # The tree metadata of the ancestors of the node, and of its old parent when it is
+        # moved, is derived from it, so has to be calculated again
+        tree_metadata_changed = (
+            not same_order
+            or self._state.adding
+            or bool(TREE_METADATA_SOURCE_FIELDS.intersection(changed_fields))
+        )
+        # new nodes have no files yet, that could start or stop counting towards the
+        # resource size of the tree
+        complete_changed = not self._state.adding and "complete" in changed_fields
         if not same_order and not skip_lock:
             # Lock the mptt fields for the trees of the old and new parent
             with ContentNode.objects.lock_mptt(
@@ -2894,20 +3117,117 @@ class ContentNode(MPTTModel, models.Model):
             if changed_ids:
                 ContentNode.objects.filter(id__in=changed_ids).update(changed=True)
 
+        self.invalidate_tree_metadata(
+            tree_metadata_changed, old_parent_id=None if same_order else old_parent_id
+        )
+        self._update_resource_size(complete_changed)
+
     # Copied from MPTT
     save.alters_data = True
 
+    def _update_resource_size(self, complete_changed):
+        """
+        Updates the cached resource size of the tree, when the files of the node started or
+        stopped counting towards it, by the node being marked complete or incomplete
+        """
+        from contentcuration.utils.nodes import get_file_states
+        from contentcuration.utils.nodes import get_resource_size_deltas
+        from contentcuration.utils.nodes import increment_resource_sizes
+
+        if not complete_changed:
+            return
+        states = get_file_states(File.objects.filter(contentnode_id=self.pk))
+        if self.complete:
+            deltas = get_resource_size_deltas(added=states)
+        else:
+            deltas = get_resource_size_deltas(removed=states)
+        increment_resource_sizes(deltas)
+
+    def invalidate_tree_metadata(self, changed, old_parent_id=None):
+        """
+        :param changed: Whether the node was created, moved or had fields that the tree
+            metadata of its ancestors is derived from changed
+        :param old_parent_id: The id of the node's parent before it was moved
+        """
+        if changed:
+            ContentNodeTreeMetadata.objects.filter(
+                contentnode__tree_id=self.tree_id,
+                contentnode__lft__lte=self.lft,
+                contentnode__rght__gte=self.rght,
+            ).delete()
+        if old_parent_id and old_parent_id is not DeferredAttribute:
+            ContentNodeTreeMetadata.invalidate(
+                ContentNode.objects.filter(pk=old_parent_id), include_self=True
+            )
+
+    def get_resource_size_deltas(self, tree_id=None):
+        """
+        Calculates how much the resource sizes of trees change by, when the node and its
+        descendants are removed from their tree, and moved to another tree if given
+
+        :param tree_id: The tree_id of the tree the node is being moved to
+        :return: A dict of tree_ids to the difference in their resource size
+        """
+        from contentcuration.utils.nodes import get_file_states
+        from contentcuration.utils.nodes import get_resource_size_deltas
+
+        files = File.objects.filter(
+            contentnode__in=self.get_descendants(include_self=True).filter(
+                complete=True
+            )
+        )
+        removed = get_file_states(files)
+        added = []
+        if tree_id is not None:
+            added = [
+                (file_id, tree_id, checksum, file_size)
+                for file_id, _, checksum, file_size in removed
+            ]
+        return get_resource_size_deltas(
+            removed=removed, added=added, changed_files=files
+        )
+
+    def get_storage_states(self):
+        """
+        :return: The storage states, from `get_storage_states`, of the files of the node and
+            its descendants
+        """
+        from contentcuration.utils.user import get_storage_states
+
+        return get_storage_states(
+            File.objects.filter(contentnode__in=self.get_descendants(include_self=True))
+        )
+
     def delete(self, *args, **kwargs):
+        from contentcuration.utils.nodes import increment_resource_sizes
+        from contentcuration.utils.user import accounted_file_deletions
+        from contentcuration.utils.user import get_storage_deltas
+        from contentcuration.utils.user import increment_user_storage
+
         parent = self.parent or self._field_updates.changed().get("parent")
         if parent:
             parent.changed = True
             parent.save()
 
-        self.recalculate_editors_storage()
+        ContentNodeTreeMetadata.objects.filter(
+            contentnode__tree_id=self.tree_id,
+            contentnode__lft__lt=self.lft,
+            contentnode__rght__gt=self.rght,
+        ).delete()
+
+        # calculated ahead of deleting, while the files are there to compare against
+        resource_size_deltas = self.get_resource_size_deltas()
+        storage_states = self.get_storage_states()
 
         # Lock the mptt fields for the tree of this node
-        with ContentNode.objects.lock_mptt(self.tree_id):
-            return super(ContentNode, self).delete(*args, **kwargs)
+        with ContentNode.objects.lock_mptt(
+            self.tree_id
+        ), accounted_file_deletions.account(storage_states):
+            result = super(ContentNode, self).delete(*args, **kwargs)
+            increment_user_storage(get_storage_deltas(removed=storage_states))
+
+        increment_resource_sizes(resource_size_deltas)
+        return result
 
     # Copied from MPTT
     delete.alters_data = True
@@ -2957,6 +3277,77 @@ class ContentNode(MPTTModel, models.Model):
         ]
 
 
+# Fields of content nodes that the tree metadata of their ancestors is derived from
+TREE_METADATA_SOURCE_FIELDS = {
+    "kind",
+    "kind_id",
+    "role_visibility",
+    "complete",
+    "changed",
+    "published",
+}
+
+
+class ContentNodeTreeMetadata(models.Model):
+    """
+    Materialized counts and flags of the descendants of a topic, which are otherwise
+    calculated for every node listed by the ContentNode viewset.
+
+    Rows are deleted when the nodes they are derived from are created, moved, copied, deleted
+    or have any of `TREE_METADATA_SOURCE_FIELDS` updated, and are calculated again when next
+    read. The tree_id, lft and rght of the node at the time of calculation are stored too, so
+    that rows are never read after tree changes that bypass the ORM.
+    """
+
+    contentnode = models.OneToOneField(
+        ContentNode,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="tree_metadata",
+    )
+    tree_id = models.IntegerField()
+    lft = models.IntegerField()
+    rght = models.IntegerField()
+    resource_count = models.IntegerField(default=0)
+    coach_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    has_updated_descendants = models.BooleanField(default=False)
+    has_new_descendants = models.BooleanField(default=False)
+
+    @classmethod
+    def invalidate(cls, nodes, include_self=False):
+        """
+        Deletes the tree metadata of the ancestors of nodes
+
+        :param nodes: A ContentNode queryset
+        :param include_self: Whether to also delete the tree metadata of the nodes themselves
+        """
+        nodes = nodes.order_by()
+        condition = Q(
+            Exists(
+                nodes.filter(
+                    tree_id=OuterRef("contentnode__tree_id"),
+                    lft__gt=OuterRef("contentnode__lft"),
+                    lft__lt=OuterRef("contentnode__rght"),
+                )
+            )
+        )
+        if include_self:
+            condition |= Q(contentnode_id__in=nodes.values("pk"))
+        cls.objects.filter(
+            condition, contentnode__tree_id__in=nodes.values("tree_id")
+        ).delete()
+
+    @classmethod
+    def invalidate_for_fields(cls, nodes, fields):
+        """
+        Deletes the tree metadata of the ancestors of nodes, if any of the fields being
+        updated on them are ones that the tree metadata is derived from
+        """
+        if TREE_METADATA_SOURCE_FIELDS.intersection(fields):
+            cls.invalidate(nodes)
+
+
 class ContentKind(models.Model):
     kind = models.CharField(
         primary_key=True, max_length=200, choices=content_kinds.choices
@@ -3260,7 +3651,7 @@ class AssessmentItem(models.Model):
 
         unique_together = ["contentnode", "assessment_id"]
 
-    _permission_filter = Q(tree_id=OuterRef("contentnode__tree_id"))
+    _permission_tree_id_fields = ("contentnode__tree_id",)
 
     @classmethod
     def filter_edit_queryset(cls, queryset, user):
@@ -3269,10 +3660,12 @@ class AssessmentItem(models.Model):
         if not user_id:
             return queryset.none()
 
-        edit_cte = PermissionCTE.editable_channels(user_id)
+        permissions = UserPermissionSet.for_user(user)
 
-        queryset = queryset.with_cte(edit_cte).annotate(
-            edit=edit_cte.exists(cls._permission_filter),
+        queryset = queryset.annotate(
+            edit=in_filter_val(
+                permissions.edit_tree_ids, *cls._permission_tree_id_fields
+            ),
         )
 
         if user.is_admin:
@@ -3297,16 +3690,15 @@ class AssessmentItem(models.Model):
                 edit=boolean_val(False), view=boolean_val(False)
             ).filter(public=True)
 
-        edit_cte = PermissionCTE.editable_channels(user_id)
-        view_cte = PermissionCTE.view_only_channels(user_id)
+        permissions = UserPermissionSet.for_user(user)
 
-        queryset = (
-            queryset.with_cte(edit_cte)
-            .with_cte(view_cte)
-            .annotate(
-                edit=edit_cte.exists(cls._permission_filter),
-                view=view_cte.exists(cls._permission_filter),
-            )
+        queryset = queryset.annotate(
+            edit=in_filter_val(
+                permissions.edit_tree_ids, *cls._permission_tree_id_fields
+            ),
+            view=in_filter_val(
+                permissions.view_tree_ids, *cls._permission_tree_id_fields
+            ),
         )
 
         if user.is_admin:
@@ -3380,6 +3772,89 @@ MEDIA_PRESETS = [
 ]
 
 
+# The fields of files that decide how much they add to the resource size of their tree
+RESOURCE_SIZE_FILE_FIELDS = {"contentnode", "contentnode_id", "checksum", "file_size"}
+
+
+class FileQuerySet(CTEQuerySet):
+    def update(self, **kwargs):
+        """
+        Stops tracking the cached resource sizes of the trees the updated files counted
+        towards before or after the update, when updating fields the sizes are derived from,
+        as how much they change by isn't known. `bulk_update` also relies on this.
+        """
+        from contentcuration.utils.nodes import invalidate_resource_sizes
+
+        if self.query.is_sliced or RESOURCE_SIZE_FILE_FIELDS.isdisjoint(kwargs):
+            return super(FileQuerySet, self).update(**kwargs)
+
+        file_ids = list(self.values_list("pk", flat=True))
+        tree_ids = set(
+            self.filter(contentnode__isnull=False).values_list(
+                "contentnode__tree_id", flat=True
+            )
+        )
+        result = super(FileQuerySet, self).update(**kwargs)
+        tree_ids.update(
+            File.objects.filter(pk__in=file_ids, contentnode__isnull=False).values_list(
+                "contentnode__tree_id", flat=True
+            )
+        )
+        if tree_ids:
+            invalidate_resource_sizes(tree_ids)
+        return result
+
+    def delete(self):
+        """
+        Decrements the cached resource sizes of the trees the deleted files counted towards,
+        and the storage of the users they counted towards
+        """
+        from contentcuration.utils.nodes import get_file_states
+        from contentcuration.utils.nodes import get_resource_size_deltas
+        from contentcuration.utils.nodes import increment_resource_sizes
+        from contentcuration.utils.user import accounted_file_deletions
+        from contentcuration.utils.user import get_storage_deltas
+        from contentcuration.utils.user import get_storage_states
+        from contentcuration.utils.user import increment_user_storage
+
+        deltas = get_resource_size_deltas(
+            removed=get_file_states(self.filter(contentnode__complete=True))
+        )
+        storage_states = get_storage_states(self)
+        with accounted_file_deletions.account(storage_states):
+            result = super(FileQuerySet, self).delete()
+        increment_resource_sizes(deltas)
+        increment_user_storage(get_storage_deltas(removed=storage_states))
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Increments the cached resource sizes of the trees the created files count towards,
+        and the storage of the users they count towards
+        """
+        from contentcuration.utils.nodes import get_file_states
+        from contentcuration.utils.nodes import get_resource_size_deltas
+        from contentcuration.utils.nodes import increment_resource_sizes
+        from contentcuration.utils.user import get_storage_deltas
+        from contentcuration.utils.user import get_storage_states
+        from contentcuration.utils.user import increment_user_storage
+
+        objs = super(FileQuerySet, self).bulk_create(objs, *args, **kwargs)
+        file_ids = [obj.pk for obj in objs if obj.contentnode_id]
+        if file_ids:
+            added = get_file_states(
+                File.objects.filter(pk__in=file_ids, contentnode__complete=True)
+            )
+            increment_resource_sizes(get_resource_size_deltas(added=added))
+            added = get_storage_states(File.objects.filter(pk__in=file_ids))
+            increment_user_storage(get_storage_deltas(added=added))
+        return objs
+
+
+class FileManager(models.Manager.from_queryset(FileQuerySet)):
+    pass
+
+
 # studio#5974 swap (next release, after backfill completes). One migration:
 # - drop the @mirror_field decorator and the file_size_bigint field below
 # - file_size = models.BigIntegerField(blank=True, null=True)
@@ -3458,10 +3933,24 @@ class File(models.Model):
     modified = models.DateTimeField(auto_now=True, verbose_name="modified", null=True)
     duration = models.IntegerField(blank=True, null=True)
 
-    objects = CustomManager()
+    objects = FileManager()
 
-    _permission_filter = Q(tree_id=OuterRef("contentnode__tree_id")) | Q(
-        tree_id=OuterRef("assessment_item__contentnode__tree_id")
+    _field_updates = FieldTracker(fields=["contentnode_id", "checksum", "file_size"])
+
+    # The fields that decide whether the file counts towards the storage of a user
+    _storage_updates = FieldTracker(
+        fields=[
+            "contentnode_id",
+            "checksum",
+            "file_size",
+            "file_format_id",
+            "uploaded_by_id",
+        ]
+    )
+
+    _permission_tree_id_fields = (
+        "contentnode__tree_id",
+        "assessment_item__contentnode__tree_id",
     )
 
     @classmethod
@@ -3471,9 +3960,12 @@ class File(models.Model):
         if not user_id:
             return queryset.none()
 
-        cte = PermissionCTE.editable_channels(user_id)
-        queryset = queryset.with_cte(cte).annotate(
-            edit=cte.exists(cls._permission_filter)
+        permissions = UserPermissionSet.for_user(user)
+
+        queryset = queryset.annotate(
+            edit=in_filter_val(
+                permissions.edit_tree_ids, *cls._permission_tree_id_fields
+            ),
         )
 
         if user.is_admin:
@@ -3510,16 +4002,15 @@ class File(models.Model):
                 edit=boolean_val(False), view=boolean_val(False)
             ).filter(public=True)
 
-        edit_cte = PermissionCTE.editable_channels(user_id)
-        view_cte = PermissionCTE.view_only_channels(user_id)
+        permissions = UserPermissionSet.for_user(user)
 
-        queryset = (
-            queryset.with_cte(edit_cte)
-            .with_cte(view_cte)
-            .annotate(
-                edit=edit_cte.exists(cls._permission_filter),
-                view=view_cte.exists(cls._permission_filter),
-            )
+        queryset = queryset.annotate(
+            edit=in_filter_val(
+                permissions.edit_tree_ids, *cls._permission_tree_id_fields
+            ),
+            view=in_filter_val(
+                permissions.view_tree_ids, *cls._permission_tree_id_fields
+            ),
         )
 
         if user.is_admin:
@@ -3569,12 +4060,25 @@ class File(models.Model):
     def save(self, set_by_file_on_disk=True, *args, **kwargs):
         """
         Overrider the default save method.
+        @see File.set_file_fields
+        """
+        self.set_file_fields(set_by_file_on_disk=set_by_file_on_disk)
+
+        removed = self._get_previous_resource_size_states()
+        removed_storage = self._get_previous_storage_states()
+
+        super(File, self).save(*args, **kwargs)
+
+        self._update_resource_sizes(removed)
+        self._update_storage(removed_storage)
+
+    def set_file_fields(self, set_by_file_on_disk=True):
+        """
+        Validates the file format, which is done before saving, or bulk creating files.
         If the file_on_disk FileField gets passed a content copy:
             1. generate the MD5 from the content copy
             2. fill the other fields accordingly
         """
-        from contentcuration.utils.user import calculate_user_storage
-
         # check if the file format exists in file_formats.choices
         if self.file_format_id:
             if self.file_format_id not in dict(file_formats.choices):
@@ -3600,10 +4104,95 @@ class File(models.Model):
                         "Files of type `{}` are not supported.".format(ext)
                     )
 
-        super(File, self).save(*args, **kwargs)
+    def delete(self, *args, **kwargs):
+        from contentcuration.utils.user import accounted_file_deletions
+
+        removed = self._get_resource_size_states() if self.contentnode_id else None
+        removed_storage = []
+        if self.uploaded_by_id and self.contentnode_id:
+            removed_storage = self._get_storage_states()
+        with accounted_file_deletions.account(removed_storage):
+            result = super(File, self).delete(*args, **kwargs)
+        self._update_resource_sizes(removed)
+        self._update_storage(removed_storage)
+        return result
 
-        if self.uploaded_by_id:
-            calculate_user_storage(self.uploaded_by_id)
+    def _get_previous_resource_size_states(self):
+        """
+        :return: The states, as saved, of this file when it counts towards the resource size
+            of its tree, or None when nothing affecting resource sizes has changed
+        """
+        if self._state.adding:
+            return [] if self.contentnode_id else None
+        if not self._field_updates.changed():
+            return None
+        return self._get_resource_size_states()
+
+    def _get_resource_size_states(self):
+        """
+        :return: The states, as saved, of this file when it counts towards the resource size
+            of its tree
+        """
+        from contentcuration.utils.nodes import get_file_states
+
+        return get_file_states(
+            File.objects.filter(pk=self.pk, contentnode__complete=True)
+        )
+
+    def _update_resource_sizes(self, removed):
+        """
+        Updates the cached resource sizes of the trees the file counted towards, and counts
+        towards now that it has been saved or deleted
+
+        :param removed: The states of the file before it was saved or deleted, or None when
+            nothing affecting resource sizes has changed
+        """
+        from contentcuration.utils.nodes import get_resource_size_deltas
+        from contentcuration.utils.nodes import increment_resource_sizes
+
+        if removed is None:
+            return
+        increment_resource_sizes(
+            get_resource_size_deltas(
+                removed=removed, added=self._get_resource_size_states()
+            )
+        )
+
+    def _get_previous_storage_states(self):
+        """
+        :return: The storage states, as saved, of this file, or None when nothing affecting
+            the storage of users has changed
+        """
+        if self._state.adding:
+            return []
+        if not self._storage_updates.changed():
+            return None
+        return self._get_storage_states()
+
+    def _get_storage_states(self):
+        from contentcuration.utils.user import get_storage_states
+
+        if self.pk is None:
+            return []
+        return get_storage_states(File.objects.filter(pk=self.pk))
+
+    def _update_storage(self, removed):
+        """
+        Updates the storage of the users the file counted towards, and counts towards now
+        that it has been saved or deleted
+
+        :param removed: The storage states of the file before it was saved or deleted, or
+            None when nothing affecting the storage of users has changed
+        """
+        from contentcuration.utils.user import get_storage_deltas
+        from contentcuration.utils.user import increment_user_storage
+
+        if removed is None:
+            return
+        added = []
+        if self.uploaded_by_id and self.contentnode_id:
+            added = self._get_storage_states()
+        increment_user_storage(get_storage_deltas(removed=removed, added=added))
 
     class Meta:
         indexes = [
@@ -3637,10 +4226,15 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     when corresponding `File` object is deleted.
     Be careful! we don't know if this will work when perform bash delete on File obejcts.
     """
-    # Recalculate storage
+    # Recalculate storage, unless the deletion was already accounted for
+    from contentcuration.utils.user import accounted_file_deletions
     from contentcuration.utils.user import calculate_user_storage
 
-    if instance.uploaded_by_id:
+    if (
+        instance.uploaded_by_id
+        and instance.contentnode_id
+        and instance.pk not in accounted_file_deletions
+    ):
         calculate_user_storage(instance.uploaded_by_id)
 
 
@@ -3653,6 +4247,7 @@ def delete_empty_file_reference(checksum, extension):
         storage_path = generate_object_storage_name(checksum, filename)
         if default_storage.exists(storage_path):
             default_storage.delete(storage_path)
+            forget_stored_file(filename)
 
 
 class PrerequisiteContentRelationship(models.Model):
@@ -3825,6 +4420,63 @@ class Invitation(models.Model):
         ).distinct()
 
 
+@receiver(models.signals.m2m_changed, sender=Channel.editors.through)
+@receiver(models.signals.m2m_changed, sender=Channel.viewers.through)
+def invalidate_channel_member_permissions(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Invalidates the cached permissions of users that are added to or removed from the
+    editors or viewers of channels
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        UserPermissionSet.invalidate([instance.pk])
+    elif action == "pre_clear":
+        UserPermissionSet.invalidate_channels([instance.pk])
+    else:
+        UserPermissionSet.invalidate(pk_set)
+
+
+@receiver(models.signals.pre_delete, sender=Channel)
+def invalidate_deleted_channel_member_permissions(sender, instance, **kwargs):
+    """
+    Invalidates the cached permissions of the editors and viewers of channels that are
+    deleted, as the rows of the editors and viewers tables are deleted along with them
+    without sending m2m_changed signals, and their trees outlive them
+    """
+    UserPermissionSet.invalidate_channels([instance.pk])
+
+
+@receiver(models.signals.m2m_changed, sender=Channel.editors.through)
+def recalculate_channel_editor_storage(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Recalculates the storage of users that are added to or removed from the editors of
+    channels, as the files they uploaded to the channels start or stop counting towards it
+    """
+    from contentcuration.utils.user import calculate_user_storage
+
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == "pre_clear":
+        user_ids = instance.editors.values_list("pk", flat=True)
+    else:
+        user_ids = pk_set
+    for user_id in user_ids:
+        calculate_user_storage(user_id)
+
+
+@receiver(models.signals.post_save, sender=Invitation)
+@receiver(models.signals.post_delete, sender=Invitation)
+def invalidate_invited_user_permissions(sender, instance, **kwargs):
+    UserPermissionSet.invalidate_email(instance.email)
+
+
 class Change(models.Model):
     server_rev = models.BigAutoField(primary_key=True)
     # We need to store the user who is applying this change
@@ -3946,6 +4598,7 @@ class Change(models.Model):
             )
 
         cls.objects.bulk_create(change_models)
+        notify_changes(change_models)
         return change_models
 
     @classmethod
@@ -3965,6 +4618,7 @@ class Change(models.Model):
             **change,
         )
         obj.save()
+        notify_changes([obj])
         return obj
 
     @classmethod
@@ -16,6 +16,7 @@ from le_utils.constants import roles
 from contentcuration.db.models.expressions import BooleanComparison
 from contentcuration.db.models.expressions import WhenQ
 from contentcuration.node_metadata.cte import AssessmentCountCTE
+from contentcuration.node_metadata.cte import DescendantMetadataCTE
 from contentcuration.node_metadata.cte import ResourceSizeCTE
 from contentcuration.node_metadata.cte import TreeMetadataCTE
 
@@ -230,3 +231,82 @@ class ResourceSize(DescendantAnnotation):
 
     def get_annotation(self, cte):
         return Max(cte.col.resource_size, output_field=IntegerField())
+
+
+class DescendantMetadataAnnotation(MetadataAnnotation):
+    """
+    Aggregates the descendants of nodes, which are joined to them by `DescendantMetadataCTE`
+    """
+
+    cte = DescendantMetadataCTE
+
+
+class DescendantResourceCount(DescendantMetadataAnnotation):
+    cte_columns = ("id", "kind_id")
+
+    def get_annotation(self, cte):
+        resource_condition = self.build_topic_condition(cte.col.kind_id, "!=")
+
+        return Count(
+            Case(
+                When(condition=WhenQ(*resource_condition), then=cte.col.id),
+                default=Value(None),
+            )
+        )
+
+
+class DescendantCoachCount(DescendantMetadataAnnotation):
+    cte_columns = ("id", "kind_id", "role_visibility")
+
+    def get_annotation(self, cte):
+        coach_condition = self.build_topic_condition(cte.col.kind_id, "!=")
+        coach_condition.append(
+            BooleanComparison(cte.col.role_visibility, "=", Value(roles.COACH))
+        )
+
+        return Count(
+            Case(
+                When(condition=WhenQ(*coach_condition), then=cte.col.id),
+                default=Value(None),
+            )
+        )
+
+
+class DescendantErrorCount(DescendantMetadataAnnotation):
+    cte_columns = ("id", "complete")
+
+    def get_annotation(self, cte):
+        error_condition = [BooleanComparison(cte.col.complete, "=", Value(False))]
+
+        return Count(
+            Case(
+                When(condition=WhenQ(*error_condition), then=cte.col.id),
+                default=Value(None),
+            )
+        )
+
+
+class HasChangedDescendants(DescendantMetadataAnnotation):
+    cte_columns = ("kind_id", "changed", "published")
+
+    def __init__(self, *args, **kwargs):
+        self.published = kwargs.pop("published")
+        super(HasChangedDescendants, self).__init__(*args, **kwargs)
+
+    def get_annotation(self, cte):
+        changed_condition = self.build_topic_condition(cte.col.kind_id, "!=")
+        changed_condition += [
+            BooleanComparison(cte.col.changed, "=", Value(True)),
+            BooleanComparison(cte.col.published, "=", Value(self.published)),
+        ]
+
+        return Coalesce(
+            BoolOr(
+                Case(
+                    When(condition=WhenQ(*changed_condition), then=Value(True)),
+                    default=Value(False),
+                )
+            ),
+            Value(False),
+            output_field=BooleanField(),
+        )
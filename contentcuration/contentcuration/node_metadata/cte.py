@@ -1,4 +1,5 @@
 from django.db.models import IntegerField
+from django.db.models import Q
 from django.db.models.aggregates import Count
 from django.db.models.aggregates import Sum
 from django.db.models.expressions import Case
@@ -24,6 +25,8 @@ class MetadataCTE(object):
         """
         self.query = queryset
         self.cte = None
+        # copy, so that columns added to this CTE aren't added to every instance of it
+        self.columns = list(self.columns)
 
     def add_columns(self, columns):
         self.columns.extend(columns)
@@ -67,6 +70,40 @@ class TreeMetadataCTE(MetadataCTE):
         return cte.join(query, tree_id=cte.col.tree_id).with_cte(cte)
 
 
+class DescendantMetadataCTE(MetadataCTE):
+    columns = ["tree_id", "lft"]
+
+    def build(self):
+        # Only the descendants of the nodes are read, rather than the whole of their trees,
+        # skipping the ranges of nodes nested in other nodes of the queryset
+        ranges = Q()
+        last_tree_id, last_rght = None, None
+        for tree_id, lft, rght in (
+            self.query.order_by("tree_id", "lft").values_list("tree_id", "lft", "rght")
+        ):
+            if tree_id == last_tree_id and rght < last_rght:
+                continue
+            ranges |= Q(tree_id=tree_id, lft__gt=lft, lft__lt=rght)
+            last_tree_id, last_rght = tree_id, rght
+        return With(
+            ContentNode.objects.filter(ranges).values(*set(self.columns)).order_by(),
+            name="descendant_cte",
+        )
+
+    def join(self, query):
+        """
+        Joins each node with its descendants, if any, so that they can be aggregated
+        """
+        cte = self.get()
+        return cte.join(
+            query,
+            tree_id=cte.col.tree_id,
+            lft__lt=cte.col.lft,
+            rght__gt=cte.col.lft,
+            _join_type=LOUTER,
+        ).with_cte(cte)
+
+
 class AssessmentCountCTE(LeftContentCTE):
     columns = ["content_id"]
 
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models.expressions import Case
+from django.db.models.expressions import Value
+from django.db.models.expressions import When
+
+from contentcuration.db.models.expressions import BooleanComparison
+from contentcuration.db.models.expressions import WhenQ
+from contentcuration.models import ContentNode
+from contentcuration.models import ContentNodeTreeMetadata
+from contentcuration.node_metadata.annotations import DescendantCoachCount
+from contentcuration.node_metadata.annotations import DescendantErrorCount
+from contentcuration.node_metadata.annotations import DescendantResourceCount
+from contentcuration.node_metadata.annotations import HasChangedDescendants
+from contentcuration.node_metadata.query import Metadata
+
+
+# The number of topics to calculate tree metadata for in a single query
+BATCH_SIZE = 100
+
+STAMP_FIELDS = ("tree_id", "lft", "rght")
+
+
+def get_tree_metadata_annotations():
+    return dict(
+        resource_count=DescendantResourceCount(),
+        coach_count=DescendantCoachCount(),
+        error_count=DescendantErrorCount(),
+        has_updated_descendants=HasChangedDescendants(published=True),
+        has_new_descendants=HasChangedDescendants(published=False),
+    )
+
+
+def filter_stale_tree_metadata(queryset):
+    """
+    :param queryset: A ContentNode queryset
+    :return: The nodes of the queryset that have descendants, but no current tree metadata
+    """
+    current_tree_metadata = ContentNodeTreeMetadata.objects.filter(
+        contentnode_id=OuterRef("id"),
+        **{field: OuterRef(field) for field in STAMP_FIELDS}
+    )
+    return queryset.filter(rght__gt=F("lft") + 1).exclude(Exists(current_tree_metadata))
+
+
+def _update_tree_metadata(node_ids):
+    nodes = ContentNode.objects.filter(pk__in=node_ids)
+    # The positions are read ahead of calculating the metadata, so that the metadata of nodes
+    # moved in between is stored with their old position, and so isn't read
+    stamps = {
+        node.pop("id"): node for node in nodes.order_by().values("id", *STAMP_FIELDS)
+    }
+    if not stamps:
+        return
+    tree_metadata = []
+    for row in Metadata(nodes, **get_tree_metadata_annotations()).build():
+        node_id = row.pop("id")
+        if node_id in stamps:
+            tree_metadata.append(
+                ContentNodeTreeMetadata(
+                    contentnode_id=node_id, **stamps[node_id], **row
+                )
+            )
+    with transaction.atomic():
+        ContentNodeTreeMetadata.objects.filter(contentnode_id__in=node_ids).delete()
+        ContentNodeTreeMetadata.objects.bulk_create(
+            tree_metadata, ignore_conflicts=True
+        )
+
+
+def update_tree_metadata(queryset, batch_size=BATCH_SIZE):
+    """
+    Calculates the tree metadata of the nodes of the queryset that have no current tree metadata
+
+    :param queryset: A ContentNode queryset
+    :return: The number of nodes that the tree metadata was calculated for
+    """
+    node_ids = list(
+        filter_stale_tree_metadata(queryset).order_by().values_list("id", flat=True)
+    )
+    for i in range(0, len(node_ids), batch_size):
+        _update_tree_metadata(node_ids[i : i + batch_size])
+    return len(node_ids)
+
+
+def annotate_tree_metadata(queryset, **fallbacks):
+    """
+    Annotates the queryset with the tree metadata of its nodes, read from their current tree
+    metadata, if there is any, or otherwise calculated by the fallback expressions.
+
+    :param queryset: A ContentNode queryset
+    :param fallbacks: A dict of ContentNodeTreeMetadata field names to expressions
+        calculating them
+    """
+    is_leaf = [BooleanComparison(F("rght"), "=", F("lft") + Value(1))]
+    is_current = [
+        BooleanComparison(F("tree_metadata__{}".format(field)), "=", F(field))
+        for field in STAMP_FIELDS
+    ]
+    annotations = {}
+    for field_name, fallback in fallbacks.items():
+        field = ContentNodeTreeMetadata._meta.get_field(field_name)
+        annotations[field_name] = Case(
+            # nodes without descendants don't have tree metadata
+            When(condition=WhenQ(*is_leaf), then=Value(field.default)),
+            When(
+                condition=WhenQ(*is_current),
+                then=F("tree_metadata__{}".format(field_name)),
+            ),
+            default=fallback,
+            output_field=field.__class__(),
+        )
+    return queryset.annotate(**annotations)
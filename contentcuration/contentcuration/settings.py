@@ -27,6 +27,8 @@ logging.basicConfig(level="INFO")
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 STORAGE_ROOT = "storage"
+RESIZED_IMAGES_STORAGE_ROOT = "resized_images"
+USER_EXPORTS_STORAGE_ROOT = "user_exports"
 DIFFS_ROOT = "diffs"
 DB_ROOT = "databases"
 STATIC_ROOT = os.getenv("STATICFILES_DIR") or os.path.join(BASE_DIR, "static")
@@ -404,6 +406,43 @@ ORPHANAGE_ROOT_ID = "00000000000000000000000000000000"
 # do choose to implement restore of old chefs, we will need to ensure moving nodes does not cause a tree sort.
 DELETED_CHEFS_ROOT_ID = "11111111111111111111111111111111"
 
+# Map channel trees into the export database a level at a time with bulk inserts when publishing,
+# rather than a node at a time
+PUBLISH_BULK_TREE_MAPPING = os.getenv("PUBLISH_BULK_TREE_MAPPING") or False
+
+# Build the export database of a publish from the export database of the previously published
+# version, only mapping the subtrees that have changed since
+PUBLISH_INCREMENTAL = os.getenv("PUBLISH_INCREMENTAL") or False
+
+# Number of threads that build the exercise archives of a publish ahead of mapping the tree.
+# With a single worker, the archives are built one at a time as their nodes are mapped.
+PUBLISH_EXERCISE_ARCHIVE_WORKERS = int(
+    os.getenv("PUBLISH_EXERCISE_ARCHIVE_WORKERS") or 1
+)
+
+# Number of processes that validate the QTI items of a bulk sync of assessment items against
+# the schema. With a single worker, the items are validated one at a time in the request.
+QTI_VALIDATION_WORKERS = int(os.getenv("QTI_VALIDATION_WORKERS") or 1)
+
+# Number of days the export of a user's data can be downloaded for, before it's deleted
+USER_EXPORT_EXPIRY_DAYS = int(os.getenv("USER_EXPORT_EXPIRY_DAYS") or 7)
+
+# Number of threads that check whether the files of a file diff that aren't known to be stored
+# are in storage
+FILE_DIFF_STORAGE_WORKERS = int(os.getenv("FILE_DIFF_STORAGE_WORKERS") or 3)
+
+# Number of zip files whose parsed central directories are kept in memory by each process
+# serving zipcontent requests
+ZIP_INDEX_CACHE_SIZE = int(os.getenv("ZIP_INDEX_CACHE_SIZE") or 128)
+
+# The longest time, in seconds, that a task applying the changes of a channel or user keeps
+# pulling newly arrived changes for, before requeuing itself if any are left
+CHANGE_DRAIN_TIME_SLICE = float(os.getenv("CHANGE_DRAIN_TIME_SLICE") or 30)
+
+# The longest time, in seconds, that a request to the waiting sync endpoint is held open
+# for new changes or task updates, before it returns with nothing new
+SYNC_LONG_POLL_TIMEOUT = float(os.getenv("SYNC_LONG_POLL_TIMEOUT") or 20)
+
 # How long we should cache any APIs that return public channel list details, which change infrequently
 PUBLIC_CHANNELS_CACHE_DURATION = 300
 
@@ -8,6 +8,7 @@ import time
 
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.contrib.sites.models import Site
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.utils.translation import override
@@ -16,7 +17,8 @@ from contentcuration.celery import app
 from contentcuration.models import Change
 from contentcuration.models import ContentNode
 from contentcuration.models import User
-from contentcuration.utils.csv_writer import write_user_csv
+from contentcuration.node_metadata.tree import update_tree_metadata
+from contentcuration.utils.csv_writer import export_user_csv
 from contentcuration.utils.nodes import calculate_resource_size
 from contentcuration.utils.nodes import generate_diff
 from contentcuration.viewsets.user import AdminUserFilter
@@ -30,15 +32,17 @@ def apply_user_changes_task(self, user_id):
     """
     :type self: contentcuration.utils.celery.tasks.CeleryTask
     :param user_id: The user ID for which to process changes
+    :return: The throughput of applying the changes, which is kept as the task's result
     """
-    from contentcuration.viewsets.sync.base import apply_changes
+    from contentcuration.viewsets.sync.base import drain_changes
 
     changes_qs = Change.objects.filter(
         applied=False, errored=False, user_id=user_id, channel__isnull=True
     )
-    apply_changes(changes_qs)
-    if changes_qs.exists():
+    throughput = drain_changes(changes_qs, settings.CHANGE_DRAIN_TIME_SLICE)
+    if throughput["queue_lag"]:
         self.requeue()
+    return throughput
 
 
 @app.task(bind=True, name="apply_channel_changes")
@@ -46,15 +50,17 @@ def apply_channel_changes_task(self, channel_id):
     """
     :type self: contentcuration.utils.celery.tasks.CeleryTask
     :param channel_id: The channel ID for which to process changes
+    :return: The throughput of applying the changes, which is kept as the task's result
     """
-    from contentcuration.viewsets.sync.base import apply_changes
+    from contentcuration.viewsets.sync.base import drain_changes
 
     changes_qs = Change.objects.filter(
         applied=False, errored=False, channel_id=channel_id
     )
-    apply_changes(changes_qs)
-    if changes_qs.exists():
+    throughput = drain_changes(changes_qs, settings.CHANGE_DRAIN_TIME_SLICE)
+    if throughput["queue_lag"]:
         self.requeue()
+    return throughput
 
 
 class CustomEmailMessage(EmailMessage):
@@ -77,11 +83,15 @@ class CustomEmailMessage(EmailMessage):
         self.attachments.append((filename, content, mimetype))
 
 
-@app.task(name="generateusercsv_task")
-def generateusercsv_task(user_id, language=settings.LANGUAGE_CODE):
+@app.task(bind=True, name="generateusercsv_task")
+def generateusercsv_task(self, user_id, language=settings.LANGUAGE_CODE):
+    """
+    :type self: contentcuration.utils.celery.tasks.CeleryTask
+    :param user_id: The ID of the user whose data is exported
+    """
     with override(language):
         user = User.objects.get(pk=user_id)
-        csv_path = write_user_csv(user)
+        export_user_csv(user, progress_tracker=self.get_progress_tracker())
         subject = render_to_string("export/user_csv_email_subject.txt", {})
         subject = "".join(subject.splitlines())
         message = render_to_string(
@@ -91,6 +101,8 @@ def generateusercsv_task(user_id, language=settings.LANGUAGE_CODE):
                 "user": user,
                 "edit_channels": user.editable_channels.values("name", "id"),
                 "view_channels": user.view_only_channels.values("name", "id"),
+                "domain": "https://{}".format(Site.objects.get_current().domain),
+                "expiry_days": settings.USER_EXPORT_EXPIRY_DAYS,
             },
         )
 
@@ -98,7 +110,6 @@ def generateusercsv_task(user_id, language=settings.LANGUAGE_CODE):
             subject, message, settings.DEFAULT_FROM_EMAIL, [user.email]
         )
         email.encoding = "utf-8"
-        email.attach_file(csv_path, mimetype="text/csv")
 
         email.send()
 
@@ -139,6 +150,28 @@ def calculate_resource_size_task(node_id, channel_id):
     return size
 
 
+@app.task(name="update_tree_metadata_task")
+def update_tree_metadata_task(node_ids):
+    """
+    Calculates the tree metadata of topics that don't have any, apart from the requests
+    that list them.
+    """
+    return update_tree_metadata(ContentNode.objects.filter(pk__in=node_ids))
+
+
+@app.task(name="sync_channel_tsvectors_task")
+def sync_channel_tsvectors_task(channel_id):
+    """
+    Updates the search tsvectors of a published channel and the nodes of its main tree, apart
+    from publishing so that it doesn't wait for them.
+    """
+    # Imported here rather than at module level to avoid a circular import, as publishing
+    # enqueues this task
+    from contentcuration.utils.publish import sync_contentnode_and_channel_tsvectors
+
+    return sync_contentnode_and_channel_tsvectors(channel_id)
+
+
 @app.task(name="sendcustomemails_task")
 def sendcustomemails_task(subject, message, query):
     subject = render_to_string(
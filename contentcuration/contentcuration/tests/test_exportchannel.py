@@ -1,6 +1,7 @@
 import json
 import os
 import random
+import shutil
 import string
 import tempfile
 import uuid
@@ -12,11 +13,15 @@ from celery import states
 from django.conf import settings
 from django.core.management import call_command
 from django.db import connections
+from django.db.models import Count
+from django.db.models import Sum
+from django.test import override_settings
 from django_celery_results.models import TaskResult
 from kolibri_content import models as kolibri_models
 from kolibri_content.router import cleanup_content_database_connection
 from kolibri_content.router import get_active_content_database
 from kolibri_content.router import set_active_content_database
+from kolibri_content.router import using_content_database
 from le_utils.constants import content_kinds
 from le_utils.constants import exercises
 from le_utils.constants import format_presets
@@ -51,6 +56,9 @@ from contentcuration.utils.publish import create_content_database
 from contentcuration.utils.publish import create_draft_channel_version
 from contentcuration.utils.publish import create_slideshow_manifest
 from contentcuration.utils.publish import fill_published_fields
+from contentcuration.utils.publish import get_mapped_channel_fields
+from contentcuration.utils.publish import get_published_statistics
+from contentcuration.utils.publish import get_tree_mapper_class
 from contentcuration.utils.publish import map_prerequisites
 from contentcuration.utils.publish import MIN_SCHEMA_VERSION
 from contentcuration.utils.publish import NoneContentNodeTreeError
@@ -88,6 +96,8 @@ def description():
 
 
 class ExportChannelTestCase(StudioTestCase):
+    bulk_mapping = False
+
     @classmethod
     def setUpClass(cls):
         super(ExportChannelTestCase, cls).setUpClass()
@@ -573,7 +583,11 @@ class ExportChannelTestCase(StudioTestCase):
 
         set_channel_icon_encoding(self.content_channel)
         self.tempdb = create_content_database(
-            self.content_channel, True, self.admin_user.id, True
+            self.content_channel,
+            True,
+            self.admin_user.id,
+            True,
+            bulk_mapping=self.bulk_mapping,
         )
 
         set_active_content_database(self.tempdb)
@@ -1051,6 +1065,319 @@ class ExportChannelTestCase(StudioTestCase):
         )
 
 
+def _export_database_rows(license_ids=True):
+    """
+    Returns the rows of the active export database, leaving out the values that are
+    generated afresh on every publish.
+    """
+    # License ids follow the order that licenses are first used in
+    contentnode_exclude = [] if license_ids else ["license_id"]
+    license_exclude = [] if license_ids else ["id"]
+
+    def rows(queryset, *exclude):
+        fields = [
+            field.attname
+            for field in queryset.model._meta.concrete_fields
+            if field.attname not in exclude
+        ]
+        return sorted(queryset.values_list(*fields), key=str)
+
+    return {
+        "contentnodes": rows(
+            kolibri_models.ContentNode.objects.all(), *contentnode_exclude
+        ),
+        "languages": rows(kolibri_models.Language.objects.all()),
+        "licenses": rows(kolibri_models.License.objects.all(), *license_exclude),
+        # Thumbnails and exercise archives are regenerated as new Studio files
+        "files": rows(kolibri_models.File.objects.all(), "id"),
+        "localfiles": rows(kolibri_models.LocalFile.objects.all()),
+        "assessmentmetadata": rows(
+            kolibri_models.AssessmentMetaData.objects.all(), "id"
+        ),
+        "tags": rows(kolibri_models.ContentTag.objects.all()),
+        "contentnode_tags": rows(
+            kolibri_models.ContentNode.tags.through.objects.all(), "id"
+        ),
+        "prerequisites": rows(
+            kolibri_models.ContentNode.has_prerequisite.through.objects.all(), "id"
+        ),
+    }
+
+
+class BulkMappingExportChannelTestCase(ExportChannelTestCase):
+    bulk_mapping = True
+
+    def test_matches_recursive_mapping(self):
+        bulk_rows = _export_database_rows()
+
+        recursive_db = create_content_database(
+            self.content_channel, True, self.admin_user.id, True, bulk_mapping=False
+        )
+        try:
+            with using_content_database(recursive_db):
+                recursive_rows = _export_database_rows()
+        finally:
+            os.remove(recursive_db)
+
+        for table, table_rows in recursive_rows.items():
+            self.assertEqual(bulk_rows[table], table_rows, table)
+
+
+@override_settings(PUBLISH_EXERCISE_ARCHIVE_WORKERS=4)
+class ExerciseArchiveWorkersExportChannelTestCase(ExportChannelTestCase):
+    """
+    Runs the export tests with the exercise archives built in a pool of threads
+    ahead of mapping the tree.
+    """
+
+    def test_matches_inline_archives(self):
+        pooled_rows = _export_database_rows()
+
+        with override_settings(PUBLISH_EXERCISE_ARCHIVE_WORKERS=1):
+            inline_db = create_content_database(
+                self.content_channel, True, self.admin_user.id, True
+            )
+        try:
+            with using_content_database(inline_db):
+                inline_rows = _export_database_rows()
+        finally:
+            os.remove(inline_db)
+
+        for table, table_rows in inline_rows.items():
+            self.assertEqual(pooled_rows[table], table_rows, table)
+
+    def test_archive_failure_raises(self):
+        with patch(
+            "contentcuration.utils.publish.QTIExerciseGenerator.build_exercise_archive",
+            side_effect=ValueError("Invalid QTI item"),
+        ), self.assertRaises(ValueError):
+            create_content_database(
+                self.content_channel, True, self.admin_user.id, True
+            )
+
+
+def _set_published_version(content_channel):
+    content_channel.version = 1
+    content_channel.published_data = {
+        "1": {"mapped_channel_fields": get_mapped_channel_fields(content_channel)}
+    }
+    cc.Channel.objects.filter(pk=content_channel.pk).update(
+        version=content_channel.version,
+        published_data=content_channel.published_data,
+    )
+
+
+def _create_incremental_database(content_channel, user_id, published_db):
+    def copy_published_export_database(channel, target_path):
+        shutil.copyfile(published_db, target_path)
+        return True
+
+    with patch(
+        "contentcuration.utils.publish.copy_published_export_database",
+        side_effect=copy_published_export_database,
+    ):
+        return create_content_database(
+            content_channel, True, user_id, False, incremental=True
+        )
+
+
+def _full_mapping_rows(content_channel, user_id):
+    full_db = create_content_database(
+        content_channel, True, user_id, False, incremental=False
+    )
+    try:
+        with using_content_database(full_db):
+            return _export_database_rows(license_ids=False)
+    finally:
+        os.remove(full_db)
+
+
+class IncrementalExportChannelTestCase(ExportChannelTestCase):
+    """
+    Runs the export tests against an export database that is mapped incrementally
+    from the export database of the published version of the channel.
+    """
+
+    def setUp(self):
+        super(IncrementalExportChannelTestCase, self).setUp()
+        cleanup_content_database_connection(self.tempdb)
+        set_active_content_database(None)
+        self.published_db = self.tempdb
+
+        _set_published_version(self.content_channel)
+        main_tree = self.content_channel.main_tree
+        main_tree.get_family().update(changed=False)
+        main_tree.get_descendants().filter(
+            title__in=[
+                "Topic B",
+                "Disinherited topic",
+                "Bad topic container",
+                "Completion criteria test",
+            ]
+        ).update(changed=True)
+
+        self.tempdb = _create_incremental_database(
+            self.content_channel, self.admin_user.id, self.published_db
+        )
+        set_active_content_database(self.tempdb)
+
+    def tearDown(self):
+        super(IncrementalExportChannelTestCase, self).tearDown()
+        if os.path.exists(self.published_db):
+            os.remove(self.published_db)
+
+    def test_matches_full_mapping(self):
+        main_tree = self.content_channel.main_tree
+        topic_a = main_tree.get_descendants().get(title="Topic A")
+        topic_b = main_tree.get_descendants().get(title="Topic B")
+
+        renamed_video = topic_a.get_descendants().get(title="Video 1")
+        renamed_video.title = "Renamed video"
+        renamed_video.save()
+        topic_a.get_descendants().get(title="Video 3").move_to(topic_b, "last-child")
+        create_node({"kind_id": "video", "title": "Added video"}, parent=topic_a)
+        main_tree.get_descendants().get(title="Unit Lesson Video").delete()
+        # Replacing a file does not mark its node as changed
+        new_file = create_studio_file(
+            b"replaced video", preset=format_presets.VIDEO_HIGH_RES, ext="mp4"
+        )["db_file"]
+        new_file.contentnode = main_tree.get_descendants().get(
+            title="Completion criteria test"
+        )
+        new_file.save()
+
+        cleanup_content_database_connection(self.tempdb)
+        os.remove(self.tempdb)
+        self.tempdb = _create_incremental_database(
+            self.content_channel, self.admin_user.id, self.published_db
+        )
+        set_active_content_database(self.tempdb)
+
+        full_rows = _full_mapping_rows(self.content_channel, self.admin_user.id)
+        incremental_rows = _export_database_rows(license_ids=False)
+        for table, table_rows in full_rows.items():
+            self.assertEqual(incremental_rows[table], table_rows, table)
+        self.assertTrue(
+            kolibri_models.ContentNode.objects.filter(title="Added video").exists()
+        )
+
+
+class IncrementalMappingTestCase(StudioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(IncrementalMappingTestCase, cls).setUpClass()
+        cls.patch_copy_db = patch("contentcuration.utils.publish.save_export_database")
+        cls.patch_copy_db.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(IncrementalMappingTestCase, cls).tearDownClass()
+        cls.patch_copy_db.stop()
+
+    def setUp(self):
+        super(IncrementalMappingTestCase, self).setUp()
+        self.content_channel = channel()
+        set_channel_icon_encoding(self.content_channel)
+        self.published_db = create_content_database(
+            self.content_channel, True, self.admin_user.id, True
+        )
+        _set_published_version(self.content_channel)
+        self.main_tree = self.content_channel.main_tree
+        self.main_tree.get_family().update(changed=False)
+        self.incremental_db = None
+
+    def tearDown(self):
+        super(IncrementalMappingTestCase, self).tearDown()
+        for db in [self.published_db, self.incremental_db]:
+            if db:
+                cleanup_content_database_connection(db)
+                os.remove(db)
+
+    def assertMatchesFullMapping(self):
+        self.incremental_db = _create_incremental_database(
+            self.content_channel, self.admin_user.id, self.published_db
+        )
+        full_rows = _full_mapping_rows(self.content_channel, self.admin_user.id)
+        with using_content_database(self.incremental_db):
+            incremental_rows = _export_database_rows(license_ids=False)
+        for table, table_rows in full_rows.items():
+            self.assertEqual(incremental_rows[table], table_rows, table)
+
+    def test_unchanged(self):
+        self.assertMatchesFullMapping()
+
+    def test_edited_nodes(self):
+        video = self.main_tree.get_descendants().get(title="Video 1")
+        video.title = "Renamed video"
+        video.save()
+        topic = self.main_tree.get_descendants().get(title="Topic B")
+        topic.description = "Edited topic"
+        topic.save()
+        self.assertMatchesFullMapping()
+
+    def test_removed_nodes(self):
+        self.main_tree.get_descendants().get(title="Video 2").delete()
+        self.main_tree.get_descendants().get(title="Exercise 1").delete()
+        self.assertMatchesFullMapping()
+        with using_content_database(self.incremental_db):
+            self.assertFalse(
+                kolibri_models.ContentNode.objects.filter(title="Topic B").exists()
+            )
+
+    def test_moved_and_added_nodes(self):
+        topic_a = self.main_tree.get_descendants().get(title="Topic A")
+        topic_b = self.main_tree.get_descendants().get(title="Topic B")
+        topic_a.get_descendants().get(title="Video 3").move_to(topic_b, "first-child")
+        topic_a.get_descendants().get(title="Video 4").move_to(topic_a, "first-child")
+        create_node({"kind_id": "video", "title": "Added video"}, parent=topic_b)
+        self.assertMatchesFullMapping()
+
+    def test_incomplete_node(self):
+        cc.ContentNode.objects.filter(
+            tree_id=self.main_tree.tree_id, title="Video 1"
+        ).update(complete=False, changed=True)
+        self.assertMatchesFullMapping()
+
+    def test_added_thumbnail(self):
+        video = self.main_tree.get_descendants().get(title="Video 1")
+        thumbnail = create_studio_file(
+            thumbnail_bytes, preset=format_presets.VIDEO_THUMBNAIL, ext="png"
+        )["db_file"]
+        thumbnail.contentnode = video
+        thumbnail.save()
+        cc.ContentNode.objects.filter(pk=video.pk).update(changed=False)
+        self.assertMatchesFullMapping()
+        with using_content_database(self.incremental_db):
+            self.assertTrue(
+                kolibri_models.File.objects.filter(
+                    contentnode_id=video.node_id, thumbnail=True
+                ).exists()
+            )
+
+    def test_channel_language_changed(self):
+        cc.Channel.objects.filter(pk=self.content_channel.pk).update(language_id="fr")
+        self.content_channel.language_id = "fr"
+        self.assertMatchesFullMapping()
+        with using_content_database(self.incremental_db):
+            self.assertTrue(
+                kolibri_models.ContentNode.objects.filter(
+                    title="Video 1", lang_id="fr"
+                ).exists()
+            )
+
+    def test_channel_language_changed_maps_whole_tree(self):
+        cc.Channel.objects.filter(pk=self.content_channel.pk).update(language_id="fr")
+        self.content_channel.language_id = "fr"
+        with patch(
+            "contentcuration.utils.publish.get_tree_mapper_class",
+            wraps=get_tree_mapper_class,
+        ) as mapper_class:
+            self.incremental_db = _create_incremental_database(
+                self.content_channel, self.admin_user.id, self.published_db
+            )
+        mapper_class.assert_called_once_with(None, False)
+
+
 class EmptyChannelTestCase(StudioTestCase):
     @classmethod
     def setUpClass(cls):
@@ -1256,6 +1583,41 @@ class ChannelExportPublishedData(StudioTestCase):
         self.assertEqual(len(returned_categories), len(expected_categories))
         self.assertSetEqual(set(returned_categories), set(expected_categories))
 
+    def test_get_published_statistics(self):
+        published_nodes = self.channel.main_tree.get_descendants().filter(
+            published=True
+        )
+        with self.assertNumQueries(1):
+            statistics = get_published_statistics(self.channel)
+
+        self.assertEqual(
+            statistics.resource_count,
+            published_nodes.exclude(kind_id=content_kinds.TOPIC).count(),
+        )
+        self.assertEqual(
+            statistics.kind_counts,
+            list(
+                published_nodes.values("kind_id")
+                .annotate(count=Count("kind_id"))
+                .order_by("kind_id")
+            ),
+        )
+        self.assertEqual(
+            statistics.size,
+            published_nodes.values("files__checksum", "files__file_size")
+            .distinct()
+            .aggregate(size=Sum("files__file_size"))["size"],
+        )
+        self.assertEqual(statistics.licenses, [self.license1.id, self.license2.id])
+        self.assertEqual(statistics.categories, [self.category1, self.category2])
+
+    def test_fill_published_fields__progress(self):
+        progress_tracker = mock.Mock()
+        fill_published_fields(
+            self.channel, description(), progress_tracker=progress_tracker
+        )
+        progress_tracker.track.assert_called_once_with(95)
+
 
 class PublishFailCleansUpTaskObjects(StudioTestCase):
     def setUp(self):
@@ -25,10 +25,12 @@ from contentcuration.models import File
 from contentcuration.models import generate_object_storage_name
 from contentcuration.models import StagedFile
 from contentcuration.models import User
+from contentcuration.models import UserStorageLedger
 from contentcuration.utils.files import create_thumbnail_from_base64
 from contentcuration.utils.files import get_thumbnail_encoding
 from contentcuration.utils.nodes import map_files_to_node
 from contentcuration.utils.publish import create_associated_thumbnail
+from contentcuration.utils.user import reconcile_user_storage
 
 
 pytestmark = pytest.mark.django_db
@@ -287,3 +289,123 @@ class UserStorageUsageTestCase(StudioTestCase):
 
         expected_usage = baseline_usage + non_perseus_size
         self.assertEqual(self.user.get_space_used(), expected_usage)
+
+
+class UserStorageLedgerTestCase(StudioTestCase):
+    def setUp(self):
+        super().setUpBase()
+        self.contentnode = (
+            self.channel.main_tree.get_descendants().filter(files__isnull=False).first()
+        )
+        self.file_format_id = self.contentnode.files.first().file_format_id
+        self.user.set_space_used()
+        self.space_used = self.user.get_space_used()
+
+    def _create_file(self, size=100, checksum=None, contentnode=None):
+        file_record = File(
+            contentnode=contentnode or self.contentnode,
+            checksum=checksum or uuid4().hex,
+            file_format_id=self.file_format_id,
+            file_size=size,
+            uploaded_by=self.user,
+        )
+        file_record.save(set_by_file_on_disk=False)
+        return file_record
+
+    def assertSpaceUsed(self, space_used):
+        self.assertEqual(self.user.get_space_used(), space_used)
+        self.assertEqual(User.objects.get(pk=self.user.pk).disk_space_used, space_used)
+        # the ledger agrees with the storage calculated from the user's files
+        self.assertEqual(
+            self.user.get_space_used(active_files=self.user.get_user_active_files()),
+            space_used,
+        )
+
+    def test_file_created(self):
+        with mock.patch.object(User, "get_user_active_files") as get_user_active_files:
+            self._create_file(size=100)
+            self.assertEqual(self.user.get_space_used(), self.space_used + 100)
+        get_user_active_files.assert_not_called()
+        self.assertSpaceUsed(self.space_used + 100)
+
+    def test_file_checksum_counted_once(self):
+        checksum = uuid4().hex
+        first = self._create_file(size=100, checksum=checksum)
+        second = self._create_file(size=100, checksum=checksum)
+        self.assertSpaceUsed(self.space_used + 100)
+
+        first.delete()
+        self.assertSpaceUsed(self.space_used + 100)
+
+        File.objects.filter(pk=second.pk).delete()
+        self.assertSpaceUsed(self.space_used)
+
+    def test_file_detached(self):
+        file_record = self._create_file(size=100)
+
+        file_record.contentnode = None
+        file_record.save(set_by_file_on_disk=False)
+        self.assertSpaceUsed(self.space_used)
+
+    def test_files_bulk_created(self):
+        File.objects.bulk_create(
+            [
+                File(
+                    contentnode=self.contentnode,
+                    checksum=uuid4().hex,
+                    file_format_id=self.file_format_id,
+                    file_size=100,
+                    uploaded_by=self.user,
+                )
+                for _ in range(3)
+            ]
+        )
+        self.assertSpaceUsed(self.space_used + 300)
+
+    def test_node_moved_to_trash(self):
+        self._create_file(size=100)
+        self.assertSpaceUsed(self.space_used + 100)
+
+        self.contentnode.move_to(self.channel.trash_tree, "last-child")
+        self.assertSpaceUsed(self.space_used)
+
+    def test_node_deleted(self):
+        self._create_file(size=100)
+        self.assertSpaceUsed(self.space_used + 100)
+
+        with mock.patch(
+            "contentcuration.utils.user.calculate_user_storage"
+        ) as calculate_user_storage:
+            self.contentnode.delete()
+        calculate_user_storage.assert_not_called()
+        self.assertSpaceUsed(self.space_used)
+
+    def test_file_created__no_ledger(self):
+        self.user.storage_ledger.delete()
+
+        with mock.patch(
+            "contentcuration.utils.user.calculate_user_storage"
+        ) as calculate_user_storage:
+            self._create_file(size=100)
+        calculate_user_storage.assert_called_once_with(self.user.pk)
+
+    def test_reconcile(self):
+        file_record = self._create_file(size=100)
+        self.user.storage_checksums.filter(checksum=file_record.checksum).delete()
+        UserStorageLedger.objects.filter(user=self.user).update(space_used=0)
+
+        previous_space_used, space_used = reconcile_user_storage(self.user)
+        self.assertEqual(previous_space_used, 0)
+        self.assertEqual(space_used, self.space_used + 100)
+        self.assertTrue(
+            self.user.storage_checksums.filter(checksum=file_record.checksum).exists()
+        )
+
+    def test_check_space(self):
+        file_record = self._create_file(size=100)
+        self.user.disk_space = self.space_used + 100
+        self.user.save()
+
+        self.assertTrue(self.user.check_space(100, file_record.checksum))
+        with self.assertRaises(PermissionDenied):
+            self.user.check_space(100, uuid4().hex)
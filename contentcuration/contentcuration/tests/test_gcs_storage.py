@@ -193,6 +193,13 @@ class CompositeGCSTestCase(TestCase):
         self.assertIsInstance(f, File)
         self.mock_default_bucket.get_blob.assert_called_with("blob")
 
+    def test_open_ranged(self):
+        blob = self.blob_cls("blob", "blob")
+        self.mock_default_bucket.get_blob.return_value = blob
+        f = self.storage.open_ranged("blob")
+        self.assertEqual(f, blob.open.return_value)
+        blob.open.assert_called_once_with("rb", chunk_size=mock.ANY)
+
     @mock.patch("contentcuration.utils.gcs_storage.Blob")
     def test_save(self, mock_blob):
         self.storage.save("blob", BytesIO(b"content"))
@@ -38,6 +38,8 @@ from contentcuration.models import RecommendationsEvent
 from contentcuration.models import RecommendationsInteractionEvent
 from contentcuration.models import User
 from contentcuration.models import UserHistory
+from contentcuration.models import USER_PERMISSIONS_CACHE_KEY
+from contentcuration.models import UserPermissionSet
 from contentcuration.tests import testdata
 from contentcuration.tests.base import StudioTestCase
 from contentcuration.tests.helpers import EagerTasksTestMixin
@@ -1201,6 +1203,112 @@ class AssessmentItemFilePermissionTestCase(PermissionQuerysetTestCase):
         self.assertQuerysetDoesNotContain(queryset, pk=assessment_file.id)
 
 
+class UserPermissionSetTestCase(StudioTestCase):
+    def setUp(self):
+        super(UserPermissionSetTestCase, self).setUp()
+        # Permissions are only cached once the changes to them have been committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = testdata.user()
+            self.channel = testdata.channel()
+            self.channel.editors.add(self.user)
+
+    def test_for_user(self):
+        permissions = UserPermissionSet.for_user(self.user)
+
+        self.assertEqual(permissions.edit_channel_ids, [self.channel.id])
+        self.assertIn(self.channel.main_tree.tree_id, permissions.edit_tree_ids)
+        self.assertIn(self.channel.trash_tree.tree_id, permissions.edit_tree_ids)
+        self.assertEqual(permissions.view_channel_ids, [])
+        self.assertEqual(permissions.view_tree_ids, [])
+
+    def test_for_user__cached(self):
+        UserPermissionSet.for_user(self.user)
+
+        with mock.patch.object(UserPermissionSet, "calculate") as calculate:
+            permissions = UserPermissionSet.for_user(self.user)
+        calculate.assert_not_called()
+        self.assertEqual(permissions.edit_channel_ids, [self.channel.id])
+
+    def test_for_user__uncommitted_changes_not_cached(self):
+        UserPermissionSet.for_user(self.user)
+        channel = testdata.channel()
+
+        with self.captureOnCommitCallbacks():
+            channel.viewers.add(self.user)
+            permissions = UserPermissionSet.for_user(self.user)
+
+        self.assertEqual(permissions.view_channel_ids, [channel.id])
+        cached = cache.get(USER_PERMISSIONS_CACHE_KEY.format(user_id=self.user.id))
+        self.assertEqual(cached["view_channel_ids"], [])
+
+    def test_invalidated__channel_members_changed(self):
+        UserPermissionSet.for_user(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.channel.editors.remove(self.user)
+            self.user.view_only_channels.add(self.channel)
+
+        permissions = UserPermissionSet.for_user(self.user)
+        self.assertEqual(permissions.edit_channel_ids, [])
+        self.assertEqual(permissions.view_channel_ids, [self.channel.id])
+        self.assertIn(self.channel.main_tree.tree_id, permissions.view_tree_ids)
+
+    def test_invalidated__channel_members_cleared(self):
+        UserPermissionSet.for_user(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.channel.editors.clear()
+
+        permissions = UserPermissionSet.for_user(self.user)
+        self.assertEqual(permissions.edit_channel_ids, [])
+
+    def test_invalidated__invitation_changed(self):
+        channel = testdata.channel()
+        UserPermissionSet.for_user(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invitation = Invitation.objects.create(
+                email=self.user.email, channel=channel
+            )
+        permissions = UserPermissionSet.for_user(self.user)
+        self.assertEqual(permissions.pending_channel_ids, [channel.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invitation.revoked = True
+            invitation.save()
+        permissions = UserPermissionSet.for_user(self.user)
+        self.assertEqual(permissions.pending_channel_ids, [])
+
+    def test_invalidated__channel_tree_changed(self):
+        UserPermissionSet.for_user(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.channel.staging_tree = testdata.tree()
+            self.channel.save(actor_id=self.user.id)
+
+        permissions = UserPermissionSet.for_user(self.user)
+        self.assertIn(self.channel.staging_tree.tree_id, permissions.edit_tree_ids)
+        queryset = ContentNode.filter_edit_queryset(
+            ContentNode.objects.all(), self.user
+        )
+        self.assertTrue(queryset.filter(pk=self.channel.staging_tree_id).exists())
+
+    def test_invalidated__channel_deleted(self):
+        UserPermissionSet.for_user(self.user)
+        main_tree_id = self.channel.main_tree_id
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.channel.delete()
+
+        permissions = UserPermissionSet.for_user(self.user)
+        self.assertEqual(permissions.edit_channel_ids, [])
+        self.assertEqual(permissions.edit_tree_ids, [])
+        queryset = ContentNode.filter_edit_queryset(
+            ContentNode.objects.all(), self.user
+        )
+        self.assertFalse(queryset.filter(pk=main_tree_id).exists())
+
+
 class UserTestCase(StudioTestCase):
     def _create_user(self, email, password="password", is_active=True):
         user = User.objects.create(email=email)
@@ -3,14 +3,19 @@ Simple User model creation tests.
 """
 import csv
 import datetime
+import gzip
 import io
 import json
 import sys
 import tempfile
 
+import mock
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.management import call_command
 from django.test import TransactionTestCase
 from django.urls import reverse_lazy
+from django.utils import timezone
 
 from .base import BaseAPITestCase
 from .base import StudioTestCase
@@ -24,6 +29,7 @@ from contentcuration.models import UserSubscription
 from contentcuration.tests import testdata
 from contentcuration.tests.utils import mixer
 from contentcuration.utils.csv_writer import _format_size
+from contentcuration.utils.csv_writer import export_user_csv
 from contentcuration.utils.csv_writer import write_user_csv
 from contentcuration.views.users import send_invitation_email
 
@@ -269,3 +275,61 @@ class UserEffectiveDiskSpaceTest(StudioTestCase):
             subscription_disk_space=50 * 1024 * 1024 * 1024,
         )
         self.assertEqual(self.user.get_effective_disk_space(), 500 * 1024 * 1024)
+
+    def test_user_csv_export_to_storage(self):
+        videos = [fileobj_video() for i in range(3)]
+
+        for video in videos:
+            video.uploaded_by = self.user
+            video.save()
+
+        progress_tracker = mock.Mock()
+        export_name = export_user_csv(self.user, progress_tracker=progress_tracker)
+
+        with default_storage.open(export_name) as export:
+            content = gzip.decompress(export.read()).decode("utf-8")
+        rows = list(csv.DictReader(io.StringIO(content), delimiter=","))
+
+        self.assertEqual(
+            sorted(row["Filename"] for row in rows),
+            sorted(video.original_filename for video in videos),
+        )
+        progress_tracker.set_total.assert_called_once_with(len(videos))
+        self.assertEqual(progress_tracker.increment.call_count, len(videos))
+
+    def test_user_csv_export_download(self):
+        video = fileobj_video()
+        video.uploaded_by = self.user
+        video.save()
+        export_user_csv(self.user)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse_lazy("download_user_data"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content))
+        self.assertIn(video.original_filename, content.decode("utf-8"))
+
+    def test_user_csv_export_name_is_not_guessable(self):
+        first_export_name = export_user_csv(self.user)
+        second_export_name = export_user_csv(self.user)
+
+        self.assertNotIn(str(self.user.id), second_export_name.split("/")[-1])
+        self.assertNotEqual(first_export_name, second_export_name)
+        self.assertFalse(default_storage.exists(first_export_name))
+        self.assertTrue(default_storage.exists(second_export_name))
+
+    def test_user_csv_export_download_expired(self):
+        export_name = export_user_csv(self.user)
+        User.objects.filter(pk=self.user.pk).update(
+            user_data_exported=timezone.now()
+            - datetime.timedelta(days=settings.USER_EXPORT_EXPIRY_DAYS + 1)
+        )
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse_lazy("download_user_data"))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(default_storage.exists(export_name))
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.user_data_export_token)
@@ -1,8 +1,12 @@
+import tempfile
+import uuid
 from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.core.files.storage import FileSystemStorage
 from django.core.management import call_command
 from django.test import TestCase
 from le_utils.constants import content_kinds
@@ -19,6 +23,7 @@ from contentcuration.models import FormatPreset
 from contentcuration.models import generate_object_storage_name
 from contentcuration.models import Language
 from contentcuration.models import License
+from contentcuration.utils.cache import forget_stored_file
 from contentcuration.utils.files import get_file_diff
 
 
@@ -67,6 +72,75 @@ class GetFileDiffTestCase(StudioTestCase):
         assert get_file_diff(files) == ["rando"]
 
 
+class GetFileDiffLocalStorageTestCase(StudioTestCase):
+    """
+    Tests for contentcuration.utils.get_file_diff, with a local storage in place of object storage.
+    """
+
+    def setUp(self):
+        super(GetFileDiffLocalStorageTestCase, self).setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.storage = FileSystemStorage(location=tempdir.name)
+        patcher = mock.patch(
+            "contentcuration.utils.files.default_storage", self.storage
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _filename(self):
+        return "{}.jpg".format(uuid.uuid4().hex)
+
+    def _save(self, filename):
+        checksum = filename.split(".")[0]
+        path = generate_object_storage_name(checksum, filename)
+        self.storage.save(path, BytesIO(b"content"))
+        return path
+
+    def test_files_in_database_missing_from_storage(self):
+        # File objects are created before their files are uploaded, so they don't
+        # show that the files are stored
+        filename = self._filename()
+        file = File(checksum=filename.split(".")[0], file_format_id="jpg", file_size=7)
+        file.file_on_disk.name = generate_object_storage_name(file.checksum, filename)
+        file.save(set_by_file_on_disk=False)
+        stored = self._filename()
+        self._save(stored)
+
+        self.assertEqual(get_file_diff([filename, stored]), [filename])
+
+    def test_files_found_in_storage_remembered(self):
+        stored = self._filename()
+        self._save(stored)
+        missing = self._filename()
+
+        self.assertEqual(get_file_diff([stored, missing]), [missing])
+        with mock.patch.object(
+            self.storage, "exists", wraps=self.storage.exists
+        ) as exists:
+            self.assertEqual(get_file_diff([stored, missing]), [missing])
+        exists.assert_called_once_with(
+            generate_object_storage_name(missing[:32], missing)
+        )
+
+    def test_deleted_files_forgotten(self):
+        filename = self._filename()
+        path = self._save(filename)
+        self.assertEqual(get_file_diff([filename]), [])
+
+        self.storage.delete(path)
+        forget_stored_file(filename)
+        self.assertEqual(get_file_diff([filename]), [filename])
+
+    def test_returns_files_in_order(self):
+        filenames = [self._filename() for _ in range(10)]
+        for filename in filenames[::2]:
+            self._save(filename)
+
+        with self.settings(FILE_DIFF_STORAGE_WORKERS=4):
+            self.assertEqual(get_file_diff(filenames), filenames[1::2])
+
+
 class FileFormatsTestCase(StudioTestCase):
     """
     Ensure that unsupported files aren't saved.
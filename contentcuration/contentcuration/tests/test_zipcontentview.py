@@ -2,7 +2,10 @@ import os
 import tempfile
 import zipfile
 
+import mock
+
 from .base import StudioTestCase
+from contentcuration.views.zip import zip_index_cache
 
 
 class ZipFileTestCase(StudioTestCase):
@@ -11,21 +14,23 @@ class ZipFileTestCase(StudioTestCase):
         self.zipfile_url = "/zipcontent/"
 
         self.temp_files = []
+        zip_index_cache.clear()
 
     def tearDown(self):
         for temp_file in self.temp_files:
             os.remove(temp_file)
 
-    def do_create_zip(self):
+    def do_create_zip(self, compress_type=zipfile.ZIP_STORED):
         zip_handle, zip_filename = tempfile.mkstemp(suffix=".zip")
         self.temp_files.append(zip_filename)
         os.close(zip_handle)
 
-        with zipfile.ZipFile(zip_filename, "w") as zip:
+        with zipfile.ZipFile(zip_filename, "w", compression=compress_type) as zip:
             zip.writestr(
                 "index.html",
                 "<html><head></head><body><p>Hello World!</p></body></html>",
             )
+            zip.writestr("media/audio.mp3", bytes(range(256)) * 4)
 
         return zip_filename
 
@@ -82,3 +87,89 @@ class ZipFileTestCase(StudioTestCase):
         url = "{}{}/../outsidejson.js".format(self.zipfile_url, temp_file["name"])
         response = self.get(url)
         assert response.status_code == 404
+
+    def _upload_zip(self, compress_type=zipfile.ZIP_STORED):
+        myzip = self.do_create_zip(compress_type=compress_type)
+
+        self.sign_in()
+        temp_file, response = self.upload_temp_file(
+            open(myzip, "rb").read(), preset="html5_zip", ext="zip"
+        )
+        assert response.status_code == 200
+        return "{}{}/".format(self.zipfile_url, temp_file["name"])
+
+    def test_valid_zipfile_file_content(self):
+        url = self._upload_zip()
+        response = self.get(url + "media/audio.mp3")
+        assert response.status_code == 200
+        assert response["Accept-Ranges"] == "bytes"
+        assert response["Content-Length"] == "1024"
+        assert b"".join(response.streaming_content) == bytes(range(256)) * 4
+
+    def test_valid_zipfile_byte_range(self):
+        url = self._upload_zip()
+        response = self.client.get(
+            url + "media/audio.mp3", HTTP_RANGE="bytes=250-259"
+        )
+        assert response.status_code == 206
+        assert response["Content-Range"] == "bytes 250-259/1024"
+        assert response["Content-Length"] == "10"
+        assert b"".join(response.streaming_content) == bytes(range(250, 256)) + bytes(
+            range(4)
+        )
+
+    def test_valid_zipfile_byte_range_suffix_compressed(self):
+        url = self._upload_zip(compress_type=zipfile.ZIP_DEFLATED)
+        response = self.client.get(
+            url + "media/audio.mp3", HTTP_RANGE="bytes=-4"
+        )
+        assert response.status_code == 206
+        assert response["Content-Range"] == "bytes 1020-1023/1024"
+        assert b"".join(response.streaming_content) == bytes(range(252, 256))
+
+    def test_valid_zipfile_byte_range_not_satisfiable(self):
+        url = self._upload_zip()
+        response = self.client.get(
+            url + "media/audio.mp3", HTTP_RANGE="bytes=1024-"
+        )
+        assert response.status_code == 416
+        assert response["Content-Range"] == "bytes */1024"
+
+    def test_valid_zipfile_if_modified_since(self):
+        url = self._upload_zip()
+        response = self.client.get(
+            url + "index.html", HTTP_IF_MODIFIED_SINCE="Sun, 17-Jan-2038 19:14:07 GMT"
+        )
+        assert response.status_code == 304
+
+    def test_valid_zipfile_index_cached(self):
+        url = self._upload_zip()
+        response = self.get(url + "index.html")
+        assert response.status_code == 200
+
+        with mock.patch(
+            "contentcuration.views.zip.read_zip_index"
+        ) as read_zip_index, mock.patch(
+            "contentcuration.views.zip.default_storage.exists"
+        ) as exists:
+            response = self.get(url + "media/audio.mp3")
+            assert response.status_code == 200
+            assert b"".join(response.streaming_content) == bytes(range(256)) * 4
+            response = self.get(url + "iamjustanillusion.txt")
+            assert response.status_code == 404
+        read_zip_index.assert_not_called()
+        exists.assert_not_called()
+
+    def test_valid_zipfile_index_cached_deleted(self):
+        url = self._upload_zip()
+        zipped_filename = url.rstrip("/").split("/")[-1]
+        response = self.get(url + "index.html")
+        assert response.status_code == 200
+
+        with mock.patch(
+            "contentcuration.views.zip.open_zip_file",
+            side_effect=FileNotFoundError("Not found"),
+        ):
+            response = self.get(url + "index.html")
+        assert response.status_code == 404
+        assert zip_index_cache.get(zipped_filename) is None
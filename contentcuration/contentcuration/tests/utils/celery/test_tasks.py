@@ -1,7 +1,19 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 import mock
+import pytest
+from celery import states
 from django.test import SimpleTestCase
 
+from contentcuration.tasks import getnodedetails_task
+from contentcuration.tests.base import StudioTestCase
+from contentcuration.utils.celery.tasks import get_registered_task_id
 from contentcuration.utils.celery.tasks import ProgressTracker
+from contentcuration.utils.celery.tasks import register_task
+from contentcuration.utils.celery.tasks import unregister_task
 
 
 class ProgressTrackerTestCase(SimpleTestCase):
@@ -43,3 +55,116 @@ class ProgressTrackerTestCase(SimpleTestCase):
         self.send_event.assert_not_called()
         self.tracker.track(1.0)
         self.send_event.assert_called_with(progress=1)
+
+
+class TaskRegistryTestCase(StudioTestCase):
+    def setUp(self):
+        super(TaskRegistryTestCase, self).setUpBase()
+        self.signature = getnodedetails_task.generate_signature(
+            {"node_id": uuid.uuid4().hex}
+        )
+
+    def test_register_task(self):
+        self.assertIsNone(get_registered_task_id(self.signature))
+        register_task(self.signature, "abc123")
+        self.assertEqual(get_registered_task_id(self.signature), "abc123")
+
+    def test_unregister_task(self):
+        register_task(self.signature, "abc123")
+        unregister_task(self.signature, task_id="def456")
+        self.assertEqual(get_registered_task_id(self.signature), "abc123")
+        unregister_task(self.signature, task_id="abc123")
+        self.assertIsNone(get_registered_task_id(self.signature))
+
+    def test_redis_unavailable(self):
+        with mock.patch(
+            "contentcuration.utils.celery.tasks.get_redis_client", return_value=None
+        ):
+            register_task(self.signature, "abc123")
+            self.assertIsNone(get_registered_task_id(self.signature))
+
+    def test_fetch_or_enqueue__registered(self):
+        node_id = uuid.uuid4().hex
+        signature = getnodedetails_task.generate_signature({"node_id": node_id})
+        register_task(signature, "abc123")
+        async_result = mock.Mock(task_id="abc123", status=states.PENDING)
+
+        with mock.patch.object(
+            getnodedetails_task, "fetch", return_value=async_result
+        ) as fetch, mock.patch.object(
+            getnodedetails_task, "_lock_signature"
+        ) as lock_signature:
+            result = getnodedetails_task.fetch_or_enqueue(self.user, node_id=node_id)
+
+        self.assertEqual(result, async_result)
+        fetch.assert_called_once_with("abc123")
+        lock_signature.assert_not_called()
+
+    def test_fetch_or_enqueue__registered_ready(self):
+        node_id = uuid.uuid4().hex
+        signature = getnodedetails_task.generate_signature({"node_id": node_id})
+        register_task(signature, "abc123")
+        async_result = mock.Mock(task_id="def456")
+
+        with mock.patch.object(
+            getnodedetails_task,
+            "fetch",
+            return_value=mock.Mock(task_id="abc123", status=states.SUCCESS),
+        ), mock.patch.object(
+            getnodedetails_task, "enqueue", return_value=async_result
+        ) as enqueue, self.captureOnCommitCallbacks(execute=True):
+            result = getnodedetails_task.fetch_or_enqueue(self.user, node_id=node_id)
+
+        self.assertEqual(result, async_result)
+        enqueue.assert_called_once()
+        self.assertEqual(get_registered_task_id(signature), "def456")
+
+    def test_fetch_or_enqueue__registered_on_commit(self):
+        node_id = uuid.uuid4().hex
+        signature = getnodedetails_task.generate_signature({"node_id": node_id})
+
+        with mock.patch.object(
+            getnodedetails_task,
+            "enqueue",
+            return_value=mock.Mock(task_id="abc123"),
+        ), self.captureOnCommitCallbacks() as callbacks:
+            getnodedetails_task.fetch_or_enqueue(self.user, node_id=node_id)
+            self.assertIsNone(get_registered_task_id(signature))
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(get_registered_task_id(signature), "abc123")
+
+    @pytest.mark.skipif(True, reason="Benchmarking test")
+    def test_fetch_or_enqueue_benchmark(self):
+        """
+        Measures the latency of 50 concurrent requesters fetching or enqueuing the same task,
+        with and without the registry of queued tasks
+        """
+        node_id = uuid.uuid4().hex
+        getnodedetails_task.fetch_or_enqueue(self.user, node_id=node_id)
+
+        def fetch_or_enqueue():
+            start = time.time()
+            getnodedetails_task.fetch_or_enqueue(self.user, node_id=node_id)
+            return time.time() - start
+
+        for registry in (True, False):
+            with (
+                nullcontext()
+                if registry
+                else mock.patch(
+                    "contentcuration.utils.celery.tasks.get_registered_task_id",
+                    return_value=None,
+                )
+            ), ThreadPoolExecutor(max_workers=50) as executor:
+                latencies = sorted(
+                    executor.map(lambda _: fetch_or_enqueue(), range(500))
+                )
+            print(
+                "Registry {}: median {:.1f}ms, p99 {:.1f}ms".format(
+                    "on" if registry else "off",
+                    latencies[len(latencies) // 2] * 1000,
+                    latencies[int(len(latencies) * 0.99)] * 1000,
+                )
+            )
@@ -1,11 +1,14 @@
 import os
 import tempfile
+import time
 import unittest
 
+import pytest
 from lxml import etree
 
 from contentcuration.utils.assessment.qti.validation import _compiled_schema
 from contentcuration.utils.assessment.qti.validation import validate_qti_item
+from contentcuration.utils.assessment.qti.validation import validate_qti_items
 
 
 class CompiledSchemaTests(unittest.TestCase):
@@ -161,3 +164,58 @@ class SchemaReuseTests(unittest.TestCase):
         validate_qti_item(ORDER_INTERACTION_ITEM)
         self.assertEqual(_compiled_schema.cache_info().misses, 1)
         self.assertEqual(_compiled_schema.cache_info().hits, 2)
+
+
+class ValidateQTIItemsTests(unittest.TestCase):
+    def _items(self, count):
+        items = [
+            VALID_CHOICE_ITEM,
+            MATCH_INTERACTION_ITEM.encode("utf-8"),
+            "<qti-assessment-item><unclosed>",
+            ORDER_INTERACTION_ITEM,
+        ]
+        return [items[i % len(items)] for i in range(count)]
+
+    def _assert_results(self, items, results):
+        self.assertEqual(len(results), len(items))
+        for item, result in zip(items, results):
+            self.assertEqual(result, validate_qti_item(item))
+
+    def test_returns_results_in_order(self):
+        items = self._items(4)
+        results = validate_qti_items(items, max_workers=1)
+        self._assert_results(items, results)
+        self.assertFalse(results[2].is_valid)
+
+    def test_returns_results_in_order_from_worker_processes(self):
+        items = self._items(40)
+        self._assert_results(items, validate_qti_items(items, max_workers=2))
+
+    def test_empty_batch(self):
+        self.assertEqual(validate_qti_items([], max_workers=2), [])
+
+    @pytest.mark.skipif(True, reason="Benchmarking test")
+    def test_validate_qti_items_benchmark(self):
+        """
+        Compares the throughput of validating items in worker processes with validating them
+        one at a time behind the validation lock
+        """
+        items = self._items(2000)
+        start = time.time()
+        for item in items:
+            validate_qti_item(item)
+        print(
+            "Locked: validated {} items per second".format(
+                len(items) / (time.time() - start)
+            )
+        )
+        for max_workers in [2, 4, 8]:
+            # Start the workers before timing them
+            validate_qti_items(items[:100], max_workers=max_workers)
+            start = time.time()
+            validate_qti_items(items, max_workers=max_workers)
+            print(
+                "{} workers: validated {} items per second".format(
+                    max_workers, len(items) / (time.time() - start)
+                )
+            )
@@ -1,8 +1,11 @@
 import mock
+from dateutil.parser import isoparse
 from django.test import SimpleTestCase
 
 from ..helpers import mock_class_instance
+from contentcuration.utils.cache import INCREMENT_SIZE_SCRIPT
 from contentcuration.utils.cache import ResourceSizeCache
+from contentcuration.utils.cache import SET_SIZE_SCRIPT
 
 
 class ResourceSizeCacheTestCase(SimpleTestCase):
@@ -90,3 +93,52 @@ class ResourceSizeCacheTestCase(SimpleTestCase):
             cache_set.assert_called_once_with(
                 self.helper.modified_key, "2021-01-01 00:00:00"
             )
+
+    def test_changes_key(self):
+        self.assertEqual("abcdefghijklmnopqrstuvwxyz:changes", self.helper.changes_key)
+
+    def test_tracked_key(self):
+        self.assertEqual("abcdefghijklmnopqrstuvwxyz:tracked", self.helper.tracked_key)
+
+    def test_increment_size(self):
+        self.helper.increment_size(123)
+        self.redis_client.register_script.assert_called_once_with(INCREMENT_SIZE_SCRIPT)
+        self.redis_client.register_script.return_value.assert_called_once_with(
+            keys=[self.helper.hash_key],
+            args=[
+                self.helper.size_key,
+                self.helper.tracked_key,
+                self.helper.changes_key,
+                123,
+            ],
+        )
+
+    def test_set_tracked_size(self):
+        self.redis_client.register_script.return_value.return_value = 1
+        self.assertTrue(
+            self.helper.set_tracked_size(
+                123, isoparse("2021-01-01T00:00:00"), b"2", tracked=True
+            )
+        )
+        self.redis_client.register_script.assert_called_once_with(SET_SIZE_SCRIPT)
+        self.redis_client.register_script.return_value.assert_called_once_with(
+            keys=[self.helper.hash_key],
+            args=[
+                self.helper.size_key,
+                self.helper.modified_key,
+                self.helper.changes_key,
+                b"2",
+                123,
+                "2021-01-01T00:00:00",
+                1,
+                self.helper.tracked_key,
+            ],
+        )
+
+    def test_set_tracked_size__not_redis__changed(self):
+        self.cache.client = mock.Mock()
+        self.cache.get.return_value = 3
+        self.assertFalse(
+            self.helper.set_tracked_size(123, isoparse("2021-01-01T00:00:00"), 2)
+        )
+        self.cache.set.assert_not_called()
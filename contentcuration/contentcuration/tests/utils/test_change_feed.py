@@ -0,0 +1,138 @@
+import mock
+from redis.exceptions import ConnectionError
+
+from contentcuration import models
+from contentcuration.tests.base import StudioTestCase
+from contentcuration.tests.viewsets.base import generate_update_event
+from contentcuration.utils import change_feed
+from contentcuration.utils.change_feed import ChangeFeedSubscription
+from contentcuration.utils.change_feed import get_latest_revs
+from contentcuration.utils.change_feed import get_task_states
+from contentcuration.utils.change_feed import have_no_tasks
+from contentcuration.utils.change_feed import notify_change_feeds
+from contentcuration.utils.change_feed import notify_tasks
+from contentcuration.utils.change_feed import record_latest_revs
+from contentcuration.utils.change_feed import record_no_tasks
+from contentcuration.viewsets.sync.constants import CHANNEL
+
+
+class ChangeFeedTestCase(StudioTestCase):
+    def setUp(self):
+        super(ChangeFeedTestCase, self).setUpBase()
+
+    def test_notify_change_feeds__after_commit(self):
+        with ChangeFeedSubscription(channel_ids=[self.channel.id]) as subscription:
+            self.assertTrue(subscription.available)
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                notify_change_feeds(channel_ids=[self.channel.id])
+                self.assertFalse(subscription.wait(0.1))
+            self.assertEqual(len(callbacks), 1)
+            self.assertTrue(subscription.wait(1))
+
+    def test_notify_change_feeds__other_feeds(self):
+        with ChangeFeedSubscription(
+            channel_ids=[self.channel.id], user_ids=[self.user.id]
+        ) as subscription:
+            with self.captureOnCommitCallbacks(execute=True):
+                notify_change_feeds(channel_ids=["a" * 32], user_ids=[self.user.id + 1])
+            self.assertFalse(subscription.wait(0.1))
+
+    def test_create_changes__applied(self):
+        event = generate_update_event(
+            self.channel.id, CHANNEL, {"name": "Name"}, channel_id=self.channel.id
+        )
+        with ChangeFeedSubscription(channel_ids=[self.channel.id]) as subscription:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                models.Change.create_changes([event], created_by_id=self.user.id)
+            self.assertEqual(len(callbacks), 0)
+
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                models.Change.create_changes(
+                    [event], created_by_id=self.user.id, applied=True
+                )
+            self.assertEqual(len(callbacks), 1)
+            self.assertTrue(subscription.wait(1))
+
+    def test_redis_unavailable(self):
+        with mock.patch.object(change_feed, "get_redis_client", return_value=None):
+            with ChangeFeedSubscription(channel_ids=[self.channel.id]) as subscription:
+                self.assertFalse(subscription.available)
+                self.assertTrue(subscription.wait(10))
+
+    def test_publish_error(self):
+        with mock.patch.object(change_feed, "_publish", side_effect=ConnectionError):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                notify_change_feeds(channel_ids=[self.channel.id])
+        self.assertEqual(len(callbacks), 1)
+
+
+class SyncIndexTestCase(StudioTestCase):
+    def setUp(self):
+        super(SyncIndexTestCase, self).setUpBase()
+
+    def create_changes(self, applied=True):
+        return models.Change.create_changes(
+            [
+                generate_update_event(
+                    self.channel.id,
+                    CHANNEL,
+                    {"name": "Name"},
+                    channel_id=self.channel.id,
+                )
+                for _ in range(2)
+            ],
+            created_by_id=self.user.id,
+            applied=applied,
+        )
+
+    def test_get_latest_revs__missing(self):
+        self.assertEqual(
+            get_latest_revs(channel_ids=[self.channel.id], user_ids=[self.user.id]),
+            ({self.channel.id: None}, {self.user.id: None}),
+        )
+
+    def test_get_latest_revs__applied_changes(self):
+        self.create_changes(applied=False)
+        self.assertEqual(
+            get_latest_revs(channel_ids=[self.channel.id]),
+            ({self.channel.id: None}, {}),
+        )
+        changes = self.create_changes()
+        self.assertEqual(
+            get_latest_revs(channel_ids=[self.channel.id]),
+            ({self.channel.id: changes[-1].server_rev}, {}),
+        )
+
+    def test_record_latest_revs__keeps_greatest(self):
+        record_latest_revs(
+            channel_revs={self.channel.id: 10}, user_revs={self.user.id: 5}
+        )
+        record_latest_revs(
+            channel_revs={self.channel.id: 3}, user_revs={self.user.id: 8}
+        )
+        self.assertEqual(
+            get_latest_revs(channel_ids=[self.channel.id], user_ids=[self.user.id]),
+            ({self.channel.id: 10}, {self.user.id: 8}),
+        )
+
+    def test_task_states(self):
+        task_states = get_task_states([self.channel.id])
+        self.assertFalse(have_no_tasks(task_states))
+        record_no_tasks(task_states)
+        self.assertTrue(have_no_tasks(get_task_states([self.channel.id])))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_tasks([self.channel.id])
+            self.assertFalse(have_no_tasks(get_task_states([self.channel.id])))
+
+    def test_task_states__record_invalidated_by_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_tasks([self.channel.id])
+            record_no_tasks(get_task_states([self.channel.id]))
+        self.assertFalse(have_no_tasks(get_task_states([self.channel.id])))
+
+    def test_redis_unavailable(self):
+        with mock.patch.object(change_feed, "get_redis_client", return_value=None):
+            self.assertIsNone(get_latest_revs(channel_ids=[self.channel.id]))
+            self.assertIsNone(get_task_states([self.channel.id]))
+            self.assertFalse(have_no_tasks(get_task_states([self.channel.id])))
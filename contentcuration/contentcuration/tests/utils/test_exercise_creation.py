@@ -7,9 +7,10 @@ import os
 import re
 import zipfile
 from io import BytesIO
-from tempfile import TemporaryDirectory
+from unittest import mock
 from uuid import uuid4
 
+from django.core.cache import cache as django_cache
 from django.core.files.storage import default_storage as storage
 from le_utils.constants import content_kinds
 from le_utils.constants import exercises
@@ -24,6 +25,9 @@ from contentcuration.tests.testdata import fileobj_exercise_image
 from contentcuration.tests.utils.qti.test_convert import _normalize_xml
 from contentcuration.tests.utils.qti.test_validation import _item_xml
 from contentcuration.tests.utils.qti.test_validation import VALID_CHOICE_ITEM
+from contentcuration.utils.assessment.base import ExerciseArchive
+from contentcuration.utils.assessment.base import RESIZED_IMAGE_CACHE_KEY
+from contentcuration.utils.assessment.base import ResizedImageCache
 from contentcuration.utils.assessment.perseus import PerseusExerciseGenerator
 from contentcuration.utils.assessment.qti.archive import hex_to_qti_id
 from contentcuration.utils.assessment.qti.archive import QTIExerciseGenerator
@@ -504,22 +508,21 @@ class TestPerseusExerciseCreation(StudioTestCase):
         generator = PerseusExerciseGenerator(
             self.exercise_node, {}, self.channel.id, "en-US", user_id=self.user.id
         )
-        with TemporaryDirectory() as tempdir:
-            generator.tempdir = tempdir
-            written = generator._write_raw_perseus_assets(item, "perseus/images")
+        generator.archive = ExerciseArchive()
+        written = generator._write_raw_perseus_assets(item, "perseus/images")
+        generator.archive.close()
 
-            image_path = (
-                f"perseus/images/{image_file.checksum}.{image_file.file_format_id}"
-            )
-            svg_path = f"perseus/images/{graphie_file.original_filename}.svg"
-            json_path = f"perseus/images/{graphie_file.original_filename}-data.json"
+        image_path = f"perseus/images/{image_file.checksum}.{image_file.file_format_id}"
+        svg_path = f"perseus/images/{graphie_file.original_filename}.svg"
+        json_path = f"perseus/images/{graphie_file.original_filename}-data.json"
 
-            self.assertIn(image_path, written)
-            self.assertIn(svg_path, written)
-            self.assertIn(json_path, written)
+        self.assertIn(image_path, written)
+        self.assertIn(svg_path, written)
+        self.assertIn(json_path, written)
 
+        with zipfile.ZipFile(generator.archive.file) as zf:
             for path in (image_path, svg_path, json_path):
-                self.assertTrue(os.path.exists(os.path.join(tempdir, path)))
+                self.assertIn(path, zf.namelist())
 
     def test_exercise_with_graphie(self):
         """Test creating an exercise with graphie files (SVG+JSON pairs)"""
@@ -1050,6 +1053,104 @@ class TestPerseusExerciseCreation(StudioTestCase):
         """Test image resizing functionality in hint content"""
         self._test_image_resizing_in_field("hint")
 
+    def test_resized_images_cached_between_generators(self):
+        image = fileobj_exercise_image(size=(400, 300), color="green")
+        image_url = exercises.CONTENT_STORAGE_FORMAT.format(image.filename())
+        django_cache.delete(
+            RESIZED_IMAGE_CACHE_KEY.format(
+                checksum=image.checksum, width=120.0, height=90.0
+            )
+        )
+        item = self._create_assessment_item(
+            exercises.SINGLE_SELECTION,
+            f"Identify the shape: ![shape]({image_url} =120x90)",
+            [
+                {"answer": "Rectangle", "correct": True, "order": 1},
+                {"answer": "Circle", "correct": False, "order": 2},
+            ],
+        )
+        image.assessment_item = item
+        image.save()
+        exercise_data = {
+            "mastery_model": exercises.M_OF_N,
+            "randomize": True,
+            "n": 1,
+            "m": 1,
+            "all_assessment_items": [item.assessment_id],
+            "assessment_mapping": {item.assessment_id: exercises.SINGLE_SELECTION},
+        }
+
+        image_cache = ResizedImageCache()
+        PerseusExerciseGenerator(
+            self.exercise_node,
+            exercise_data,
+            self.channel.id,
+            "en-US",
+            image_cache=image_cache,
+        ).create_exercise_archive()
+        checksum = self.exercise_node.files.get(
+            preset_id=format_presets.EXERCISE
+        ).checksum
+        self.assertEqual((image_cache.hits, image_cache.misses), (0, 1))
+
+        with mock.patch(
+            "contentcuration.utils.assessment.base.resize_image"
+        ) as resize_image:
+            PerseusExerciseGenerator(
+                self.exercise_node,
+                exercise_data,
+                self.channel.id,
+                "en-US",
+                image_cache=image_cache,
+            ).create_exercise_archive()
+        resize_image.assert_not_called()
+        self.assertEqual((image_cache.hits, image_cache.misses), (1, 1))
+        self.assertEqual(
+            self.exercise_node.files.get(preset_id=format_presets.EXERCISE).checksum,
+            checksum,
+        )
+
+    def test_resized_images_without_cache(self):
+        image = fileobj_exercise_image(size=(400, 300), color="green")
+        image_url = exercises.CONTENT_STORAGE_FORMAT.format(image.filename())
+        item = self._create_assessment_item(
+            exercises.SINGLE_SELECTION,
+            f"Identify the shape: ![shape]({image_url} =120x90)",
+            [
+                {"answer": "Rectangle", "correct": True, "order": 1},
+                {"answer": "Circle", "correct": False, "order": 2},
+            ],
+        )
+        image.assessment_item = item
+        image.save()
+        exercise_data = {
+            "mastery_model": exercises.M_OF_N,
+            "randomize": True,
+            "n": 1,
+            "m": 1,
+            "all_assessment_items": [item.assessment_id],
+            "assessment_mapping": {item.assessment_id: exercises.SINGLE_SELECTION},
+        }
+
+        image_cache = ResizedImageCache()
+        with mock.patch(
+            "contentcuration.utils.assessment.base.django_cache"
+        ) as unavailable_cache:
+            unavailable_cache.get.side_effect = ConnectionError
+            unavailable_cache.set_many.side_effect = ConnectionError
+            PerseusExerciseGenerator(
+                self.exercise_node,
+                exercise_data,
+                self.channel.id,
+                "en-US",
+                image_cache=image_cache,
+            ).create_exercise_archive()
+
+        self.assertEqual((image_cache.hits, image_cache.misses), (0, 1))
+        self.assertTrue(
+            self.exercise_node.files.filter(preset_id=format_presets.EXERCISE).exists()
+        )
+
     def test_image_with_same_resize_dimensions(self):
         """Test handling of multiple instances of the same image with the same resize dimensions"""
         # Create a base image file
@@ -1,15 +1,21 @@
 import json
+import os
 import random
+import sqlite3
+import tempfile
 import uuid
 from datetime import datetime
 from datetime import timedelta
 
+import mock
 import pytest
 import requests
 from celery import states
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.core.files.storage import FileSystemStorage
 from django.urls import reverse_lazy
 from django_celery_results.models import TaskResult
 from le_utils.constants import content_kinds
@@ -20,10 +26,15 @@ from contentcuration import models as cc
 from contentcuration.constants import user_history
 from contentcuration.models import ContentNode
 from contentcuration.models import File
+from contentcuration.models import generate_object_storage_name
+from contentcuration.models import StagedFile
 from contentcuration.models import UserHistory
 from contentcuration.tests.base import BaseAPITestCase
 from contentcuration.tests.base import StudioTestCase
 from contentcuration.tests.testdata import tree
+from contentcuration.utils.assessment.base import generate_resized_image_storage_name
+from contentcuration.utils.assessment.base import get_resized_image_file_cache_key
+from contentcuration.utils.cache import get_stored_file_cache_key
 from contentcuration.utils.db_tools import create_user
 from contentcuration.utils.garbage_collect import clean_up_contentnodes
 from contentcuration.utils.garbage_collect import clean_up_deleted_chefs
@@ -32,6 +43,9 @@ from contentcuration.utils.garbage_collect import clean_up_soft_deleted_users
 from contentcuration.utils.garbage_collect import clean_up_stale_files
 from contentcuration.utils.garbage_collect import clean_up_tasks
 from contentcuration.utils.garbage_collect import get_deleted_chefs_root
+from contentcuration.utils.garbage_collect import purge_tree
+from contentcuration.utils.garbage_collect import sweep_storage
+from contentcuration.utils.publish import get_content_db_path
 from contentcuration.views.internal import api_commit_channel
 from contentcuration.views.internal import create_channel
 
@@ -393,6 +407,79 @@ class CleanUpContentNodesTestCase(StudioTestCase):
         assert default_storage.exists("storage/a/a/aaa.jpg")
 
 
+class PurgeTreeTestCase(StudioTestCase):
+    def setUp(self):
+        super(PurgeTreeTestCase, self).setUpBase()
+        self.root = tree()
+        self.root.refresh_from_db()
+
+    def test_deletes_whole_tree(self):
+        node_count = self.root.get_descendant_count() + 1
+
+        count = purge_tree(self.root.tree_id, chunksize=3)
+
+        self.assertEqual(count, node_count)
+        self.assertFalse(
+            ContentNode.objects.filter(tree_id=self.root.tree_id).exists()
+        )
+
+    def test_deletes_subtree_only(self):
+        topic = self.root.get_children().filter(kind_id=content_kinds.TOPIC).first()
+        descendant_pks = list(topic.get_descendants().values_list("pk", flat=True))
+
+        purge_tree(topic.tree_id, lft=topic.lft, rght=topic.rght)
+
+        self.assertFalse(ContentNode.objects.filter(pk=topic.pk).exists())
+        self.assertFalse(ContentNode.objects.filter(pk__in=descendant_pks).exists())
+        self.assertTrue(ContentNode.objects.filter(pk=self.root.pk).exists())
+
+    def test_deletes_related_rows(self):
+        node = self.root.get_descendants().exclude(kind_id=content_kinds.TOPIC).first()
+        tag = cc.ContentTag.objects.create(tag_name="purged")
+        node.tags.add(tag)
+        item = cc.AssessmentItem.objects.create(contentnode=node)
+        item_file = File.objects.create(assessment_item=item, checksum="aaa")
+        node_file = File.objects.create(contentnode=node, checksum="bbb")
+
+        purge_tree(self.root.tree_id)
+
+        self.assertFalse(File.objects.filter(pk=item_file.pk).exists())
+        self.assertFalse(File.objects.filter(pk=node_file.pk).exists())
+        self.assertFalse(cc.AssessmentItem.objects.filter(pk=item.pk).exists())
+        self.assertFalse(
+            ContentNode.tags.through.objects.filter(contenttag=tag).exists()
+        )
+        self.assertTrue(cc.ContentTag.objects.filter(pk=tag.pk).exists())
+
+    def test_clears_references_from_other_nodes(self):
+        node = self.root.get_descendants().first()
+        copy = ContentNode.objects.create(
+            kind_id=content_kinds.TOPIC, original_node=node, cloned_source=node
+        )
+
+        purge_tree(self.root.tree_id)
+
+        copy.refresh_from_db()
+        self.assertIsNone(copy.original_node_id)
+        self.assertIsNone(copy.cloned_source_id)
+
+    def test_deletes_children_outside_of_range(self):
+        topic = self.root.get_children().filter(kind_id=content_kinds.TOPIC).first()
+        with ContentNode.objects.disable_mptt_updates():
+            stray = ContentNode.objects.create(
+                kind_id=content_kinds.TOPIC,
+                parent=topic,
+                tree_id=topic.tree_id,
+                lft=topic.rght + 100,
+                rght=topic.rght + 101,
+                level=topic.level + 1,
+            )
+
+        purge_tree(topic.tree_id, lft=topic.lft, rght=topic.rght)
+
+        self.assertFalse(ContentNode.objects.filter(pk=stray.pk).exists())
+
+
 class CleanUpFeatureFlagsTestCase(StudioTestCase):
     def setUp(self):
         return super(CleanUpFeatureFlagsTestCase, self).setUpBase()
@@ -491,3 +578,146 @@ class CleanupStaleFilesTestCase(StudioTestCase):
             File.objects.get(id=self.file_to_keep.id)
         except File.DoesNotExist:
             self.fail("File was deleted")
+
+
+class SweepStorageTestCase(StudioTestCase):
+    def setUp(self):
+        super(SweepStorageTestCase, self).setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.storage = FileSystemStorage(location=tempdir.name)
+
+    def _save_object(self):
+        checksum = uuid.uuid4().hex
+        filename = "{}.mp3".format(checksum)
+        path = generate_object_storage_name(checksum, filename)
+        self.storage.save(path, ContentFile(b"content"))
+        return checksum, path
+
+    def _save_channel_db(self, channel, checksums):
+        tempdb = os.path.join(self.storage.location, "content.sqlite3")
+        connection = sqlite3.connect(tempdb)
+        connection.execute("CREATE TABLE content_localfile (id varchar(32))")
+        connection.executemany(
+            "INSERT INTO content_localfile VALUES (?)",
+            [(checksum,) for checksum in checksums],
+        )
+        connection.commit()
+        connection.close()
+        with open(tempdb, "rb") as content_db:
+            self.storage.save(get_content_db_path(channel.id), content_db)
+        os.remove(tempdb)
+
+    def _sweep(self, **kwargs):
+        kwargs.setdefault("grace_period", timedelta(0))
+        return sweep_storage(storage=self.storage, **kwargs)
+
+    def test_deletes_unreferenced_objects(self):
+        _, path = self._save_object()
+
+        report = self._sweep()
+
+        self.assertFalse(self.storage.exists(path))
+        self.assertEqual(report["objects_unreferenced"], 1)
+
+    def test_keeps_objects_referenced_by_files(self):
+        checksum, path = self._save_object()
+        File.objects.create(checksum=checksum, file_on_disk=path)
+
+        self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+
+    def test_keeps_objects_referenced_by_staged_files(self):
+        checksum, path = self._save_object()
+        StagedFile.objects.create(
+            checksum=checksum, file_size=7, uploaded_by=self.admin_user
+        )
+
+        self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+
+    def test_keeps_objects_referenced_by_published_channels(self):
+        checksum, path = self._save_object()
+        channel = cc.Channel.objects.create(
+            name="published", actor_id=self.admin_user.id, version=1
+        )
+        self._save_channel_db(channel, [checksum])
+
+        self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+
+    def test_keeps_objects_within_grace_period(self):
+        _, path = self._save_object()
+
+        report = self._sweep(grace_period=timedelta(days=7))
+
+        self.assertTrue(self.storage.exists(path))
+        self.assertEqual(report["objects_unreferenced"], 0)
+
+    def test_keeps_objects_not_named_by_checksum(self):
+        path = "{}/a/b/not-a-checksum.mp3".format(settings.STORAGE_ROOT)
+        self.storage.save(path, ContentFile(b"content"))
+
+        self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+
+    def test_keeps_objects_reported_as_stored(self):
+        _, path = self._save_object()
+        filename = os.path.basename(path)
+        cache.set(get_stored_file_cache_key(filename), True)
+        self.addCleanup(cache.delete, get_stored_file_cache_key(filename))
+
+        report = self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+        self.assertEqual(report["objects_unreferenced"], 0)
+
+    def test_keeps_objects_referenced_after_mark(self):
+        checksum, path = self._save_object()
+
+        def mark_then_reference(**kwargs):
+            File.objects.create(checksum=checksum, file_on_disk=path)
+            return set()
+
+        with mock.patch(
+            "contentcuration.utils.garbage_collect.mark_live_checksums",
+            side_effect=mark_then_reference,
+        ):
+            self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+
+    def _save_resized_image(self):
+        filename = "{}.png".format(uuid.uuid4().hex)
+        path = generate_resized_image_storage_name(filename)
+        self.storage.save(path, ContentFile(b"content"))
+        return filename, path
+
+    def test_deletes_resized_images_out_of_cache(self):
+        _, path = self._save_resized_image()
+
+        self._sweep()
+
+        self.assertFalse(self.storage.exists(path))
+
+    def test_keeps_cached_resized_images(self):
+        filename, path = self._save_resized_image()
+        cache.set(get_resized_image_file_cache_key(filename), True)
+        self.addCleanup(cache.delete, get_resized_image_file_cache_key(filename))
+
+        self._sweep()
+
+        self.assertTrue(self.storage.exists(path))
+
+    def test_dry_run_deletes_nothing(self):
+        _, path = self._save_object()
+
+        report = self._sweep(dry_run=True)
+
+        self.assertTrue(self.storage.exists(path))
+        self.assertEqual(report["objects_scanned"], 1)
+        self.assertEqual(report["objects_unreferenced"], 1)
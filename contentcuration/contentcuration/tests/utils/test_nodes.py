@@ -5,16 +5,20 @@ from time import sleep
 import mock
 import pytest
 from dateutil.parser import isoparse
+from django.core.management import call_command
 from django.db.models import F
 from django.db.models import Max
 from django.test import SimpleTestCase
+from django.utils import timezone
 from le_utils.constants import content_kinds
 from le_utils.constants import format_presets
 
 from ..base import StudioTestCase
+from contentcuration.models import ContentNode
 from contentcuration.models import File
 from contentcuration.tests import testdata
 from contentcuration.tests.helpers import mock_class_instance
+from contentcuration.utils.cache import ResourceSizeCache
 from contentcuration.utils.nodes import calculate_resource_size
 from contentcuration.utils.nodes import generate_diff
 from contentcuration.utils.nodes import ResourceSizeHelper
@@ -54,8 +58,9 @@ class CalculateResourceSizeTestCase(SimpleTestCase):
     def setUp(self):
         super(CalculateResourceSizeTestCase, self).setUp()
         self.node = mock_class_instance("contentcuration.models.ContentNode")
+        self.node.is_root_node.return_value = False
 
-    def assertCalculation(self, cache, helper, force=False):
+    def assertCalculation(self, cache, helper, force=False, tracked=False):
         helper().get_size.return_value = 456
         now_val = isoparse("2021-01-01T00:00:00")
         with mock.patch("contentcuration.utils.nodes.timezone.now") as now:
@@ -63,8 +68,9 @@ class CalculateResourceSizeTestCase(SimpleTestCase):
             size, stale = calculate_resource_size(self.node, force=force)
         self.assertEqual(456, size)
         self.assertFalse(stale)
-        cache().set_size.assert_called_once_with(456)
-        cache().set_modified.assert_called_once_with(now_val)
+        cache().set_tracked_size.assert_called_once_with(
+            456, now_val, cache().get_changes(), tracked=tracked
+        )
 
     def test_cached(self, cache, helper):
         cache().get_size.return_value = 123
@@ -74,6 +80,17 @@ class CalculateResourceSizeTestCase(SimpleTestCase):
         self.assertEqual(123, size)
         self.assertFalse(stale)
 
+    def test_cached__tracked(self, cache, helper):
+        self.node.is_root_node.return_value = True
+        self.node.get_descendant_count.return_value = STALE_MAX_CALCULATION_SIZE + 1
+        cache().get_size.return_value = 123
+        cache().get_modified.return_value = "2021-01-01 00:00:00"
+        cache().is_tracked.return_value = True
+        size, stale = calculate_resource_size(self.node)
+        self.assertEqual(123, size)
+        self.assertFalse(stale)
+        helper().modified_since.assert_not_called()
+
     def test_stale__too_big__no_force(self, cache, helper):
         self.node.get_descendant_count.return_value = STALE_MAX_CALCULATION_SIZE + 1
         cache().get_size.return_value = 123
@@ -106,6 +123,13 @@ class CalculateResourceSizeTestCase(SimpleTestCase):
         cache().get_modified.return_value = None
         self.assertCalculation(cache, helper)
 
+    def test_missing__root_node(self, cache, helper):
+        self.node.is_root_node.return_value = True
+        self.node.get_descendant_count.return_value = 1
+        cache().get_size.return_value = None
+        cache().get_modified.return_value = None
+        self.assertCalculation(cache, helper, tracked=True)
+
     def test_unforced__took_too_long(self, cache, helper):
         self.node.get_descendant_count.return_value = 1
         cache().get_size.return_value = None
@@ -148,6 +172,172 @@ class CalculateResourceSizeIntegrationTestCase(StudioTestCase):
         self.assertFalse(stale)
 
 
+class ResourceSizeTrackingTestCase(StudioTestCase):
+    def setUp(self):
+        super(ResourceSizeTrackingTestCase, self).setUpBase()
+        self.root = self.channel.main_tree
+        self.cache = ResourceSizeCache(self.root)
+        calculate_resource_size(self.root)
+        self.size = self.cache.get_size()
+        self.node = (
+            self.root.get_descendants()
+            .filter(complete=True, files__isnull=False)
+            .distinct()
+            .first()
+        )
+
+    def assertTrackedSize(self, expected_size):
+        self.assertTrue(self.cache.is_tracked())
+        self.assertEqual(expected_size, self.cache.get_size())
+        self.assertEqual(expected_size, ResourceSizeHelper(self.root).get_size() or 0)
+
+    def _create_file(self, node, checksum=None, file_size=100):
+        return File.objects.create(
+            contentnode=node,
+            checksum=checksum or uuid.uuid4().hex,
+            file_size=file_size,
+            preset_id=format_presets.VIDEO_HIGH_RES,
+        )
+
+    def test_tracked(self):
+        self.assertTrackedSize(10)
+
+    def test_file_added(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        self.assertTrackedSize(self.size + 100)
+
+    def test_file_added__duplicate(self):
+        existing = self.node.files.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(
+                self.node, checksum=existing.checksum, file_size=existing.file_size
+            )
+        self.assertTrackedSize(self.size)
+
+    def test_file_added__incomplete_node(self):
+        self.node.complete = False
+        self.node.save()
+        size = self.cache.get_size()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        self.assertTrackedSize(size)
+
+    def test_file_changed(self):
+        new_file = self._create_file(None)
+        with self.captureOnCommitCallbacks(execute=True):
+            new_file.contentnode = self.node
+            new_file.save()
+        self.assertTrackedSize(self.size + 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_file.file_size = 50
+            new_file.save()
+        self.assertTrackedSize(self.size + 50)
+
+    def test_file_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            new_file = self._create_file(self.node)
+        with self.captureOnCommitCallbacks(execute=True):
+            new_file.delete()
+        self.assertTrackedSize(self.size)
+
+    def test_files_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        # the other files of the node have copies elsewhere in the tree
+        with self.captureOnCommitCallbacks(execute=True):
+            File.objects.filter(contentnode=self.node).delete()
+        self.assertTrackedSize(self.size)
+
+    def test_node_marked_incomplete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.node.complete = False
+            self.node.save()
+        self.assertTrackedSize(self.size)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.node.complete = True
+            self.node.save()
+        self.assertTrackedSize(self.size + 100)
+
+    def test_nodes_updated_incomplete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ContentNode.objects.filter(pk=self.node.pk).update(complete=False)
+        self.assertFalse(self.cache.is_tracked())
+        size, _ = calculate_resource_size(self.root)
+        self.assertEqual(ResourceSizeHelper(self.root).get_size() or 0, size)
+
+    def test_nodes_updated_unchanged_completeness(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ContentNode.objects.filter(pk=self.node.pk).update(complete=True)
+        self.assertTrackedSize(self.size)
+
+    def test_files_updated_node(self):
+        new_file = self._create_file(None)
+        with self.captureOnCommitCallbacks(execute=True):
+            File.objects.filter(pk=new_file.pk).update(contentnode=self.node)
+        self.assertFalse(self.cache.is_tracked())
+        size, _ = calculate_resource_size(self.root)
+        self.assertEqual(self.size + 100, size)
+
+    def test_node_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.node.parent.delete()
+        self.assertTrackedSize(ResourceSizeHelper(self.root).get_size() or 0)
+
+    def test_node_moved__other_tree(self):
+        other_channel = testdata.channel()
+        other_cache = ResourceSizeCache(other_channel.main_tree)
+        calculate_resource_size(other_channel.main_tree)
+        other_size = other_cache.get_size()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.node.move_to(other_channel.main_tree, "last-child")
+        self.assertTrackedSize(ResourceSizeHelper(self.root).get_size() or 0)
+        self.assertTrue(other_cache.is_tracked())
+        self.assertEqual(
+            ResourceSizeHelper(other_channel.main_tree).get_size(),
+            other_cache.get_size(),
+        )
+        self.assertGreater(other_cache.get_size(), other_size)
+
+    def test_node_copied(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.node.copy_to(self.root)
+        self.assertTrackedSize(self.size + 100)
+
+    def test_calculation__changed_meanwhile(self):
+        changes = self.cache.get_changes()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file(self.node)
+        self.assertFalse(
+            self.cache.set_tracked_size(self.size, timezone.now(), changes)
+        )
+        self.assertTrackedSize(self.size + 100)
+
+    def test_invalidate(self):
+        self.cache.invalidate()
+        self.assertFalse(self.cache.is_tracked())
+        size, stale = calculate_resource_size(self.root)
+        self.assertEqual(self.size, size)
+        self.assertTrue(self.cache.is_tracked())
+
+    def test_check_resource_sizes(self):
+        self.cache.set_size(1)
+        call_command("check_resource_sizes", channel_ids=[self.channel.id])
+        self.assertEqual(1, self.cache.get_size())
+        call_command("check_resource_sizes", channel_ids=[self.channel.id], fix=True)
+        self.assertTrackedSize(self.size)
+
+
 class GenerateTreesDiffTestCase(StudioTestCase):
     def setUp(self):
         super(GenerateTreesDiffTestCase, self).setUpBase()
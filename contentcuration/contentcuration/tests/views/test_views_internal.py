@@ -40,6 +40,7 @@ from contentcuration.db.models.manager import ALLOWED_OVERRIDES
 from contentcuration.db.models.manager import EDIT_ALLOWED_OVERRIDES
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
+from contentcuration.models import ContentTag
 from contentcuration.models import File
 from contentcuration.utils.assessment.qti.validation import validate_qti_item
 from contentcuration.views import internal
@@ -205,6 +206,52 @@ class ApiAddNodesToTreeTestCase(StudioTestCase):
         for label, values in METADATA.items():
             self.assertEqual(getattr(node, label), {values[0]: True})
 
+    def test_nodes_created_in_order(self):
+        content_data = self.sample_data["content_data"]
+        self.root_node.refresh_from_db()
+        children = list(self.root_node.get_children())[-len(content_data) :]
+        self.assertEqual(
+            [child.node_id for child in children],
+            [node["node_id"] for node in content_data],
+        )
+        self.assertEqual(self.root_node.rght, children[-1].rght + 1)
+        for i, child in enumerate(children):
+            self.assertEqual(child.lft, children[0].lft + 2 * i)
+            self.assertEqual(child.rght, child.lft + 1)
+            self.assertEqual(child.level, self.root_node.level + 1)
+            self.assertEqual(child.tree_id, self.root_node.tree_id)
+            self.assertTrue(child.changed)
+
+    def test_tags_created_once_per_channel(self):
+        node_ids = [node["node_id"] for node in self.sample_data["content_data"]]
+        for node in ContentNode.objects.filter(
+            parent=self.root_node, node_id__in=node_ids
+        ):
+            self.assertEqual(
+                sorted(node.tags.values_list("tag_name", flat=True)), ["edtech", "oer"]
+            )
+        self.assertEqual(
+            ContentTag.objects.filter(
+                channel=self.channel, tag_name__in=["oer", "edtech"]
+            ).count(),
+            2,
+        )
+
+    def test_added_after_existing_children(self):
+        existing = list(self.root_node.get_children().values_list("node_id", flat=True))
+        new_node = self._make_node_data()
+        response = self.admin_client().post(
+            reverse_lazy("api_add_nodes_to_tree"),
+            data={"root_id": self.root_node.id, "content_data": [new_node]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.root_node.refresh_from_db()
+        self.assertEqual(
+            list(self.root_node.get_children().values_list("node_id", flat=True)),
+            existing + [new_node["node_id"]],
+        )
+
     @skipIf(True, "Disable until we mark nodes as incomplete rather than just warn")
     def test_invalid_nodes_are_not_complete(self):
         node_0 = ContentNode.objects.get(title=self.title)
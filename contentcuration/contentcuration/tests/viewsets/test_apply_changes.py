@@ -0,0 +1,268 @@
+import mock
+
+from contentcuration import models
+from contentcuration.tests import testdata
+from contentcuration.tests.base import StudioTestCase
+from contentcuration.tests.viewsets.base import generate_create_event
+from contentcuration.tests.viewsets.base import generate_update_event
+from contentcuration.viewsets.contentnode import ContentNodeViewSet
+from contentcuration.viewsets.sync import base
+from contentcuration.viewsets.sync.base import apply_changes
+from contentcuration.viewsets.sync.base import drain_changes
+from contentcuration.viewsets.sync.base import get_change_batches
+from contentcuration.viewsets.sync.constants import CONTENTNODE
+from contentcuration.viewsets.sync.constants import FILE
+from contentcuration.viewsets.sync.utils import generate_move_event
+
+
+class ApplyChangesTestCase(StudioTestCase):
+    def setUp(self):
+        super(ApplyChangesTestCase, self).setUpBase()
+        self.nodes = [
+            testdata.node({"kind_id": "video", "title": "Video {}".format(i)})
+            for i in range(3)
+        ]
+        for node in self.nodes:
+            node.parent = self.channel.main_tree
+            node.save()
+
+    def create_change(self, event, user=None):
+        return models.Change.create_change(event, created_by_id=(user or self.user).id)
+
+    def update_change(self, node, mods, user=None):
+        return self.create_change(
+            generate_update_event(
+                node.id, CONTENTNODE, mods, channel_id=self.channel.id
+            ),
+            user=user,
+        )
+
+    def get_changes(self):
+        return models.Change.objects.filter(channel=self.channel).order_by("server_rev")
+
+    def test_get_change_batches(self):
+        title_changes = [
+            self.update_change(node, {"title": "New title"}) for node in self.nodes
+        ]
+        repeated_change = self.update_change(self.nodes[0], {"title": "Newer title"})
+        other_user_change = self.update_change(
+            self.nodes[1], {"title": "Title"}, user=testdata.user("other@test.com")
+        )
+        file_change = self.create_change(
+            generate_create_event(
+                "abcd", FILE, {"title": "File"}, channel_id=self.channel.id
+            )
+        )
+        move_changes = [
+            self.create_change(
+                generate_move_event(
+                    node.id,
+                    CONTENTNODE,
+                    self.channel.main_tree.id,
+                    "last-child",
+                    channel_id=self.channel.id,
+                )
+            )
+            for node in self.nodes[:2]
+        ]
+
+        batches = list(get_change_batches(self.get_changes()))
+
+        self.assertEqual(
+            [[change.server_rev for change in batch] for batch in batches],
+            [
+                [change.server_rev for change in title_changes],
+                [repeated_change.server_rev],
+                [other_user_change.server_rev],
+                [file_change.server_rev],
+                [move_changes[0].server_rev],
+                [move_changes[1].server_rev],
+            ],
+        )
+
+    def test_apply_changes_in_batch(self):
+        for node in self.nodes:
+            self.update_change(node, {"title": "New title"})
+
+        with mock.patch.object(
+            ContentNodeViewSet,
+            "update_from_changes",
+            autospec=True,
+            side_effect=ContentNodeViewSet.update_from_changes,
+        ) as update_from_changes:
+            apply_changes(self.get_changes())
+
+        self.assertEqual(update_from_changes.call_count, 1)
+        self.assertEqual(len(update_from_changes.call_args[0][1]), len(self.nodes))
+        for node in self.nodes:
+            node.refresh_from_db()
+            self.assertEqual(node.title, "New title")
+        for change in self.get_changes():
+            self.assertTrue(change.applied)
+            self.assertFalse(change.errored)
+
+    def test_apply_changes_in_batch_reports_errors_per_change(self):
+        valid_change = self.update_change(self.nodes[0], {"title": "New title"})
+        invalid_change = self.update_change(self.nodes[1], {"tags": ["tag"]})
+        missing_change = self.create_change(
+            generate_update_event(
+                "a" * 32, CONTENTNODE, {"title": "Title"}, channel_id=self.channel.id
+            )
+        )
+
+        apply_changes(self.get_changes())
+
+        valid_change.refresh_from_db()
+        self.assertTrue(valid_change.applied)
+        self.assertFalse(valid_change.errored)
+        self.nodes[0].refresh_from_db()
+        self.assertEqual(self.nodes[0].title, "New title")
+
+        for change in [invalid_change, missing_change]:
+            change.refresh_from_db()
+            self.assertFalse(change.applied)
+            self.assertTrue(change.errored)
+            self.assertTrue(change.kwargs["errors"])
+
+    def test_apply_changes_in_batch_exception_errors_only_its_change(self):
+        changes = [
+            self.update_change(node, {"title": "New title"}) for node in self.nodes
+        ]
+        failing_id = self.nodes[1].id
+
+        def update_from_changes(viewset, changes):
+            if any(change["key"] == failing_id for change in changes):
+                raise ValueError("Failed")
+            return ContentNodeViewSet.update_from_changes(viewset, changes)
+
+        with mock.patch.object(
+            ContentNodeViewSet,
+            "update_from_changes",
+            autospec=True,
+            side_effect=update_from_changes,
+        ):
+            apply_changes(self.get_changes())
+
+        for node, change in zip(self.nodes, changes):
+            node.refresh_from_db()
+            change.refresh_from_db()
+            if node.id == failing_id:
+                self.assertTrue(change.errored)
+                self.assertEqual(change.kwargs["errors"], ["Failed"])
+                self.assertNotEqual(node.title, "New title")
+            else:
+                self.assertTrue(change.applied)
+                self.assertFalse(change.errored)
+                self.assertEqual(node.title, "New title")
+
+    def test_apply_changes_in_batch_bulk_update_exception_errors_only_its_change(self):
+        changes = [
+            self.update_change(node, {"title": "New title"}) for node in self.nodes
+        ]
+        failing_id = self.nodes[1].id
+        perform_bulk_update = ContentNodeViewSet.perform_bulk_update
+
+        def perform_failing_bulk_update(viewset, serializer):
+            if any(datum["id"] == failing_id for datum in serializer.initial_data):
+                raise ValueError("Failed")
+            return perform_bulk_update(viewset, serializer)
+
+        with mock.patch.object(
+            ContentNodeViewSet,
+            "perform_bulk_update",
+            autospec=True,
+            side_effect=perform_failing_bulk_update,
+        ):
+            apply_changes(self.get_changes())
+
+        for node, change in zip(self.nodes, changes):
+            node.refresh_from_db()
+            change.refresh_from_db()
+            if node.id == failing_id:
+                self.assertTrue(change.errored)
+                self.assertEqual(change.kwargs["errors"], ["Internal server error"])
+                self.assertNotEqual(node.title, "New title")
+            else:
+                self.assertTrue(change.applied)
+                self.assertFalse(change.errored)
+                self.assertEqual(node.title, "New title")
+
+    def test_apply_changes_in_batch_untraceable_error_applied_one_at_a_time(self):
+        changes = [
+            self.update_change(node, {"title": "New title"}) for node in self.nodes
+        ]
+        failing_id = self.nodes[1].id
+
+        def update_from_changes(viewset, changes):
+            errors = ContentNodeViewSet.update_from_changes(viewset, changes)
+            if any(change["key"] == failing_id for change in changes):
+                errors.append({"errors": ["Untraceable"]})
+            return errors
+
+        with mock.patch.object(
+            ContentNodeViewSet,
+            "update_from_changes",
+            autospec=True,
+            side_effect=update_from_changes,
+        ) as mock_update_from_changes:
+            apply_changes(self.get_changes())
+
+        self.assertEqual(mock_update_from_changes.call_count, 1 + len(self.nodes))
+        for node, change in zip(self.nodes, changes):
+            change.refresh_from_db()
+            if node.id == failing_id:
+                self.assertTrue(change.errored)
+                self.assertEqual(change.kwargs["errors"], ["Untraceable"])
+            else:
+                self.assertTrue(change.applied)
+                self.assertFalse(change.errored)
+
+    def get_unapplied_changes(self):
+        return models.Change.objects.filter(
+            channel=self.channel, applied=False, errored=False
+        )
+
+    def test_drain_changes(self):
+        for node in self.nodes:
+            self.update_change(node, {"title": "New title"})
+
+        with mock.patch.object(base, "CHANGE_DRAIN_BATCH_SIZE", 2):
+            throughput = drain_changes(self.get_unapplied_changes(), 30)
+
+        self.assertEqual(throughput["changes_applied"], len(self.nodes))
+        self.assertEqual(throughput["queue_lag"], 0)
+        for node in self.nodes:
+            node.refresh_from_db()
+            self.assertEqual(node.title, "New title")
+
+    def test_drain_changes__pulls_changes_that_arrive(self):
+        self.update_change(self.nodes[0], {"title": "New title"})
+        apply_change_batch = base.apply_change_batch
+
+        def apply_and_receive_change(batch):
+            apply_change_batch(batch)
+            if len(self.get_changes()) == 1:
+                self.update_change(self.nodes[1], {"title": "Arrived title"})
+
+        with mock.patch.object(
+            base, "apply_change_batch", side_effect=apply_and_receive_change
+        ):
+            throughput = drain_changes(self.get_unapplied_changes(), 30)
+
+        self.assertEqual(throughput["changes_applied"], 2)
+        self.nodes[1].refresh_from_db()
+        self.assertEqual(self.nodes[1].title, "Arrived title")
+
+    def test_drain_changes__time_slice(self):
+        for node in self.nodes:
+            self.update_change(node, {"title": "New title"})
+
+        with mock.patch.object(base, "CHANGE_DRAIN_BATCH_SIZE", 1), mock.patch.object(
+            base, "time"
+        ) as mock_time:
+            mock_time.monotonic.side_effect = [0, 0, 1, 1]
+            throughput = drain_changes(self.get_unapplied_changes(), 1)
+
+        self.assertEqual(throughput["changes_applied"], 1)
+        self.assertEqual(throughput["changes_per_second"], 1.0)
+        self.assertEqual(throughput["queue_lag"], len(self.nodes) - 1)
@@ -1,5 +1,6 @@
 import json
 import uuid
+from unittest import mock
 
 from django.urls import reverse
 from le_utils.constants import content_kinds
@@ -14,6 +15,7 @@ from contentcuration.tests.viewsets.base import generate_create_event
 from contentcuration.tests.viewsets.base import generate_delete_event
 from contentcuration.tests.viewsets.base import generate_update_event
 from contentcuration.tests.viewsets.base import SyncTestMixin
+from contentcuration.utils.assessment.qti.validation import validate_qti_items
 from contentcuration.viewsets.sync.constants import ASSESSMENTITEM
 
 
@@ -1055,6 +1057,48 @@ class SyncTestCase(SyncTestMixin, StudioAPITestCase):
                 assessment_id=assessmentitem["assessment_id"]
             )
 
+    def test_create_qti_assessmentitems_validated_together(self):
+        self.client.force_authenticate(user=self.user)
+        valid_item = self.assessmentitem_metadata
+        valid_item["type"] = "QTI"
+        valid_item["raw_data"] = VALID_CHOICE_ITEM
+        invalid_item = self.assessmentitem_metadata
+        invalid_item["type"] = "QTI"
+        invalid_item["raw_data"] = "<qti-assessment-item><unclosed>"
+        with mock.patch(
+            "contentcuration.viewsets.assessmentitem.validate_qti_items",
+            wraps=validate_qti_items,
+        ) as validate_mock:
+            response = self.sync_changes(
+                [
+                    generate_create_event(
+                        [item["contentnode"], item["assessment_id"]],
+                        ASSESSMENTITEM,
+                        item,
+                        channel_id=self.channel.id,
+                    )
+                    for item in (valid_item, invalid_item)
+                ],
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        # The valid items are validated again when they are created on their own
+        self.assertCountEqual(
+            validate_mock.call_args_list[0][0][0],
+            [valid_item["raw_data"], invalid_item["raw_data"]],
+        )
+        self.assertEqual(len(response.json()["errors"]), 1)
+        self.assertTrue(response.json()["errors"][0]["errors"]["raw_data"])
+        self.assertTrue(
+            models.AssessmentItem.objects.filter(
+                assessment_id=valid_item["assessment_id"]
+            ).exists()
+        )
+        self.assertFalse(
+            models.AssessmentItem.objects.filter(
+                assessment_id=invalid_item["assessment_id"]
+            ).exists()
+        )
+
     def test_valid_answers_assessmentitem(self):
         self.client.force_authenticate(user=self.user)
         assessmentitem = self.assessmentitem_metadata
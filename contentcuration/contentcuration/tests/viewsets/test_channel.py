@@ -678,6 +678,84 @@ class CRUDTestCase(StudioAPITestCase):
         )
         self.assertEqual(response.status_code, 200, response.content)
 
+    def _get_admin_channel_pages(self, query):
+        self.client.force_authenticate(user=self.admin_user)
+        query = dict(query, cursor="")
+        pages = []
+        while query is not None:
+            response = self.client.get(
+                reverse_with_query("admin-channels-list", query=query),
+                format="json",
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append(response.data["results"])
+            query = response.data["more"]
+        return pages
+
+    def test_fetch_admin_channels_keyset_pages(self):
+        user = testdata.user()
+        channel_ids = [
+            models.Channel.objects.create(actor_id=user.id, **self.channel_metadata).id
+            for _ in range(5)
+        ]
+
+        pages = self._get_admin_channel_pages(
+            {"id__in": ",".join(channel_ids), "page_size": 2, "ordering": "-name"}
+        )
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertCountEqual(
+            [channel["id"] for page in pages for channel in page], channel_ids
+        )
+
+    def test_fetch_admin_channels_keyset_ordered_by_annotation(self):
+        user = testdata.user()
+        channel_ids = [
+            models.Channel.objects.create(actor_id=user.id, **self.channel_metadata).id
+            for _ in range(3)
+        ]
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(
+            reverse_with_query(
+                "admin-channels-list",
+                query={"id__in": ",".join(channel_ids), "page_size": 2, "cursor": ""},
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        # modified is a subquery annotation, so the list is paged by page number
+        self.assertNotIn("more", response.data)
+        self.assertEqual(response.data["total_pages"], 2)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_fetch_admin_channels_keyset_pages_ordered_by_name(self):
+        user = testdata.user()
+        names = ["d", "a", "c", "a", "b"]
+        channel_ids = [
+            models.Channel.objects.create(
+                actor_id=user.id, **dict(self.channel_metadata, name=name)
+            ).id
+            for name in names
+        ]
+
+        pages = self._get_admin_channel_pages(
+            {"id__in": ",".join(channel_ids), "page_size": 2, "ordering": "name"}
+        )
+
+        results = [channel for page in pages for channel in page]
+        self.assertEqual([channel["name"] for channel in results], sorted(names))
+        self.assertCountEqual([channel["id"] for channel in results], channel_ids)
+
+    def test_fetch_admin_channels_invalid_cursor(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(
+            reverse_with_query(
+                "admin-channels-list", query={"cursor": "invalid", "page_size": 2}
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 404, response.content)
+
     def test_admin_channel_detail__latest_community_library_submission__exists(self):
         older_submission = testdata.community_library_submission()
         older_submission.channel.version = 2
@@ -4,6 +4,7 @@ import mock
 import pytest
 from django.conf import settings
 from django.core.management import call_command
+from django.db.models import F
 from django.db.utils import OperationalError
 from django.test.testcases import TestCase
 from django.test.testcases import TransactionTestCase
@@ -23,6 +24,7 @@ from le_utils.constants.labels.subjects import SUBJECTSLIST
 from contentcuration import models
 from contentcuration.tests import testdata
 from contentcuration.tests.base import StudioAPITestCase
+from contentcuration.tests.helpers import EagerTasksTestMixin
 from contentcuration.tests.viewsets.base import generate_copy_event
 from contentcuration.tests.viewsets.base import generate_create_event
 from contentcuration.tests.viewsets.base import generate_delete_event
@@ -2195,7 +2197,7 @@ class CRUDTestCase(StudioAPITestCase):
         self.assertEqual(response.data.get("size", 0), total_size)
 
 
-class AnnotationsTest(StudioAPITestCase):
+class AnnotationsTest(EagerTasksTestMixin, StudioAPITestCase):
     def setUp(self):
         super(AnnotationsTest, self).setUp()
         self.channel = testdata.channel()
@@ -2327,3 +2329,110 @@ class AnnotationsTest(StudioAPITestCase):
         self.assertEqual(0, exercise_node_results.get("resource_count"))
         self.assertEqual(3, exercise_node_results.get("assessment_item_count"))
         self.assertEqual(0, exercise_node_results.get("coach_count"))
+
+    def test_tree_metadata__materialized(self):
+        topic_tree_node = testdata.tree()
+        self.fetch_data(topic_tree_node)
+
+        tree_metadata = models.ContentNodeTreeMetadata.objects.get(
+            contentnode=topic_tree_node
+        )
+        self.assertEqual(topic_tree_node.rght, tree_metadata.rght)
+        self.assertEqual(5, tree_metadata.resource_count)
+        self.assertFalse(
+            models.ContentNodeTreeMetadata.objects.filter(
+                contentnode__tree_id=topic_tree_node.tree_id,
+                contentnode__kind_id=content_kinds.VIDEO,
+            ).exists()
+        )
+
+    def test_tree_metadata__calculated_by_task(self):
+        topic_tree_node = testdata.tree()
+        with mock.patch(
+            "contentcuration.viewsets.contentnode.update_tree_metadata_task"
+        ) as task:
+            self.assertEqual(5, self.fetch_data(topic_tree_node).get("resource_count"))
+
+        task.fetch_or_enqueue.assert_called_once_with(
+            self.user, node_ids=[topic_tree_node.id]
+        )
+        self.assertFalse(
+            models.ContentNodeTreeMetadata.objects.filter(
+                contentnode__tree_id=topic_tree_node.tree_id
+            ).exists()
+        )
+
+    def test_tree_metadata__read(self):
+        topic_tree_node = testdata.tree()
+        self.fetch_data(topic_tree_node)
+        models.ContentNodeTreeMetadata.objects.filter(
+            contentnode=topic_tree_node
+        ).update(resource_count=100)
+
+        self.assertEqual(100, self.fetch_data(topic_tree_node).get("resource_count"))
+
+    def test_tree_metadata__created(self):
+        topic_tree_node = testdata.tree()
+        self.assertEqual(0, self.fetch_data(topic_tree_node).get("coach_count"))
+        nested_topic = (
+            topic_tree_node.get_descendants().filter(kind=content_kinds.TOPIC).first()
+        )
+        self.create_coach_node(nested_topic)
+
+        self.assertEqual(1, self.fetch_data(topic_tree_node).get("coach_count"))
+        self.assertEqual(1, self.fetch_data(nested_topic).get("coach_count"))
+
+    def test_tree_metadata__updated(self):
+        topic_tree_node = testdata.tree()
+        self.assertEqual(0, self.fetch_data(topic_tree_node).get("error_count"))
+
+        count = (
+            topic_tree_node.get_descendants()
+            .filter(kind_id=content_kinds.VIDEO)
+            .update(complete=False)
+        )
+
+        self.assertEqual(count, self.fetch_data(topic_tree_node).get("error_count"))
+
+    def test_tree_metadata__moved(self):
+        topic_tree_node = testdata.tree()
+        topics = topic_tree_node.get_children().filter(kind=content_kinds.TOPIC)
+        source, target = topics.first(), topics.last()
+        source_count = self.fetch_data(source).get("resource_count")
+        target_count = self.fetch_data(target).get("resource_count")
+        resource = source.get_descendants().exclude(kind=content_kinds.TOPIC).first()
+
+        resource.move_to(target, "last-child")
+
+        self.assertEqual(
+            source_count - 1, self.fetch_data(source).get("resource_count")
+        )
+        self.assertEqual(
+            target_count + 1, self.fetch_data(target).get("resource_count")
+        )
+
+    def test_tree_metadata__deleted(self):
+        topic_tree_node = testdata.tree()
+        self.assertEqual(5, self.fetch_data(topic_tree_node).get("resource_count"))
+
+        topic_tree_node.get_descendants().exclude(
+            kind=content_kinds.TOPIC
+        ).first().delete()
+
+        self.assertEqual(4, self.fetch_data(topic_tree_node).get("resource_count"))
+
+    def test_tree_metadata__backfill(self):
+        topic_tree_node = testdata.tree()
+        self.channel.main_tree = topic_tree_node
+        self.channel.save()
+
+        call_command("backfill_tree_metadata", channel_ids=[self.channel.id])
+
+        self.assertEqual(
+            topic_tree_node.get_descendants(include_self=True)
+            .filter(kind=content_kinds.TOPIC, rght__gt=F("lft") + 1)
+            .count(),
+            models.ContentNodeTreeMetadata.objects.filter(
+                contentnode__tree_id=topic_tree_node.tree_id
+            ).count(),
+        )
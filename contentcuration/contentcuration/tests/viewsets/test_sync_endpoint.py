@@ -0,0 +1,93 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contentcuration import models
+from contentcuration.tests import testdata
+from contentcuration.tests.base import StudioAPITestCase
+from contentcuration.tests.viewsets.base import generate_update_event
+from contentcuration.viewsets.base import create_change_tracker
+from contentcuration.viewsets.sync.constants import CHANNEL
+
+
+class SyncIndexTestCase(StudioAPITestCase):
+    def setUp(self):
+        super(SyncIndexTestCase, self).setUp()
+        self.user = testdata.user()
+        self.channel = testdata.channel()
+        self.channel.editors.add(self.user)
+        self.sign_in()
+
+    def sync(self, channel_rev=0, user_rev=0, unapplied_revs=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("sync"),
+                {
+                    "channel_revs": {self.channel.id: channel_rev},
+                    "user_rev": user_rev,
+                    "unapplied_revs": unapplied_revs or [],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.queried_tables = {
+            table
+            for table in (
+                models.Change._meta.db_table,
+                models.CustomTaskMetadata._meta.db_table,
+            )
+            if any(table in query["sql"] for query in queries.captured_queries)
+        }
+        return response.json()
+
+    def create_applied_change(self):
+        return models.Change.create_change(
+            generate_update_event(
+                self.channel.id, CHANNEL, {"name": "Name"}, channel_id=self.channel.id
+            ),
+            created_by_id=self.user.id,
+            applied=True,
+        )
+
+    def test_up_to_date_poll_skips_database(self):
+        change = self.create_applied_change()
+        response = self.sync()
+        self.assertEqual(
+            [c["server_rev"] for c in response["changes"]], [change.server_rev]
+        )
+        self.assertEqual(
+            self.queried_tables,
+            {models.Change._meta.db_table, models.CustomTaskMetadata._meta.db_table},
+        )
+
+        response = self.sync(channel_rev=change.server_rev)
+        self.assertEqual(response["changes"], [])
+        self.assertEqual(response["tasks"], [])
+        self.assertEqual(self.queried_tables, set())
+
+    def test_new_changes_are_returned(self):
+        change = self.create_applied_change()
+        self.sync(channel_rev=change.server_rev)
+
+        new_change = self.create_applied_change()
+        response = self.sync(channel_rev=change.server_rev)
+        self.assertEqual(
+            [c["server_rev"] for c in response["changes"]], [new_change.server_rev]
+        )
+
+    def test_unapplied_revs_query_database(self):
+        change = self.create_applied_change()
+        self.sync(channel_rev=change.server_rev)
+
+        self.sync(channel_rev=change.server_rev, unapplied_revs=[change.server_rev])
+        self.assertIn(models.Change._meta.db_table, self.queried_tables)
+
+    def test_started_tasks_are_returned(self):
+        self.sync()
+        with create_change_tracker(
+            self.channel.id, CHANNEL, self.channel.id, self.user, "test-task"
+        ):
+            response = self.sync()
+        self.assertEqual(
+            [task["task_name"] for task in response["tasks"]], ["test-task"]
+        )
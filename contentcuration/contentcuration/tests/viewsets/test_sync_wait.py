@@ -0,0 +1,76 @@
+import threading
+import time
+
+from django.test import override_settings
+from django.urls import reverse
+
+from contentcuration import models
+from contentcuration.tests import testdata
+from contentcuration.tests.base import StudioAPITestCase
+from contentcuration.tests.viewsets.base import generate_update_event
+from contentcuration.utils.change_feed import get_channel_feed
+from contentcuration.utils.change_feed import publish
+from contentcuration.viewsets.sync.constants import CHANNEL
+
+
+@override_settings(SYNC_LONG_POLL_TIMEOUT=0.2)
+class SyncWaitTestCase(StudioAPITestCase):
+    def setUp(self):
+        super(SyncWaitTestCase, self).setUp()
+        self.user = testdata.user()
+        self.channel = testdata.channel()
+        self.channel.editors.add(self.user)
+        self.sign_in()
+
+    def sync_wait(self, channel_rev=0):
+        return self.client.post(
+            reverse("sync_wait"),
+            {"channel_revs": {self.channel.id: channel_rev}, "user_rev": 0},
+            format="json",
+        )
+
+    def create_applied_change(self):
+        return models.Change.create_change(
+            generate_update_event(
+                self.channel.id, CHANNEL, {"name": "Name"}, channel_id=self.channel.id
+            ),
+            created_by_id=self.user.id,
+            applied=True,
+        )
+
+    def test_returns_changes(self):
+        change = self.create_applied_change()
+        response = self.sync_wait()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            [c["server_rev"] for c in response.json()["changes"]], [change.server_rev]
+        )
+        self.assertEqual(response.json()["tasks"], [])
+
+    def test_returns_nothing_after_timeout(self):
+        change = self.create_applied_change()
+        response = self.sync_wait(channel_rev=change.server_rev)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            response.json(),
+            {
+                "disallowed": [],
+                "allowed": [],
+                "changes": [],
+                "errors": [],
+                "successes": [],
+                "tasks": [],
+            },
+        )
+
+    @override_settings(SYNC_LONG_POLL_TIMEOUT=10)
+    def test_returns_when_notified(self):
+        timer = threading.Timer(0.2, publish, [{get_channel_feed(self.channel.id)}])
+        start = time.monotonic()
+        timer.start()
+        try:
+            response = self.sync_wait()
+        finally:
+            timer.cancel()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertLess(time.monotonic() - start, 10)
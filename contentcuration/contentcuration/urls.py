@@ -59,6 +59,7 @@ from contentcuration.viewsets.file import FileViewSet
 from contentcuration.viewsets.invitation import InvitationViewSet
 from contentcuration.viewsets.recommendation import RecommendationView
 from contentcuration.viewsets.sync.endpoint import SyncView
+from contentcuration.viewsets.sync.endpoint import SyncWaitView
 from contentcuration.viewsets.user import AdminUserViewSet
 from contentcuration.viewsets.user import ChannelUserViewSet
 from contentcuration.viewsets.user import UserViewSet
@@ -153,6 +154,7 @@ urlpatterns = [
         name="unapplied_changes_status",
     ),
     re_path(r"^api/sync/$", SyncView.as_view(), name="sync"),
+    re_path(r"^api/sync/wait/$", SyncWaitView.as_view(), name="sync_wait"),
     re_path(
         r"^api/recommendations/$", RecommendationView.as_view(), name="recommendations"
     ),
@@ -214,6 +216,11 @@ urlpatterns += [
         settings_views.export_user_data,
         name="export_user_data",
     ),
+    re_path(
+        r"^settings/user_data/$",
+        settings_views.download_user_data,
+        name="download_user_data",
+    ),
     re_path(
         r"^api/change_password/$",
         settings_views.UserPasswordChangeView.as_view(),
@@ -3,14 +3,17 @@ import json
 import logging
 import os
 import re
+import threading
 import zipfile
 from abc import ABC
 from abc import abstractmethod
 from io import BytesIO
-from tempfile import NamedTemporaryFile
-from tempfile import TemporaryDirectory
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
+from django.core.cache import cache as django_cache
 from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage as storage
 from le_utils.constants import exercises
 from le_utils.constants import format_presets
@@ -39,6 +42,148 @@ def get_resized_image_checksum(image_content):
     return hashlib.md5(image_content).hexdigest()
 
 
+RESIZED_IMAGE_CACHE_KEY = "resized_image:{checksum}:{width}x{height}"
+
+# Marks the resized images in storage that are still indexed in the cache, for the sweep
+# of storage by garbage collection to keep
+RESIZED_IMAGE_FILE_CACHE_KEY = "resized_image_file:{filename}"
+
+# Resized images that haven't been used for this long drop out of the cache, and are then
+# deleted from storage by garbage collection. They're resized again if they're used after.
+RESIZED_IMAGE_CACHE_TIMEOUT = 90 * 24 * 60 * 60
+
+
+def get_resized_image_file_cache_key(filename):
+    return RESIZED_IMAGE_FILE_CACHE_KEY.format(filename=filename)
+
+
+def generate_resized_image_storage_name(filename):
+    """
+    Resized images are stored apart from the uploaded files, as no File objects reference them
+    """
+    checksum, ext = os.path.splitext(filename)
+    directory = "/".join(
+        [settings.RESIZED_IMAGES_STORAGE_ROOT, checksum[0], checksum[1]]
+    )
+    return "{}/{}{}".format(directory, checksum, ext.lower())
+
+
+class ResizedImageCache(object):
+    """
+    Keeps the images resized for exercise archives in storage, indexed in the cache by the
+    checksum of the original image and the size it was resized to, so that an image is only
+    resized once for all of the exercises, channels and publishes it's used in. The cache
+    only saves resizing images again, so when it can't be reached, images are resized in
+    place rather than failing the publish.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _get_key(self, checksum, width, height):
+        return RESIZED_IMAGE_CACHE_KEY.format(
+            checksum=checksum, width=width, height=height
+        )
+
+    def _index(self, key, filename):
+        try:
+            django_cache.set_many(
+                {key: filename, get_resized_image_file_cache_key(filename): True},
+                timeout=RESIZED_IMAGE_CACHE_TIMEOUT,
+            )
+        except Exception as e:
+            logging.warning(f"Could not index resized image {filename}: {str(e)}")
+
+    def get(self, checksum, width, height):
+        """
+        :return: A tuple of the filename and content of the resized image, or None if the image
+            hasn't been resized to this size yet
+        """
+        key = self._get_key(checksum, width, height)
+        try:
+            filename = django_cache.get(key)
+        except Exception as e:
+            logging.warning(f"Could not read the resized image cache: {str(e)}")
+            filename = None
+        content = None
+        if filename:
+            try:
+                with storage.open(
+                    generate_resized_image_storage_name(filename), "rb"
+                ) as f:
+                    content = f.read()
+            except OSError:
+                logging.warning(f"Cached resized image {filename} is missing")
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if content is None:
+            return None
+        # Resized images stay in the cache for as long as they keep being used
+        self._index(key, filename)
+        return filename, content
+
+    def set(self, checksum, width, height, filename, content):
+        storage_name = generate_resized_image_storage_name(filename)
+        if not storage.exists(storage_name):
+            storage.save(storage_name, ContentFile(content))
+        self._index(self._get_key(checksum, width, height), filename)
+
+    def report(self, channel_id):
+        if self.hits or self.misses:
+            logging.info(
+                f"Resized images for the exercises of channel {channel_id}: "
+                f"{self.hits} found in the cache, {self.misses} resized"
+            )
+
+
+# Archives larger than this are spooled to a temporary file rather than kept in memory
+ARCHIVE_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
+
+class ExerciseArchive(object):
+    """
+    A zip file that is written as each of its files is added, and hashed as it's written, so
+    that it can be saved to storage without being read from disk again.
+    """
+
+    def __init__(self):
+        self.file = SpooledTemporaryFile(max_size=ARCHIVE_MAX_MEMORY_SIZE)
+        self.zipfile = zipfile.ZipFile(self.file, "w")
+        self.checksum = None
+        self.size = 0
+        self._md5 = hashlib.md5()
+
+    def writestr(self, info, content):
+        self.zipfile.writestr(info, content)
+        self._update_checksum()
+
+    def _update_checksum(self):
+        # The local header of an entry is only final once the entry has been written, so the
+        # bytes are hashed after each entry rather than as they are written
+        end = self.file.seek(0, os.SEEK_END)
+        self.file.seek(self.size)
+        while self.file.tell() < end:
+            self._md5.update(self.file.read(min(end - self.file.tell(), 65536)))
+        self.size = end
+
+    def close(self):
+        """
+        Writes the central directory of the zip file, and rewinds it so that it can be saved.
+        """
+        self.zipfile.close()
+        self._update_checksum()
+        self.checksum = self._md5.hexdigest()
+        self.file.seek(0)
+
+    def discard(self):
+        self.file.close()
+
+
 class ExerciseArchiveGenerator(ABC):
     """
     Abstract base class for exercise zip generators.
@@ -48,6 +193,9 @@ class ExerciseArchiveGenerator(ABC):
     ZIP_DATE_TIME = (2015, 10, 21, 7, 28, 0)
     ZIP_COMPRESS_TYPE = zipfile.ZIP_DEFLATED
     ZIP_COMMENT = "".encode()
+    # Whether the files are written to the archive in the order of their paths, rather than the
+    # order they are added in, in which case they are kept in memory until the archive is built
+    ZIP_SORT_FILES = False
 
     @property
     @abstractmethod
@@ -91,7 +239,13 @@ class ExerciseArchiveGenerator(ABC):
         pass
 
     def __init__(
-        self, ccnode, exercise_data, channel_id, default_language, user_id=None
+        self,
+        ccnode,
+        exercise_data,
+        channel_id,
+        default_language,
+        user_id=None,
+        image_cache=None,
     ):
         """
         Initialize the exercise zip generator.
@@ -100,16 +254,20 @@ class ExerciseArchiveGenerator(ABC):
             ccnode: Content node containing exercise data
             exercise_data: Data specific to the exercise format
             user_id: Optional user ID for tracking who created the exercise
+            image_cache: Optional ResizedImageCache to share between generators, so that
+                its hits and misses can be reported together
         """
         self.ccnode = ccnode
         self.exercise_data = exercise_data
         self.channel_id = channel_id
         self.default_language = default_language
         self.user_id = user_id
+        self.image_cache = image_cache or ResizedImageCache()
         self.resized_images_map = {}
         self.assessment_items = []
-        self.files_to_write = []
-        self.tempdir = None
+        self._assessment_items = None
+        self.archive = None
+        self.files_to_write = {}
 
     def write_to_zipfile(self, zf, filepath, content):
         """
@@ -125,17 +283,15 @@ class ExerciseArchiveGenerator(ABC):
         zf.writestr(info, content)
 
     def add_file_to_write(self, filepath, content):
-        if self.tempdir is None:
-            raise RuntimeError(
-                "Cannot add files to write before creating the temporary directory."
-            )
-        full_path = os.path.join(self.tempdir, filepath)
-        if os.path.exists(full_path):
+        if self.archive is None:
+            raise RuntimeError("Cannot add files to write before creating the archive.")
+        if filepath in self.files_to_write:
             return
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, "wb") as f:
-            f.write(content)
-        self.files_to_write.append(full_path)
+        if self.ZIP_SORT_FILES:
+            self.files_to_write[filepath] = content
+        else:
+            self.files_to_write[filepath] = None
+            self.write_to_zipfile(self.archive, filepath, content)
 
     def _write_raw_perseus_assets(self, assessment_item, images_dir):
         """Write a raw Perseus item's image and graphie assets into ``images_dir``
@@ -221,20 +377,27 @@ class ExerciseArchiveGenerator(ABC):
                 return resized_image
 
     def _resize_image(self, checksum, ext, filename, width, height, new_file_path):
-        with storage.open(
-            models.generate_object_storage_name(checksum, filename),
-            "rb",
-        ) as imgfile:
-            original_content = imgfile.read()
+        cached = self.image_cache.get(checksum, width, height)
+        if cached:
+            new_img_ref, resized_content = cached
+        else:
+            with storage.open(
+                models.generate_object_storage_name(checksum, filename),
+                "rb",
+            ) as imgfile:
+                original_content = imgfile.read()
 
-        resized_content = resize_image(original_content, width, height)
+            resized_content = resize_image(original_content, width, height)
 
-        if not resized_content:
-            logging.warning(f"Failed to resize image {filename}. Using original image.")
-            return
-        resized_checksum = get_resized_image_checksum(resized_content)
+            if not resized_content:
+                logging.warning(
+                    f"Failed to resize image {filename}. Using original image."
+                )
+                return
+            resized_checksum = get_resized_image_checksum(resized_content)
 
-        new_img_ref = f"{resized_checksum}{ext}"
+            new_img_ref = f"{resized_checksum}{ext}"
+            self.image_cache.set(checksum, width, height, new_img_ref, resized_content)
         self.resized_images_map[filename][(width, height)] = new_img_ref
         self.add_file_to_write(
             os.path.join(new_file_path, new_img_ref), resized_content
@@ -399,29 +562,63 @@ class ExerciseArchiveGenerator(ABC):
     def handle_after_assessment_items(self):
         pass
 
-    def _create_zipfile(self):
-        filename = "{0}.{ext}".format(self.ccnode.title, ext=self.file_format)
-        with NamedTemporaryFile(suffix="zip") as tempf:
-            with zipfile.ZipFile(tempf.name, "w") as zf:
-                for file_path in self.files_to_write:
-                    with open(file_path, "rb") as f:
-                        self.write_to_zipfile(
-                            zf,
-                            os.path.relpath(file_path, self.tempdir),
-                            f.read(),
-                        )
-            file_size = tempf.tell()
-            tempf.flush()
+    def _write_sorted_files(self):
+        for filepath in sorted(self.files_to_write):
+            self.write_to_zipfile(self.archive, filepath, self.files_to_write[filepath])
+
+    def get_assessment_items(self):
+        """
+        Returns the assessment items of the node in order, with their files prefetched. They are
+        only loaded once, so that the archive can be built without querying the database.
+        """
+        if self._assessment_items is None:
+            self._assessment_items = list(
+                self.ccnode.assessment_items.prefetch_related("files")
+                .all()
+                .order_by("order")
+            )
+        return self._assessment_items
 
+    def build_exercise_archive(self):
+        """
+        Builds the archive, and returns it as an ExerciseArchive. Once the assessment items have
+        been loaded with get_assessment_items, this does not query the database, so archives can
+        be built in other threads.
+        """
+        archive = self.archive = ExerciseArchive()
+        try:
+            self.handle_before_assessment_items()
+            for question in self.get_assessment_items():
+                self.process_assessment_item(question)
+            self.handle_after_assessment_items()
+            if self.ZIP_SORT_FILES:
+                self._write_sorted_files()
+            archive.close()
+        except Exception:
+            archive.discard()
+            raise
+        finally:
+            self.archive = None
+            self.files_to_write = {}
+        return archive
+
+    def save_exercise_archive(self, archive):
+        """
+        Replaces the node's file for the archive with the ExerciseArchive built by
+        build_exercise_archive, which is then discarded.
+        """
+        filename = "{0}.{ext}".format(self.ccnode.title, ext=self.file_format)
+        try:
             self.ccnode.files.filter(preset_id=self.preset).delete()
 
             assessment_file_obj = models.File.objects.create(
-                file_on_disk=File(open(tempf.name, "rb"), name=filename),
+                file_on_disk=File(archive.file, name=filename),
                 contentnode=self.ccnode,
                 file_format_id=self.file_format,
                 preset_id=self.preset,
                 original_filename=filename,
-                file_size=file_size,
+                checksum=archive.checksum,
+                file_size=archive.size,
                 uploaded_by_id=self.user_id,
             )
             logging.debug(
@@ -429,16 +626,8 @@ class ExerciseArchiveGenerator(ABC):
                     self.ccnode.title, assessment_file_obj.checksum
                 )
             )
+        finally:
+            archive.discard()
 
     def create_exercise_archive(self):
-        with TemporaryDirectory() as tempdir:
-            self.tempdir = tempdir
-            self.handle_before_assessment_items()
-            for question in (
-                self.ccnode.assessment_items.prefetch_related("files")
-                .all()
-                .order_by("order")
-            ):
-                self.process_assessment_item(question)
-            self.handle_after_assessment_items()
-            self._create_zipfile()
+        self.save_exercise_archive(self.build_exercise_archive())
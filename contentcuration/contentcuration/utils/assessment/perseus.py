@@ -48,7 +48,7 @@ class PerseusExerciseGenerator(ExerciseArchiveGenerator):
         if self._derived_cache is None:
             self._derived_cache = {
                 item.assessment_id: derive_perseus_item(item)
-                for item in self.ccnode.assessment_items.all()
+                for item in self.get_assessment_items()
                 if item.type == exercises.QTI
             }
         return self._derived_cache
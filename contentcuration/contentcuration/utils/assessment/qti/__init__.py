@@ -2,6 +2,7 @@ from .base import ElementTreeBase
 from .validation import QTIValidationError
 from .validation import QTIValidationResult
 from .validation import validate_qti_item
+from .validation import validate_qti_items
 
 
 __all__ = [
@@ -9,4 +10,5 @@ __all__ = [
     "QTIValidationError",
     "QTIValidationResult",
     "validate_qti_item",
+    "validate_qti_items",
 ]
@@ -45,6 +45,9 @@ class QTIExerciseGenerator(ExerciseArchiveGenerator):
 
     file_format = "zip"
     preset = format_presets.QTI_ZIP
+    # Sort all paths to parallel the predictable zip generation logic in ricecooker
+    # and the Kolibri Studio frontend.
+    ZIP_SORT_FILES = True
 
     PERSEUS_IMAGE_DIR = "perseus/images"
 
@@ -123,7 +126,7 @@ class QTIExerciseGenerator(ExerciseArchiveGenerator):
         if not filenames:
             return raw_data, []
 
-        # assessment_item.files is prefetched by ExerciseArchiveGenerator.create_exercise_archive
+        # assessment_item.files is prefetched by ExerciseArchiveGenerator.get_assessment_items
         files_by_name = {
             f"{f.checksum}.{f.file_format_id}": f for f in assessment_item.files.all()
         }
@@ -257,6 +260,3 @@ class QTIExerciseGenerator(ExerciseArchiveGenerator):
         # Create and write the IMS manifest
         manifest_xml = self._create_imsmanifest()
         self.add_file_to_write("imsmanifest.xml", manifest_xml.encode("utf-8"))
-        # Sort all paths to parallel the predictable zip generation logic in ricecooker
-        # and the Kolibri Studio frontend.
-        self.files_to_write = sorted(self.files_to_write)
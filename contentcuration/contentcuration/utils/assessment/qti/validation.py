@@ -1,10 +1,16 @@
+import os
 import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
 from dataclasses import dataclass
 from dataclasses import field
 from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
+from typing import Iterable
 from typing import List
+from typing import Optional
 from typing import Union
 
 from lxml import etree
@@ -19,6 +25,15 @@ ITEM_SCHEMA_PATH = SCHEMA_DIR / "imsqti_itemv3p0p1_v1p0.xsd"
 # Serialize validate + error_log read to keep results correctly attributed.
 _VALIDATION_LOCK = threading.Lock()
 
+# Batches of fewer items than this are validated in the calling process, as handing them
+# to the worker processes would take longer than validating them.
+MIN_POOL_BATCH_SIZE = 16
+
+# Worker process pools for validate_qti_items, by their number of workers. They are
+# started on first use, and kept for the lifetime of the process.
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
 
 @lru_cache(maxsize=1)
 def _compiled_schema() -> etree.XMLSchema:
@@ -58,10 +73,7 @@ def parse_qti_xml(xml: bytes) -> etree._Element:
     return etree.parse(BytesIO(xml), parser=secure_parser())
 
 
-def validate_qti_item(xml: Union[str, bytes]) -> QTIValidationResult:
-    if isinstance(xml, str):
-        xml = xml.encode("utf-8")
-
+def _validate_qti_item(xml: bytes, lock) -> QTIValidationResult:
     try:
         doc = parse_qti_xml(xml)
     except etree.XMLSyntaxError as exc:
@@ -75,10 +87,72 @@ def validate_qti_item(xml: Union[str, bytes]) -> QTIValidationResult:
         )
 
     schema = _compiled_schema()
-    with _VALIDATION_LOCK:
+    with lock:
         is_valid = schema.validate(doc)
         errors = [
             QTIValidationError(message=err.message, line=err.line, column=err.column)
             for err in schema.error_log
         ]
     return QTIValidationResult(is_valid=is_valid, errors=errors)
+
+
+def validate_qti_item(xml: Union[str, bytes]) -> QTIValidationResult:
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    return _validate_qti_item(xml, _VALIDATION_LOCK)
+
+
+def _initialize_worker():
+    # Compile the worker's own copy of the schema as it starts, rather than
+    # while validating its first batch.
+    _compiled_schema()
+
+
+def _validate_qti_item_in_worker(xml: bytes) -> QTIValidationResult:
+    # A worker process validates one item at a time, so nothing else can
+    # write to the error log of its schema while it is read.
+    return _validate_qti_item(xml, nullcontext())
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    with _POOLS_LOCK:
+        if max_workers not in _POOLS:
+            _POOLS[max_workers] = ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_initialize_worker
+            )
+        return _POOLS[max_workers]
+
+
+def validate_qti_items(
+    xmls: Iterable[Union[str, bytes]], max_workers: Optional[int] = None
+) -> List[QTIValidationResult]:
+    """
+    Validates a batch of items, and returns their results in the same order. The items are
+    validated in a pool of worker processes, that each compile the schema once, so that
+    they are not validated one at a time behind _VALIDATION_LOCK.
+
+    max_workers defaults to the number of CPUs. With a single worker, or a batch too small
+    to be worth sending to the pool, the items are validated in the calling process.
+    """
+    xmls = [xml.encode("utf-8") if isinstance(xml, str) else xml for xml in xmls]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1 or len(xmls) < MIN_POOL_BATCH_SIZE:
+        return [validate_qti_item(xml) for xml in xmls]
+
+    # Send the items in a few chunks per worker, to limit the round trips to the pool
+    # while still spreading the items evenly between the workers.
+    chunksize = -(-len(xmls) // (max_workers * 4))
+    try:
+        return list(
+            _get_pool(max_workers).map(
+                _validate_qti_item_in_worker, xmls, chunksize=chunksize
+            )
+        )
+    except BrokenProcessPool:
+        # A worker died, e.g. it was killed for using too much memory, which leaves
+        # the pool unusable. Start a new pool for the next batch, and validate this
+        # one here instead.
+        with _POOLS_LOCK:
+            _POOLS.pop(max_workers, None)
+        return [validate_qti_item(xml) for xml in xmls]
@@ -110,6 +110,20 @@ def delete_public_channel_cache_keys():
     django_cache.delete_many(list(PUBLIC_CHANNELS_CACHE_KEYS.values()))
 
 
+def get_stored_file_cache_key(filename):
+    """
+    The key that marks a file, by its filename, as found in storage by get_file_diff
+    """
+    return "stored_file:{}".format(filename)
+
+
+def forget_stored_file(filename):
+    """
+    Unmarks a file as found in storage, once it's deleted from storage.
+    """
+    django_cache.delete(get_stored_file_cache_key(filename))
+
+
 def redis_retry(func):
     """
     This decorator wraps a function using the lower level Redis client to mimic functionality
@@ -131,6 +145,35 @@ def redis_retry(func):
 
 FILE_MODIFIED = -1
 
+# Increments the number of changes to the resource size, and the size itself when it is tracked
+INCREMENT_SIZE_SCRIPT = """
+redis.call("HINCRBY", KEYS[1], ARGV[3], 1)
+if redis.call("HEXISTS", KEYS[1], ARGV[2]) == 1 then
+    redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[4])
+end
+"""
+
+# Sets the resource size, unless it has changed since the number of changes was read
+SET_SIZE_SCRIPT = """
+if (redis.call("HGET", KEYS[1], ARGV[3]) or "") ~= ARGV[4] then
+    return 0
+end
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[5])
+redis.call("HSET", KEYS[1], ARGV[2], ARGV[6])
+if ARGV[7] == "1" then
+    redis.call("HSET", KEYS[1], ARGV[8], 1)
+else
+    redis.call("HDEL", KEYS[1], ARGV[8])
+end
+return 1
+"""
+
+# Stops tracking the resource size, so that it is calculated again
+INVALIDATE_SIZE_SCRIPT = """
+redis.call("HINCRBY", KEYS[1], ARGV[2], 1)
+redis.call("HDEL", KEYS[1], ARGV[1])
+"""
+
 
 class ResourceSizeCache:
     """
@@ -181,6 +224,14 @@ class ResourceSizeCache:
     def modified_key(self):
         return "{}:modified".format(self.node.pk)
 
+    @property
+    def changes_key(self):
+        return "{}:changes".format(self.node.pk)
+
+    @property
+    def tracked_key(self):
+        return "{}:tracked".format(self.node.pk)
+
     @redis_retry
     def cache_get(self, key):
         if self.redis_client is not None:
@@ -228,3 +279,83 @@ class ResourceSizeCache:
         current_modified = self.get_modified()
         if current_modified and current_modified > modified:
             return self.set_modified(modified)
+
+    def get_changes(self):
+        """
+        :return: The number of changes made to the resource size, which is used to tell whether
+            it changed during a calculation
+        """
+        return self.cache_get(self.changes_key)
+
+    def is_tracked(self):
+        """
+        :return: Whether the size is kept up to date by incrementing it with every change,
+            since it was last calculated
+        """
+        return bool(self.cache_get(self.tracked_key))
+
+    @redis_retry
+    def set_tracked_size(self, size, modified, changes, tracked=True):
+        """
+        Sets the size and modified, unless the size changed after the number of changes was read
+        ahead of calculating it, in which case the calculated size may already be out of date
+
+        :param size: The calculated size
+        :param modified: A datetime of when the calculation started
+        :param changes: The number of changes, as read before the calculation started
+        :param tracked: Whether the size is kept up to date with every change from now on
+        :return: Whether the size was set
+        """
+        modified = modified.isoformat()
+        if self.redis_client is not None:
+            script = self.redis_client.register_script(SET_SIZE_SCRIPT)
+            return bool(
+                script(
+                    keys=[self.hash_key],
+                    args=[
+                        self.size_key,
+                        self.modified_key,
+                        self.changes_key,
+                        "" if changes is None else changes,
+                        size or 0,
+                        modified,
+                        int(tracked),
+                        self.tracked_key,
+                    ],
+                )
+            )
+        if self.get_changes() != changes:
+            return False
+        self.set_size(size or 0)
+        self.set_modified(modified)
+        self.cache_set(self.tracked_key, 1 if tracked else None)
+        return True
+
+    @redis_retry
+    def increment_size(self, delta):
+        """
+        Increments the size when it is tracked, and always counts the change, so that any
+        calculation in progress doesn't overwrite it
+        """
+        if self.redis_client is not None:
+            script = self.redis_client.register_script(INCREMENT_SIZE_SCRIPT)
+            return script(
+                keys=[self.hash_key],
+                args=[self.size_key, self.tracked_key, self.changes_key, delta],
+            )
+        self.cache_set(self.changes_key, int(self.get_changes() or 0) + 1)
+        if self.is_tracked():
+            self.set_size(self.get_size() + delta)
+
+    @redis_retry
+    def invalidate(self):
+        """
+        Stops tracking the size, for changes whose effect on it is unknown
+        """
+        if self.redis_client is not None:
+            script = self.redis_client.register_script(INVALIDATE_SIZE_SCRIPT)
+            return script(
+                keys=[self.hash_key], args=[self.tracked_key, self.changes_key]
+            )
+        self.cache_set(self.changes_key, int(self.get_changes() or 0) + 1)
+        self.cache_set(self.tracked_key, None)
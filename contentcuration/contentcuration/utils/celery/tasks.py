@@ -10,15 +10,32 @@ from celery import states
 from celery.app.task import Task
 from celery.result import AsyncResult
 from django.db import transaction
+from django_redis.client.default import _main_exceptions
 
 from contentcuration.constants.locking import TASK_LOCK
 from contentcuration.db.advisory_lock import advisory_lock
+from contentcuration.utils.cache import redis_retry
+from contentcuration.utils.change_feed import get_redis_client
+from contentcuration.utils.change_feed import notify_tasks
 from contentcuration.utils.sentry import report_exception
 
 
 logger = logging.getLogger(__name__)
 
 
+# How long, in seconds, tasks are kept in the registry of queued tasks for, which bounds how long
+# a task that finished without being removed from it is looked up for
+TASK_REGISTRY_TIMEOUT = 3600
+
+# Removes a task from the registry, unless another task has been registered in its place
+UNREGISTER_TASK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
 class ProgressTracker:
     """
     Helper to track task progress
@@ -95,6 +112,76 @@ def generate_task_signature(task_name, task_kwargs=None, channel_id=None):
     return md5.hexdigest()
 
 
+def get_task_registry_key(signature):
+    return "task_registry:{}".format(signature)
+
+
+@redis_retry
+def _get_registered_task_id(signature):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return None
+    task_id = redis_client.get(get_task_registry_key(signature))
+    return task_id.decode("utf-8") if task_id is not None else None
+
+
+def get_registered_task_id(signature):
+    """
+    Looks up the task last queued with a signature in the registry of queued tasks, which
+    doesn't need a database transaction
+
+    :param signature: An hex string representing an md5 hash of task metadata
+    :return: The task ID, or None when there isn't one in the registry or it is unavailable
+    """
+    try:
+        return _get_registered_task_id(signature)
+    except _main_exceptions as e:
+        logger.warning("Unable to read the task registry: {}".format(e))
+        return None
+
+
+@redis_retry
+def _register_task(signature, task_id):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    redis_client.set(get_task_registry_key(signature), task_id, ex=TASK_REGISTRY_TIMEOUT)
+
+
+def register_task(signature, task_id):
+    """
+    Records the task as the one queued with the signature in the registry of queued tasks
+    """
+    try:
+        _register_task(signature, task_id)
+    except _main_exceptions as e:
+        logger.warning("Unable to update the task registry: {}".format(e))
+
+
+@redis_retry
+def _unregister_task(signature, task_id):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    key = get_task_registry_key(signature)
+    if task_id is None:
+        redis_client.delete(key)
+    else:
+        redis_client.eval(UNREGISTER_TASK_SCRIPT, 1, key, task_id)
+
+
+def unregister_task(signature, task_id=None):
+    """
+    Removes the task queued with the signature from the registry of queued tasks
+
+    :param task_id: Only remove the task with this ID, rather than any task
+    """
+    try:
+        _unregister_task(signature, task_id)
+    except _main_exceptions as e:
+        logger.warning("Unable to update the task registry: {}".format(e))
+
+
 class CeleryTask(Task):
     """
     This is set as the Task class on our Celery app, so to track progress on a task, mark it
@@ -130,6 +217,45 @@ class CeleryTask(Task):
         ):
             report_exception(exc)
 
+    def _notify_change_feeds(self, kwargs):
+        """
+        Notifies the change feed and task index of the task's channel, so that sync requests return its status
+        """
+        channel_id = (kwargs or {}).get("channel_id")
+        if channel_id:
+            notify_tasks([channel_id])
+
+    def get_progress_tracker(self):
+        """
+        Must be called within the execution of the task
+
+        :return: A ProgressTracker that reports the progress of the task to its task metadata
+        :rtype: ProgressTracker
+        """
+        from contentcuration.models import CustomTaskMetadata
+
+        request = self.request
+        if request is None or request.id is None:
+            raise NotImplementedError(
+                "This method should only be called within the execution of a task"
+            )
+
+        def update_progress(progress=None):
+            if progress:
+                CustomTaskMetadata.objects.filter(task_id=request.id).update(
+                    progress=progress
+                )
+                self._notify_change_feeds(request.kwargs)
+
+        return ProgressTracker(request.id, update_progress)
+
+    def before_start(self, task_id, args, kwargs):
+        self._notify_change_feeds(kwargs)
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        self._notify_change_feeds(kwargs)
+        unregister_task(self.generate_signature(kwargs or {}), task_id=task_id)
+
     def shadow_name(self, *args, **kwargs):
         """
         DO NOT add functionality here as that will make it impossible to rely on `.name` for finding task by name in the
@@ -266,8 +392,19 @@ class CeleryTask(Task):
 
         signature = self.generate_signature(kwargs)
 
+        # the registry of queued tasks answers for most calls, without a transaction or lock
+        task_id = get_registered_task_id(signature)
+        if task_id is not None:
+            async_result = self.fetch(task_id)
+            if async_result.status not in states.READY_STATES:
+                logging.info(
+                    f"Fetched registered task {self.name} for user {user.pk} with id {async_result.id} | {signature}"
+                )
+                return async_result
+
         # create an advisory lock to obtain exclusive control on preventing task duplicates
         with self._lock_signature(signature):
+            async_result = None
             # order by most recently created
             task_ids = self.find_incomplete_ids(signature).order_by("-date_created")[:1]
             if task_ids:
@@ -277,12 +414,19 @@ class CeleryTask(Task):
                     logging.info(
                         f"Fetched matching task {self.name} for user {user.pk} with id {async_result.id} | {signature}"
                     )
-                    return async_result
-            logging.info(
-                f"Didn't fetch matching task {self.name} for user {user.pk} | {signature}"
-            )
-            kwargs.update(signature=signature)
-            return self.enqueue(user, **kwargs)
+                else:
+                    async_result = None
+            if async_result is None:
+                logging.info(
+                    f"Didn't fetch matching task {self.name} for user {user.pk} | {signature}"
+                )
+                kwargs.update(signature=signature)
+                async_result = self.enqueue(user, **kwargs)
+
+        # registered once the task is committed, so that it can be found in the database too
+        task_id = async_result.task_id
+        transaction.on_commit(lambda: register_task(signature, task_id))
+        return async_result
 
     def requeue(self, **kwargs):
         """
@@ -320,6 +464,7 @@ class CeleryTask(Task):
 
         signature = self.generate_signature(kwargs)
         task_ids = self.find_incomplete_ids(signature)
+        unregister_task(signature)
 
         if exclude_task_ids is not None:
             task_ids = task_ids.exclude(task_id__in=exclude_task_ids)
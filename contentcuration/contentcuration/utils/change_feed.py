@@ -0,0 +1,350 @@
+"""
+A feed, using Redis pub/sub, that lets sync requests wait for there to be something new to
+return to a user, rather than polling the database for it.
+
+Anything that makes changes or task updates visible to the sync endpoint notifies the feeds
+of the users and channels they belong to. Notifying is best effort, so that Redis being
+unavailable never prevents changes from being made.
+
+Alongside the feeds, an index of the latest server_rev of the applied changes of each channel
+and user, and of whether each channel has had task updates, lets sync requests skip querying
+the database when there is nothing new. Anything missing from the index is treated as unknown,
+so that the database is queried instead.
+"""
+import logging
+import time
+import uuid
+
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django_redis.client import DefaultClient
+from django_redis.client.default import _main_exceptions
+
+from contentcuration.utils.cache import redis_retry
+
+
+# How long, in seconds, entries in the index are kept for, which also bounds how long they can be
+# out of date for, should updating them fail
+INDEX_TIMEOUT = 300
+
+
+def get_redis_client():
+    """
+    Gets the lower level Redis client, if the cache is a Redis cache
+
+    :rtype: redis.client.StrictRedis|None
+    """
+    cache_client = getattr(django_cache, "client", None)
+    if isinstance(cache_client, DefaultClient):
+        return cache_client.get_client(write=True)
+    return None
+
+
+def get_channel_feed(channel_id):
+    return "change_feed:channel:{}".format(channel_id)
+
+
+def get_user_feed(user_id):
+    return "change_feed:user:{}".format(user_id)
+
+
+def get_channel_rev_key(channel_id):
+    return "sync_index:channel:{}:rev".format(channel_id)
+
+
+def get_user_rev_key(user_id):
+    return "sync_index:user:{}:rev".format(user_id)
+
+
+def get_channel_tasks_key(channel_id):
+    return "sync_index:channel:{}:tasks".format(channel_id)
+
+
+def get_channel_no_tasks_key(channel_id):
+    return "sync_index:channel:{}:no_tasks".format(channel_id)
+
+
+def get_feeds(channel_ids=(), user_ids=()):
+    return {
+        get_channel_feed(channel_id) for channel_id in channel_ids if channel_id
+    }.union(get_user_feed(user_id) for user_id in user_ids if user_id)
+
+
+@redis_retry
+def _publish(feeds, revs=None, task_channel_ids=()):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    # The index is updated in the same transaction, ahead of notifying any feeds,
+    # so that requests woken by the feeds see the updated index
+    pipeline = redis_client.pipeline()
+    for key, rev in (revs or {}).items():
+        _add_rev(pipeline, key, rev)
+    for channel_id in task_channel_ids:
+        pipeline.set(
+            get_channel_tasks_key(channel_id), uuid.uuid4().hex, ex=INDEX_TIMEOUT
+        )
+    for feed in feeds:
+        pipeline.publish(feed, 1)
+    pipeline.execute()
+
+
+def publish(feeds, revs=None, task_channel_ids=()):
+    try:
+        _publish(feeds, revs=revs, task_channel_ids=task_channel_ids)
+    except _main_exceptions as e:
+        logging.warning("Unable to notify change feeds: {}".format(e))
+
+
+def notify_change_feeds(channel_ids=(), user_ids=(), revs=None, task_channel_ids=()):
+    """
+    Notifies the feeds of the channels and users, once the current transaction
+    has been committed, so that waiting requests can read what was written in it.
+
+    The index is updated straight away, as well as after the commit for task states. An index
+    that is ahead of the database only causes the database to be queried, whereas one that is
+    behind would hide what was written.
+
+    :param revs: A dict of rev index keys to the latest server_rev for them
+    :param task_channel_ids: The ids of channels whose tasks have changed
+    """
+    if revs or task_channel_ids:
+        publish((), revs=revs, task_channel_ids=task_channel_ids)
+    feeds = get_feeds(channel_ids=channel_ids, user_ids=user_ids)
+    if feeds:
+        transaction.on_commit(lambda: publish(feeds, task_channel_ids=task_channel_ids))
+
+
+def notify_changes(changes):
+    """
+    Notifies the feeds of the channels and users of changes that have been applied or errored,
+    as those are the only changes returned by the sync endpoint, and records the latest
+    server_rev of the applied changes in the index.
+
+    :type changes: list[contentcuration.models.Change]
+    """
+    changes = [change for change in changes if change.applied or change.errored]
+    revs = {}
+    for change in changes:
+        if not change.applied:
+            continue
+        for key in (
+            get_channel_rev_key(change.channel_id) if change.channel_id else None,
+            get_user_rev_key(change.user_id) if change.user_id else None,
+        ):
+            if key is not None:
+                revs[key] = max(revs.get(key, 0), change.server_rev)
+    notify_change_feeds(
+        channel_ids={change.channel_id for change in changes},
+        user_ids={change.user_id for change in changes},
+        revs=revs,
+    )
+
+
+def notify_tasks(channel_ids):
+    """
+    Notifies the feeds of channels whose tasks have started, progressed or finished, and
+    marks the channels as possibly having tasks in the index.
+    """
+    notify_change_feeds(channel_ids=channel_ids, task_channel_ids=channel_ids)
+
+
+def _add_rev(pipeline, key, rev):
+    # Only the greatest rev is kept in the sorted set, so this is safe to run concurrently
+    pipeline.zadd(key, {rev: rev})
+    pipeline.zremrangebyrank(key, 0, -2)
+    pipeline.expire(key, INDEX_TIMEOUT)
+
+
+@redis_retry
+def _get_latest_revs(keys):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return None
+    pipeline = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.zrevrange(key, 0, 0)
+    return [int(result[0]) if result else None for result in pipeline.execute()]
+
+
+def get_latest_revs(channel_ids=(), user_ids=()):
+    """
+    Gets the latest server_rev of the applied changes of channels and users from the index
+
+    :return: A tuple of dicts of channel ids and user ids to their latest server_rev, which is
+        None when not in the index, or None when the index is unavailable
+    """
+    channel_ids = list(channel_ids)
+    user_ids = list(user_ids)
+    keys = [get_channel_rev_key(channel_id) for channel_id in channel_ids]
+    keys.extend(get_user_rev_key(user_id) for user_id in user_ids)
+    try:
+        revs = _get_latest_revs(keys)
+    except _main_exceptions as e:
+        logging.warning("Unable to read the rev index: {}".format(e))
+        return None
+    if revs is None:
+        return None
+    return (
+        dict(zip(channel_ids, revs[: len(channel_ids)])),
+        dict(zip(user_ids, revs[len(channel_ids) :])),
+    )
+
+
+@redis_retry
+def _record_latest_revs(revs):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    pipeline = redis_client.pipeline()
+    for key, rev in revs.items():
+        _add_rev(pipeline, key, rev)
+    pipeline.execute()
+
+
+def record_latest_revs(channel_revs=None, user_revs=None):
+    """
+    Records the latest server_rev of the applied changes of channels and users, as read from
+    the database, in the index
+    """
+    revs = {
+        get_channel_rev_key(channel_id): rev
+        for channel_id, rev in (channel_revs or {}).items()
+    }
+    revs.update(
+        (get_user_rev_key(user_id), rev) for user_id, rev in (user_revs or {}).items()
+    )
+    try:
+        _record_latest_revs(revs)
+    except _main_exceptions as e:
+        logging.warning("Unable to update the rev index: {}".format(e))
+
+
+@redis_retry
+def _get_task_states(channel_ids):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return None
+    pipeline = redis_client.pipeline()
+    for channel_id in channel_ids:
+        # Channels that have had no task updates yet are given a token, so that
+        # they can be recorded as having no tasks
+        pipeline.set(
+            get_channel_tasks_key(channel_id),
+            uuid.uuid4().hex,
+            ex=INDEX_TIMEOUT,
+            nx=True,
+        )
+        pipeline.get(get_channel_tasks_key(channel_id))
+        pipeline.get(get_channel_no_tasks_key(channel_id))
+    results = pipeline.execute()
+    return {
+        channel_id: (results[i * 3 + 1], results[i * 3 + 2])
+        for i, channel_id in enumerate(channel_ids)
+    }
+
+
+def get_task_states(channel_ids):
+    """
+    Gets the task state of channels from the index, which changes whenever a task of the
+    channel starts, progresses or finishes.
+
+    :return: A dict of channel ids to a tuple of their current task state and the task state
+        when they were last recorded as having no tasks, or None when the index is unavailable
+    """
+    try:
+        return _get_task_states(list(channel_ids))
+    except _main_exceptions as e:
+        logging.warning("Unable to read the task index: {}".format(e))
+        return None
+
+
+def have_no_tasks(task_states):
+    """
+    :param task_states: A dict returned by `get_task_states`
+    :return: Whether none of the channels have had tasks since they were last checked
+    """
+    return task_states is not None and all(
+        state is not None and state == no_tasks_state
+        for state, no_tasks_state in task_states.values()
+    )
+
+
+@redis_retry
+def _record_no_tasks(task_states):
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    pipeline = redis_client.pipeline()
+    for channel_id, (state, _) in task_states.items():
+        if state is not None:
+            pipeline.set(get_channel_no_tasks_key(channel_id), state, ex=INDEX_TIMEOUT)
+    pipeline.execute()
+
+
+def record_no_tasks(task_states):
+    """
+    Records that the channels had no tasks, as of the task states read before checking
+    the database, so that any task updates since then invalidate the record
+    """
+    if not task_states:
+        return
+    try:
+        _record_no_tasks(task_states)
+    except _main_exceptions as e:
+        logging.warning("Unable to update the task index: {}".format(e))
+
+
+class ChangeFeedSubscription:
+    """
+    Subscribes to the feeds of a user and channels for the duration of a sync request.
+    """
+
+    def __init__(self, channel_ids=(), user_ids=()):
+        self.feeds = get_feeds(channel_ids=channel_ids, user_ids=user_ids)
+        self.pubsub = None
+
+    def __enter__(self):
+        redis_client = get_redis_client()
+        if redis_client is not None and self.feeds:
+            try:
+                self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                self.pubsub.subscribe(*self.feeds)
+            except _main_exceptions as e:
+                logging.warning("Unable to subscribe to change feeds: {}".format(e))
+                self.close()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.pubsub is not None:
+            self.pubsub.close()
+            self.pubsub = None
+
+    @property
+    def available(self):
+        return self.pubsub is not None
+
+    def wait(self, timeout):
+        """
+        Waits for any of the feeds to be notified, for at most timeout seconds.
+
+        :return: Whether a feed was notified. When the feeds are unavailable, this returns
+            True straight away, so that the caller falls back to checking the database.
+        """
+        if not self.available:
+            return True
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if self.pubsub.get_message(timeout=remaining) is not None:
+                    return True
+        except _main_exceptions as e:
+            logging.warning("Unable to wait on change feeds: {}".format(e))
+            self.close()
+            return True
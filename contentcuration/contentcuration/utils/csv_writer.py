@@ -1,16 +1,23 @@
 import csv
+import gzip
 import io
 import os
 import re
+import secrets
 import sys
+import tempfile
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db.models import Exists
 from django.db.models import F
 from django.db.models import OuterRef
 from django.db.models import Subquery
 from django.db.models.sql.constants import LOUTER
+from django.utils import timezone
 from django.utils.translation import gettext as _
 from le_utils.constants import content_kinds
 
@@ -22,6 +29,9 @@ from contentcuration.models import generate_storage_url
 if not os.path.exists(settings.CSV_ROOT):
     os.makedirs(settings.CSV_ROOT)
 
+# number of rows fetched at a time from the server-side cursor over a user's files
+USER_CSV_CHUNK_SIZE = 2000
+
 
 # Formatting helpers
 
@@ -35,17 +45,51 @@ def _format_size(num, suffix="B"):
     return "%.1f%s%s" % (num, "Yi", suffix)
 
 
+def generate_user_csv_basename(user):
+    email = re.sub(r"([^\s\w]|_)+", "", user.email.split(".")[0])
+    return "{}{}- {} {} Data.csv".format(
+        email, user.id, user.first_name, user.last_name
+    )
+
+
 def generate_user_csv_filename(user):
     directory = os.path.join(settings.CSV_ROOT, "users")
     if not os.path.exists(directory):
         os.makedirs(directory)
-    email = re.sub(r"([^\s\w]|_)+", "", user.email.split(".")[0])
-    return os.path.join(
-        directory,
-        "{}{}- {} {} Data.csv".format(email, user.id, user.first_name, user.last_name),
+    return os.path.join(directory, generate_user_csv_basename(user))
+
+
+def generate_user_csv_export_name(user):
+    """
+    :return: The name in storage of the gzip-compressed CSV export of the user's data, or
+        None when their data hasn't been exported
+    """
+    if not user.user_data_export_token:
+        return None
+    return "{}/{}.csv.gz".format(
+        settings.USER_EXPORTS_STORAGE_ROOT, user.user_data_export_token
     )
 
 
+def get_user_csv_export_expiry():
+    """
+    :return: The time before which exports of user data were made that have expired
+    """
+    return timezone.now() - timedelta(days=settings.USER_EXPORT_EXPIRY_DAYS)
+
+
+def delete_user_csv_export(user):
+    """
+    Deletes the export of the user's data from storage, and forgets its token
+    """
+    export_name = generate_user_csv_export_name(user)
+    if export_name and default_storage.exists(export_name):
+        default_storage.delete(export_name)
+    user.user_data_export_token = None
+    user.user_data_exported = None
+    user.save(update_fields=["user_data_export_token", "user_data_exported"])
+
+
 def _write_user_row(file, writer, domain):
     filename = "{}.{}".format(file["checksum"], file["file_extension"])
     writer.writerow(
@@ -69,6 +113,167 @@ def _write_user_row(file, writer, domain):
     )
 
 
+def _get_user_files(user):
+    """
+    :return: A values queryset of the user's files, with details of their nodes and channels
+    """
+    # Build CTEs so we first reduce to this user's files, then resolve only
+    # needed content node and channel fields.
+    user_files_cte = With(
+        user.files.values(
+            "id",
+            "contentnode_id",
+            "original_filename",
+            "file_size",
+            "checksum",
+            file_extension=F("file_format__extension"),
+            file_language=F("language__readable_name"),
+        ),
+        name="user_files",
+    )
+
+    content_nodes_cte = With(
+        user_files_cte.join(
+            ContentNode.objects.all(),
+            id=user_files_cte.col.contentnode_id,
+        )
+        .values(
+            "id",
+            "tree_id",
+            node_title=F("title"),
+            node_kind_id=F("kind_id"),
+            node_description=F("description"),
+            node_author=F("author"),
+            node_language=F("language__readable_name"),
+            node_license_name=F("license__license_name"),
+            node_license_description=F("license_description"),
+            node_copyright_holder=F("copyright_holder"),
+        )
+        .distinct(),
+        name="content_nodes",
+    )
+
+    main_channel_names = Channel.objects.filter(
+        Exists(
+            content_nodes_cte.queryset().filter(tree_id=OuterRef("main_tree__tree_id"))
+        )
+    ).values(
+        tree_id=F("main_tree__tree_id"),
+        channel_name=F("name"),
+    )
+    trash_channel_names = Channel.objects.filter(
+        Exists(
+            content_nodes_cte.queryset().filter(tree_id=OuterRef("trash_tree__tree_id"))
+        )
+    ).values(
+        tree_id=F("trash_tree__tree_id"),
+        channel_name=F("name"),
+    )
+    channel_names_cte = With(
+        main_channel_names.union(trash_channel_names), name="channel_names"
+    )
+
+    return (
+        content_nodes_cte.join(
+            user_files_cte.queryset(),
+            contentnode_id=content_nodes_cte.col.id,
+            _join_type=LOUTER,
+        )
+        .with_cte(user_files_cte)
+        .with_cte(content_nodes_cte)
+        .with_cte(channel_names_cte)
+        .annotate(
+            channel_name=Subquery(
+                channel_names_cte.queryset()
+                .filter(tree_id=content_nodes_cte.col.tree_id)
+                .values("channel_name")[:1]
+            ),
+            node_title=content_nodes_cte.col.node_title,
+            node_kind_id=content_nodes_cte.col.node_kind_id,
+            node_description=content_nodes_cte.col.node_description,
+            node_author=content_nodes_cte.col.node_author,
+            node_language=content_nodes_cte.col.node_language,
+            node_license_name=content_nodes_cte.col.node_license_name,
+            node_license_description=content_nodes_cte.col.node_license_description,
+            node_copyright_holder=content_nodes_cte.col.node_copyright_holder,
+        )
+        .values(
+            "channel_name",
+            "original_filename",
+            "file_size",
+            "checksum",
+            "file_extension",
+            "file_language",
+            "node_title",
+            "node_kind_id",
+            "node_description",
+            "node_author",
+            "node_language",
+            "node_license_name",
+            "node_license_description",
+            "node_copyright_holder",
+        )
+    )
+
+
+def _write_user_rows(user, writer, progress_tracker=None):
+    """
+    Writes the CSV header and a row per file of the user, fetching the files with a
+    server-side cursor
+
+    :type progress_tracker: contentcuration.utils.celery.ProgressTracker|None
+    """
+    writer.writerow(
+        [
+            _("Channel"),
+            _("Title"),
+            _("Kind"),
+            _("Filename"),
+            _("File Size"),
+            _("URL"),
+            _("Description"),
+            _("Author"),
+            _("Language"),
+            _("License"),
+            _("License Description"),
+            _("Copyright Holder"),
+        ]
+    )
+
+    domain = Site.objects.get(pk=1).domain
+
+    user_files = _get_user_files(user)
+    staged_files = user.staged_files.all()
+    if progress_tracker:
+        progress_tracker.set_total(user.files.count() + staged_files.count())
+
+    for file in user_files.iterator(chunk_size=USER_CSV_CHUNK_SIZE):
+        _write_user_row(file, writer, domain)
+        if progress_tracker:
+            progress_tracker.increment()
+
+    for file in staged_files.iterator(chunk_size=USER_CSV_CHUNK_SIZE):
+        file_size = _format_size(file.file_size)
+        writer.writerow(
+            [
+                _("No Channel"),
+                _("No Resource"),
+                "",
+                _("Staged File"),
+                file_size,
+                "",
+                "",
+                "",
+                "",
+                "",
+                "",
+                "",
+            ]
+        )
+        if progress_tracker:
+            progress_tracker.increment()
+
+
 def write_user_csv(user, path=None):
     csv_path = path or generate_user_csv_filename(user)
     mode = "wb"
@@ -79,147 +284,37 @@ def write_user_csv(user, path=None):
         encoding = "utf-8"
     with io.open(csv_path, mode, encoding=encoding) as csvfile:
         writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_MINIMAL)
+        _write_user_rows(user, writer)
 
-        writer.writerow(
-            [
-                _("Channel"),
-                _("Title"),
-                _("Kind"),
-                _("Filename"),
-                _("File Size"),
-                _("URL"),
-                _("Description"),
-                _("Author"),
-                _("Language"),
-                _("License"),
-                _("License Description"),
-                _("Copyright Holder"),
-            ]
-        )
+    return csv_path
 
-        domain = Site.objects.get(pk=1).domain
-
-        # Build CTEs so we first reduce to this user's files, then resolve only
-        # needed content node and channel fields.
-        user_files_cte = With(
-            user.files.values(
-                "id",
-                "contentnode_id",
-                "original_filename",
-                "file_size",
-                "checksum",
-                file_extension=F("file_format__extension"),
-                file_language=F("language__readable_name"),
-            ),
-            name="user_files",
-        )
 
-        content_nodes_cte = With(
-            user_files_cte.join(
-                ContentNode.objects.all(),
-                id=user_files_cte.col.contentnode_id,
-            )
-            .values(
-                "id",
-                "tree_id",
-                node_title=F("title"),
-                node_kind_id=F("kind_id"),
-                node_description=F("description"),
-                node_author=F("author"),
-                node_language=F("language__readable_name"),
-                node_license_name=F("license__license_name"),
-                node_license_description=F("license_description"),
-                node_copyright_holder=F("copyright_holder"),
-            )
-            .distinct(),
-            name="content_nodes",
-        )
+def export_user_csv(user, progress_tracker=None):
+    """
+    Writes the user's data as a gzip-compressed CSV to storage. Rows are compressed as they
+    are written, so only the compressed CSV is held, in a temporary file.
 
-        main_channel_names = Channel.objects.filter(
-            Exists(
-                content_nodes_cte.queryset().filter(
-                    tree_id=OuterRef("main_tree__tree_id")
-                )
-            )
-        ).values(
-            tree_id=F("main_tree__tree_id"),
-            channel_name=F("name"),
-        )
-        trash_channel_names = Channel.objects.filter(
-            Exists(
-                content_nodes_cte.queryset().filter(
-                    tree_id=OuterRef("trash_tree__tree_id")
-                )
-            )
-        ).values(
-            tree_id=F("trash_tree__tree_id"),
-            channel_name=F("name"),
-        )
-        channel_names_cte = With(
-            main_channel_names.union(trash_channel_names), name="channel_names"
-        )
+    :type progress_tracker: contentcuration.utils.celery.ProgressTracker|None
+    :return: The name of the export in storage
+    """
+    previous_export_name = generate_user_csv_export_name(user)
+    # the name of the export can't be guessed from the user, so it can only be found through
+    # the download view, which checks who is logged in
+    user.user_data_export_token = secrets.token_hex(32)
+    export_name = generate_user_csv_export_name(user)
+    with tempfile.TemporaryFile() as compressed:
+        with gzip.GzipFile(fileobj=compressed, mode="wb") as gzipped:
+            with io.TextIOWrapper(gzipped, encoding="utf-8", newline="") as csvfile:
+                writer = csv.writer(csvfile, delimiter=",", quoting=csv.QUOTE_MINIMAL)
+                _write_user_rows(user, writer, progress_tracker=progress_tracker)
+        compressed.seek(0)
+        default_storage.save(export_name, File(compressed, name=export_name))
 
-        user_files = (
-            content_nodes_cte.join(
-                user_files_cte.queryset(),
-                contentnode_id=content_nodes_cte.col.id,
-                _join_type=LOUTER,
-            )
-            .with_cte(user_files_cte)
-            .with_cte(content_nodes_cte)
-            .with_cte(channel_names_cte)
-            .annotate(
-                channel_name=Subquery(
-                    channel_names_cte.queryset()
-                    .filter(tree_id=content_nodes_cte.col.tree_id)
-                    .values("channel_name")[:1]
-                ),
-                node_title=content_nodes_cte.col.node_title,
-                node_kind_id=content_nodes_cte.col.node_kind_id,
-                node_description=content_nodes_cte.col.node_description,
-                node_author=content_nodes_cte.col.node_author,
-                node_language=content_nodes_cte.col.node_language,
-                node_license_name=content_nodes_cte.col.node_license_name,
-                node_license_description=content_nodes_cte.col.node_license_description,
-                node_copyright_holder=content_nodes_cte.col.node_copyright_holder,
-            )
-            .values(
-                "channel_name",
-                "original_filename",
-                "file_size",
-                "checksum",
-                "file_extension",
-                "file_language",
-                "node_title",
-                "node_kind_id",
-                "node_description",
-                "node_author",
-                "node_language",
-                "node_license_name",
-                "node_license_description",
-                "node_copyright_holder",
-            )
-        )
-        for file in user_files:
-            _write_user_row(file, writer, domain)
-
-        for file in user.staged_files.all():
-            file_size = _format_size(file.file_size)
-            writer.writerow(
-                [
-                    _("No Channel"),
-                    _("No Resource"),
-                    "",
-                    _("Staged File"),
-                    file_size,
-                    "",
-                    "",
-                    "",
-                    "",
-                    "",
-                    "",
-                    "",
-                ]
-            )
+    user.user_data_exported = timezone.now()
+    user.save(update_fields=["user_data_export_token", "user_data_exported"])
 
-    return csv_path
+    # replace any previous export, rather than keeping it alongside the new one
+    if previous_export_name and default_storage.exists(previous_export_name):
+        default_storage.delete(previous_export_name)
+
+    return export_name
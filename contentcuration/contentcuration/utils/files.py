@@ -5,17 +5,18 @@ import mimetypes
 import os
 import re
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from multiprocessing.dummy import Pool
 
-import requests
 from django.conf import settings
+from django.core.cache import cache as django_cache
 from django.core.files.storage import default_storage
 from le_utils.constants import file_formats
 from PIL import Image
 from PIL import ImageFile
 
 from contentcuration.api import write_raw_content_to_storage
+from contentcuration.utils.cache import get_stored_file_cache_key
 
 
 # Do this to ensure that we infer mimetypes for files properly, specifically
@@ -26,6 +27,11 @@ mimetypes.init([os.path.join(os.path.dirname(__file__), "mime.types")])
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 THUMBNAIL_WIDTH = 400
 
+# The number of files that get_file_diff looks up in the cache at a time
+FILE_DIFF_BATCH_SIZE = 1000
+# How long, in seconds, get_file_diff remembers the files it found in storage for
+STORED_FILE_CACHE_TIMEOUT = 24 * 60 * 60
+
 
 def create_file_from_contents(
     contents, ext=None, node=None, preset_id=None, uploaded_by=None
@@ -50,39 +56,63 @@ def create_file_from_contents(
     return result
 
 
+def _get_files_in_cache(filenames):
+    cached = django_cache.get_many(
+        [get_stored_file_cache_key(filename) for filename in filenames]
+    )
+    return {
+        filename
+        for filename in filenames
+        if cached.get(get_stored_file_cache_key(filename))
+    }
+
+
+def _get_files_in_storage(storage_paths):
+    """
+    Returns which of storage_paths, by filename, exist in storage, checking them in a pool of
+    settings.FILE_DIFF_STORAGE_WORKERS threads, and remembers them in the cache.
+    """
+    with ThreadPoolExecutor(max_workers=settings.FILE_DIFF_STORAGE_WORKERS) as pool:
+        stored = {
+            filename
+            for filename, exists in zip(
+                storage_paths,
+                pool.map(default_storage.exists, storage_paths.values()),
+            )
+            if exists
+        }
+    django_cache.set_many(
+        {get_stored_file_cache_key(filename): True for filename in stored},
+        timeout=STORED_FILE_CACHE_TIMEOUT,
+    )
+    return stored
+
+
 def get_file_diff(files):
     """Given a list of filenames as strings, find the filenames that aren't in our
     storage, and return.
 
+    Files that an earlier diff found in storage are known to be stored. Only the rest are
+    checked in storage. File objects aren't used, as they are created before their files are
+    uploaded.
     """
 
     # Imported here rather than at module level to avoid a circular import (see
     # create_file_from_contents).
     from contentcuration.models import generate_object_storage_name
 
-    # We use a thread pool in here, making direct HEAD requests to the storage URL
-    # to see if the objects exist.
-    # The threaded method is found to be the fastest -- see
-    # https://gist.github.com/aronasorman/57b8c01e5ed2b7cbf876e7734b7b9f38
-    # for benchmarking details.
-    ret = []
-
-    session = requests.Session()
-
-    def check_file_url(f):
-        filepath = generate_object_storage_name(os.path.splitext(f)[0], f)
-        url = "/".join(
-            [settings.AWS_S3_ENDPOINT_URL, settings.AWS_S3_BUCKET_NAME, filepath]
-        )
-        resp = session.head(url)
-        if resp.status_code != 200:
-            ret.append(f)
-
-    # use a pool of 3 threads to make our queries
-    pool = Pool(3)
-    pool.map(check_file_url, files)
-
-    return ret
+    unknown_paths = {}
+    filenames = list(dict.fromkeys(files))
+    for i in range(0, len(filenames), FILE_DIFF_BATCH_SIZE):
+        batch = {
+            f: generate_object_storage_name(os.path.splitext(f)[0], f)
+            for f in filenames[i : i + FILE_DIFF_BATCH_SIZE]
+        }
+        known = _get_files_in_cache(list(batch))
+        unknown_paths.update((f, path) for f, path in batch.items() if f not in known)
+
+    stored = _get_files_in_storage(unknown_paths) if unknown_paths else set()
+    return [f for f in files if f in unknown_paths and f not in stored]
 
 
 def duplicate_file(
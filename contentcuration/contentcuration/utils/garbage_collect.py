@@ -4,13 +4,22 @@ Studio garbage collection utilities. Clean up all these old, unused records!
 """
 import datetime
 import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import product
 
 from celery import states
 from django.conf import settings
+from django.core.cache import cache as django_cache
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.db.models import Subquery
 from django.db.models.expressions import CombinedExpression
-from django.db.models.expressions import Exists
 from django.db.models.expressions import F
 from django.db.models.expressions import OuterRef
 from django.db.models.expressions import Value
@@ -21,12 +30,21 @@ from le_utils.constants import content_kinds
 
 from contentcuration.constants import feature_flags
 from contentcuration.constants import user_history
+from contentcuration.db.models.deletion import raw_delete_cascade
 from contentcuration.db.models.functions import JSONObjectKeys
+from contentcuration.models import Channel
+from contentcuration.models import ChannelVersion
 from contentcuration.models import ContentNode
 from contentcuration.models import CustomTaskMetadata
 from contentcuration.models import File
+from contentcuration.models import StagedFile
 from contentcuration.models import User
 from contentcuration.models import UserHistory
+from contentcuration.utils.assessment.base import get_resized_image_file_cache_key
+from contentcuration.utils.cache import forget_stored_file
+from contentcuration.utils.cache import get_stored_file_cache_key
+from contentcuration.utils.csv_writer import delete_user_csv_export
+from contentcuration.utils.csv_writer import get_user_csv_export_expiry
 
 
 class DisablePostDeleteSignal(object):
@@ -51,26 +69,61 @@ def get_deleted_chefs_root():
     return deleted_chefs_node
 
 
-def _clean_up_files(contentnode_ids):
-    """
-    Clean up the files (both in the DB and in object storage)
-    associated with the `contentnode_ids` iterable that are
-    not pointed by any other contentnode.
+# The number of nodes deleted in each transaction when purging trees
+PURGE_CHUNKSIZE = 10000
+
+
+def _handle_purged_relation(pks, related, related_rows):
+    if related.related_model is ContentNode and related.field.name == "parent":
+        # descendants are deleted along with the nodes by the range of their tree,
+        # this only finds children whose lft and rght have fallen outside of it
+        _purge_subtrees(related_rows.exclude(pk__in=pks))
+        return True
+    return False
+
+
+def purge_tree(tree_id, lft=None, rght=None, chunksize=PURGE_CHUNKSIZE):
     """
-    files = File.objects.filter(contentnode__in=contentnode_ids)
-    files_on_storage = files.values_list("file_on_disk", flat=True)
+    Deletes a whole tree, or the subtree within the `lft` and `rght` range of the tree,
+    in chunks of `chunksize` nodes. Along with the nodes, their files, assessment items,
+    tags, prerequisites and any other rows that cascade from them are deleted with raw
+    DELETEs, so neither MPTT, the storage of users, nor signals are updated. This is
+    only meant for the trees of nodes that are no longer in any channel.
 
-    for disk_file_path in files_on_storage:
-        is_other_node_pointing = Exists(
-            File.objects.filter(file_on_disk=disk_file_path).exclude(
-                contentnode__in=contentnode_ids
+    :return: The number of nodes deleted
+    """
+    nodes = ContentNode.objects.filter(tree_id=tree_id)
+    if lft is not None:
+        nodes = nodes.filter(lft__gte=lft, rght__lte=rght)
+    # descendants always come after their ancestors in a tree, so deleting by descending
+    # lft never leaves nodes behind whose parents are gone
+    nodes = nodes.order_by("-lft").values_list("pk", flat=True)
+
+    count = 0
+    while True:
+        pks = list(nodes[:chunksize])
+        if not pks:
+            break
+        with transaction.atomic():
+            raw_delete_cascade(
+                ContentNode,
+                pks,
+                handle_relation=partial(_handle_purged_relation, pks),
             )
-        )
-        if not is_other_node_pointing:
-            default_storage.delete(disk_file_path)
+        count += len(pks)
+        logging.info("Deleted {} node(s) from tree {}".format(count, tree_id))
+    return count
+
 
-    # use _raw_delete for much fast file deletions
-    files._raw_delete(files.db)
+def _purge_subtrees(nodes):
+    """
+    Deletes the nodes in the `nodes` queryset, along with all of their descendants
+    :return: The number of nodes deleted
+    """
+    count = 0
+    for tree_id, lft, rght in nodes.values_list("tree_id", "lft", "rght").iterator():
+        count += purge_tree(tree_id, lft=lft, rght=rght)
+    return count
 
 
 def clean_up_soft_deleted_users():
@@ -110,27 +163,19 @@ def clean_up_deleted_chefs():
 
     """
     deleted_chefs_node = get_deleted_chefs_root()
-    # we cannot use MPTT methods like get_descendants() or use tree_id because for performance reasons
-    # we are avoiding MPTT entirely.
+    # nodes are moved into this tree with MPTT updates disabled, so each still has the
+    # tree_id, lft and rght of the tree it was the root of, and is purged by those
     nodes_to_clean_up = ContentNode.objects.filter(parent=deleted_chefs_node)
 
-    # don't delete files until we can ensure files are not referenced anywhere.
-    # disable mptt updates as they are disabled when we insert nodes into this tree
-    with ContentNode.objects.disable_mptt_updates(), DisablePostDeleteSignal():
-        for i, node in enumerate(nodes_to_clean_up):
-            try:
-                node.delete()
-            except ContentNode.DoesNotExist:
-                # If it doesn't exist, job done!
-                pass
-            logging.info("Deleted {} node(s) from the deleted chef tree".format(i + 1))
+    count = _purge_subtrees(nodes_to_clean_up)
+    logging.info("Deleted {} node(s) from the deleted chef tree".format(count))
 
 
 def clean_up_contentnodes(delete_older_than=settings.ORPHAN_DATE_CLEAN_UP_THRESHOLD):
     """
     Clean up all contentnodes associated with the orphan tree with a `created`
-    time older than `delete_older_than`, as well as all files (and their file
-    objects on storage) linked to those contentnodes.
+    time older than `delete_older_than`, as well as all files linked to those
+    contentnodes.
 
     delete_older_than=The age of the contentnode from the current time, before
     it's deleted. Default is two weeks from datetime.now().
@@ -140,17 +185,8 @@ def clean_up_contentnodes(delete_older_than=settings.ORPHAN_DATE_CLEAN_UP_THRESH
         modified__lt=delete_older_than, parent_id=settings.ORPHANAGE_ROOT_ID
     )
 
-    # delete all files first
-    with DisablePostDeleteSignal():
-        _clean_up_files(nodes_to_clean_up)
-
-    # Use _raw_delete for fast bulk deletions
-    try:
-        with DisablePostDeleteSignal():
-            count, _ = nodes_to_clean_up.delete()
-        logging.info("Deleted {} node(s) from the orphanage tree".format(count))
-    except ContentNode.DoesNotExist:
-        pass
+    count = _purge_subtrees(nodes_to_clean_up)
+    logging.info("Deleted {} node(s) from the orphanage tree".format(count))
 
 
 def clean_up_feature_flags():
@@ -190,6 +226,18 @@ def clean_up_tasks():
     logging.info("Deleted {} completed task(s) from the task table".format(count))
 
 
+def clean_up_user_exports():
+    """
+    Deletes the exports of user data that can no longer be downloaded
+    """
+    users = User.objects.filter(user_data_exported__lt=get_user_csv_export_expiry())
+    count = 0
+    for user in users.iterator():
+        delete_user_csv_export(user)
+        count += 1
+    logging.info("Deleted {} expired export(s) of user data".format(count))
+
+
 CHUNKSIZE = 500000
 
 
@@ -209,23 +257,292 @@ def clean_up_stale_files(last_modified=None):
             modified__lt=last_modified,
         )
 
-        files_to_clean_up_slice = files_to_clean_up.values_list("id", flat=True)[
-            0:CHUNKSIZE
-        ]
-
         count = 0
 
-        while files_to_clean_up.exists():
-            this_count, _ = File.objects.filter(id__in=files_to_clean_up_slice).delete()
-
-            this_count = len(files_to_clean_up_slice)
-            count += this_count
-            files_to_clean_up_slice = files_to_clean_up.values_list("id", flat=True)[
-                0:CHUNKSIZE
-            ]
+        while True:
+            # evaluate each slice once, rather than re-running the anti-join to check
+            # for more, to delete, and to count them
+            ids_to_clean_up = list(
+                files_to_clean_up.values_list("id", flat=True)[0:CHUNKSIZE]
+            )
+            if not ids_to_clean_up:
+                break
+            File.objects.filter(id__in=ids_to_clean_up).delete()
+            count += len(ids_to_clean_up)
 
     logging.info(
         "Files with a modified date older than {} were deleted. Deleted {} file(s).".format(
             last_modified, count
         )
     )
+
+
+# The number of rows fetched at a time when marking the checksums that are referenced
+MARK_CHUNKSIZE = 10000
+
+# How old, in days, an unreferenced object must be for the sweep to delete it, so that
+# objects uploaded before their File or StagedFile is saved, or during a sweep, are kept
+SWEEP_GRACE_PERIOD_DAYS = 7
+
+# The number of threads that read channel databases and sweep storage prefixes
+SWEEP_WORKERS = 8
+
+# The number of unreferenced objects checked again for references, then deleted, at once
+SWEEP_BATCH_SIZE = 100
+
+# objects in storage are named by their checksum and extension
+STORAGE_OBJECT_NAME = re.compile(r"^([0-9a-f]{32})\.[0-9a-z]+$")
+
+
+def _get_channel_database_paths():
+    """
+    :return: The paths in storage of the content databases of every version of published
+        channels, including deleted channels, as their versions may still be imported
+    """
+    from contentcuration.utils.publish import get_content_db_path
+
+    paths = set()
+    channels = Channel.objects.filter(version__gt=0).values_list("id", "version")
+    for channel_id, version in channels.iterator(chunk_size=MARK_CHUNKSIZE):
+        paths.add(get_content_db_path(channel_id))
+        paths.update(
+            get_content_db_path(channel_id, channel_version)
+            for channel_version in range(1, version + 1)
+        )
+    channel_versions = ChannelVersion.objects.filter(
+        version__isnull=False
+    ).values_list("channel_id", "version")
+    for channel_id, version in channel_versions.iterator(chunk_size=MARK_CHUNKSIZE):
+        paths.add(get_content_db_path(channel_id, version))
+    return paths
+
+
+def _get_channel_database_checksums(storage, path):
+    """
+    :return: The checksums of the files in a channel's content database in storage,
+        which are empty when the database doesn't exist
+    """
+    from kolibri_content.models import LocalFile
+
+    if not storage.exists(path):
+        return []
+    with tempfile.NamedTemporaryFile(suffix=".sqlite3") as tempdb:
+        with storage.open(path) as content_db:
+            shutil.copyfileobj(content_db, tempdb)
+        tempdb.flush()
+        connection = sqlite3.connect(tempdb.name)
+        try:
+            return [
+                checksum
+                for (checksum,) in connection.execute(
+                    "SELECT id FROM {}".format(LocalFile._meta.db_table)
+                )
+            ]
+        finally:
+            connection.close()
+
+
+def mark_live_checksums(storage=default_storage, workers=SWEEP_WORKERS):
+    """
+    Builds the set of checksums whose objects in storage are still referenced by files,
+    staged files, channel thumbnails, or the content databases of published channels.
+    Any failure to read what is referenced is raised, as the sweep can't run without it.
+
+    :return: A set of checksums
+    """
+    live_checksums = set()
+    for queryset in (
+        File.objects.values_list("checksum", flat=True),
+        StagedFile.objects.values_list("checksum", flat=True),
+    ):
+        live_checksums.update(
+            checksum
+            for checksum in queryset.iterator(chunk_size=MARK_CHUNKSIZE)
+            if checksum
+        )
+
+    thumbnails = Channel.objects.exclude(thumbnail__isnull=True).exclude(thumbnail="")
+    live_checksums.update(
+        os.path.splitext(os.path.basename(thumbnail))[0]
+        for thumbnail in thumbnails.values_list("thumbnail", flat=True).iterator(
+            chunk_size=MARK_CHUNKSIZE
+        )
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for checksums in executor.map(
+            lambda path: _get_channel_database_checksums(storage, path),
+            _get_channel_database_paths(),
+        ):
+            live_checksums.update(checksums)
+
+    return live_checksums
+
+
+def _find_unreferenced_objects(storage, prefix, live_checksums, created_before):
+    """
+    Lists the objects directly under a storage prefix whose checksums aren't live and
+    which were created before `created_before`
+
+    :return: A tuple of the number of objects scanned, and a list of (name, filename,
+        checksum) of the unreferenced objects
+    """
+    # the listing of the bucket holds the creation time of its objects already, which
+    # saves a request per object
+    if hasattr(storage, "list_created_times"):
+        created_times = storage.list_created_times(prefix)
+        filenames = list(created_times)
+    else:
+        created_times = None
+        try:
+            _, filenames = storage.listdir(prefix)
+        except FileNotFoundError:
+            return 0, []
+
+    unreferenced = []
+    for filename in filenames:
+        match = STORAGE_OBJECT_NAME.match(filename)
+        # anything not named like a stored file is left alone
+        if not match or match.group(1) in live_checksums:
+            continue
+        name = "{}/{}".format(prefix, filename)
+        created = (
+            created_times[filename]
+            if created_times is not None
+            else storage.get_created_time(name)
+        )
+        if created < created_before:
+            unreferenced.append((name, filename, match.group(1)))
+    return len(filenames), unreferenced
+
+
+def _exclude_newly_referenced(objects):
+    """
+    Excludes the objects that became referenced since the checksums in use were marked,
+    or that `get_file_diff` has reported as stored, as files referencing them are
+    about to be created
+
+    :param objects: A list of (name, filename, checksum) of unreferenced objects
+    """
+    checksums = {checksum for _, _, checksum in objects}
+    referenced = set(
+        File.objects.filter(checksum__in=checksums).values_list("checksum", flat=True)
+    )
+    referenced.update(
+        StagedFile.objects.filter(checksum__in=checksums).values_list(
+            "checksum", flat=True
+        )
+    )
+    marked = django_cache.get_many(
+        [get_stored_file_cache_key(filename) for _, filename, _ in objects]
+    )
+    return [
+        (name, filename, checksum)
+        for name, filename, checksum in objects
+        if checksum not in referenced
+        and not marked.get(get_stored_file_cache_key(filename))
+    ]
+
+
+def _exclude_cached_resized_images(objects):
+    """
+    Excludes the resized images that are still indexed in the cache, which are kept for as
+    long as they keep being used for exercise archives
+
+    :param objects: A list of (name, filename, checksum) of resized images
+    """
+    cached = django_cache.get_many(
+        [get_resized_image_file_cache_key(filename) for _, filename, _ in objects]
+    )
+    return [
+        (name, filename, checksum)
+        for name, filename, checksum in objects
+        if not cached.get(get_resized_image_file_cache_key(filename))
+    ]
+
+
+def _get_prefixes(root):
+    return [
+        "/".join([root, first, second])
+        for first, second in product("0123456789abcdef", repeat=2)
+    ]
+
+
+def _delete_object(storage, name, filename):
+    storage.delete(name)
+    forget_stored_file(filename)
+
+
+def sweep_storage(
+    storage=default_storage,
+    dry_run=False,
+    grace_period=datetime.timedelta(days=SWEEP_GRACE_PERIOD_DAYS),
+    workers=SWEEP_WORKERS,
+):
+    """
+    Mark-and-sweep collection of the objects in storage that no longer have references.
+    The checksums that are referenced are marked in a single pass over the database,
+    then the prefixes of the storage root are listed in parallel, and the unreferenced
+    objects under them deleted in parallel batches. Each batch is checked again for
+    references made since the mark, and for objects `get_file_diff` has reported as
+    stored to a client that is yet to create files for them, which are kept.
+    Images resized for exercise archives are swept too, keeping those still in the cache.
+
+    :param dry_run: Only report the objects that would be deleted
+    :param grace_period: How long ago unreferenced objects must have been created
+    :return: A dict of the numbers of live checksums, objects scanned and unreferenced
+        objects deleted, or which would be deleted on a dry run
+    """
+    live_checksums = mark_live_checksums(storage=storage, workers=workers)
+    created_before = now() - grace_period
+
+    # Resized images are never referenced by the database, only by the cache
+    sweeps = [
+        (settings.STORAGE_ROOT, live_checksums, _exclude_newly_referenced),
+        (settings.RESIZED_IMAGES_STORAGE_ROOT, set(), _exclude_cached_resized_images),
+    ]
+    scanned = 0
+    unreferenced = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for root, live, exclude_referenced in sweeps:
+            candidates = []
+            for prefix_scanned, prefix_candidates in executor.map(
+                partial(
+                    _find_unreferenced_objects,
+                    storage,
+                    live_checksums=live,
+                    created_before=created_before,
+                ),
+                _get_prefixes(root),
+            ):
+                scanned += prefix_scanned
+                candidates.extend(prefix_candidates)
+
+            for i in range(0, len(candidates), SWEEP_BATCH_SIZE):
+                batch = exclude_referenced(candidates[i : i + SWEEP_BATCH_SIZE])
+                unreferenced += len(batch)
+                if dry_run:
+                    for name, _, _ in batch:
+                        logging.info(
+                            "Would delete unreferenced object {}".format(name)
+                        )
+                    continue
+                list(
+                    executor.map(
+                        lambda obj: _delete_object(storage, obj[0], obj[1]), batch
+                    )
+                )
+
+    logging.info(
+        "{} {} unreferenced object(s) out of {} in storage, with {} checksum(s) in use".format(
+            "Found" if dry_run else "Deleted",
+            unreferenced,
+            scanned,
+            len(live_checksums),
+        )
+    )
+    return {
+        "live_checksums": len(live_checksums),
+        "objects_scanned": scanned,
+        "objects_unreferenced": unreferenced,
+    }
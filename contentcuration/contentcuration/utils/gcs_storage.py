@@ -21,6 +21,9 @@ CONTENT_DATABASES_MAX_AGE = 5  # seconds
 
 MAX_RETRY_TIME = 60  # seconds
 
+# bytes fetched at a time by file objects from open_ranged
+RANGED_READ_CHUNK_SIZE = 1024 * 1024
+
 
 def _create_default_client(
     service_account_credentials_path=settings.GCS_STORAGE_SERVICE_ACCOUNT_KEY_PATH,
@@ -88,6 +91,20 @@ class GoogleCloudStorage(Storage):
         django_file.just_downloaded = True
         return django_file
 
+    def open_ranged(self, name):
+        """
+        open_ranged returns a seekable file object for reading the bytes of name, which fetches
+        them in ranges as they are read, rather than downloading all of them ahead of time.
+        """
+        if name.startswith(OLD_STUDIO_STORAGE_PREFIX):
+            name = name.split(OLD_STUDIO_STORAGE_PREFIX).pop()
+        blob = self.bucket.get_blob(name)
+
+        if blob is None:
+            raise FileNotFoundError("{} not found".format(name))
+
+        return blob.open("rb", chunk_size=RANGED_READ_CHUNK_SIZE)
+
     @backoff.on_exception(backoff.expo, InternalServerError, max_time=MAX_RETRY_TIME)
     def exists(self, name):
         """
@@ -172,6 +189,30 @@ class GoogleCloudStorage(Storage):
         blob = self.bucket.get_blob(name)
         return blob.delete()
 
+    def listdir(self, path):
+        """
+        List the contents of a "directory" of the bucket, which is a prefix up to a "/".
+        :return: A tuple of the names of the directories and objects directly under it
+        """
+        prefix = "{}/".format(path.rstrip("/")) if path else ""
+        blobs = self.client.list_blobs(self.bucket, prefix=prefix, delimiter="/")
+        # the directories are only collected once the blobs have all been iterated
+        files = [blob.name[len(prefix) :] for blob in blobs]
+        directories = [
+            directory[len(prefix) :].rstrip("/") for directory in blobs.prefixes
+        ]
+        return directories, files
+
+    def list_created_times(self, path):
+        """
+        List the objects directly under a "directory" of the bucket, with the times they
+        were created, which the listing includes, saving a request for each object.
+        :return: A dict of the names of the objects to their times of creation
+        """
+        prefix = "{}/".format(path.rstrip("/")) if path else ""
+        blobs = self.client.list_blobs(self.bucket, prefix=prefix, delimiter="/")
+        return {blob.name[len(prefix) :]: blob.time_created for blob in blobs}
+
     def get_accessed_time(self, name):
         raise NotImplementedError
 
@@ -264,6 +305,9 @@ class CompositeGCS(Storage):
     def open(self, name, mode="rb"):
         return self._get_readable_backend(name).open(name, mode)
 
+    def open_ranged(self, name):
+        return self._get_readable_backend(name).open_ranged(name)
+
     def save(self, name, content, max_length=None):
         return self._get_writeable_backend().save(name, content, max_length=max_length)
 
@@ -278,8 +322,11 @@ class CompositeGCS(Storage):
             return False
 
     def listdir(self, path):
-        # This method was not implemented on GoogleCloudStorage to begin with
-        raise NotImplementedError("listdir is not implemented for CompositeGCS")
+        # Only the writeable backend is listed, as objects can only be deleted from it
+        return self._get_writeable_backend().listdir(path)
+
+    def list_created_times(self, path):
+        return self._get_writeable_backend().list_created_times(path)
 
     def size(self, name):
         return self._get_readable_backend(name).size(name)
@@ -2,12 +2,14 @@ import json
 import logging
 import os
 import time
+from collections import defaultdict
 from io import BytesIO
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.db.models import Count
 from django.db.models import Exists
 from django.db.models import OuterRef
@@ -110,6 +112,97 @@ def map_files_to_node(user, node, data):  # noqa: C901
             node.save()
 
 
+def map_files_to_nodes(user, nodes_data):  # noqa: C901
+    """
+    Generate files that reference newly created content nodes, in bulk, doing what
+    `map_files_to_node` does for each node with a single query per batch where it can.
+
+    :param nodes_data: A list of tuples of a node, which has no files yet, and its file data
+    """
+    nodes_data = [(node, list(filter_out_nones(data))) for node, data in nodes_data]
+    language_ids = {
+        file_data["language"]
+        for _, data in nodes_data
+        for file_data in data
+        if file_data.get("language")
+    }
+    valid_language_ids = set(
+        Language.objects.filter(pk__in=language_ids).values_list("pk", flat=True)
+    )
+    presets = {}
+
+    def get_preset(preset_name, filename):
+        ext = os.path.splitext(filename)[1]
+        if (preset_name, ext) not in presets:
+            presets[(preset_name, ext)] = FormatPreset.get_preset(
+                preset_name
+            ) or FormatPreset.guess_format_preset(filename)
+        return presets[(preset_name, ext)]
+
+    files = []
+    thumbnail_nodes = []
+    for node, data in nodes_data:
+        node_files = []
+        for file_data in data:
+            filename = file_data["filename"]
+            checksum, ext1 = os.path.splitext(filename)
+            ext = ext1.lstrip(".")
+
+            # Determine a preset if none is given
+            kind_preset = get_preset(file_data["preset"], filename)
+
+            file_path = generate_object_storage_name(checksum, filename)
+
+            if not default_storage.exists(file_path):
+                raise IOError("{} not found".format(file_path))
+
+            language_id = file_data.get("language")
+            if language_id and language_id not in valid_language_ids:
+                logging.warning(
+                    "file_data with language {} does not exist.".format(language_id)
+                )
+                # like `map_files_to_node`, stop adding files to the node
+                break
+
+            resource_obj = File(
+                checksum=checksum,
+                contentnode=node,
+                file_format_id=ext,
+                original_filename=file_data.get("original_filename") or "file",
+                source_url=file_data.get("source_url"),
+                file_size=file_data["size"],
+                preset=kind_preset,
+                language_id=language_id,
+                uploaded_by=user,
+                duration=file_data.get("duration"),
+            )
+            resource_obj.file_on_disk.name = file_path
+            resource_obj.set_file_fields()
+
+            if kind_preset and kind_preset.thumbnail:
+                # If this is a thumbnail, replace any other thumbnails for the node
+                node_files = [f for f in node_files if f.preset_id != kind_preset.id]
+
+            node_files.append(resource_obj)
+
+        for resource_obj in node_files:
+            # Handle thumbnail
+            if resource_obj.preset and resource_obj.preset.thumbnail:
+                node.thumbnail_encoding = json.dumps(
+                    {
+                        "base64": get_thumbnail_encoding(str(resource_obj)),
+                        "points": [],
+                        "zoom": 0,
+                    }
+                )
+                thumbnail_nodes.append(node)
+        files.extend(node_files)
+
+    File.objects.bulk_create(files)
+    if thumbnail_nodes:
+        ContentNode.objects.bulk_update(thumbnail_nodes, ["thumbnail_encoding"])
+
+
 def map_files_to_assessment_item(user, assessment_item, data):
     """
     Generate files referenced in given assesment item (a.k.a. question).
@@ -444,6 +537,143 @@ class ResourceSizeHelper:
         # return result['modified_since']
 
 
+def get_resource_size_delta(tree_id, changed_files, removed=(), added=()):
+    """
+    Calculates how much the resource size of a tree changes by, when files stop or start
+    counting towards it. Files only add to the size when no other file in the tree, on a
+    complete node, has the same checksum and size.
+
+    :param tree_id: The tree_id of the tree
+    :param changed_files: A File queryset, or list of ids, of the changed files, which aren't
+        counted as other copies of themselves
+    :param removed: An iterable of (checksum, file_size) of the files that stopped counting
+    :param added: An iterable of (checksum, file_size) of the files that started counting
+    :return: The difference in the resource size
+    :rtype: int
+    """
+    removed = set(removed)
+    added = set(added)
+    # files that are both removed and added leave the size as it is
+    changed = {
+        (checksum, file_size)
+        for checksum, file_size in removed.symmetric_difference(added)
+        if file_size
+    }
+    if not changed:
+        return 0
+
+    other_copies = set(
+        File.objects.filter(
+            contentnode__tree_id=tree_id,
+            contentnode__complete=True,
+            checksum__in={checksum for checksum, _ in changed},
+        )
+        .exclude(pk__in=changed_files)
+        .values_list("checksum", "file_size")
+        .distinct()
+    )
+    return sum(
+        file_size if (checksum, file_size) in added else -file_size
+        for checksum, file_size in changed.difference(other_copies)
+    )
+
+
+def increment_resource_size(tree_id, delta):
+    """
+    Increments the cached resource size of the root node of a tree, once the current
+    transaction has been committed. A delta of None, for a tree that isn't tracked, only
+    counts the change, so that any calculation in progress doesn't overwrite it.
+    """
+    if delta is None:
+        invalidate_resource_sizes([tree_id])
+        return
+    if not delta:
+        return
+    root = (
+        ContentNode.objects.filter(tree_id=tree_id, parent__isnull=True)
+        .only("id")
+        .first()
+    )
+    if root is not None:
+        transaction.on_commit(lambda: ResourceSizeCache(root).increment_size(delta))
+
+
+def get_file_states(files):
+    """
+    :param files: A File queryset
+    :return: A list of (id, tree_id, checksum, file_size) of the files
+    """
+    return list(
+        files.filter(contentnode__isnull=False).values_list(
+            "id", "contentnode__tree_id", "checksum", "file_size"
+        )
+    )
+
+
+def get_resource_size_deltas(removed=(), added=(), changed_files=None):
+    """
+    Calculates how much the resource size of each tree changes by, when files stop or start
+    counting towards them
+
+    :param removed: A list of file states, from `get_file_states`, that stopped counting
+    :param added: A list of file states that started counting
+    :param changed_files: A File queryset of the changed files, which defaults to the ids
+        of the file states
+    :return: A dict of tree_ids to the difference in their resource size, which is None for
+        trees whose resource size isn't tracked, as it's calculated in full for those anyway
+    """
+    if changed_files is None:
+        changed_files = [file_id for file_id, _, _, _ in removed]
+        changed_files.extend(file_id for file_id, _, _, _ in added)
+
+    trees = defaultdict(lambda: (set(), set()))
+    for _, tree_id, checksum, file_size in removed:
+        trees[tree_id][0].add((checksum, file_size))
+    for _, tree_id, checksum, file_size in added:
+        trees[tree_id][1].add((checksum, file_size))
+
+    tracked_tree_ids = {
+        root.tree_id
+        for root in ContentNode.objects.filter(
+            tree_id__in=trees.keys(), parent__isnull=True
+        ).only("id", "tree_id")
+        if ResourceSizeCache(root).is_tracked()
+    }
+    return {
+        tree_id: get_resource_size_delta(
+            tree_id, changed_files, removed=tree_removed, added=tree_added
+        )
+        if tree_id in tracked_tree_ids
+        else None
+        for tree_id, (tree_removed, tree_added) in trees.items()
+    }
+
+
+def increment_resource_sizes(deltas):
+    """
+    :param deltas: A dict of tree_ids to the difference in their resource size
+    """
+    for tree_id, delta in deltas.items():
+        increment_resource_size(tree_id, delta)
+
+
+def invalidate_resource_sizes(tree_ids):
+    """
+    Stops tracking the cached resource sizes of trees, for changes whose effect on them is
+    unknown, so that they're calculated again once the current transaction has been committed
+    """
+    roots = list(
+        ContentNode.objects.filter(tree_id__in=tree_ids, parent__isnull=True).only("id")
+    )
+
+    def invalidate():
+        for root in roots:
+            ResourceSizeCache(root).invalidate()
+
+    if roots:
+        transaction.on_commit(invalidate)
+
+
 STALE_MAX_CALCULATION_SIZE = 500
 SLOW_UNFORCED_CALC_THRESHOLD = 5
 
@@ -481,13 +711,16 @@ def calculate_resource_size(node, force=False):
 
     size = None if force else cache.get_size()
     modified = None if force else cache.get_modified()
+    # the size of root nodes is incremented with every change to the files of their tree,
+    # so once calculated, it stays exact without having to check the files again
+    tracked = node.is_root_node()
 
     # since we added file.modified as nullable, if the result is None/Null, then we know that it
     # hasn't been modified since our last cached value, so we only need to check is False
     if (
         size is not None
         and modified is not None
-        and db.modified_since(modified) is False
+        and ((tracked and cache.is_tracked()) or db.modified_since(modified) is False)
     ):
         # use cache if not modified since cache modified timestamp
         return size, False
@@ -498,11 +731,11 @@ def calculate_resource_size(node, force=False):
 
     start = time.time()
 
-    # do recalculation, marking modified time before starting
+    # do recalculation, marking modified time and the number of changes before starting
+    changes = cache.get_changes()
     now = timezone.now()
     size = db.get_size()
-    cache.set_size(size)
-    cache.set_modified(now)
+    cache.set_tracked_size(size, now, changes, tracked=tracked)
     elapsed = time.time() - start
 
     if not force and elapsed > SLOW_UNFORCED_CALC_THRESHOLD:
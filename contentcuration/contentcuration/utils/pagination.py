@@ -1,5 +1,8 @@
 import hashlib
+import json
 from base64 import b64encode
+from base64 import urlsafe_b64decode
+from base64 import urlsafe_b64encode
 from collections import OrderedDict
 from urllib.parse import urlencode
 
@@ -8,6 +11,7 @@ from django.core.exceptions import EmptyResultSet
 from django.core.paginator import InvalidPage
 from django.core.paginator import Page
 from django.core.paginator import Paginator
+from django.db.models import Q
 from django.db.models import QuerySet
 from django.utils.functional import cached_property
 from rest_framework.pagination import _reverse_ordering
@@ -135,6 +139,178 @@ class CachedListPagination(ValuesViewsetPageNumberPagination):
     django_paginator_class = CachedValuesViewsetPaginator
 
 
+def get_approximate_count(queryset):
+    """
+    :return: The number of rows the query planner estimates the queryset returns,
+        which is None when the database can't provide an estimate
+    """
+    try:
+        plan = json.loads(queryset.explain(format="json"))
+        return plan[0]["Plan"]["Plan Rows"]
+    except EmptyResultSet:
+        return 0
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+class ValuesViewsetKeysetPagination(ValuesViewsetPageNumberPagination):
+    """
+    Pages through a queryset by seeking past the sort keys of the last item of the
+    previous page, so every page costs the same as the first when the keys are indexed.
+
+    Keyset pagination is used when the `cursor_query_param` is in the request, empty for
+    the first page, and the opaque cursor for the next page is returned as `more`.
+    Otherwise, the page number pagination of `ValuesViewsetPageNumberPagination` is used.
+
+    The queryset is sorted by its ordering, or `ordering` when it has none, with the
+    primary key appended to break ties. Nulls sort as in Postgres, last when ascending.
+    Orderings that can't be sought on an index, such as expressions or annotations, fall
+    back to page number pagination.
+    """
+
+    cursor_query_param = "cursor"
+    ordering = ()
+    # Include the query planner's estimate of the total number of results as `count`
+    approximate_count = False
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, queryset):
+        """
+        :return: The list of sort keys, or None when the queryset's ordering includes
+            expressions, random ordering or annotations, which have no index to seek on
+        """
+        ordering = queryset.query.order_by or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = list(ordering)
+        for term in ordering:
+            if not isinstance(term, str) or term == "?":
+                return None
+            if term.lstrip("-") in queryset.query.annotations:
+                return None
+        pk_name = queryset.model._meta.pk.name
+        if not any(term.lstrip("-") in ("pk", pk_name) for term in ordering):
+            ordering.append("pk")
+        return ordering
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.keyset_ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(
+            # str keeps the full precision of datetimes, which JSON encoders truncate
+            json.dumps(position, default=str).encode("utf8")
+        ).decode("ascii")
+
+    @staticmethod
+    def _after(term, value):
+        field = term.lstrip("-")
+        if term.startswith("-"):
+            # descending, nulls come first
+            if value is None:
+                return Q(**{"{}__isnull".format(field): False})
+            return Q(**{"{}__lt".format(field): value})
+        # ascending, nulls come last
+        if value is None:
+            return None
+        return Q(**{"{}__gt".format(field): value}) | Q(
+            **{"{}__isnull".format(field): True}
+        )
+
+    @staticmethod
+    def _equal(term, value):
+        field = term.lstrip("-")
+        if value is None:
+            return Q(**{"{}__isnull".format(field): True})
+        return Q(**{field: value})
+
+    def get_keyset_filter(self, position):
+        """
+        :return: A Q matching the items that sort after `position`, the keys of an item
+        """
+        keyset_filter = Q(pk__in=[])
+        preceding = Q()
+        for term, value in zip(self.keyset_ordering, position):
+            after = self._after(term, value)
+            if after is not None:
+                keyset_filter |= preceding & after
+            preceding &= self._equal(term, value)
+        first_term, first_value = self.keyset_ordering[0], position[0]
+        # the redundant bound on the first key lets the database seek on its index
+        first_bound = self._equal(first_term, first_value)
+        first_after = self._after(first_term, first_value)
+        if first_after is not None:
+            first_bound |= first_after
+        return first_bound & keyset_filter
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_ordering = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset_ordering = self.get_ordering(queryset)
+        self.keyset = self.keyset_ordering is not None
+        if not self.keyset:
+            return super(ValuesViewsetKeysetPagination, self).paginate_queryset(
+                queryset, request, view=view
+            )
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        position = self.decode_cursor(request.query_params[self.cursor_query_param])
+        fields = [term.lstrip("-") for term in self.keyset_ordering]
+
+        self.count = (
+            get_approximate_count(queryset.values_list("pk", flat=True).distinct())
+            if self.approximate_count
+            else None
+        )
+
+        keys_queryset = queryset.order_by(*self.keyset_ordering)
+        if position is not None:
+            keys_queryset = keys_queryset.filter(self.get_keyset_filter(position))
+        keys = list(
+            keys_queryset.values_list(*fields).distinct()[: self.page_size + 1]
+        )
+
+        self.next_position = None
+        if len(keys) > self.page_size:
+            keys = keys[: self.page_size]
+            self.next_position = list(keys[-1])
+
+        pk_name = queryset.model._meta.pk.name
+        pk_index = fields.index("pk") if "pk" in fields else fields.index(pk_name)
+        return queryset.filter(pk__in=[key[pk_index] for key in keys]).order_by(
+            *self.keyset_ordering
+        )
+
+    def get_more(self):
+        if self.next_position is None:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = self.encode_cursor(self.next_position)
+        return params
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super(ValuesViewsetKeysetPagination, self).get_paginated_response(
+                data
+            )
+        response = OrderedDict([("more", self.get_more()), ("results", data)])
+        if self.approximate_count:
+            response["count"] = self.count
+        return Response(response)
+
+
 class ValuesViewsetCursorPagination(CursorPagination):
     def paginate_queryset(self, queryset, request, view=None):
         pks_queryset = super(ValuesViewsetCursorPagination, self).paginate_queryset(
@@ -1,10 +1,15 @@
+import base64
+import hashlib
 import itertools
 import json
 import logging as logmodule
 import os
+import shutil
 import tempfile
 import time
 import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from itertools import chain
 
@@ -13,23 +18,18 @@ from django.contrib.sites.models import Site
 from django.core.files import File
 from django.core.files.storage import default_storage as storage
 from django.core.management import call_command
-from django.db.models import Count
+from django.db import connection
+from django.db import connections
+from django.db import transaction
 from django.db.models import Exists
 from django.db.models import Max
 from django.db.models import OuterRef
 from django.db.models import Q
-from django.db.models import Subquery
-from django.db.models import Sum
 from django.db.utils import IntegrityError
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import override
-from kolibri_content import models as kolibrimodels
-from kolibri_content.base_models import MAX_TAG_LENGTH
-from kolibri_content.router import get_active_content_database
-from kolibri_content.router import using_content_database
-from kolibri_public.utils.mapper import ChannelMapper
 from le_utils.constants import completion_criteria
 from le_utils.constants import content_kinds
 from le_utils.constants import exercises
@@ -39,13 +39,11 @@ from le_utils.constants import licenses
 from le_utils.constants import modalities
 from le_utils.constants import roles
 from le_utils.constants.format_presets import RENDERABLE_PRESETS_ORDER
-from search.models import ChannelFullTextSearch
-from search.models import ContentNodeFullTextSearch
-from search.utils import get_fts_annotated_channel_qs
-from search.utils import get_fts_annotated_contentnode_qs
 
 from contentcuration import models as ccmodels
 from contentcuration.decorators import delay_user_storage_calculation
+from contentcuration.tasks import sync_channel_tsvectors_task
+from contentcuration.utils.assessment.base import ResizedImageCache
 from contentcuration.utils.assessment.perseus import PerseusExerciseGenerator
 from contentcuration.utils.assessment.qti.archive import QTIExerciseGenerator
 from contentcuration.utils.assessment.qti.imsmanifest import (
@@ -54,10 +52,24 @@ from contentcuration.utils.assessment.qti.imsmanifest import (
 from contentcuration.utils.assessment.qti.perseus_derive import is_perseus_derivable
 from contentcuration.utils.cache import delete_public_channel_cache_keys
 from contentcuration.utils.files import create_thumbnail_from_base64
+from contentcuration.utils.files import get_base64_encoding
 from contentcuration.utils.files import get_thumbnail_encoding
 from contentcuration.utils.nodes import migrate_extra_fields
 from contentcuration.utils.parser import load_json_string
 from contentcuration.utils.sentry import report_exception
+from kolibri_content import models as kolibrimodels
+from kolibri_content.base_models import MAX_TAG_LENGTH
+from kolibri_content.router import get_active_content_database
+from kolibri_content.router import using_content_database
+from kolibri_public.utils.mapper import ChannelMapper
+from search.models import ChannelFullTextSearch
+from search.models import ContentNodeFullTextSearch
+from search.models import ContentNodeFullTextSearchChange
+from search.utils import get_fts_annotated_channel_qs
+from search.utils import get_contentnode_ids_without_tsvectors
+from search.utils import log_contentnode_tsvector_changes
+from search.utils import TSVECTOR_BATCH_SIZE
+from search.utils import upsert_contentnode_tsvectors
 
 
 logmodule.basicConfig()
@@ -69,6 +81,8 @@ MIN_SCHEMA_VERSION = "1"
 # Largest value the legacy 32-bit LocalFile.file_size / File.file_size columns hold.
 INT_32BIT_MAX = 2 ** 31 - 1
 PUBLISHING_UPDATE_THRESHOLD = 3600
+# Number of nodes or files loaded per query when mapping the tree in bulk.
+BULK_MAPPING_BATCH_SIZE = 1000
 
 
 class NoNodesChangedError(Exception):
@@ -152,10 +166,22 @@ def create_content_database(
     progress_tracker=None,
     is_draft_version=False,
     use_staging_tree=False,
+    bulk_mapping=None,
+    incremental=None,
 ):
     """
     :type progress_tracker: contentcuration.utils.celery.ProgressTracker|None
+    :param bulk_mapping: Whether to map the tree with the BulkTreeMapper, defaults to
+        the PUBLISH_BULK_TREE_MAPPING setting
+    :param incremental: Whether to only map the nodes that have changed into the export
+        database of the published version of the channel, defaults to the PUBLISH_INCREMENTAL
+        setting. The whole tree is mapped for draft versions, when regenerating exercises, when
+        the channel fields its nodes are mapped with have changed, or when there is no export
+        database for the published version.
     """
+    if incremental is None:
+        incremental = settings.PUBLISH_INCREMENTAL
+
     if not is_draft_version and use_staging_tree:
         raise ValueError("Staging tree is only supported for draft versions")
 
@@ -165,6 +191,13 @@ def create_content_database(
     if not is_draft_version and not force:
         raise_if_nodes_are_all_unchanged(channel)
     fh, tempdb = tempfile.mkstemp(suffix=".sqlite3")
+    incremental = (
+        incremental
+        and not is_draft_version
+        and not force_exercises
+        and not mapped_channel_fields_changed(channel)
+        and copy_published_export_database(channel, tempdb)
+    )
 
     with using_content_database(tempdb):
         if not is_draft_version and not channel.main_tree.publishing:
@@ -176,7 +209,8 @@ def create_content_database(
         if progress_tracker:
             progress_tracker.track(10)
         base_tree = channel.staging_tree if use_staging_tree else channel.main_tree
-        tree_mapper = TreeMapper(
+        tree_mapper_class = get_tree_mapper_class(bulk_mapping, incremental)
+        tree_mapper = tree_mapper_class(
             base_tree,
             channel.language,
             channel.id,
@@ -187,6 +221,7 @@ def create_content_database(
             inherit_metadata=bool(channel.ricecooker_version),
         )
         tree_mapper.map_nodes()
+        tree_mapper.image_cache.report(channel.id)
         kolibri_channel = map_channel_to_kolibri_channel(
             channel, use_staging_tree, is_draft_version=is_draft_version
         )
@@ -208,13 +243,49 @@ def create_content_database(
     return tempdb
 
 
+def get_mapped_channel_fields(channel):
+    """
+    Returns the fields of the channel that the rows of every node in its tree are mapped with.
+    """
+    return {
+        "language": channel.language_id,
+        "inherit_metadata": bool(channel.ricecooker_version),
+    }
+
+
+def mapped_channel_fields_changed(channel):
+    """
+    Returns whether the fields of the channel that its nodes are mapped with have changed
+    since its published version was mapped, in which case the whole tree is mapped again.
+    """
+    published_data = channel.published_data.get(
+        str(channel.version)
+    ) or channel.published_data.get(channel.version, {})
+    return published_data.get("mapped_channel_fields") != get_mapped_channel_fields(
+        channel
+    )
+
+
+def copy_published_export_database(channel, target_path):
+    """
+    Copies the export database of the published version of the channel to target_path,
+    returning whether there was one to copy.
+    """
+    if not channel.version:
+        return False
+    published_db_path = get_content_db_path(channel.id, channel.version)
+    if not storage.exists(published_db_path):
+        return False
+    with storage.open(published_db_path, "rb") as publishedf, open(
+        target_path, "wb"
+    ) as targetf:
+        shutil.copyfileobj(publishedf, targetf)
+    return True
+
+
 def create_kolibri_license_object(ccnode):
-    use_license_description = not ccnode.license.is_custom
     return kolibrimodels.License.objects.get_or_create(
-        license_name=ccnode.license.license_name,
-        license_description=ccnode.license.license_description
-        if use_license_description
-        else ccnode.license_description,
+        **get_kolibri_license_fields(ccnode)
     )
 
 
@@ -274,6 +345,14 @@ def _node_is_perseus_derivable(node):
     return has_native_qti
 
 
+def is_unit_topic(node):
+    """Check if a node is a TOPIC node with UNIT modality."""
+    if node.kind_id != content_kinds.TOPIC:
+        return False
+    options = node.extra_fields.get("options", {}) if node.extra_fields else {}
+    return options.get("modality") == modalities.UNIT
+
+
 def has_assessments(node):
     """Check if a node should have its assessment items published.
 
@@ -282,11 +361,9 @@ def has_assessments(node):
     """
     if node.kind_id == content_kinds.EXERCISE:
         return True
-    if node.kind_id == content_kinds.TOPIC:
-        options = node.extra_fields.get("options", {}) if node.extra_fields else {}
-        if options.get("modality") == modalities.UNIT:
-            # Only return True if the UNIT has assessment items
-            return node.assessment_items.filter(deleted=False).exists()
+    if is_unit_topic(node):
+        # Only return True if the UNIT has assessment items
+        return node.assessment_items.filter(deleted=False).exists()
     return False
 
 
@@ -301,6 +378,7 @@ class TreeMapper:
         force_exercises=False,
         progress_tracker=None,
         inherit_metadata=False,
+        exercise_archive_workers=None,
     ):
         if not root_node.is_publishable():
             raise ChannelIncompleteError(
@@ -320,14 +398,80 @@ class TreeMapper:
         self.user_id = user_id
         self.force_exercises = force_exercises
         self.inherit_metadata = inherit_metadata
+        if exercise_archive_workers is None:
+            exercise_archive_workers = settings.PUBLISH_EXERCISE_ARCHIVE_WORKERS
+        self.exercise_archive_workers = exercise_archive_workers
+        # Whether the QTI package of each node embeds Perseus questions, for the nodes
+        # whose exercise archives have been built ahead of mapping
+        self._exercise_archives = {}
+        # Shared by the exercise archive generators, to report the images resized for them
+        self.image_cache = ResizedImageCache()
 
     def _node_completed(self):
         if self.progress_tracker:
             self.progress_tracker.increment(increment=self.percent_per_node)
 
     def map_nodes(self):
+        if self.exercise_archive_workers > 1:
+            children, _, publishable = self._load_tree_structure()
+            self._build_exercise_archives(
+                self._get_mapped_node_ids(children, publishable, self.root_node.id)
+            )
         self.recurse_nodes(self.root_node, {})
 
+    def _load_tree_structure(self):
+        """
+        Reads the shape of the whole tree in a single query, and returns the child ids of
+        each topic in tree order, along with the ids of the nodes that are publishable.
+        """
+        structure = list(
+            self.root_node.get_descendants(include_self=True)
+            .order_by("lft")
+            .values_list("id", "parent_id", "kind_id", "complete")
+        )
+        children = defaultdict(list)
+        has_resources = {}
+        for node_id, parent_id, kind_id, complete in structure:
+            # Only the children of topics are mapped
+            if parent_id in has_resources and not has_resources[parent_id]:
+                children[parent_id].append(node_id)
+            has_resources[node_id] = kind_id != content_kinds.TOPIC
+        # Walk the tree bottom up, so that each node knows whether it has any non-topic descendants
+        for node_id, parent_id, kind_id, complete in reversed(structure):
+            if has_resources[node_id] and parent_id in has_resources:
+                has_resources[parent_id] = True
+        publishable = {
+            node_id
+            for node_id, parent_id, kind_id, complete in structure
+            if complete and has_resources[node_id]
+        }
+        return children, has_resources, publishable
+
+    def _get_mapped_node_ids(self, children, publishable, node_id):
+        """
+        Returns the ids of the nodes of the subtree rooted at node_id that are mapped, in tree order.
+        """
+        mapped = []
+        stack = [node_id]
+        while stack:
+            node_id = stack.pop()
+            if node_id in publishable:
+                mapped.append(node_id)
+                stack.extend(reversed(children[node_id]))
+        return mapped
+
+    def _get_units_with_assessments(self, nodes):
+        unit_ids = [node.id for node in nodes if is_unit_topic(node)]
+        if not unit_ids:
+            return set()
+        return set(
+            ccmodels.AssessmentItem.objects.filter(
+                contentnode_id__in=unit_ids, deleted=False
+            )
+            .values_list("contentnode_id", flat=True)
+            .distinct()
+        )
+
     def _gather_inherited_metadata(self, node, inherited_fields):
         metadata = {}
 
@@ -354,27 +498,169 @@ class TreeMapper:
                 metadata[field] = getattr(node, field)
         return metadata
 
-    def recurse_nodes(self, node, inherited_fields):  # noqa C901
+    def _has_mastery_model(self, node, log_errors=True):
+        """
+        Early validation to make sure we don't have any nodes with assessments
+        without mastery models, which should be unlikely when the node is complete,
+        but just in case
+        """
+        try:
+            # migrates and extracts the mastery model from the exercise
+            _, mastery_model = parse_assessment_metadata(node)
+            if not mastery_model:
+                raise ValueError("Exercise does not have a mastery model")
+        except Exception as e:
+            if not log_errors:
+                return False
+            logging.warning(
+                "Unable to parse exercise {id} {title} mastery model: {error}".format(
+                    id=node.pk, title=node.title, error=str(e)
+                )
+            )
+            return False
+        return True
+
+    def _get_exercise_archive_generators(self, node):
+        """
+        Returns the generators of the exercise archives that need to be created for a node
+        with assessments, along with whether its QTI package embeds Perseus questions.
+        """
+        # A mixed node's QTI package embeds its raw Perseus questions as
+        # custom interactions, so that file also needs the Perseus/exercise
+        # renderer. Discovered here alongside generator selection and carried
+        # to create_associated_file_objects, so the included_presets bit is
+        # grounded in the same decision that drives the embedding.
+        exercise_data = process_assessment_metadata(node)
+        mapping_values = exercise_data["assessment_mapping"].values()
+        any_perseus_question = any(
+            t == exercises.PERSEUS_QUESTION for t in mapping_values
+        )
+        any_native_qti = any(t == exercises.QTI for t in mapping_values)
+        qti_embeds_perseus = any_perseus_question and any_native_qti
+        if qti_embeds_perseus:
+            # Mixed node: one QTI package, raw Perseus embedded as
+            # custom interactions.
+            generator_classes = [QTIExerciseGenerator]
+        elif any_perseus_question:
+            generator_classes = [PerseusExerciseGenerator]
+        else:
+            generator_classes = [QTIExerciseGenerator]
+            # Also emit a Perseus archive when every item is a native QTI
+            # interaction Perseus can express, so older Kolibri renders it.
+            if _node_is_perseus_derivable(node):
+                generator_classes.append(PerseusExerciseGenerator)
+
+        # If this exercise previously had files generated by generators no
+        # longer in use, make sure we clean them up here.
+        target_presets = {g.preset for g in generator_classes}
+        stale_presets = {
+            PerseusExerciseGenerator.preset,
+            QTIExerciseGenerator.preset,
+        } - target_presets
+        node.files.filter(preset_id__in=stale_presets).delete()
+
+        generators = [
+            generator_class(
+                node,
+                exercise_data,
+                self.channel_id,
+                self.default_language.lang_code,
+                user_id=self.user_id,
+                image_cache=self.image_cache,
+            )
+            for generator_class in generator_classes
+            if (
+                self.force_exercises
+                or node.changed
+                or not node.files.filter(preset_id=generator_class.preset).exists()
+            )
+        ]
+        return generators, qti_embeds_perseus
+
+    def _create_exercise_archives(self, node):
+        """
+        Generates the exercise archives for a node with assessments, returning whether
+        its QTI package embeds Perseus questions.
+        """
+        if node.id in self._exercise_archives:
+            # The archives were built by _build_exercise_archives
+            return self._exercise_archives[node.id]
+        generators, qti_embeds_perseus = self._get_exercise_archive_generators(node)
+        for generator in generators:
+            generator.create_exercise_archive()
+        return qti_embeds_perseus
+
+    def _load_nodes_with_assessments(self, node_ids):
+        """
+        Loads the nodes with assessments among the mapped node_ids, in tree order. Nodes without
+        a mastery model are left out along with their descendants, as they are when mapping.
+        """
+        nodes = {}
+        for i in range(0, len(node_ids), BULK_MAPPING_BATCH_SIZE):
+            for node in ccmodels.ContentNode.objects.filter(
+                id__in=node_ids[i : i + BULK_MAPPING_BATCH_SIZE],
+                kind_id__in=[content_kinds.EXERCISE, content_kinds.TOPIC],
+            ).select_related("language"):
+                nodes[node.id] = node
+        units_with_assessments = self._get_units_with_assessments(nodes.values())
+
+        nodes_with_assessments = []
+        skipped = set()
+        for node_id in node_ids:
+            node = nodes.get(node_id)
+            if node is None:
+                continue
+            if node.parent_id in skipped:
+                skipped.add(node_id)
+            elif (
+                node.kind_id == content_kinds.EXERCISE
+                or node_id in units_with_assessments
+            ):
+                # The node is checked again, and the error logged, when it is mapped
+                if self._has_mastery_model(node, log_errors=False):
+                    nodes_with_assessments.append(node)
+                else:
+                    skipped.add(node_id)
+        return nodes_with_assessments
+
+    def _build_exercise_archives(self, node_ids):
+        """
+        Builds the exercise archives of the mapped node_ids in a pool of threads ahead of
+        mapping them. The generators and their assessment items are loaded beforehand, so the
+        threads only build the zip files, which are then saved in tree order. As when they
+        are built during mapping, the first archive that fails to build raises its error once
+        the archives before it have been saved.
+        """
+        generators = []
+        for node in self._load_nodes_with_assessments(node_ids):
+            node_generators, qti_embeds_perseus = self._get_exercise_archive_generators(
+                node
+            )
+            for generator in node_generators:
+                generator.get_assessment_items()
+            generators.extend(node_generators)
+            self._exercise_archives[node.id] = qti_embeds_perseus
+
+        with ThreadPoolExecutor(max_workers=self.exercise_archive_workers) as executor:
+            archives = [
+                executor.submit(generator.build_exercise_archive)
+                for generator in generators
+            ]
+            for index, generator in enumerate(generators):
+                try:
+                    generator.save_exercise_archive(archives[index].result())
+                except Exception:
+                    _discard_exercise_archives(archives[index + 1 :])
+                    raise
+
+    def recurse_nodes(self, node, inherited_fields):
         logging.debug("Mapping node with id {id}".format(id=node.pk))
 
         # Only process nodes that are either non-topics or have non-topic descendants
         if node.is_publishable():
-            # early validation to make sure we don't have any nodes with assessments
-            # without mastery models, which should be unlikely when the node is complete,
-            # but just in case
-            if has_assessments(node):
-                try:
-                    # migrates and extracts the mastery model from the exercise
-                    _, mastery_model = parse_assessment_metadata(node)
-                    if not mastery_model:
-                        raise ValueError("Exercise does not have a mastery model")
-                except Exception as e:
-                    logging.warning(
-                        "Unable to parse exercise {id} {title} mastery model: {error}".format(
-                            id=node.pk, title=node.title, error=str(e)
-                        )
-                    )
-                    return
+            node_has_assessments = has_assessments(node)
+            if node_has_assessments and not self._has_mastery_model(node):
+                return
 
             metadata = self._gather_inherited_metadata(node, inherited_fields)
 
@@ -386,59 +672,10 @@ class TreeMapper:
                 metadata,
             )
 
-            # A mixed node's QTI package embeds its raw Perseus questions as
-            # custom interactions, so that file also needs the Perseus/exercise
-            # renderer. Discovered here alongside generator selection and carried
-            # to create_associated_file_objects, so the included_presets bit is
-            # grounded in the same decision that drives the embedding.
             qti_embeds_perseus = False
 
-            if has_assessments(node):
-                exercise_data = process_assessment_metadata(node)
-                mapping_values = exercise_data["assessment_mapping"].values()
-                any_perseus_question = any(
-                    t == exercises.PERSEUS_QUESTION for t in mapping_values
-                )
-                any_native_qti = any(t == exercises.QTI for t in mapping_values)
-                qti_embeds_perseus = any_perseus_question and any_native_qti
-                if qti_embeds_perseus:
-                    # Mixed node: one QTI package, raw Perseus embedded as
-                    # custom interactions.
-                    generator_classes = [QTIExerciseGenerator]
-                elif any_perseus_question:
-                    generator_classes = [PerseusExerciseGenerator]
-                else:
-                    generator_classes = [QTIExerciseGenerator]
-                    # Also emit a Perseus archive when every item is a native QTI
-                    # interaction Perseus can express, so older Kolibri renders it.
-                    if _node_is_perseus_derivable(node):
-                        generator_classes.append(PerseusExerciseGenerator)
-
-                # If this exercise previously had files generated by generators no
-                # longer in use, make sure we clean them up here.
-                target_presets = {g.preset for g in generator_classes}
-                stale_presets = {
-                    PerseusExerciseGenerator.preset,
-                    QTIExerciseGenerator.preset,
-                } - target_presets
-                node.files.filter(preset_id__in=stale_presets).delete()
-
-                for generator_class in generator_classes:
-                    if (
-                        self.force_exercises
-                        or node.changed
-                        or not node.files.filter(
-                            preset_id=generator_class.preset
-                        ).exists()
-                    ):
-                        generator = generator_class(
-                            node,
-                            exercise_data,
-                            self.channel_id,
-                            self.default_language.lang_code,
-                            user_id=self.user_id,
-                        )
-                        generator.create_exercise_archive()
+            if node_has_assessments:
+                qti_embeds_perseus = self._create_exercise_archives(node)
 
                 # Only create assessment metadata for exercises, not UNIT topics
                 # UNIT topics store their assessment config in options/completion_criteria
@@ -458,6 +695,730 @@ class TreeMapper:
         self._node_completed()
 
 
+class BulkTreeMapper(TreeMapper):
+    """
+    Maps the tree into the export database a level at a time rather than a node at a time.
+
+    The Studio nodes of each level are loaded together, and the Kolibri ContentNode, File,
+    LocalFile, tag and assessment metadata rows are built in memory. Once the whole tree has
+    been mapped, the MPTT fields are assigned the values the recursive TreeMapper ends up with,
+    and the rows are written with bulk_create. This keeps the number of queries proportional
+    to the depth of the tree, rather than to the number of nodes in it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(BulkTreeMapper, self).__init__(*args, **kwargs)
+        self._languages = {}
+        # Kolibri nodes in the order they were mapped, and the data attached to them
+        self._kolibri_nodes = []
+        self._node_licenses = {}
+        self._node_files = {}
+        self._node_tags = {}
+        self._assessment_metadata = {}
+
+    def _nodes_completed(self, count):
+        if self.progress_tracker and count:
+            self.progress_tracker.increment(increment=self.percent_per_node * count)
+
+    def _get_kolibri_language(self, language):
+        if language.pk not in self._languages:
+            self._languages[language.pk] = get_or_create_language(language)[0]
+        return self._languages[language.pk]
+
+    def _load_nodes(self, node_ids):
+        nodes = {}
+        for i in range(0, len(node_ids), BULK_MAPPING_BATCH_SIZE):
+            batch = node_ids[i : i + BULK_MAPPING_BATCH_SIZE]
+            for node in (
+                ccmodels.ContentNode.objects.filter(id__in=batch)
+                .select_related("kind", "license", "language")
+                .prefetch_related("tags")
+            ):
+                nodes[node.id] = node
+        return [nodes[node_id] for node_id in node_ids]
+
+    def _get_file_durations(self, nodes):
+        node_ids = [
+            node.id
+            for node in nodes
+            if node.kind_id in [content_kinds.AUDIO, content_kinds.VIDEO]
+        ]
+        if not node_ids:
+            return {}
+        return dict(
+            ccmodels.File.objects.filter(contentnode_id__in=node_ids)
+            .values("contentnode_id")
+            .annotate(duration=Max("duration"))
+            .values_list("contentnode_id", "duration")
+        )
+
+    def _map_files(self, mapped):
+        """
+        Builds the Kolibri File and LocalFile rows for the mapped nodes of a level. This runs
+        after the exercise archives and slideshow manifests for the level have been created,
+        as these are files of the nodes too.
+        """
+        node_ids = [node.id for node, _, _ in mapped]
+        files_by_node = defaultdict(list)
+        for i in range(0, len(node_ids), BULK_MAPPING_BATCH_SIZE):
+            for ccfilemodel in ccmodels.File.objects.filter(
+                EXPORTED_FILES_FILTER,
+                contentnode_id__in=node_ids[i : i + BULK_MAPPING_BATCH_SIZE],
+            ).select_related("preset", "file_format", "language"):
+                files_by_node[ccfilemodel.contentnode_id].append(ccfilemodel)
+
+        for node, kolibrinode, qti_embeds_perseus in mapped:
+            node_files = []
+            for ccfilemodel in files_by_node[node.id]:
+                preset = ccfilemodel.preset
+                fformat = ccfilemodel.file_format
+                if ccfilemodel.language:
+                    self._get_kolibri_language(ccfilemodel.language)
+
+                if preset.thumbnail:
+                    ccfilemodel = (
+                        create_associated_thumbnail(node, ccfilemodel) or ccfilemodel
+                    )
+
+                node_files.append(
+                    map_file_fields(ccfilemodel, preset, fformat, qti_embeds_perseus)
+                )
+            self._node_files[kolibrinode.id] = node_files
+
+    def _build_kolibri_node(self, node, parent_id, metadata, duration, available):
+        kolibri_license = None
+        license_fields = None
+        if node.license is not None:
+            license_fields = get_kolibri_license_fields(node)
+            kolibri_license = kolibrimodels.License(**license_fields)
+
+        language = get_contentnode_language(node, self.default_language, metadata)
+        if language:
+            language = self._get_kolibri_language(language)
+
+        kolibrinode = kolibrimodels.ContentNode(
+            id=node.node_id,
+            parent_id=parent_id,
+            **map_contentnode_fields(
+                node,
+                self.channel_id,
+                self.channel_name,
+                metadata,
+                kolibri_license,
+                language,
+                duration,
+                available,
+            ),
+        )
+        if license_fields is not None:
+            # The TreeMapper creates the License rows in tree order, so they are only
+            # created once the final order of the nodes is known, in _write_rows.
+            self._node_licenses[kolibrinode.id] = license_fields
+            kolibrinode.license = None
+        self._kolibri_nodes.append(kolibrinode)
+        return kolibrinode
+
+    def _map_level(self, level, children, has_resources, publishable):
+        """
+        Maps one level of the tree.
+
+        :param level: A list of tuples of Studio node id, Kolibri parent id and the metadata
+            inherited from the parent, in tree order
+        :return: The next level of the tree in the same form
+        """
+        inherited = {
+            node_id: (parent_id, fields) for node_id, parent_id, fields in level
+        }
+        completed = len(
+            [node_id for node_id in inherited if node_id not in publishable]
+        )
+        nodes = self._load_nodes(
+            [node_id for node_id in inherited if node_id in publishable]
+        )
+        units_with_assessments = self._get_units_with_assessments(nodes)
+        file_durations = self._get_file_durations(nodes)
+
+        mapped = []
+        next_level = []
+        for node in nodes:
+            logging.debug("Mapping node with id {id}".format(id=node.pk))
+            node_has_assessments = (
+                node.kind_id == content_kinds.EXERCISE
+                or node.id in units_with_assessments
+            )
+            if node_has_assessments and not self._has_mastery_model(node):
+                continue
+
+            parent_id, inherited_fields = inherited[node.id]
+            metadata = self._gather_inherited_metadata(node, inherited_fields)
+
+            duration = get_completion_criteria_duration(get_contentnode_options(node))
+            if duration is None:
+                duration = file_durations.get(node.id)
+
+            kolibrinode = self._build_kolibri_node(
+                node, parent_id, metadata, duration, has_resources[node.id]
+            )
+
+            qti_embeds_perseus = False
+            if node_has_assessments:
+                qti_embeds_perseus = self._create_exercise_archives(node)
+
+                # Only create assessment metadata for exercises, not UNIT topics
+                # UNIT topics store their assessment config in options/completion_criteria
+                if node.kind_id == content_kinds.EXERCISE:
+                    self._assessment_metadata[
+                        kolibrinode.id
+                    ] = map_assessment_metadata_fields(node)
+            elif node.kind_id == content_kinds.SLIDESHOW:
+                create_slideshow_manifest(node, user_id=self.user_id)
+
+            self._node_tags[kolibrinode.id] = list(node.tags.all())
+            mapped.append((node, kolibrinode, qti_embeds_perseus))
+            completed += 1
+
+            # TOPIC nodes need to map their children, including UNIT topics
+            # that also had their assessments processed above
+            if node.kind_id == content_kinds.TOPIC:
+                next_level.extend(
+                    (child_id, kolibrinode.id, metadata)
+                    for child_id in children[node.id]
+                )
+
+        self._map_files(mapped)
+        self._nodes_completed(completed)
+        return next_level
+
+    def _assign_mptt_fields(self):
+        """
+        Numbers the mapped nodes the way django-mptt does when each node is appended as the
+        last child of its parent, and returns them in tree order.
+        """
+        nodes_by_parent = defaultdict(list)
+        for kolibrinode in self._kolibri_nodes:
+            nodes_by_parent[kolibrinode.parent_id].append(kolibrinode)
+
+        ordered = []
+        counter = 0
+        stack = [(self._kolibri_nodes[0], 0, False)]
+        while stack:
+            kolibrinode, level, visited = stack.pop()
+            counter += 1
+            if visited:
+                kolibrinode.rght = counter
+                continue
+            kolibrinode.lft = counter
+            kolibrinode.level = level
+            kolibrinode.tree_id = 1
+            ordered.append(kolibrinode)
+            stack.append((kolibrinode, level, True))
+            stack.extend(
+                (child, level + 1, False)
+                for child in reversed(nodes_by_parent[kolibrinode.id])
+            )
+        return ordered
+
+    def _create_nodes(self, ordered):
+        kolibrimodels.ContentNode.objects.bulk_create(ordered)
+
+    def _write_rows(self, ordered):
+        licenses = {}
+        for kolibrinode in ordered:
+            license_fields = self._node_licenses.get(kolibrinode.id)
+            if license_fields is not None:
+                key = tuple(license_fields.values())
+                if key not in licenses:
+                    licenses[key] = kolibrimodels.License.objects.get_or_create(
+                        **license_fields
+                    )[0]
+                kolibrinode.license = licenses[key]
+
+        self._create_nodes(ordered)
+
+        kolibrimodels.AssessmentMetaData.objects.bulk_create(
+            kolibrimodels.AssessmentMetaData(
+                contentnode_id=kolibrinode.id,
+                **self._assessment_metadata[kolibrinode.id],
+            )
+            for kolibrinode in ordered
+            if kolibrinode.id in self._assessment_metadata
+        )
+
+        # The TreeMapper creates files and tags after a node's descendants have been mapped.
+        post_order = sorted(ordered, key=lambda n: n.rght)
+
+        local_files = {}
+        files = []
+        tags = {}
+        node_tags = []
+        for kolibrinode in post_order:
+            for local_file_defaults, file_fields in self._node_files[kolibrinode.id]:
+                checksum = file_fields["checksum"]
+                if checksum not in local_files:
+                    local_files[checksum] = kolibrimodels.LocalFile(
+                        id=checksum, **local_file_defaults
+                    )
+                files.append(
+                    kolibrimodels.File(
+                        contentnode_id=kolibrinode.id,
+                        local_file_id=checksum,
+                        **file_fields,
+                    )
+                )
+            for tag in self._node_tags[kolibrinode.id]:
+                if tag.pk not in tags:
+                    tags[tag.pk] = kolibrimodels.ContentTag(
+                        id=tag.pk, tag_name=tag.tag_name
+                    )
+                if len(tag.tag_name) <= MAX_TAG_LENGTH:
+                    node_tags.append(
+                        kolibrimodels.ContentNode.tags.through(
+                            contentnode_id=kolibrinode.id, contenttag_id=tag.pk
+                        )
+                    )
+
+        # The IncrementalTreeMapper writes into a database that can already have these rows
+        kolibrimodels.LocalFile.objects.bulk_create(
+            local_files.values(), ignore_conflicts=True
+        )
+        kolibrimodels.File.objects.bulk_create(files)
+        kolibrimodels.ContentTag.objects.bulk_create(
+            tags.values(), ignore_conflicts=True
+        )
+        kolibrimodels.ContentNode.tags.through.objects.bulk_create(node_tags)
+
+    def map_nodes(self):
+        children, has_resources, publishable = self._load_tree_structure()
+        if self.exercise_archive_workers > 1:
+            self._build_exercise_archives(
+                self._get_mapped_node_ids(children, publishable, self.root_node.id)
+            )
+        level = [(self.root_node.id, None, {})]
+        while level:
+            level = self._map_level(level, children, has_resources, publishable)
+        if self._kolibri_nodes:
+            self._write_rows(self._assign_mptt_fields())
+
+
+class IncrementalTreeMapper(BulkTreeMapper):
+    """
+    Maps the tree into an export database that already holds the tree as it was last published.
+
+    Only the nodes that have changed since are mapped again. Nodes that have been added or moved
+    are mapped along with their descendants, while nodes that have been edited only have their own
+    rows replaced. The rows of nodes that are no longer published are deleted, the rows of the rest
+    of the tree are kept as they are, and the MPTT fields of the whole tree are then renumbered.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(IncrementalTreeMapper, self).__init__(*args, **kwargs)
+        # Kolibri ids of the exported nodes whose rows are replaced in place
+        self._replaced_ids = set()
+
+    def _load_studio_nodes(self):
+        return {
+            node.id: node
+            for node in self.root_node.get_descendants(include_self=True).values_list(
+                "id", "node_id", "parent_id", "kind_id", "changed", "lft", named=True
+            )
+        }
+
+    def _get_nodes_with_changed_files(self):
+        """
+        Returns the Kolibri ids of the nodes whose exported files differ from their Studio files.
+        Thumbnails are exported as files generated from the thumbnail encodings of their nodes,
+        so they are compared by the checksums of the files their encodings generate.
+        """
+        exported_files = defaultdict(set)
+        for (
+            kolibri_id,
+            file_id,
+            checksum,
+            preset,
+            lang_id,
+            thumbnail,
+        ) in kolibrimodels.File.objects.values_list(
+            "contentnode_id", "id", "local_file_id", "preset", "lang_id", "thumbnail"
+        ):
+            exported_files[kolibri_id].add(
+                (preset, checksum)
+                if thumbnail
+                else (file_id, checksum, preset, lang_id)
+            )
+
+        files = defaultdict(set)
+        tree_files = ccmodels.File.objects.filter(
+            EXPORTED_FILES_FILTER, contentnode__tree_id=self.root_node.tree_id
+        )
+        for kolibri_id, *file_fields in tree_files.filter(
+            preset__thumbnail=False
+        ).values_list(
+            "contentnode__node_id", "id", "checksum", "preset_id", "language_id"
+        ):
+            files[kolibri_id].add(tuple(file_fields))
+        for kolibri_id, preset, thumbnail_encoding in tree_files.filter(
+            preset__thumbnail=True
+        ).values_list(
+            "contentnode__node_id", "preset_id", "contentnode__thumbnail_encoding"
+        ):
+            files[kolibri_id].add(
+                (preset, get_exported_thumbnail_checksum(thumbnail_encoding))
+            )
+
+        return {
+            kolibri_id
+            for kolibri_id in set(exported_files) | set(files)
+            if exported_files[kolibri_id] != files[kolibri_id]
+        }
+
+    def _get_changes(self, nodes, children, publishable):
+        """
+        Compares the tree with the exported one.
+
+        :return: The ids of the Studio nodes to map along with their descendants, the ids of the
+            Studio nodes to map on their own, and the Kolibri ids of the exported nodes that are
+            no longer published
+        """
+        exported = dict(
+            kolibrimodels.ContentNode.objects.values_list("id", "parent_id")
+        )
+        changed_files = self._get_nodes_with_changed_files()
+        mapped = self._get_mapped_node_ids(children, publishable, self.root_node.id)
+
+        subtrees = set()
+        rows = set()
+        for node_id in mapped:
+            node = nodes[node_id]
+            parent = nodes.get(node.parent_id)
+            kolibri_parent_id = parent.node_id if parent else None
+            if exported.get(node.node_id, False) != kolibri_parent_id:
+                # The node has been added or moved
+                subtrees.add(node_id)
+            elif (
+                node.changed
+                and self.inherit_metadata
+                and node.kind_id == content_kinds.TOPIC
+            ):
+                # The descendants of the topic may inherit the changes to its metadata
+                subtrees.add(node_id)
+            elif node.changed or node.node_id in changed_files:
+                rows.add(node_id)
+
+        mapped_kolibri_ids = {nodes[node_id].node_id for node_id in mapped}
+        removed = [
+            kolibri_id
+            for kolibri_id in exported
+            if kolibri_id not in mapped_kolibri_ids
+        ]
+        return subtrees, rows, removed
+
+    def _get_nodes_to_map(self, children, subtrees, rows):
+        """
+        Returns the roots of the subtrees to map, and the nodes to map on their own that are
+        outside of those subtrees, in tree order.
+        """
+        node_ids = []
+        stack = [self.root_node.id]
+        while stack:
+            node_id = stack.pop()
+            if node_id in subtrees:
+                node_ids.append(node_id)
+                continue
+            if node_id in rows:
+                node_ids.append(node_id)
+            stack.extend(reversed(children[node_id]))
+        return node_ids
+
+    def _delete_exported_subtrees(self, kolibri_ids):
+        kolibri_ids = list(kolibri_ids)
+        subtrees = []
+        for i in range(0, len(kolibri_ids), BULK_MAPPING_BATCH_SIZE):
+            subtrees.extend(
+                kolibrimodels.ContentNode.objects.filter(
+                    id__in=kolibri_ids[i : i + BULK_MAPPING_BATCH_SIZE]
+                ).values_list("lft", "rght")
+            )
+        # Subtrees nested in one deleted before them are already gone
+        for lft, rght in subtrees:
+            subtree = kolibrimodels.ContentNode.objects.filter(
+                lft__gte=lft, rght__lte=rght
+            )
+            kolibrimodels.File.objects.filter(contentnode__in=subtree).delete()
+            kolibrimodels.AssessmentMetaData.objects.filter(
+                contentnode__in=subtree
+            ).delete()
+            kolibrimodels.ContentNode.tags.through.objects.filter(
+                contentnode__in=subtree
+            ).delete()
+            subtree.delete()
+
+    def _delete_exported_node_data(self, kolibri_ids):
+        kolibri_ids = list(kolibri_ids)
+        for i in range(0, len(kolibri_ids), BULK_MAPPING_BATCH_SIZE):
+            batch = kolibri_ids[i : i + BULK_MAPPING_BATCH_SIZE]
+            kolibrimodels.File.objects.filter(contentnode_id__in=batch).delete()
+            kolibrimodels.AssessmentMetaData.objects.filter(
+                contentnode_id__in=batch
+            ).delete()
+            kolibrimodels.ContentNode.tags.through.objects.filter(
+                contentnode_id__in=batch
+            ).delete()
+
+    def _get_first_level(self, node_ids, nodes):
+        """
+        Returns the nodes to map in the form _map_level takes, along with the metadata each of
+        them inherits from its ancestors.
+        """
+        ancestor_ids = set()
+        for node_id in node_ids:
+            parent_id = nodes[node_id].parent_id
+            while parent_id in nodes and parent_id not in ancestor_ids:
+                ancestor_ids.add(parent_id)
+                parent_id = nodes[parent_id].parent_id
+        ancestors = {node.id: node for node in self._load_nodes(sorted(ancestor_ids))}
+
+        inherited_metadata = {}
+
+        def get_inherited_metadata(node_id):
+            # The metadata that the children of a node inherit
+            if node_id not in nodes:
+                return {}
+            if node_id not in inherited_metadata:
+                path = []
+                while node_id in nodes and node_id not in inherited_metadata:
+                    path.append(node_id)
+                    node_id = nodes[node_id].parent_id
+                for ancestor_id in reversed(path):
+                    inherited_metadata[ancestor_id] = self._gather_inherited_metadata(
+                        ancestors[ancestor_id],
+                        inherited_metadata.get(nodes[ancestor_id].parent_id, {}),
+                    )
+                node_id = path[0]
+            return inherited_metadata[node_id]
+
+        level = []
+        for node_id in node_ids:
+            parent_id = nodes[node_id].parent_id
+            kolibri_parent_id = nodes[parent_id].node_id if parent_id in nodes else None
+            level.append(
+                (node_id, kolibri_parent_id, get_inherited_metadata(parent_id))
+            )
+        return level
+
+    def _get_kolibri_children(self, nodes, new_nodes):
+        """
+        Returns the child ids of each Kolibri node, ordered as they are in the Studio tree,
+        along with the MPTT fields of the rows that are kept.
+        """
+        kept = {}
+        children = defaultdict(list)
+        for (
+            kolibri_id,
+            parent_id,
+            lft,
+            rght,
+            level,
+        ) in kolibrimodels.ContentNode.objects.values_list(
+            "id", "parent_id", "lft", "rght", "level"
+        ).iterator():
+            if kolibri_id in new_nodes:
+                continue
+            kept[kolibri_id] = (lft, rght, level)
+            children[parent_id].append(kolibri_id)
+        for kolibrinode in new_nodes.values():
+            children[kolibrinode.parent_id].append(kolibrinode.id)
+
+        sort_keys = {node.node_id: node.lft for node in nodes.values()}
+        for siblings in children.values():
+            siblings.sort(key=sort_keys.__getitem__)
+        return children, kept
+
+    def _renumber_tree(self, nodes):
+        """
+        Numbers the whole Kolibri tree the way the BulkTreeMapper does, updating the MPTT fields
+        of the kept rows, and returns the newly mapped nodes in tree order.
+        """
+        new_nodes = {kolibrinode.id: kolibrinode for kolibrinode in self._kolibri_nodes}
+        children, kept = self._get_kolibri_children(nodes, new_nodes)
+
+        ordered = []
+        updates = []
+        lfts = {}
+        counter = 0
+        stack = [(kolibri_id, 0, False) for kolibri_id in reversed(children[None])]
+        while stack:
+            kolibri_id, level, visited = stack.pop()
+            counter += 1
+            if not visited:
+                lfts[kolibri_id] = counter
+                stack.append((kolibri_id, level, True))
+                stack.extend(
+                    (child_id, level + 1, False)
+                    for child_id in reversed(children[kolibri_id])
+                )
+                if kolibri_id in new_nodes:
+                    kolibrinode = new_nodes[kolibri_id]
+                    kolibrinode.lft = counter
+                    kolibrinode.level = level
+                    kolibrinode.tree_id = 1
+                    ordered.append(kolibrinode)
+            elif kolibri_id in new_nodes:
+                new_nodes[kolibri_id].rght = counter
+            elif kept[kolibri_id] != (lfts[kolibri_id], counter, level):
+                updates.append((lfts[kolibri_id], counter, level, kolibri_id))
+
+        if updates:
+            database = get_active_content_database()
+            with transaction.atomic(using=database), connections[
+                database
+            ].cursor() as cursor:
+                cursor.executemany(
+                    "UPDATE {} SET lft = %s, rght = %s, level = %s WHERE id = %s".format(
+                        kolibrimodels.ContentNode._meta.db_table
+                    ),
+                    updates,
+                )
+        return ordered
+
+    def _delete_unused_rows(self):
+        """
+        Deletes the rows that were only used by the nodes of the replaced subtrees.
+        """
+        kolibrimodels.LocalFile.objects.filter(
+            ~Exists(kolibrimodels.File.objects.filter(local_file_id=OuterRef("id")))
+        ).delete()
+        kolibrimodels.License.objects.filter(
+            ~Exists(kolibrimodels.ContentNode.objects.filter(license_id=OuterRef("id")))
+        ).delete()
+        kolibrimodels.Language.objects.filter(
+            ~Exists(kolibrimodels.ContentNode.objects.filter(lang_id=OuterRef("id"))),
+            ~Exists(kolibrimodels.File.objects.filter(lang_id=OuterRef("id"))),
+        ).delete()
+
+        # Tags that are too long are exported without being linked to their nodes,
+        # so the tags in use are read from the Studio tree.
+        kolibri_ids = set(
+            kolibrimodels.ContentNode.objects.values_list("id", flat=True)
+        )
+        tag_ids = {
+            tag_id
+            for kolibri_id, tag_id in ccmodels.ContentNode.tags.through.objects.filter(
+                contentnode__tree_id=self.root_node.tree_id
+            ).values_list("contentnode__node_id", "contenttag_id")
+            if kolibri_id in kolibri_ids
+        }
+        unused_tag_ids = [
+            tag_id
+            for tag_id in kolibrimodels.ContentTag.objects.values_list("id", flat=True)
+            if tag_id not in tag_ids
+        ]
+        for i in range(0, len(unused_tag_ids), BULK_MAPPING_BATCH_SIZE):
+            kolibrimodels.ContentTag.objects.filter(
+                id__in=unused_tag_ids[i : i + BULK_MAPPING_BATCH_SIZE]
+            ).delete()
+
+    def _create_nodes(self, ordered):
+        super(IncrementalTreeMapper, self)._create_nodes(
+            [
+                kolibrinode
+                for kolibrinode in ordered
+                if kolibrinode.id not in self._replaced_ids
+            ]
+        )
+        kolibrimodels.ContentNode.objects.bulk_update(
+            [
+                kolibrinode
+                for kolibrinode in ordered
+                if kolibrinode.id in self._replaced_ids
+            ],
+            [
+                field.name
+                for field in kolibrimodels.ContentNode._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+
+    def map_nodes(self):
+        # The channel metadata and prerequisites are mapped afresh after the tree
+        kolibrimodels.ChannelMetadata.objects.all().delete()
+        kolibrimodels.ContentNode.has_prerequisite.through.objects.all().delete()
+
+        children, has_resources, publishable = self._load_tree_structure()
+        nodes = self._load_studio_nodes()
+        subtrees, rows, removed = self._get_changes(nodes, children, publishable)
+        node_ids = self._get_nodes_to_map(children, subtrees, rows)
+        if not node_ids and not removed:
+            return
+        logging.debug(
+            "Mapping {} changed nodes and removing {} nodes".format(
+                len(node_ids), len(removed)
+            )
+        )
+
+        self._replaced_ids = {
+            nodes[node_id].node_id for node_id in node_ids if node_id in rows
+        }
+        self._delete_exported_subtrees(
+            removed
+            + [nodes[node_id].node_id for node_id in node_ids if node_id in subtrees]
+        )
+        self._delete_exported_node_data(self._replaced_ids)
+
+        if self.exercise_archive_workers > 1:
+            self._build_exercise_archives(
+                list(
+                    chain.from_iterable(
+                        self._get_mapped_node_ids(children, publishable, node_id)
+                        if node_id in subtrees
+                        else [node_id]
+                        for node_id in node_ids
+                    )
+                )
+            )
+
+        level = self._get_first_level(node_ids, nodes)
+        while level:
+            # The children of the nodes that are replaced in place are kept
+            level = [
+                (node_id, parent_id, inherited_fields)
+                for node_id, parent_id, inherited_fields in self._map_level(
+                    level, children, has_resources, publishable
+                )
+                if parent_id not in self._replaced_ids
+            ]
+
+        # Nodes can fail to map, e.g. exercises without a mastery model, in which
+        # case the whole tree mapping leaves out their subtrees.
+        unmapped_ids = self._replaced_ids - {
+            kolibrinode.id for kolibrinode in self._kolibri_nodes
+        }
+        if unmapped_ids:
+            self._delete_exported_subtrees(unmapped_ids)
+            self._replaced_ids -= unmapped_ids
+
+        ordered = self._renumber_tree(nodes)
+        if ordered:
+            self._write_rows(ordered)
+        self._delete_unused_rows()
+
+
+def _discard_exercise_archives(archives):
+    """
+    Discards the exercise archives that were built but will not be saved.
+    """
+    for archive in archives:
+        if not archive.cancel() and archive.exception() is None:
+            archive.result().discard()
+
+
+def get_tree_mapper_class(bulk_mapping=None, incremental=False):
+    if incremental:
+        return IncrementalTreeMapper
+    if bulk_mapping is None:
+        bulk_mapping = settings.PUBLISH_BULK_TREE_MAPPING
+    return BulkTreeMapper if bulk_mapping else TreeMapper
+
+
 def create_slideshow_manifest(ccnode, user_id=None):
     print("Creating slideshow manifest...")  # noqa: T201
 
@@ -490,49 +1451,54 @@ def create_slideshow_manifest(ccnode, user_id=None):
         temp_manifest.close()
 
 
-def create_bare_contentnode(  # noqa: C901
-    ccnode, default_language, channel_id, channel_name, metadata
-):
-    logging.debug(
-        "Creating a Kolibri contentnode for instance id {}".format(ccnode.node_id)
-    )
+def get_contentnode_options(ccnode):
+    if ccnode.extra_fields and "options" in ccnode.extra_fields:
+        return ccnode.extra_fields["options"]
+    return {}
+
+
+def get_completion_criteria_duration(options):
+    ccnode_completion_criteria = options.get("completion_criteria")
+    if ccnode_completion_criteria and (
+        ccnode_completion_criteria["model"] == completion_criteria.TIME
+        or ccnode_completion_criteria["model"] == completion_criteria.APPROX_TIME
+    ):
+        return ccnode_completion_criteria["threshold"]
+    return None
 
-    kolibri_license = None
-    if ccnode.license is not None:
-        kolibri_license = create_kolibri_license_object(ccnode)[0]
 
-    language = (
+def get_contentnode_language(ccnode, default_language, metadata):
+    return (
         ccnode.language
         if ccnode.kind_id == content_kinds.TOPIC
         else metadata.get("language")
     ) or default_language
-    if language:
-        language, _new = get_or_create_language(language)
 
-    duration = None
-    if ccnode.kind_id in [content_kinds.AUDIO, content_kinds.VIDEO]:
-        # aggregate duration from associated files, choosing maximum if there are multiple, like hi and lo res videos
-        duration = ccnode.files.aggregate(duration=Max("duration")).get("duration")
 
-    options = {}
-    if ccnode.extra_fields and "options" in ccnode.extra_fields:
-        options = ccnode.extra_fields["options"]
+def get_kolibri_license_fields(ccnode):
+    use_license_description = not ccnode.license.is_custom
+    return {
+        "license_name": ccnode.license.license_name,
+        "license_description": ccnode.license.license_description
+        if use_license_description
+        else ccnode.license_description,
+    }
 
-    duration = None
-    ccnode_completion_criteria = options.get("completion_criteria")
-    if ccnode_completion_criteria:
-        if (
-            ccnode_completion_criteria["model"] == completion_criteria.TIME
-            or ccnode_completion_criteria["model"] == completion_criteria.APPROX_TIME
-        ):
-            duration = ccnode_completion_criteria["threshold"]
-    if duration is None and ccnode.kind_id in [
-        content_kinds.AUDIO,
-        content_kinds.VIDEO,
-    ]:
-        # aggregate duration from associated files, choosing maximum if there are multiple, like hi and lo res videos.
-        duration = ccnode.files.aggregate(duration=Max("duration")).get("duration")
 
+def map_contentnode_fields(
+    ccnode,
+    channel_id,
+    channel_name,
+    metadata,
+    kolibri_license,
+    language,
+    duration,
+    available,
+):
+    """
+    Returns the field values of the Kolibri ContentNode for a Studio node, other than its
+    primary key and its position in the tree.
+    """
     learning_activities = None
     accessibility_labels = None
     if ccnode.kind_id != content_kinds.TOPIC:
@@ -563,42 +1529,75 @@ def create_bare_contentnode(  # noqa: C901
         else metadata["learner_needs"]
     )
 
+    return {
+        "kind": ccnode.kind.kind,
+        "title": ccnode.title if ccnode.parent_id else channel_name,
+        "content_id": ccnode.content_id,
+        "channel_id": channel_id,
+        "author": ccnode.author or "",
+        "description": ccnode.description,
+        "sort_order": ccnode.sort_order,
+        "license_owner": ccnode.copyright_holder or "",
+        "license": kolibri_license,
+        "available": available,  # Hide empty topics
+        "stemmed_metaphone": "",  # Stemmed metaphone is no longer used, and will cause no harm if blank
+        "lang": language,
+        "license_name": kolibri_license.license_name
+        if kolibri_license is not None
+        else None,
+        "license_description": kolibri_license.license_description
+        if kolibri_license is not None
+        else None,
+        "coach_content": ccnode.role_visibility == roles.COACH,
+        "duration": duration,
+        "options": get_contentnode_options(ccnode),
+        # Fields for metadata labels
+        "grade_levels": ",".join(grade_levels.keys()) if grade_levels else None,
+        "resource_types": ",".join(resource_types.keys()) if resource_types else None,
+        "learning_activities": learning_activities,
+        "accessibility_labels": accessibility_labels,
+        "categories": ",".join(categories.keys()) if categories else None,
+        "learner_needs": ",".join(learner_needs.keys()) if learner_needs else None,
+    }
+
+
+def create_bare_contentnode(
+    ccnode, default_language, channel_id, channel_name, metadata
+):
+    logging.debug(
+        "Creating a Kolibri contentnode for instance id {}".format(ccnode.node_id)
+    )
+
+    kolibri_license = None
+    if ccnode.license is not None:
+        kolibri_license = create_kolibri_license_object(ccnode)[0]
+
+    language = get_contentnode_language(ccnode, default_language, metadata)
+    if language:
+        language, _new = get_or_create_language(language)
+
+    duration = get_completion_criteria_duration(get_contentnode_options(ccnode))
+    if duration is None and ccnode.kind_id in [
+        content_kinds.AUDIO,
+        content_kinds.VIDEO,
+    ]:
+        # aggregate duration from associated files, choosing maximum if there are multiple, like hi and lo res videos.
+        duration = ccnode.files.aggregate(duration=Max("duration")).get("duration")
+
     kolibrinode, is_new = kolibrimodels.ContentNode.objects.update_or_create(
         pk=ccnode.node_id,
-        defaults={
-            "kind": ccnode.kind.kind,
-            "title": ccnode.title if ccnode.parent else channel_name,
-            "content_id": ccnode.content_id,
-            "channel_id": channel_id,
-            "author": ccnode.author or "",
-            "description": ccnode.description,
-            "sort_order": ccnode.sort_order,
-            "license_owner": ccnode.copyright_holder or "",
-            "license": kolibri_license,
-            "available": ccnode.get_descendants(include_self=True)
+        defaults=map_contentnode_fields(
+            ccnode,
+            channel_id,
+            channel_name,
+            metadata,
+            kolibri_license,
+            language,
+            duration,
+            ccnode.get_descendants(include_self=True)
             .exclude(kind_id=content_kinds.TOPIC)
-            .exists(),  # Hide empty topics
-            "stemmed_metaphone": "",  # Stemmed metaphone is no longer used, and will cause no harm if blank
-            "lang": language,
-            "license_name": kolibri_license.license_name
-            if kolibri_license is not None
-            else None,
-            "license_description": kolibri_license.license_description
-            if kolibri_license is not None
-            else None,
-            "coach_content": ccnode.role_visibility == roles.COACH,
-            "duration": duration,
-            "options": options,
-            # Fields for metadata labels
-            "grade_levels": ",".join(grade_levels.keys()) if grade_levels else None,
-            "resource_types": ",".join(resource_types.keys())
-            if resource_types
-            else None,
-            "learning_activities": learning_activities,
-            "accessibility_labels": accessibility_labels,
-            "categories": ",".join(categories.keys()) if categories else None,
-            "learner_needs": ",".join(learner_needs.keys()) if learner_needs else None,
-        },
+            .exists(),
+        ),
     )
 
     if ccnode.parent:
@@ -613,9 +1612,12 @@ def create_bare_contentnode(  # noqa: C901
 
     kolibrinode.save()
     logging.debug("Created Kolibri ContentNode with node id {}".format(ccnode.node_id))
-    logging.debug(
-        "Kolibri node count: {}".format(kolibrimodels.ContentNode.objects.all().count())
-    )
+    if logging.isEnabledFor(logmodule.DEBUG):
+        logging.debug(
+            "Kolibri node count: {}".format(
+                kolibrimodels.ContentNode.objects.all().count()
+            )
+        )
 
     return kolibrinode
 
@@ -682,14 +1684,98 @@ def create_associated_thumbnail(ccnode, ccfilemodel):
     )
 
 
+def get_exported_thumbnail_checksum(thumbnail_encoding):
+    """
+    Returns the checksum of the thumbnail file create_associated_thumbnail exports for a node
+    with the given thumbnail encoding, or None when it has no valid encoding to export.
+    """
+    try:
+        encoding = thumbnail_encoding and load_json_string(thumbnail_encoding).get(
+            "base64"
+        )
+    except ValueError:
+        return None
+    encoding_match = encoding and get_base64_encoding(encoding)
+    if not encoding_match:
+        return None
+    return hashlib.md5(
+        base64.decodebytes(encoding_match.group(2).encode("utf-8"))
+    ).hexdigest()
+
+
+# Exercise images are bundled into the exercise archives, so are not exported on their own.
+EXPORTED_FILES_FILTER = ~(
+    Q(preset_id=format_presets.EXERCISE_IMAGE)
+    | Q(preset_id=format_presets.EXERCISE_GRAPHIE)
+)
+
+
+def map_file_fields(ccfilemodel, preset, fformat, qti_embeds_perseus=False):
+    """
+    Returns the LocalFile defaults and the Kolibri File field values for a Studio file,
+    other than the File's contentnode and local_file.
+    """
+    # The true size lives in the studio#5974 file_size_bigint shadow (the
+    # legacy 32-bit file_size cannot hold >2.1 GB); fall back to file_size
+    # for rows the shadow has not been backfilled onto yet.
+    real_size = ccfilemodel.file_size_bigint
+    if real_size is None:
+        real_size = ccfilemodel.file_size
+    if real_size is not None and real_size > INT_32BIT_MAX:
+        legacy_size = None
+    else:
+        legacy_size = real_size
+
+    included_presets = None
+    if not preset.supplementary:
+        try:
+            included_presets = 2 ** RENDERABLE_PRESETS_ORDER.index(preset.pk)
+        except ValueError:
+            # Renderable preset not in the (append-only) ordering — e.g. a newer
+            # le-utils preset. Log and leave included_presets NULL for this file
+            # rather than aborting the whole channel publish.
+            logging.warning(
+                "Preset %s missing from RENDERABLE_PRESETS_ORDER; leaving "
+                "included_presets NULL for file %s",
+                preset.pk,
+                ccfilemodel.pk,
+            )
+
+    # EXERCISE bit: a mixed QTI package embeds raw Perseus custom
+    # interactions, so it also needs the Perseus renderer (see recurse_nodes).
+    if (
+        included_presets is not None
+        and preset.pk == format_presets.QTI_ZIP
+        and qti_embeds_perseus
+    ):
+        included_presets |= 2 ** RENDERABLE_PRESETS_ORDER.index(format_presets.EXERCISE)
+
+    local_file_defaults = {
+        "extension": fformat.extension,
+        "file_size": legacy_size,
+        "file_size_bigint": real_size,
+    }
+    file_fields = {
+        "id": ccfilemodel.pk,
+        "checksum": ccfilemodel.checksum,
+        "extension": fformat.extension,
+        "available": True,  # TODO: Set this to False, once we have availability stamping implemented in Kolibri
+        "file_size": legacy_size,
+        "preset": preset.pk,
+        "supplementary": preset.supplementary,
+        "lang_id": ccfilemodel.language and ccfilemodel.language.pk,
+        "thumbnail": preset.thumbnail,
+        "priority": preset.order,
+        "included_presets": included_presets,
+    }
+    return local_file_defaults, file_fields
+
+
 def create_associated_file_objects(kolibrinode, ccnode, qti_embeds_perseus=False):
     logging.debug(
         "Creating LocalFile and File objects for Node {}".format(kolibrinode.id)
     )
-    for ccfilemodel in ccnode.files.exclude(
-        Q(preset_id=format_presets.EXERCISE_IMAGE)
-        | Q(preset_id=format_presets.EXERCISE_GRAPHIE)
-    ):
+    for ccfilemodel in ccnode.files.filter(EXPORTED_FILES_FILTER):
         preset = ccfilemodel.preset
         fformat = ccfilemodel.file_format
         if ccfilemodel.language:
@@ -700,66 +1786,19 @@ def create_associated_file_objects(kolibrinode, ccnode, qti_embeds_perseus=False
                 create_associated_thumbnail(ccnode, ccfilemodel) or ccfilemodel
             )
 
-        # The true size lives in the studio#5974 file_size_bigint shadow (the
-        # legacy 32-bit file_size cannot hold >2.1 GB); fall back to file_size
-        # for rows the shadow has not been backfilled onto yet.
-        real_size = ccfilemodel.file_size_bigint
-        if real_size is None:
-            real_size = ccfilemodel.file_size
-        if real_size is not None and real_size > INT_32BIT_MAX:
-            legacy_size = None
-        else:
-            legacy_size = real_size
+        local_file_defaults, file_fields = map_file_fields(
+            ccfilemodel, preset, fformat, qti_embeds_perseus
+        )
 
         kolibrilocalfilemodel, new = kolibrimodels.LocalFile.objects.get_or_create(
             pk=ccfilemodel.checksum,
-            defaults={
-                "extension": fformat.extension,
-                "file_size": legacy_size,
-                "file_size_bigint": real_size,
-            },
+            defaults=local_file_defaults,
         )
 
-        included_presets = None
-        if not preset.supplementary:
-            try:
-                included_presets = 2 ** RENDERABLE_PRESETS_ORDER.index(preset.pk)
-            except ValueError:
-                # Renderable preset not in the (append-only) ordering — e.g. a newer
-                # le-utils preset. Log and leave included_presets NULL for this file
-                # rather than aborting the whole channel publish.
-                logging.warning(
-                    "Preset %s missing from RENDERABLE_PRESETS_ORDER; leaving "
-                    "included_presets NULL for file %s",
-                    preset.pk,
-                    ccfilemodel.pk,
-                )
-
-        # EXERCISE bit: a mixed QTI package embeds raw Perseus custom
-        # interactions, so it also needs the Perseus renderer (see recurse_nodes).
-        if (
-            included_presets is not None
-            and preset.pk == format_presets.QTI_ZIP
-            and qti_embeds_perseus
-        ):
-            included_presets |= 2 ** RENDERABLE_PRESETS_ORDER.index(
-                format_presets.EXERCISE
-            )
-
         kolibrimodels.File.objects.create(
-            pk=ccfilemodel.pk,
-            checksum=ccfilemodel.checksum,
-            extension=fformat.extension,
-            available=True,  # TODO: Set this to False, once we have availability stamping implemented in Kolibri
-            file_size=legacy_size,
             contentnode=kolibrinode,
-            preset=preset.pk,
-            supplementary=preset.supplementary,
-            lang_id=ccfilemodel.language and ccfilemodel.language.pk,
-            thumbnail=preset.thumbnail,
-            priority=preset.order,
             local_file=kolibrilocalfilemodel,
-            included_presets=included_presets,
+            **file_fields,
         )
 
 
@@ -836,7 +1875,11 @@ def process_assessment_metadata(ccnode):
     return exercise_data
 
 
-def create_kolibri_assessment_metadata(ccnode, kolibrinode):
+def map_assessment_metadata_fields(ccnode):
+    """
+    Returns the field values of the Kolibri AssessmentMetaData for an exercise,
+    other than its contentnode.
+    """
     assessment_items = ccnode.assessment_items.all().order_by("order")
     assessment_item_ids = [a.assessment_id for a in assessment_items]
     randomize, _, mastery_model = _get_exercise_data_from_ccnode(
@@ -848,14 +1891,20 @@ def create_kolibri_assessment_metadata(ccnode, kolibrinode):
         with qti_file.file_on_disk.open("rb") as file_handle:
             assessment_item_ids = get_assessment_ids_from_manifest(file_handle)
 
+    return {
+        "id": uuid.uuid4(),
+        "assessment_item_ids": assessment_item_ids,
+        "number_of_assessments": len(assessment_item_ids),
+        "mastery_model": mastery_model,
+        "randomize": randomize,
+        "is_manipulable": ccnode.kind_id == content_kinds.EXERCISE,
+    }
+
+
+def create_kolibri_assessment_metadata(ccnode, kolibrinode):
     kolibrimodels.AssessmentMetaData.objects.create(
-        id=uuid.uuid4(),
         contentnode=kolibrinode,
-        assessment_item_ids=assessment_item_ids,
-        number_of_assessments=len(assessment_item_ids),
-        mastery_model=mastery_model,
-        randomize=randomize,
-        is_manipulable=ccnode.kind_id == content_kinds.EXERCISE,
+        **map_assessment_metadata_fields(ccnode),
     )
 
 
@@ -999,61 +2048,166 @@ def add_tokens_to_channel(channel):
         channel.make_token()
 
 
-def fill_published_fields(channel, version_notes, draft_channel_version=None):
-    is_draft = draft_channel_version is not None
-    date_now = timezone.now()
+class PublishedStatistics:
+    """
+    Accumulates the statistics of the published nodes of a channel and their files.
+    """
 
-    published_nodes = (
+    def __init__(self):
+        self.resource_count = 0
+        self._kind_counts = defaultdict(int)
+        self._languages = set()
+        self._licenses = set()
+        self._categories = set()
+        self._license_descriptions = defaultdict(set)
+        self._files = set()
+
+    def add_node(
+        self, kind_id, language_id, license_id, license_description, categories
+    ):
+        if kind_id != content_kinds.TOPIC:
+            self.resource_count += 1
+        self._kind_counts[kind_id] += 1
+        if language_id:
+            self._languages.add(language_id)
+        if license_id is not None:
+            self._licenses.add(license_id)
+            if license_description:
+                self._license_descriptions[license_id].add(license_description)
+        if categories:
+            self._categories.update(categories.keys())
+
+    def add_file(self, checksum, file_size, language_id):
+        self._files.add((checksum, file_size))
+        if language_id:
+            self._languages.add(language_id)
+
+    @property
+    def kind_counts(self):
+        return [
+            {"kind_id": kind_id, "count": count}
+            for kind_id, count in sorted(self._kind_counts.items())
+        ]
+
+    @property
+    def size(self):
+        return sum(file_size for _, file_size in self._files if file_size)
+
+    @property
+    def languages(self):
+        return list(self._languages)
+
+    @property
+    def licenses(self):
+        return sorted(self._licenses)
+
+    @property
+    def categories(self):
+        return sorted(self._categories)
+
+    def get_license_descriptions(self, license_id):
+        return sorted(self._license_descriptions[license_id])
+
+
+def get_published_statistics(channel):
+    """
+    Reads the published nodes of the channel along with their files in a single query, and
+    returns their PublishedStatistics.
+    """
+    statistics = PublishedStatistics()
+    previous_node_id = None
+    for (
+        node_id,
+        kind_id,
+        language_id,
+        license_id,
+        license_description,
+        categories,
+        checksum,
+        file_size,
+        file_language_id,
+    ) in (
         channel.main_tree.get_descendants()
         .filter(published=True)
-        .prefetch_related("files")
-    )
-    total_resource_count = published_nodes.exclude(kind_id=content_kinds.TOPIC).count()
-    kind_counts = list(
-        published_nodes.values("kind_id")
-        .annotate(count=Count("kind_id"))
-        .order_by("kind_id")
-    )
-    published_size = (
-        published_nodes.values("files__checksum", "files__file_size")
-        .distinct()
-        .aggregate(resource_size=Sum("files__file_size"))["resource_size"]
-        or 0
-    )
+        .order_by("lft")
+        .values_list(
+            "id",
+            "kind_id",
+            "language_id",
+            "license_id",
+            "license_description",
+            "categories",
+            "files__checksum",
+            "files__file_size",
+            "files__language_id",
+        )
+        .iterator()
+    ):
+        # The rows of a node are consecutive, one for each of its files
+        if node_id != previous_node_id:
+            previous_node_id = node_id
+            statistics.add_node(
+                kind_id, language_id, license_id, license_description, categories
+            )
+        if checksum is not None:
+            statistics.add_file(checksum, file_size, file_language_id)
+    return statistics
 
-    node_languages = published_nodes.exclude(language=None).values_list(
-        "language", flat=True
-    )
-    file_languages = published_nodes.exclude(files__language=None).values_list(
-        "files__language", flat=True
-    )
-    language_list = list(set(chain(node_languages, file_languages)))
 
-    included_licenses = published_nodes.exclude(license=None).values_list(
-        "license", flat=True
-    )
-    license_list = sorted(set(included_licenses))
+class QueryCounter:
+    """
+    Counts the queries run on a database connection, when installed with
+    connection.execute_wrapper.
+    """
 
-    included_categories_dicts = published_nodes.exclude(categories=None).values_list(
-        "categories", flat=True
-    )
-    category_list = sorted(
-        set(
-            chain.from_iterable(
-                (
-                    node_categories_dict.keys()
-                    for node_categories_dict in included_categories_dicts
-                )
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def fill_published_fields(
+    channel, version_notes, draft_channel_version=None, progress_tracker=None
+):
+    """
+    :type progress_tracker: contentcuration.utils.celery.ProgressTracker|None
+    """
+    is_draft = draft_channel_version is not None
+    date_now = timezone.now()
+
+    start = time.time()
+    query_counter = QueryCounter()
+    with connection.execute_wrapper(query_counter):
+        statistics = get_published_statistics(channel)
+        license_ids = dict(
+            ccmodels.License.objects.filter(
+                license_name__in=[
+                    licenses.ALL_RIGHTS_RESERVED,
+                    licenses.SPECIAL_PERMISSIONS,
+                ]
             )
+            .order_by("-id")
+            .values_list("license_name", "id")
+        )
+    logging.info(
+        "Calculated the published statistics of channel {} with {} queries in {:.2f}s.".format(
+            channel.id, query_counter.count, time.time() - start
         )
     )
+    if progress_tracker:
+        progress_tracker.track(95)
+
+    total_resource_count = statistics.resource_count
+    kind_counts = statistics.kind_counts
+    published_size = statistics.size
+    language_list = statistics.languages
+    license_list = statistics.licenses
+    category_list = statistics.categories
 
     # Calculate non-distributable licenses (All Rights Reserved)
-    all_rights_reserved_id = (
-        ccmodels.License.objects.filter(license_name=licenses.ALL_RIGHTS_RESERVED)
-        .values_list("id", flat=True)
-        .first()
-    )
+    all_rights_reserved_id = license_ids.get(licenses.ALL_RIGHTS_RESERVED)
 
     non_distributable_licenses_included = (
         [all_rights_reserved_id]
@@ -1063,20 +2217,12 @@ def fill_published_fields(channel, version_notes, draft_channel_version=None):
 
     # records for each unique description so reviewers can approve/reject them individually.
     # This allows centralized tracking of custom licenses across all channels.
-    special_permissions_id = (
-        ccmodels.License.objects.filter(license_name=licenses.SPECIAL_PERMISSIONS)
-        .values_list("id", flat=True)
-        .first()
-    )
+    special_permissions_id = license_ids.get(licenses.SPECIAL_PERMISSIONS)
 
     special_perms_descriptions = None
     if special_permissions_id and special_permissions_id in license_list:
-        special_perms_descriptions = list(
-            published_nodes.filter(license_id=special_permissions_id)
-            .exclude(license_description__isnull=True)
-            .exclude(license_description="")
-            .values_list("license_description", flat=True)
-            .distinct()
+        special_perms_descriptions = statistics.get_license_descriptions(
+            special_permissions_id
         )
 
         if special_perms_descriptions:
@@ -1111,6 +2257,7 @@ def fill_published_fields(channel, version_notes, draft_channel_version=None):
                     "included_languages": language_list,
                     "included_licenses": license_list,
                     "included_categories": category_list,
+                    "mapped_channel_fields": get_mapped_channel_fields(channel),
                 }
             }
         )
@@ -1149,7 +2296,10 @@ def fill_published_fields(channel, version_notes, draft_channel_version=None):
 def sync_contentnode_and_channel_tsvectors(channel_id):
     """
     Creates, deletes and updates tsvectors of the channel and all its content nodes
-    to reflect the current state of channel's main tree.
+    to reflect the current state of channel's main tree. Only the tsvectors of nodes that
+    were logged as changed, or that don't have tsvectors yet, are inserted or updated.
+
+    :return: A dict of the number of content node tsvectors inserted, updated and deleted
     """
     # Update or create channel tsvector entry.
     logging.info("Setting tsvector for channel with id {}.".format(channel_id))
@@ -1159,6 +2309,7 @@ def sync_contentnode_and_channel_tsvectors(channel_id):
         .values("keywords_tsvector", "main_tree__tree_id")
         .get(pk=channel_id)
     )
+    tree_id = channel["main_tree__tree_id"]
 
     obj, is_created = ChannelFullTextSearch.objects.update_or_create(
         channel_id=channel_id,
@@ -1171,43 +2322,53 @@ def sync_contentnode_and_channel_tsvectors(channel_id):
     else:
         logging.info("Updated 1 channel tsvector.")
 
-    # Update or create contentnodes tsvector entry for channel_id.
     logging.info(
         "Setting tsvectors for all main tree contentnodes in channel {}.".format(
             channel_id
         )
     )
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
 
-    if ContentNodeFullTextSearch.objects.filter(channel_id=channel_id).exists():
-        # First, delete nodes that are no longer in main_tree.
-        nodes_no_longer_in_main_tree = ~Exists(
-            ccmodels.ContentNode.objects.filter(
-                id=OuterRef("contentnode_id"), tree_id=channel["main_tree__tree_id"]
-            )
-        )
-        ContentNodeFullTextSearch.objects.filter(
-            nodes_no_longer_in_main_tree, channel_id=channel_id
-        ).delete()
-
-        # Now, all remaining nodes are in main_tree, so let's update them.
-        # Update only changed nodes.
-        node_tsv_subquery = (
-            get_fts_annotated_contentnode_qs(channel_id)
-            .filter(id=OuterRef("contentnode_id"))
-            .order_by()
-        )
-        ContentNodeFullTextSearch.objects.filter(
-            channel_id=channel_id, contentnode__complete=True, contentnode__changed=True
-        ).update(
-            keywords_tsvector=Subquery(
-                node_tsv_subquery.values("keywords_tsvector")[:1]
-            ),
-            author_tsvector=Subquery(node_tsv_subquery.values("author_tsvector")[:1]),
+    # First, delete nodes that are no longer in main_tree.
+    nodes_no_longer_in_main_tree = ~Exists(
+        ccmodels.ContentNode.objects.filter(
+            id=OuterRef("contentnode_id"), tree_id=tree_id
         )
+    )
+    counts["deleted"], _ = ContentNodeFullTextSearch.objects.filter(
+        nodes_no_longer_in_main_tree, channel_id=channel_id
+    ).delete()
+
+    def upsert(node_ids):
+        inserted, updated = upsert_contentnode_tsvectors(channel_id, tree_id, node_ids)
+        counts["inserted"] += inserted
+        counts["updated"] += updated
+
+    # Then update the nodes that were logged as changed, removing them from the log as they
+    # are updated, so that they are only updated again if this fails part way through.
+    changes = ContentNodeFullTextSearchChange.objects.filter(
+        channel_id=channel_id
+    ).order_by("id")
+    while True:
+        batch = list(changes.values_list("id", "contentnode_id")[:TSVECTOR_BATCH_SIZE])
+        if not batch:
+            break
+        change_ids, node_ids = zip(*batch)
+        with transaction.atomic():
+            upsert(set(node_ids))
+            ContentNodeFullTextSearchChange.objects.filter(id__in=change_ids).delete()
+
+    # Finally insert the nodes that don't have tsvectors yet, e.g. as the channel has not
+    # been published since they were added to its search.
+    node_ids = get_contentnode_ids_without_tsvectors(tree_id)
+    for i in range(0, len(node_ids), TSVECTOR_BATCH_SIZE):
+        upsert(node_ids[i : i + TSVECTOR_BATCH_SIZE])
 
-    # Insert newly created nodes.
-    # "set_contentnode_tsvectors" command is defined in "search/management/commands" directory.
-    call_command("set_contentnode_tsvectors", "--channel-id={}".format(channel_id))
+    logging.info(
+        "Inserted {inserted}, updated {updated} and deleted {deleted} contentnode tsvectors "
+        "of channel {channel_id}.".format(channel_id=channel_id, **counts)
+    )
+    return counts
 
 
 @delay_user_storage_calculation
@@ -1248,7 +2409,10 @@ def publish_channel(  # noqa: C901
         if is_draft_version:
             draft_channel_version = create_draft_channel_version(channel)
             fill_published_fields(
-                channel, version_notes, draft_channel_version=draft_channel_version
+                channel,
+                version_notes,
+                draft_channel_version=draft_channel_version,
+                progress_tracker=progress_tracker,
             )
         else:
             increment_channel_version(channel)
@@ -1259,9 +2423,17 @@ def publish_channel(  # noqa: C901
             if storage.exists(draft_db_path):
                 storage.delete(draft_db_path)
 
-            sync_contentnode_and_channel_tsvectors(channel_id=channel.id)
+            # The tsvectors are updated by their own task, from the nodes that are logged
+            # here before their changed flags are cleared
+            log_contentnode_tsvector_changes(channel.id, channel.main_tree.tree_id)
+            user = ccmodels.User.objects.get(pk=user_id)
+            transaction.on_commit(
+                lambda: sync_channel_tsvectors_task.enqueue(user, channel_id=channel.id)
+            )
             mark_all_nodes_as_published(base_tree)
-            fill_published_fields(channel, version_notes)
+            fill_published_fields(
+                channel, version_notes, progress_tracker=progress_tracker
+            )
             base_tree.publishing = False
             base_tree.changed = False
             base_tree.published = True
@@ -1,11 +1,24 @@
 import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Max
+from django.utils import timezone
+from le_utils.constants import file_formats
+
+from contentcuration.models import Channel
+from contentcuration.models import User
+from contentcuration.models import UserStorageChecksum
+from contentcuration.models import UserStorageLedger
 from contentcuration.tasks import calculate_user_storage_task
 
 
 def calculate_user_storage(user_id):
     """TODO: Perhaps move this to User model to avoid unnecessary User lookups"""
-    from contentcuration.models import User
     from contentcuration.decorators import delay_user_storage_calculation
 
     if delay_user_storage_calculation.is_active:
@@ -24,3 +37,201 @@ def calculate_user_storage(user_id):
                 user_id
             )
         )
+
+
+def get_storage_states(files):
+    """
+    :param files: A File queryset
+    :return: A list of (id, uploaded_by_id, tree_id, checksum, file_size) of the files that
+        could count towards the storage of the users that uploaded them
+    """
+    return list(
+        files.filter(uploaded_by__isnull=False, contentnode__isnull=False)
+        .exclude(file_format_id__isnull=True)
+        .exclude(file_format_id=file_formats.PERSEUS)
+        .values_list(
+            "id", "uploaded_by_id", "contentnode__tree_id", "checksum", "file_size"
+        )
+    )
+
+
+def get_storage_deltas(removed=(), added=()):
+    """
+    Calculates how the storage ledgers of users change, when files stop or start counting
+    towards their storage. Files only count towards the storage of the user that uploaded
+    them while they're in the main tree of a channel that isn't deleted, which the user edits.
+
+    :param removed: A list of storage states, from `get_storage_states`, that were removed
+    :param added: A list of storage states that were added
+    :return: A dict of user_ids to dicts of checksums to how many more files with the checksum
+        count towards the user's storage, and their file size
+    """
+    states = list(removed) + list(added)
+    if not states:
+        return {}
+
+    active_trees = set(
+        Channel.editors.through.objects.filter(
+            user_id__in={user_id for _, user_id, _, _, _ in states},
+            channel__deleted=False,
+            channel__main_tree__tree_id__in={tree_id for _, _, tree_id, _, _ in states},
+        ).values_list("user_id", "channel__main_tree__tree_id")
+    )
+
+    deltas = defaultdict(dict)
+    for change, changed_states in ((-1, removed), (1, added)):
+        for _, user_id, tree_id, checksum, file_size in changed_states:
+            if (user_id, tree_id) not in active_trees:
+                continue
+            count, _ = deltas[user_id].get(checksum, (0, None))
+            deltas[user_id][checksum] = (count + change, file_size or 0)
+
+    return {
+        user_id: {
+            checksum: delta for checksum, delta in checksums.items() if delta[0] != 0
+        }
+        for user_id, checksums in deltas.items()
+        if any(count != 0 for count, _ in checksums.values())
+    }
+
+
+def increment_user_storage(deltas):
+    """
+    Updates the storage ledgers of users, as part of the current transaction. The storage of
+    users whose ledgers haven't been built yet is calculated in full instead.
+
+    :param deltas: A dict of user_ids to the changes to their ledgers, from
+        `get_storage_deltas`
+    """
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        # Locking the ledgers makes concurrent changes to them, and reconciliations, wait
+        # for this transaction
+        ledger_user_ids = set(
+            UserStorageLedger.objects.select_for_update()
+            .filter(user_id__in=deltas.keys())
+            .order_by("user_id")
+            .values_list("user_id", flat=True)
+        )
+        for user_id, checksums in deltas.items():
+            if user_id in ledger_user_ids:
+                _increment_ledger(user_id, checksums)
+
+    for user_id in deltas.keys() - ledger_user_ids:
+        calculate_user_storage(user_id)
+
+
+def _increment_ledger(user_id, checksums):
+    entries = {
+        entry.checksum: entry
+        for entry in UserStorageChecksum.objects.filter(
+            user_id=user_id, checksum__in=checksums.keys()
+        )
+    }
+    space_used_delta = 0
+    created = []
+    updated = []
+    deleted = []
+    for checksum, (count, file_size) in checksums.items():
+        entry = entries.get(checksum)
+        if entry is None:
+            if count > 0:
+                created.append(
+                    UserStorageChecksum(
+                        user_id=user_id,
+                        checksum=checksum,
+                        file_size=file_size,
+                        count=count,
+                    )
+                )
+                space_used_delta += file_size
+        elif entry.count + count > 0:
+            entry.count += count
+            updated.append(entry)
+        else:
+            deleted.append(entry.pk)
+            space_used_delta -= entry.file_size
+
+    UserStorageChecksum.objects.bulk_create(created)
+    UserStorageChecksum.objects.bulk_update(updated, ["count"])
+    UserStorageChecksum.objects.filter(pk__in=deleted).delete()
+    if space_used_delta:
+        UserStorageLedger.objects.filter(user_id=user_id).update(
+            space_used=F("space_used") + space_used_delta
+        )
+        User.objects.filter(pk=user_id).update(
+            disk_space_used=F("disk_space_used") + space_used_delta
+        )
+
+
+def reconcile_user_storage(user):
+    """
+    Builds the storage ledger of the user from their files, replacing it if it differs
+
+    :param user: The User
+    :return: A tuple of the space used by the user according to their ledger before it was
+        reconciled, which is None when it hadn't been built, and according to their files
+    """
+    with transaction.atomic():
+        ledger, created = UserStorageLedger.objects.select_for_update().get_or_create(
+            user=user
+        )
+        previous_space_used = None if created else ledger.space_used
+
+        checksums = {
+            item["checksum"]: (item["count"], item["file_size"] or 0)
+            for item in user.get_user_storage_files()
+            .values("checksum")
+            .annotate(count=Count("id"), file_size=Max("file_size"))
+            .order_by()
+        }
+        recorded = {
+            checksum: (count, file_size)
+            for checksum, count, file_size in user.storage_checksums.values_list(
+                "checksum", "count", "file_size"
+            )
+        }
+        if checksums != recorded:
+            user.storage_checksums.all().delete()
+            UserStorageChecksum.objects.bulk_create(
+                UserStorageChecksum(
+                    user=user, checksum=checksum, count=count, file_size=file_size
+                )
+                for checksum, (count, file_size) in checksums.items()
+            )
+
+        space_used = sum(file_size for _, file_size in checksums.values())
+        ledger.space_used = space_used
+        ledger.reconciled = timezone.now()
+        ledger.save()
+        User.objects.filter(pk=user.pk).update(disk_space_used=space_used)
+        user.disk_space_used = space_used
+
+    return previous_space_used, space_used
+
+
+class AccountedFileDeletions(threading.local):
+    """
+    Tracks the files being deleted whose effect on the storage of users has already been
+    calculated, so that deleting them doesn't calculate it again in full
+    """
+
+    def __init__(self):
+        self.file_ids = set()
+
+    @contextmanager
+    def account(self, states):
+        file_ids = {file_id for file_id, _, _, _, _ in states} - self.file_ids
+        self.file_ids.update(file_ids)
+        try:
+            yield
+        finally:
+            self.file_ids.difference_update(file_ids)
+
+    def __contains__(self, file_id):
+        return file_id in self.file_ids
+
+
+accounted_file_deletions = AccountedFileDeletions()
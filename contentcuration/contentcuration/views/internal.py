@@ -42,6 +42,7 @@ from contentcuration.constants import completion_criteria
 from contentcuration.decorators import delay_user_storage_calculation
 from contentcuration.models import Change
 from contentcuration.models import Channel
+from contentcuration.models import ContentKind
 from contentcuration.models import ContentNode
 from contentcuration.models import ContentTag
 from contentcuration.models import License
@@ -58,6 +59,7 @@ from contentcuration.utils.files import get_file_diff
 from contentcuration.utils.garbage_collect import get_deleted_chefs_root
 from contentcuration.utils.nodes import map_files_to_assessment_item
 from contentcuration.utils.nodes import map_files_to_node
+from contentcuration.utils.nodes import map_files_to_nodes
 from contentcuration.utils.nodes import map_files_to_slideshow_slide_item
 from contentcuration.utils.nodes import migrate_extra_fields
 from contentcuration.utils.sentry import report_exception
@@ -793,62 +795,102 @@ def convert_data_to_nodes(user, content_data, parent_node):  # noqa: C901
         existing_node_ids = ContentNode.objects.filter(
             parent_id=parent_node.pk
         ).values_list("node_id", flat=True)
+        lookups = NodeLookups()
+        # Nodes are created in bulk, in runs between the remote nodes, which are copied
+        # one by one, so that they end up in the order given
+        batch = []
         with transaction.atomic():
             for node_data in content_data:
                 # Check if node id is already in the tree to avoid duplicates
                 if node_data["node_id"] not in existing_node_ids:
                     if "source_channel_id" in node_data:
+                        root_mapping.update(
+                            create_nodes(user, parent_node, batch, lookups)
+                        )
+                        batch = []
+
                         new_node = handle_remote_node(user, node_data, parent_node)
 
                         map_files_to_node(user, new_node, node_data.get("files", []))
 
                         add_tags(new_node, node_data)
 
+                        check_completion(new_node)
+
+                        # Track mapping between newly created node and node id
+                        root_mapping.update({node_data["node_id"]: new_node.pk})
                     else:
-                        # Create the node
-                        new_node = create_node(node_data, parent_node, sort_order)
+                        batch.append(
+                            (
+                                node_data,
+                                build_node(node_data, sort_order, lookups),
+                            )
+                        )
+                        sort_order += 1
+            root_mapping.update(create_nodes(user, parent_node, batch, lookups))
+            return root_mapping
 
-                        # Create files associated with node
-                        map_files_to_node(user, new_node, node_data["files"])
+    except KeyError as e:
+        raise ObjectDoesNotExist("Error creating node: {0}".format(e))
 
-                        # Create questions associated exercise nodes
-                        create_exercises(user, new_node, node_data["questions"])
-                        sort_order += 1
 
-                        # Create Slideshow slides (if slideshow kind)
-                        if node_data["kind"] == "slideshow":
-                            extra_fields_unicode = node_data["extra_fields"]
+def create_nodes(user, parent_node, batch, lookups):
+    """
+    Creates a batch of nodes as the last children of the parent node, along with their
+    tags, files, questions and slides
 
-                            # Extra Fields comes as type<unicode> - convert it to a dict and get slideshow_data
-                            extra_fields_json = extra_fields_unicode.encode(
-                                "ascii", "ignore"
-                            )
-                            extra_fields = json.loads(extra_fields_json)
+    :param batch: A list of tuples of node data and the node built from it by `build_node`
+    :param lookups: The NodeLookups for the nodes
+    :return: A dict mapping the node ids of the nodes to their pks
+    """
+    if not batch:
+        return {}
 
-                            slides = create_slides(
-                                user, new_node, extra_fields.get("slideshow_data")
-                            )
-                            map_files_to_slideshow_slide_item(
-                                user, new_node, slides, node_data["files"]
-                            )
+    ContentNode.objects.bulk_create_children(parent_node, [node for _, node in batch])
 
-                    # Wait until after files have been set on the node to check for node completeness
-                    # as some node kinds are counted as incomplete if they lack a default file.
-                    completion_errors = new_node.mark_complete()
+    add_tags_to_nodes(parent_node.get_channel(), batch, lookups)
 
-                    if completion_errors:
-                        try:
-                            # we need to raise it to get Python to fill out the stack trace.
-                            raise IncompleteNodeError(new_node, completion_errors)
-                        except IncompleteNodeError as e:
-                            report_exception(e)
+    # Create files associated with nodes
+    map_files_to_nodes(user, [(node, node_data["files"]) for node_data, node in batch])
 
-                    # Track mapping between newly created node and node id
-                    root_mapping.update({node_data["node_id"]: new_node.pk})
-            return root_mapping
+    root_mapping = {}
+    for node_data, new_node in batch:
+        # Create questions associated exercise nodes
+        questions = node_data["questions"]
+        if questions:
+            create_exercises(user, new_node, questions)
+
+        # Create Slideshow slides (if slideshow kind)
+        if node_data["kind"] == "slideshow":
+            extra_fields_unicode = node_data["extra_fields"]
+
+            # Extra Fields comes as type<unicode> - convert it to a dict and get slideshow_data
+            extra_fields_json = extra_fields_unicode.encode("ascii", "ignore")
+            extra_fields = json.loads(extra_fields_json)
+
+            slides = create_slides(user, new_node, extra_fields.get("slideshow_data"))
+            map_files_to_slideshow_slide_item(
+                user, new_node, slides, node_data["files"]
+            )
+
+        check_completion(new_node)
+
+        # Track mapping between newly created node and node id
+        root_mapping.update({node_data["node_id"]: new_node.pk})
+    return root_mapping
 
-    except KeyError as e:
-        raise ObjectDoesNotExist("Error creating node: {0}".format(e))
+
+def check_completion(node):
+    # Wait until after files have been set on the node to check for node completeness
+    # as some node kinds are counted as incomplete if they lack a default file.
+    completion_errors = node.mark_complete()
+
+    if completion_errors:
+        try:
+            # we need to raise it to get Python to fill out the stack trace.
+            raise IncompleteNodeError(node, completion_errors)
+        except IncompleteNodeError as e:
+            report_exception(e)
 
 
 METADATA = {
@@ -861,15 +903,40 @@ METADATA = {
 }
 
 
-def create_node(node_data, parent_node, sort_order):  # noqa: C901
-    """ Generate node based on node dict """
+class NodeLookups(object):
+    """
+    Caches the licenses, kinds and tags looked up while creating a batch of nodes
+    """
+
+    def __init__(self):
+        self._licenses = None
+        self._kinds = None
+        self.tags = {}
+
+    @property
+    def licenses(self):
+        if self._licenses is None:
+            self._licenses = {
+                license.license_name.lower(): license
+                for license in License.objects.all()
+            }
+        return self._licenses
+
+    @property
+    def kinds(self):
+        if self._kinds is None:
+            self._kinds = ContentKind.objects.in_bulk()
+        return self._kinds
+
+
+def build_node(node_data, sort_order, lookups):  # noqa: C901
+    """ Generate an unsaved node based on node dict """
     # Make sure license is valid
     license = None
     license_name = node_data["license"]
     if license_name is not None:
-        try:
-            license = License.objects.get(license_name__iexact=license_name)
-        except ObjectDoesNotExist:
+        license = lookups.licenses.get(license_name.lower())
+        if license is None:
             raise ObjectDoesNotExist("Invalid license found")
 
     extra_fields = node_data["extra_fields"] or {}
@@ -900,10 +967,10 @@ def create_node(node_data, parent_node, sort_order):  # noqa: C901
     copyright_holder = node_data.get("copyright_holder", "")
 
     metadata_labels = validate_metadata_labels(node_data)
+    validate_tags(node_data)
 
-    node = ContentNode.objects.create(
+    node = ContentNode(
         title=title,
-        tree_id=parent_node.tree_id,
         kind_id=node_data["kind"],
         node_id=node_data["node_id"],
         content_id=node_data["content_id"],
@@ -914,7 +981,6 @@ def create_node(node_data, parent_node, sort_order):  # noqa: C901
         license=license,
         license_description=license_description,
         copyright_holder=copyright_holder,
-        parent=parent_node,
         extra_fields=extra_fields,
         sort_order=sort_order,
         source_id=node_data.get("source_id"),
@@ -927,14 +993,56 @@ def create_node(node_data, parent_node, sort_order):  # noqa: C901
         # complete or not.
         complete=True,
         suggested_duration=node_data.get("suggested_duration"),
+        changed=True,
         **metadata_labels
     )
-
-    add_tags(node, node_data)
+    if node.kind_id in lookups.kinds:
+        node.kind = lookups.kinds[node.kind_id]
+    node.set_default_learning_activity()
 
     return node
 
 
+def validate_tags(node_data):
+    for tag in node_data.get("tags") or []:
+        if len(tag) > 30:
+            raise ValidationError("tag is greater than 30 characters")
+
+
+def add_tags_to_nodes(channel, batch, lookups):
+    """
+    Tags the nodes of a batch, creating the tags of the channel that don't exist yet
+
+    :param batch: A list of tuples of node data and the created node
+    """
+    tag_names = {
+        tag
+        for node_data, _ in batch
+        for tag in node_data.get("tags") or []
+        if tag not in lookups.tags
+    }
+    if tag_names:
+        for tag in ContentTag.objects.filter(channel=channel, tag_name__in=tag_names):
+            lookups.tags.setdefault(tag.tag_name, tag)
+        new_tags = [
+            ContentTag(tag_name=tag_name, channel=channel)
+            for tag_name in tag_names
+            if tag_name not in lookups.tags
+        ]
+        ContentTag.objects.bulk_create(new_tags)
+        lookups.tags.update((tag.tag_name, tag) for tag in new_tags)
+
+    ContentNode.tags.through.objects.bulk_create(
+        [
+            ContentNode.tags.through(
+                contentnode_id=node.pk, contenttag_id=lookups.tags[tag].pk
+            )
+            for node_data, node in batch
+            for tag in set(node_data.get("tags") or [])
+        ]
+    )
+
+
 def create_exercises(user, node, data):
     """Generate exercise from data, delegating item construction and QTI schema
     validation to AssessmentItemSerializer."""
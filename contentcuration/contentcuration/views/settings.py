@@ -10,10 +10,13 @@ from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.db.models import Count
+from django.http import FileResponse
 from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
+from django.http import HttpResponseNotFound
 from django.shortcuts import render
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
@@ -31,7 +34,11 @@ from contentcuration.forms import PolicyAcceptForm
 from contentcuration.forms import StorageRequestForm
 from contentcuration.forms import UsernameChangeForm
 from contentcuration.tasks import generateusercsv_task
+from contentcuration.utils.csv_writer import delete_user_csv_export
+from contentcuration.utils.csv_writer import generate_user_csv_basename
+from contentcuration.utils.csv_writer import generate_user_csv_export_name
 from contentcuration.utils.csv_writer import generate_user_csv_filename
+from contentcuration.utils.csv_writer import get_user_csv_export_expiry
 from contentcuration.utils.messages import get_messages
 from contentcuration.views.base import current_user_for_context
 from contentcuration.views.users import logout
@@ -73,6 +80,30 @@ def export_user_data(request):
     return HttpResponse({"success": True})
 
 
+@login_required
+def download_user_data(request):
+    """
+    Serves the latest CSV export of the user's data, which is stored gzip-compressed,
+    until it expires
+    """
+    user = request.user
+    expiry = get_user_csv_export_expiry()
+    if user.user_data_exported and user.user_data_exported < expiry:
+        delete_user_csv_export(user)
+    export_name = generate_user_csv_export_name(user)
+    if not export_name or not default_storage.exists(export_name):
+        return HttpResponseNotFound(_("Your data has not been exported"))
+
+    response = FileResponse(
+        default_storage.open(export_name),
+        as_attachment=True,
+        filename=generate_user_csv_basename(request.user),
+        content_type="text/csv",
+    )
+    response["Content-Encoding"] = "gzip"
+    return response
+
+
 class PostFormMixin(LoginRequiredMixin):
     http_method_names = ["post"]
     success_url = reverse_lazy("settings")
@@ -168,6 +199,7 @@ class DeleteAccountView(PostFormMixin, FormView):
         )  # Remove any generated csvs
         if os.path.exists(csv_path):
             os.unlink(csv_path)
+        delete_user_csv_export(self.request.user)
 
         self.request.user.delete()
         logout(self.request)
@@ -3,8 +3,13 @@ import logging
 import mimetypes
 import os
 import re
+import struct
+import threading
 import time
 import zipfile
+import zlib
+from collections import namedtuple
+from collections import OrderedDict
 from xml.etree.ElementTree import SubElement
 
 import html5lib
@@ -36,6 +41,20 @@ VALID_STORAGE_FILENAME = re.compile("[0-9a-f]{32}(-data)?\\.[0-9a-z]+")
 # set of file extensions that should be considered zip files and allow access to internal files
 POSSIBLE_ZIPPED_FILE_EXTENSIONS = set([".perseus", ".zip", ".epub", ".epub3"])
 
+# a single byte range, as requested in a Range header
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# the fixed size part of the local header that precedes the data of each zip member
+LOCAL_FILE_HEADER = struct.Struct(zipfile.structFileHeader)
+
+# the number of bytes read from a zip file, or decompressed, at a time when serving a member
+ZIP_MEMBER_CHUNK_SIZE = 64 * 1024
+
+ZipMember = namedtuple(
+    "ZipMember",
+    ["header_offset", "compress_type", "compress_size", "file_size", "date_time"],
+)
+
 
 def _add_access_control_headers(request, response):
     response["Access-Control-Allow-Origin"] = "*"
@@ -98,6 +117,213 @@ def parse_html(content):
         return content
 
 
+class ZipIndexCache(object):
+    """
+    An LRU cache of the members of zip files, by the storage filenames of the zip files.
+    Storage filenames are content-addressed, so the members of a zip file never change.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, zipped_filename):
+        with self._lock:
+            index = self._indexes.get(zipped_filename)
+            if index is not None:
+                self._indexes.move_to_end(zipped_filename)
+            return index
+
+    def set(self, zipped_filename, index):
+        with self._lock:
+            self._indexes[zipped_filename] = index
+            self._indexes.move_to_end(zipped_filename)
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+
+    def delete(self, zipped_filename):
+        with self._lock:
+            self._indexes.pop(zipped_filename, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+zip_index_cache = ZipIndexCache(settings.ZIP_INDEX_CACHE_SIZE)
+
+
+def open_zip_file(storage, zipped_path):
+    """
+    Opens a zip file in storage, only fetching the byte ranges that are read from it when the
+    storage supports it, rather than downloading all of it
+    """
+    if hasattr(storage, "open_ranged"):
+        return storage.open_ranged(zipped_path)
+    return storage.open(zipped_path)
+
+
+def read_zip_index(zf_obj):
+    """
+    Parses the central directory of a zip file
+
+    :return: A dict of the names of the members of the zip file to their ZipMember
+    """
+    with zipfile.ZipFile(zf_obj) as zf:
+        return {
+            info.filename: ZipMember(
+                info.header_offset,
+                info.compress_type,
+                info.compress_size,
+                info.file_size,
+                info.date_time,
+            )
+            for info in zf.infolist()
+        }
+
+
+def get_member_data_offset(zf_obj, member):
+    """
+    Reads the local header of a zip member to find where its data starts in the zip file
+    """
+    zf_obj.seek(member.header_offset)
+    header = zf_obj.read(LOCAL_FILE_HEADER.size)
+    if len(header) != LOCAL_FILE_HEADER.size:
+        raise zipfile.BadZipfile("Truncated file header")
+    header = LOCAL_FILE_HEADER.unpack(header)
+    if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipfile("Bad magic number for file header")
+    return (
+        member.header_offset
+        + LOCAL_FILE_HEADER.size
+        + header[zipfile._FH_FILENAME_LENGTH]
+        + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+    )
+
+
+def _read_stored(zf_obj, offset, length):
+    zf_obj.seek(offset)
+    while length > 0:
+        chunk = zf_obj.read(min(ZIP_MEMBER_CHUNK_SIZE, length))
+        if not chunk:
+            raise zipfile.BadZipfile("Truncated file data")
+        length -= len(chunk)
+        yield chunk
+
+
+def _read_deflated(zf_obj, offset, compress_size):
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    for data in _read_stored(zf_obj, offset, compress_size):
+        chunk = decompressor.decompress(data)
+        if chunk:
+            yield chunk
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _slice_chunks(chunks, start, end):
+    position = 0
+    for chunk in chunks:
+        chunk_start = position
+        position += len(chunk)
+        if position <= start:
+            continue
+        if chunk_start >= end:
+            break
+        yield chunk[max(start - chunk_start, 0) : end - chunk_start]
+
+
+def iter_zip_member(zf_obj, name, member, data_offset, start=0, end=None):
+    """
+    Yields the bytes of a zip member from start up to, but not including, end. The bytes of
+    stored members are read straight from their range of the zip file.
+    """
+    end = member.file_size if end is None else end
+    if member.compress_type == zipfile.ZIP_STORED:
+        return _read_stored(zf_obj, data_offset + start, end - start)
+    if member.compress_type == zipfile.ZIP_DEFLATED:
+        chunks = _read_deflated(zf_obj, data_offset, member.compress_size)
+    else:
+        # other compression methods are rare enough to leave to zipfile
+        zf_obj.seek(0)
+        member_file = zipfile.ZipFile(zf_obj).open(name)
+        chunks = iter(lambda: member_file.read(ZIP_MEMBER_CHUNK_SIZE), b"")
+    return _slice_chunks(chunks, start, end)
+
+
+class ZipMemberFile(object):
+    """
+    A file object over a range of the bytes of a zip member, which closes the zip file when
+    it's closed. Each read returns at most one chunk of the member.
+    """
+
+    def __init__(self, zf_obj, name, chunks):
+        self.name = name
+        self._zf_obj = zf_obj
+        self._chunks = chunks
+        self._chunk = b""
+        self._offset = 0
+
+    def read(self, size=-1):
+        if self._offset >= len(self._chunk):
+            self._chunk = next(self._chunks, b"")
+            self._offset = 0
+        end = len(self._chunk) if size is None or size < 0 else self._offset + size
+        data = self._chunk[self._offset : end]
+        self._offset += len(data)
+        return data
+
+    def close(self):
+        self._zf_obj.close()
+
+
+def parse_byte_range(header, size):
+    """
+    Parses a Range header requesting a single byte range of a file
+
+    :param header: The value of the Range header
+    :param size: The size of the file
+    :return: A tuple of the start and end, exclusive, of the range, which is empty when the
+        range can't be satisfied, or None when the header should be ignored
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # a suffix range of the last bytes of the file
+        suffix_length = int(last)
+        if not suffix_length:
+            return size, size
+        return max(size - suffix_length, 0), size
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    end = min(int(last) + 1, size) if last else size
+    return (start, end) if start < size else (size, size)
+
+
+def _capture_bad_zip_file(zf_obj):
+    just_downloaded = getattr(
+        zf_obj, "just_downloaded", "Unknown (Most likely local file)"
+    )
+    capture_message(
+        "Unable to open zip file. File info: name={}, size={}, mode={}, just_downloaded={}".format(
+            getattr(zf_obj, "name", None),
+            getattr(zf_obj, "size", None),
+            getattr(zf_obj, "mode", None),
+            just_downloaded,
+        )
+    )
+    return HttpResponseServerError(
+        "Attempt to open zip file failed. Please try again, and if you continue to receive this message, please check that the zip file is valid."
+    )
+
+
 # DISK PATHS
 
 
@@ -128,80 +354,120 @@ class ZipContentView(View):
         # file size
         file_size = 0
 
+        # the members of zip files that have been served recently are cached, so their
+        # central directories don't have to be read again
+        index = zip_index_cache.get(zipped_filename)
+
         # if the zipfile does not exist on disk, return a 404
-        if not storage.exists(zipped_path):
+        if index is None and not storage.exists(zipped_path):
             return HttpResponseNotFound("Zipfile does not exist in storage")
 
         # if client has a cached version, use that (we can safely assume nothing has changed, due to MD5)
         if request.META.get("HTTP_IF_MODIFIED_SINCE"):
             return HttpResponseNotModified()
 
-        zf_obj = storage.open(zipped_path)
+        zf_obj = None
+        if index is None:
+            zf_obj = open_zip_file(storage, zipped_path)
+            try:
+                index = read_zip_index(zf_obj)
+            except zipfile.BadZipfile:
+                zf_obj.close()
+                return _capture_bad_zip_file(zf_obj)
+            zip_index_cache.set(zipped_filename, index)
+
+        # if no path, or a directory, is being referenced, look for an index.html file
+        if not embedded_filepath or embedded_filepath.endswith("/"):
+            embedded_filepath += "index.html"
+
+        # get the details about the embedded file, and ensure it exists
+        member = index.get(embedded_filepath)
+        if member is None:
+            if zf_obj is not None:
+                zf_obj.close()
+            return HttpResponseNotFound("Embedded file does not exist inside zip")
+
+        if zf_obj is None:
+            try:
+                zf_obj = open_zip_file(storage, zipped_path)
+            except OSError:
+                # the zip file was deleted from storage after its index was cached
+                zip_index_cache.delete(zipped_filename)
+                return HttpResponseNotFound("Zipfile does not exist in storage")
 
         try:
-            with zipfile.ZipFile(zf_obj) as zf:
-                # if no path, or a directory, is being referenced, look for an index.html file
-                if not embedded_filepath or embedded_filepath.endswith("/"):
-                    embedded_filepath += "index.html"
-
-                # get the details about the embedded file, and ensure it exists
-                try:
-                    info = zf.getinfo(embedded_filepath)
-                except KeyError:
-                    return HttpResponseNotFound(
-                        "Embedded file does not exist inside zip"
-                    )
-
-                # try to guess the MIME type of the embedded file being referenced
-                content_type = (
-                    mimetypes.guess_type(embedded_filepath)[0]
-                    or "application/octet-stream"
+            data_offset = get_member_data_offset(zf_obj, member)
+        except zipfile.BadZipfile:
+            zf_obj.close()
+            return _capture_bad_zip_file(zf_obj)
+
+        # try to guess the MIME type of the embedded file being referenced
+        content_type = (
+            mimetypes.guess_type(embedded_filepath)[0] or "application/octet-stream"
+        )
+
+        byte_range = None
+        if embedded_filepath.endswith(".html") and request.GET.get("screenshot"):
+            content_type = "text/html"
+
+            with zf_obj:
+                content = b"".join(
+                    iter_zip_member(zf_obj, embedded_filepath, member, data_offset)
                 )
 
-                if embedded_filepath.endswith(".html") and request.GET.get(
-                    "screenshot"
-                ):
-                    content_type = "text/html"
-
-                    content = zf.open(info).read()
-
-                    response = HttpResponse(
-                        parse_html(content), content_type=content_type
-                    )
-                    file_size = info.file_size
-                elif not os.path.splitext(embedded_filepath)[1] == ".json":
-                    # generate a streaming response object, pulling data from within the zip  file
-                    response = FileResponse(zf.open(info), content_type=content_type)
-                    file_size = info.file_size
-                else:
-                    # load the stream from json file into memory, replace the path_place_holder.
-                    content = zf.open(info).read()
-                    str_to_be_replaced = ("$" + exercises.IMG_PLACEHOLDER).encode()
-                    zipcontent = (
-                        "/" + request.resolver_match.url_name + "/" + zipped_filename
-                    ).encode()
-                    content_with_path = content.replace(str_to_be_replaced, zipcontent)
-                    response = HttpResponse(
-                        content_with_path, content_type=content_type
-                    )
-                    file_size = len(content_with_path)
-        except zipfile.BadZipfile:
-            just_downloaded = getattr(
-                zf_obj, "just_downloaded", "Unknown (Most likely local file)"
-            )
-            capture_message(
-                "Unable to open zip file. File info: name={}, size={}, mode={}, just_downloaded={}".format(
-                    zf_obj.name, zf_obj.size, zf_obj.mode, just_downloaded
+            response = HttpResponse(parse_html(content), content_type=content_type)
+            file_size = member.file_size
+        elif not os.path.splitext(embedded_filepath)[1] == ".json":
+            if request.META.get("HTTP_RANGE"):
+                byte_range = parse_byte_range(
+                    request.META["HTTP_RANGE"], member.file_size
                 )
+            start, end = byte_range or (0, member.file_size)
+
+            if start == end and byte_range:
+                zf_obj.close()
+                response = HttpResponse(status=416)
+                response["Content-Range"] = "bytes */{}".format(member.file_size)
+                _add_access_control_headers(request, response)
+                return response
+
+            # generate a streaming response object, pulling data from within the zip  file
+            response = FileResponse(
+                ZipMemberFile(
+                    zf_obj,
+                    embedded_filepath,
+                    iter_zip_member(
+                        zf_obj, embedded_filepath, member, data_offset, start, end
+                    ),
+                ),
+                content_type=content_type,
             )
-            return HttpResponseServerError(
-                "Attempt to open zip file failed. Please try again, and if you continue to receive this message, please check that the zip file is valid."
-            )
+            response.block_size = ZIP_MEMBER_CHUNK_SIZE
+            file_size = end - start
+
+            if byte_range:
+                response.status_code = 206
+                response["Content-Range"] = "bytes {}-{}/{}".format(
+                    start, end - 1, member.file_size
+                )
+        else:
+            # load the stream from json file into memory, replace the path_place_holder.
+            with zf_obj:
+                content = b"".join(
+                    iter_zip_member(zf_obj, embedded_filepath, member, data_offset)
+                )
+            str_to_be_replaced = ("$" + exercises.IMG_PLACEHOLDER).encode()
+            zipcontent = (
+                "/" + request.resolver_match.url_name + "/" + zipped_filename
+            ).encode()
+            content_with_path = content.replace(str_to_be_replaced, zipcontent)
+            response = HttpResponse(content_with_path, content_type=content_type)
+            file_size = len(content_with_path)
 
         # set the last-modified header to the date marked on the embedded file
-        if info.date_time:
+        if member.date_time:
             response["Last-Modified"] = http_date(
-                time.mktime(datetime.datetime(*info.date_time).timetuple())
+                time.mktime(datetime.datetime(*member.date_time).timetuple())
             )
 
         # cache these resources forever; this is safe due to the MD5-naming used on content files
@@ -211,8 +477,11 @@ class ZipContentView(View):
         if file_size:
             response["Content-Length"] = file_size
 
-        # ensure the browser knows not to try byte-range requests, as we don't support them here
-        response["Accept-Ranges"] = "none"
+        # files served as they are stored in the zip file support byte-range requests, so
+        # that media inside them can be seeked, but files that are rewritten don't
+        response["Accept-Ranges"] = (
+            "bytes" if isinstance(response, FileResponse) else "none"
+        )
 
         _add_access_control_headers(request, response)
 
@@ -1,6 +1,7 @@
 import json
 import re
 
+from django.conf import settings
 from django.db import transaction
 from le_utils.constants import exercises
 from le_utils.constants import format_presets
@@ -14,6 +15,7 @@ from contentcuration.models import File
 from contentcuration.models import generate_object_storage_name
 from contentcuration.utils.assessment.qti.media import get_qti_media_references
 from contentcuration.utils.assessment.qti.validation import validate_qti_item
+from contentcuration.utils.assessment.qti.validation import validate_qti_items
 from contentcuration.viewsets.base import BulkCreateMixin
 from contentcuration.viewsets.base import BulkListSerializer
 from contentcuration.viewsets.base import BulkModelSerializer
@@ -65,6 +67,39 @@ def get_filenames_from_qti_item(assessment_item):
 
 
 class AssessmentListSerializer(BulkListSerializer):
+    def _validate_qti_items(self, data):
+        """
+        Validates the raw_data of all of the QTI items together, so that they can be
+        validated in parallel, and returns their results by their raw_data.
+        """
+        data_lookup = self._data_lookup_dict()
+        raw_data = set()
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            instance = (
+                data_lookup.get(self.child.id_value_lookup(item))
+                if data_lookup
+                else None
+            )
+            item_type = item.get("type", instance.type if instance else None)
+            value = item.get("raw_data", instance.raw_data if instance else "")
+            if item_type == exercises.QTI and isinstance(value, str):
+                raw_data.add(value)
+        raw_data = list(raw_data)
+        results = validate_qti_items(
+            raw_data, max_workers=settings.QTI_VALIDATION_WORKERS
+        )
+        return dict(zip(raw_data, results))
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.qti_validation_results = self._validate_qti_items(data)
+        try:
+            return super(AssessmentListSerializer, self).to_internal_value(data)
+        finally:
+            self.child.qti_validation_results = {}
+
     def create(self, all_validated_data):
         with transaction.atomic():
             all_objects = super(AssessmentListSerializer, self).create(
@@ -93,6 +128,10 @@ class AssessmentItemSerializer(BulkModelSerializer):
         queryset=ContentNode.objects.all(), required=False
     )
 
+    # The results of validating the raw_data of QTI items in bulk, by their raw_data,
+    # set by AssessmentListSerializer while it validates its items
+    qti_validation_results = {}
+
     class Meta:
         model = AssessmentItem
         fields = (
@@ -139,7 +178,9 @@ class AssessmentItemSerializer(BulkModelSerializer):
             raw_data = data.get(
                 "raw_data", self.instance.raw_data if self.instance else ""
             )
-            result = validate_qti_item(raw_data)
+            result = self.qti_validation_results.get(raw_data) or validate_qti_item(
+                raw_data
+            )
             if not result.is_valid:
                 raise ValidationError(
                     {"raw_data": [error.message for error in result.errors]}
@@ -33,6 +33,7 @@ from contentcuration.models import Change
 from contentcuration.models import CustomTaskMetadata
 from contentcuration.utils.celery.tasks import generate_task_signature
 from contentcuration.utils.celery.tasks import ProgressTracker
+from contentcuration.utils.change_feed import notify_tasks
 from contentcuration.viewsets.common import MissingRequiredParamsException
 from contentcuration.viewsets.sync.constants import TASK_ID
 from contentcuration.viewsets.sync.utils import generate_update_event
@@ -974,11 +975,13 @@ def create_change_tracker(pk, table, channel_id, user, task_name):
     custom_task_metadata_object = CustomTaskMetadata.objects.create(
         task_id=task_id, channel_id=channel_id, user=user, signature=signature
     )
+    notify_tasks([channel_id])
 
     def update_progress(progress=None):
         if progress:
             custom_task_metadata_object.progress = progress
             custom_task_metadata_object.save()
+            notify_tasks([channel_id])
 
     Change.create_change(
         # These changes are purely for ephemeral progress updating, and do not constitute a publishable change.
@@ -997,6 +1000,7 @@ def create_change_tracker(pk, table, channel_id, user, task_name):
         task_object.status = states.FAILURE
         task_object.traceback = traceback.format_exc()
         task_object.save()
+        notify_tasks([channel_id])
         raise
     finally:
         if task_object.status == states.STARTED:
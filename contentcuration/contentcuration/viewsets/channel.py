@@ -59,7 +59,9 @@ from contentcuration.models import SecretToken
 from contentcuration.models import User
 from contentcuration.utils.garbage_collect import get_deleted_chefs_root
 from contentcuration.utils.pagination import CachedListPagination
+from contentcuration.utils.pagination import CachedValuesViewsetPaginator
 from contentcuration.utils.pagination import ValuesViewsetCursorPagination
+from contentcuration.utils.pagination import ValuesViewsetKeysetPagination
 from contentcuration.utils.pagination import ValuesViewsetPageNumberPagination
 from contentcuration.utils.publish import ChannelIncompleteError
 from contentcuration.utils.publish import publish_channel
@@ -97,6 +99,16 @@ class CatalogListPagination(CachedListPagination):
     max_page_size = 1000
 
 
+class AdminChannelListPagination(ValuesViewsetKeysetPagination):
+    # The default ordering by modified is a subquery annotation without an index, so
+    # only the ordering by the indexed name uses keyset pagination
+    django_paginator_class = CachedValuesViewsetPaginator
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    approximate_count = True
+
+
 class ChannelVersionListPagination(ValuesViewsetCursorPagination):
     ordering = "-version"
     page_size_query_param = "max_results"
@@ -1224,7 +1236,7 @@ class AdminChannelSerializer(ChannelSerializer):
 
 
 class AdminChannelViewSet(ChannelViewSet, RESTUpdateModelMixin, RESTDestroyModelMixin):
-    pagination_class = CatalogListPagination
+    pagination_class = AdminChannelListPagination
     permission_classes = [IsAdminUser]
     serializer_class = AdminChannelSerializer
     filterset_class = AdminChannelFilter
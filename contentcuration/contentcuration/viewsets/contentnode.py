@@ -57,7 +57,10 @@ from contentcuration.models import File
 from contentcuration.models import generate_storage_url
 from contentcuration.models import PrerequisiteContentRelationship
 from contentcuration.models import UUIDField
+from contentcuration.node_metadata.tree import annotate_tree_metadata
+from contentcuration.node_metadata.tree import filter_stale_tree_metadata
 from contentcuration.tasks import calculate_resource_size_task
+from contentcuration.tasks import update_tree_metadata_task
 from contentcuration.utils.nodes import calculate_resource_size
 from contentcuration.utils.nodes import migrate_extra_fields
 from contentcuration.utils.nodes import validate_and_conform_to_schema_threshold_none
@@ -1007,13 +1010,15 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
             .distinct()
         )
 
-        queryset = queryset.annotate(
+        # Read the descendant counts and flags from the materialized tree metadata, falling
+        # back to the subqueries for the topics that don't have it yet, see consolidate
+        queryset = annotate_tree_metadata(
+            queryset,
             resource_count=SQCount(descendant_resources, field="id"),
             coach_count=SQCount(
                 descendant_resources.filter(role_visibility=roles.COACH),
                 field="id",
             ),
-            assessment_item_count=SQCount(assessment_items, field="assessment_id"),
             error_count=SQCount(descendant_errors, field="id"),
             has_updated_descendants=Exists(
                 changed_descendants.filter(published=True).values("id")
@@ -1021,6 +1026,10 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
             has_new_descendants=Exists(
                 changed_descendants.filter(published=False).values("id")
             ),
+        )
+
+        queryset = queryset.annotate(
+            assessment_item_count=SQCount(assessment_items, field="assessment_id"),
             thumbnail_checksum=Subquery(thumbnails.values("checksum")[:1]),
             thumbnail_extension=Subquery(
                 thumbnails.values("file_format__extension")[:1]
@@ -1036,6 +1045,22 @@ class ContentNodeViewSet(BulkUpdateMixin, ValuesViewset):
 
         return queryset
 
+    def consolidate(self, items, queryset):
+        # The tree metadata of the listed topics that don't have any is calculated by a task,
+        # rather than during the request, which reads it from the subqueries meanwhile
+        stale_ids = sorted(
+            filter_stale_tree_metadata(
+                ContentNode.objects.filter(
+                    pk__in=[item["id"] for item in items if item["total_count"]]
+                )
+            ).values_list("id", flat=True)
+        )
+        if stale_ids:
+            update_tree_metadata_task.fetch_or_enqueue(
+                self.request.user, node_ids=stale_ids
+            )
+        return items
+
     def validate_targeting_args(self, target, position):
         position = position or "last-child"
         if target is None:
@@ -16,10 +16,8 @@ from contentcuration.models import ContentNode
 from contentcuration.models import File
 from contentcuration.models import generate_object_storage_name
 from contentcuration.models import generate_storage_url
-from contentcuration.utils.cache import ResourceSizeCache
 from contentcuration.utils.sentry import report_exception
 from contentcuration.utils.storage_common import get_presigned_upload_url
-from contentcuration.utils.user import calculate_user_storage
 from contentcuration.viewsets.base import BulkDeleteMixin
 from contentcuration.viewsets.base import BulkListSerializer
 from contentcuration.viewsets.base import BulkModelSerializer
@@ -125,14 +123,6 @@ class FileSerializer(BulkModelSerializer):
     )
 
     def update(self, instance, validated_data):
-        update_node = None
-        if "contentnode" in validated_data:
-            # if we're updating the file's related node, we'll trigger a reset for the
-            # old channel's cache modified date
-            update_node = validated_data.get("contentnode", None)
-            if not update_node or update_node.id != instance.contentnode_id:
-                ResourceSizeCache.reset_modified_for_file(instance)
-
         results = super(FileSerializer, self).update(instance, validated_data)
         results.on_update()  # Make sure contentnode.content_id is unique
 
@@ -151,9 +141,6 @@ class FileSerializer(BulkModelSerializer):
                     applied=True,
                 )
 
-        if instance.uploaded_by_id:
-            calculate_user_storage(instance.uploaded_by_id)
-
         return results
 
     class Meta:
@@ -205,20 +192,10 @@ class FileViewSet(BulkDeleteMixin, UpdateModelMixin, ReadOnlyValuesViewset):
 
     def delete_from_changes(self, changes):
         try:
-            # Reset channel resource size cache.
             keys = [change["key"] for change in changes]
             files_qs = self.filter_queryset_from_keys(
                 self.get_edit_queryset(), keys
             ).order_by()
-            # Find all root nodes for files, and reset the cache modified date.
-            root_nodes = ContentNode.objects.filter(
-                parent__isnull=True,
-                tree_id__in=files_qs.values_list(
-                    "contentnode__tree_id", flat=True
-                ).distinct(),
-            )
-            for root_node in root_nodes:
-                ResourceSizeCache(root_node).reset_modified(None)
 
             # Update file's contentnode content_id.
             for file in files_qs:
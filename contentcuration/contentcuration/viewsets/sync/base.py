@@ -1,8 +1,13 @@
+import json
+import time
 from collections import OrderedDict
 
+from django.db import transaction
 from search.viewsets.savedsearch import SavedSearchViewSet
 
 from contentcuration.decorators import delay_user_storage_calculation
+from contentcuration.models import Change
+from contentcuration.utils.change_feed import notify_changes
 from contentcuration.viewsets.assessmentitem import AssessmentItemViewSet
 from contentcuration.viewsets.bookmark import BookmarkViewSet
 from contentcuration.viewsets.channel import ChannelViewSet
@@ -41,6 +46,13 @@ from contentcuration.viewsets.user import ChannelUserViewSet
 from contentcuration.viewsets.user import UserViewSet
 
 
+class BatchErrorsUntraceable(Exception):
+    """
+    Used when the errors of a batch of changes can't be put down to the changes that caused
+    them, so that the changes are applied again one at a time
+    """
+
+
 class ChangeNotAllowed(Exception):
     """
     Used to report changes that are not supported by the backend
@@ -103,35 +115,171 @@ event_handlers = {
 }
 
 
+# Change types whose event handlers apply a batch of changes in bulk
+BATCHED_CHANGE_TYPES = {CREATED, UPDATED, DELETED}
+
+# The maximum number of changes passed to an event handler at once
+CHANGE_BATCH_SIZE = 500
+
+# The number of changes pulled from the database at a time when draining changes
+CHANGE_DRAIN_BATCH_SIZE = 1000
+
+
+def get_change_batches(changes):
+    """
+    Groups consecutive changes of the same table, change type and creator into batches
+    that are passed to their event handler together, keeping them in server_rev order.
+    A batch never holds two changes to the same object, as the bulk event handlers apply
+    a single change per object.
+    """
+    batch = []
+    keys = set()
+    for change in changes:
+        key = json.dumps(change.kwargs.get("key"), sort_keys=True)
+        if batch and (
+            change.change_type not in BATCHED_CHANGE_TYPES
+            or (change.table, change.change_type, change.created_by_id)
+            != (batch[0].table, batch[0].change_type, batch[0].created_by_id)
+            or key in keys
+            or len(batch) == CHANGE_BATCH_SIZE
+        ):
+            yield batch
+            batch = []
+            keys = set()
+        batch.append(change)
+        keys.add(key)
+    if batch:
+        yield batch
+
+
+def _error_matches_change(viewset, error, change):
+    # Event handlers report errors on the change itself, on its key,
+    # or on the data they mapped from the change
+    if "server_rev" in error:
+        return error["server_rev"] == change["server_rev"]
+    if "key" in error:
+        return error["key"] == change["key"]
+    return all(
+        error.get(field) == value
+        for field, value in viewset.values_from_key(change["key"])
+    )
+
+
+# The error the bulk event handlers report on every change of a batch they failed to apply
+INTERNAL_SERVER_ERROR = "Internal server error"
+
+
+def get_change_errors(viewset, changes, errors):
+    """
+    Returns the errors an event handler returned for a batch of changes, keyed by the
+    server_rev of the change each error belongs to.
+
+    :raises BatchErrorsUntraceable: When the batch holds more than one change, and an error
+        can't be traced to a change, or the handler failed to apply the batch
+    """
+    if len(changes) == 1:
+        return {changes[0]["server_rev"]: errors}
+    change_errors = {}
+    for error in errors:
+        if INTERNAL_SERVER_ERROR in (error.get("errors") or ()):
+            raise BatchErrorsUntraceable()
+        matching = [
+            change
+            for change in changes
+            if _error_matches_change(viewset, error, change)
+        ]
+        if not matching:
+            raise BatchErrorsUntraceable()
+        change_errors.setdefault(matching[0]["server_rev"], []).append(error)
+    return change_errors
+
+
+def _apply_change_batch(batch, changes):
+    viewset_class = viewset_mapping[batch[0].table]
+    change_type = int(batch[0].change_type)
+    viewset = viewset_class()
+    viewset.sync_initial(batch[0].created_by)
+    if change_type in event_handlers:
+        event_handler = getattr(viewset, event_handlers[change_type], None)
+        if event_handler is None:
+            raise ChangeNotAllowed(change_type, viewset_class)
+        change_errors = get_change_errors(
+            viewset, changes, event_handler(changes) or []
+        )
+        for change in batch:
+            errors = change_errors.get(change.server_rev)
+            if errors:
+                change.errored = True
+                change.kwargs["errors"] = errors[0]["errors"]
+            else:
+                change.applied = True
+
+
+def apply_change_batch(batch):
+    created_by = batch[0].created_by
+    changes = [change.serialize_to_change_dict() for change in batch]
+    try:
+        # Roll back whatever the batch applied before failing, so its changes can be
+        # applied again one at a time
+        with transaction.atomic():
+            _apply_change_batch(batch, changes)
+    except Exception as e:
+        if len(batch) > 1:
+            # Apply the changes one at a time, so only the change that caused the
+            # exception, or the untraceable errors, is errored
+            for change in batch:
+                change.applied = False
+                change.errored = False
+                change.kwargs.pop("errors", None)
+                apply_change_batch([change])
+            return
+        log_sync_exception(e, user=created_by, change=changes[0])
+        change = batch[0]
+        change.applied = False
+        change.errored = True
+        change.kwargs["errors"] = [str(e)]
+
+
 @delay_user_storage_calculation
 def apply_changes(changes_queryset):
     changes = changes_queryset.order_by("server_rev").select_related("created_by")
-    for change in changes:
-        # Assume an error, this will be updated
-        # in the case there isn't!
-        changed_fields = ("errored", "kwargs")
-        table_name = change.table
-        try:
-            viewset_class = viewset_mapping[table_name]
-            change_type = change.change_type
-            change_type = int(change_type)
-            viewset = viewset_class()
-            viewset.sync_initial(change.created_by)
-            if change_type in event_handlers:
-                event_handler = getattr(viewset, event_handlers[change_type], None)
-                if event_handler is None:
-                    raise ChangeNotAllowed(change_type, viewset_class)
-                errors = event_handler([change.serialize_to_change_dict()])
-                if errors:
-                    change.errored = True
-                    change.kwargs["errors"] = errors[0]["errors"]
-                else:
-                    change.applied = True
-                    changed_fields = ("applied",)
-        except Exception as e:
-            log_sync_exception(
-                e, user=change.created_by, change=change.serialize_to_change_dict()
-            )
-            change.errored = True
-            change.kwargs["errors"] = [str(e)]
-        change.save(update_fields=changed_fields)
+    _apply_changes(changes)
+
+
+@delay_user_storage_calculation
+def drain_changes(changes_queryset, time_slice):
+    """
+    Applies the changes of the queryset in server_rev order, pulling them from the database a
+    batch at a time, so that changes that arrive meanwhile are applied too, until there are
+    none left or the time slice has passed. The queryset must only match unapplied changes.
+
+    :param time_slice: The number of seconds after which no more batches are pulled
+    :return: A dict of the number of changes applied, the number applied per second, and the
+        queue lag, which is the number of changes left to apply
+    """
+    start = time.monotonic()
+    applied = 0
+    drained = False
+    changes_queryset = changes_queryset.order_by("server_rev").select_related(
+        "created_by"
+    )
+    while time.monotonic() - start < time_slice:
+        changes = list(changes_queryset[:CHANGE_DRAIN_BATCH_SIZE])
+        if not changes:
+            drained = True
+            break
+        _apply_changes(changes)
+        applied += len(changes)
+    duration = time.monotonic() - start
+    return {
+        "changes_applied": applied,
+        "changes_per_second": round(applied / duration, 2) if duration else 0.0,
+        "queue_lag": 0 if drained else changes_queryset.count(),
+    }
+
+
+def _apply_changes(changes):
+    for batch in get_change_batches(changes):
+        apply_change_batch(batch)
+        Change.objects.bulk_update(batch, ["applied", "errored", "kwargs"])
+        notify_changes(batch)
@@ -4,6 +4,8 @@ and deals with processing all the changes to make appropriate
 bulk creates, updates, and deletes.
 """
 from celery import states
+from django.conf import settings
+from django.db.models import Max
 from django.db.models import Q
 from django_celery_results.models import TaskResult
 from django_cte import CTEQuerySet
@@ -18,6 +20,12 @@ from contentcuration.models import Channel
 from contentcuration.models import CustomTaskMetadata
 from contentcuration.tasks import apply_channel_changes_task
 from contentcuration.tasks import apply_user_changes_task
+from contentcuration.utils.change_feed import ChangeFeedSubscription
+from contentcuration.utils.change_feed import get_latest_revs
+from contentcuration.utils.change_feed import get_task_states
+from contentcuration.utils.change_feed import have_no_tasks
+from contentcuration.utils.change_feed import record_latest_revs
+from contentcuration.utils.change_feed import record_no_tasks
 from contentcuration.viewsets.sync.constants import CHANNEL
 from contentcuration.viewsets.sync.constants import CREATED
 from contentcuration.viewsets.sync.constants import SERVER_ONLY_CHANGES
@@ -117,7 +125,76 @@ class SyncView(APIView):
             }
         return channel_revs
 
+    def get_latest_revs(self, request, channel_revs):
+        """
+        Gets the latest server_rev of the applied changes of the user and channels from the
+        index, reading any that are missing from the database and adding them to the index.
+        """
+        latest_revs = get_latest_revs(
+            channel_ids=channel_revs.keys(), user_ids=[request.user.id]
+        )
+        if latest_revs is None:
+            return None
+        latest_channel_revs, latest_user_revs = latest_revs
+        applied_changes = Change.objects.filter(applied=True).order_by()
+
+        missing_channel_ids = [
+            channel_id for channel_id, rev in latest_channel_revs.items() if rev is None
+        ]
+        if missing_channel_ids:
+            missing_channel_revs = dict(
+                applied_changes.filter(channel_id__in=missing_channel_ids)
+                .values("channel_id")
+                .annotate(rev=Max("server_rev"))
+                .values_list("channel_id", "rev")
+            )
+            latest_channel_revs.update(
+                (channel_id, missing_channel_revs.get(channel_id) or 0)
+                for channel_id in missing_channel_ids
+            )
+
+        missing_user_revs = {}
+        if latest_user_revs[request.user.id] is None:
+            missing_user_revs[request.user.id] = (
+                applied_changes.filter(user=request.user).aggregate(
+                    rev=Max("server_rev")
+                )["rev"]
+                or 0
+            )
+            latest_user_revs.update(missing_user_revs)
+
+        if missing_channel_ids or missing_user_revs:
+            record_latest_revs(
+                channel_revs={
+                    channel_id: latest_channel_revs[channel_id]
+                    for channel_id in missing_channel_ids
+                },
+                user_revs=missing_user_revs,
+            )
+        return latest_channel_revs, latest_user_revs
+
+    def has_new_changes(self, request, channel_revs):
+        """
+        Checks whether there are any changes newer than the revs the client has. Changes the
+        client has made, in this request or unapplied from earlier ones, may have errored,
+        which the index doesn't track, so the database is always checked for those.
+        """
+        if request.data.get("changes") or request.data.get("unapplied_revs"):
+            return True
+        latest_revs = self.get_latest_revs(request, channel_revs)
+        if latest_revs is None:
+            return True
+        latest_channel_revs, latest_user_revs = latest_revs
+        user_rev = request.data.get("user_rev") or 0
+        return latest_user_revs[request.user.id] > user_rev or any(
+            latest_channel_revs[channel_id] > (rev or 0)
+            for channel_id, rev in channel_revs.items()
+        )
+
     def return_changes(self, request, channel_revs):
+        if not self.has_new_changes(request, channel_revs):
+            return {}
+
         user_rev = request.data.get("user_rev") or 0
         unapplied_revs = request.data.get("unapplied_revs", [])
         session_key = request.session.session_key
@@ -179,6 +256,10 @@ class SyncView(APIView):
         return {"changes": changes, "errors": errors, "successes": successes}
 
     def return_tasks(self, request, channel_revs):
+        task_states = get_task_states(channel_revs.keys())
+        if have_no_tasks(task_states):
+            return {"tasks": []}
+
         custom_task_cte = With(
             CustomTaskMetadata.objects.filter(channel_id__in=channel_revs.keys())
         )
@@ -207,7 +288,9 @@ class SyncView(APIView):
             "tasks": [],
         }
 
-        if query.exists():
+        if not query.exists():
+            record_no_tasks(task_states)
+        else:
             response_payload = {
                 "tasks": query.values(
                     "task_id",
@@ -240,3 +323,53 @@ class SyncView(APIView):
         response_payload.update(self.return_tasks(request, channel_revs))
 
         return Response(response_payload)
+
+
+class SyncWaitView(SyncView):
+    """
+    A long polling version of the sync endpoint. When a client has nothing to send and
+    nothing is waiting to be returned to it, the request is held open until the change feed of
+    the user or one of its channels is notified, or `SYNC_LONG_POLL_TIMEOUT` elapses, so that
+    idle clients don't query the database on every poll.
+    """
+
+    def should_wait(self, request, response_payload):
+        return not (
+            request.data.get("changes")
+            or request.data.get("unapplied_revs")
+            or response_payload["allowed"]
+            or response_payload["disallowed"]
+        )
+
+    def post(self, request):
+        response_payload = {
+            "disallowed": [],
+            "allowed": [],
+            "changes": [],
+            "errors": [],
+            "successes": [],
+            "tasks": [],
+        }
+
+        channel_revs = self.get_channel_revs(request)
+
+        response_payload.update(self.handle_changes(request))
+
+        # Subscribe before checking for changes, so that nothing made in between is missed
+        with ChangeFeedSubscription(
+            channel_ids=channel_revs.keys(), user_ids=[request.user.id]
+        ) as subscription:
+            changes_payload = self.return_changes(request, channel_revs)
+            if (
+                not changes_payload
+                and subscription.available
+                and self.should_wait(request, response_payload)
+                and subscription.wait(settings.SYNC_LONG_POLL_TIMEOUT)
+            ):
+                changes_payload = self.return_changes(request, channel_revs)
+
+        response_payload.update(changes_payload)
+
+        response_payload.update(self.return_tasks(request, channel_revs))
+
+        return Response(response_payload)
@@ -38,6 +38,7 @@ from contentcuration.models import Change
 from contentcuration.models import Channel
 from contentcuration.models import Country
 from contentcuration.models import User
+from contentcuration.models import UserPermissionSet
 from contentcuration.utils.pagination import ValuesViewsetPageNumberPagination
 from contentcuration.viewsets.base import BulkListSerializer
 from contentcuration.viewsets.base import BulkModelSerializer
@@ -259,6 +260,9 @@ class ChannelUserViewSet(ReadOnlyValuesViewset):
         }
 
     def _execute_changes(self, table, change_type, data):
+        # Imported here rather than at module level to avoid a circular import
+        from contentcuration.utils.user import calculate_user_storage
+
         if data:
             if change_type == CREATED:
                 if table == EDITOR_M2M:
@@ -275,6 +279,11 @@ class ChannelUserViewSet(ReadOnlyValuesViewset):
                     Channel.editors.through.objects.filter(q).delete()
                 elif table == VIEWER_M2M:
                     Channel.viewers.through.objects.filter(q).delete()
+            # Bulk changes to the through tables don't send m2m_changed signals
+            UserPermissionSet.invalidate(d["user_id"] for d in data)
+            if table == EDITOR_M2M:
+                for user_id in {d["user_id"] for d in data}:
+                    calculate_user_storage(user_id)
 
     def _check_permissions(self, changes):
         # Filter the passed in channels
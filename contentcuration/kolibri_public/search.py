@@ -215,6 +215,25 @@ def annotate_label_bitmasks(queryset, bitmask_fieldnames):
     queryset.update(**update_statements)
 
 
+def get_label_bitmasks(obj, bitmask_fieldnames):
+    """
+    Calculates the same label bitmasks for a single object as `annotate_label_bitmasks` sets in
+    the database, for when the object is about to be created.
+    """
+    bitmasks = {}
+    for bitmask_fieldname, label_info in bitmask_fieldnames.items():
+        bitmasks[bitmask_fieldname] = sum(
+            info["bits"]
+            for info in label_info
+            if info["label"] in (getattr(obj, info["field_name"]) or "")
+        )
+    return bitmasks
+
+
+def get_contentnode_label_bitmasks(node):
+    return get_label_bitmasks(node, contentnode_bitmask_fieldnames)
+
+
 def annotate_contentnode_label_bitmasks(queryset):
     return annotate_label_bitmasks(queryset, contentnode_bitmask_fieldnames)
 
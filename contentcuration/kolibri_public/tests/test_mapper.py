@@ -1,9 +1,11 @@
 import datetime
 import os
 import tempfile
+import uuid
 from unittest import mock
 
 import pytz
+from automation.models import RecommendationsCache
 from django.core.management import call_command
 from django.test import TestCase
 from kolibri_content import models as kolibri_content_models
@@ -11,6 +13,8 @@ from kolibri_content.router import cleanup_content_database_connection
 from kolibri_content.router import get_active_content_database
 from kolibri_content.router import using_content_database
 from kolibri_public import models as kolibri_public_models
+from kolibri_public.search import annotate_contentnode_label_bitmasks
+from kolibri_public.search import contentnode_bitmask_fieldnames
 from kolibri_public.tests.base import ChannelBuilder
 from kolibri_public.tests.base import OKAY_TAG
 from kolibri_public.utils.mapper import ChannelMapper
@@ -173,6 +177,74 @@ class ChannelMapperTest(TestCase):
                 kolibri_public_models.ChannelMetadata,
             )
 
+    def test_map_replace__old_tree_deleted(self):
+        with using_content_database(self.tempdb):
+            self.mapper = ChannelMapper(self.channel)
+            self.mapper.run()
+            tree_id = self.mapper.tree_id
+
+            def counts():
+                nodes = kolibri_public_models.ContentNode.objects.filter(
+                    tree_id=tree_id
+                )
+                return (
+                    nodes.count(),
+                    kolibri_public_models.File.objects.filter(
+                        contentnode__in=nodes
+                    ).count(),
+                    kolibri_public_models.AssessmentMetaData.objects.filter(
+                        contentnode__in=nodes
+                    ).count(),
+                    kolibri_public_models.ContentNode.tags.through.objects.filter(
+                        contentnode__in=nodes
+                    ).count(),
+                    kolibri_public_models.ChannelMetadata.objects.count(),
+                )
+
+            expected = counts()
+
+            mapper = ChannelMapper(self.channel)
+            mapper.run()
+
+            self.assertEqual(tree_id, mapper.tree_id)
+            self.assertEqual(expected, counts())
+
+    def test_map_replace__cached_recommendations_deleted(self):
+        with using_content_database(self.tempdb):
+            self.mapper = ChannelMapper(self.channel)
+            self.mapper.run()
+            node = self.mapper.mapped_root.get_descendants().first()
+            recommendation = RecommendationsCache.objects.create(
+                request_hash="a" * 32,
+                topic_id=uuid.uuid4(),
+                contentnode=node,
+            )
+
+            mapper = ChannelMapper(self.channel)
+            mapper.run()
+
+            self.assertFalse(
+                RecommendationsCache.objects.filter(pk=recommendation.pk).exists()
+            )
+            self.assertTrue(
+                kolibri_public_models.ContentNode.objects.filter(pk=node.pk).exists()
+            )
+
+    def test_label_bitmasks(self):
+        with using_content_database(self.tempdb):
+            self.mapper = ChannelMapper(self.channel)
+            self.mapper.run()
+
+            mapped_nodes = self.mapper.mapped_root.get_descendants(include_self=True)
+            bitmask_fieldnames = list(contentnode_bitmask_fieldnames)
+            bitmasks = list(mapped_nodes.values_list("id", *bitmask_fieldnames))
+            self.assertTrue(any(any(row[1:]) for row in bitmasks))
+
+            annotate_contentnode_label_bitmasks(mapped_nodes)
+            self.assertEqual(
+                bitmasks, list(mapped_nodes.values_list("id", *bitmask_fieldnames))
+            )
+
     def test_categories__none_provided(self):
         with using_content_database(self.tempdb):
             kolibri_content_models.ContentNode.objects.filter(
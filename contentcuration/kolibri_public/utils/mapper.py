@@ -3,10 +3,12 @@ from django.db.models.functions import Length
 from kolibri_content import models as kolibri_content_models
 from kolibri_content.base_models import MAX_TAG_LENGTH
 from kolibri_public import models as kolibri_public_models
-from kolibri_public.search import annotate_contentnode_label_bitmasks
+from kolibri_public.search import get_contentnode_label_bitmasks
 from kolibri_public.utils.annotation import set_channel_metadata_fields
 from le_utils.constants import content_kinds
 
+from contentcuration.db.models.deletion import raw_delete_cascade
+
 
 BATCH_SIZE = 1000
 
@@ -55,10 +57,33 @@ class ChannelMapper(object):
                 id=self.channel.id
             )
             self.tree_id = old_channel.root.tree_id
-            old_channel.root.get_descendants(include_self=True).delete()
+            self._delete_old_tree(old_channel)
         except kolibri_public_models.ChannelMetadata.DoesNotExist:
             self.tree_id = kolibri_public_models.MPTTTreeIDManager.objects.create().id
 
+    def _delete_old_tree(self, old_channel):
+        """
+        Deletes the old channel and its tree with a query per related table, rather than
+        collecting every object to cascade the delete to, as deleting the root would.
+        """
+        ContentNode = kolibri_public_models.ContentNode
+        nodes = (
+            ContentNode.objects.filter(tree_id=self.tree_id)
+            .order_by()
+            .values_list("pk", flat=True)
+        )
+
+        def handle_relation(related, related_rows):
+            # the whole tree is deleted, so nodes referencing its nodes are deleted too
+            return related.related_model is ContentNode
+
+        raw_delete_cascade(
+            kolibri_public_models.ChannelMetadata,
+            [old_channel.id],
+            handle_relation=handle_relation,
+        )
+        raw_delete_cascade(ContentNode, nodes, handle_relation=handle_relation)
+
     def run(self):
         with transaction.atomic():
             self._handle_old_tree_if_exists()
@@ -69,12 +94,6 @@ class ChannelMapper(object):
             self.mapped_channel.public = self.public
             self.mapped_channel.save_base(raw=True)
 
-            annotate_contentnode_label_bitmasks(
-                self.mapped_root.get_descendants(include_self=True)
-            )
-            # Rather than set the ancestors fields after mapping, like it is done in Kolibri
-            # here we set it during mapping as we are already recursing through the tree.
-
             set_channel_metadata_fields(
                 self.mapped_channel.id,
                 public=self.public,
@@ -106,81 +125,68 @@ class ChannelMapper(object):
     def _map_node(self, source, ancestors):
         node = self._map_model(source, kolibri_public_models.ContentNode)
         node.ancestors = ancestors
+        # Rather than annotating the label bitmasks after mapping, with an update of the
+        # whole tree, they are set as the nodes are mapped.
+        for field_name, bitmask in get_contentnode_label_bitmasks(source).items():
+            setattr(node, field_name, bitmask)
         return node
 
-    def _extend_ancestors(self, ancestors, new_ancestor):
-        return ancestors + [
-            {"id": new_ancestor.id, "title": new_ancestor.title.replace('"', '\\"')}
-        ]
-
-    def _recurse_to_create_tree(
-        self,
-        source,
-        nodes_by_parent,
-        ancestors,
-    ):
-        nodes_to_create = [self._map_node(source, ancestors)]
-
-        if source.kind == content_kinds.TOPIC and source.id in nodes_by_parent:
-            children = sorted(nodes_by_parent[source.id], key=lambda x: x.lft)
-            ancestors = self._extend_ancestors(ancestors, source)
-            for child in children:
-                nodes_to_create.extend(
-                    self._recurse_to_create_tree(
-                        child,
-                        nodes_by_parent,
-                        ancestors,
-                    )
-                )
-        return nodes_to_create
+    def _ancestor(self, node):
+        return {"id": node.id, "title": node.title.replace('"', '\\"')}
 
     def map_root(self, root, batch_size=None, progress_tracker=None):
         """
+        Maps the tree of the root, reading the nodes in tree order, so that the ancestors
+        of each node are the topics read before it that it is still within.
+
         :type progress_tracker: contentcuration.utils.celery.ProgressTracker|None
         """
         if batch_size is None:
             batch_size = BATCH_SIZE
 
-        return self._map(
-            root,
-            batch_size,
-            progress_tracker=progress_tracker,
-        )[0]
-
-    def _map(
-        self,
-        node,
-        batch_size,
-        ancestors=[],
-        progress_tracker=None,
-    ):
+        source_nodes = root.get_descendants(include_self=True).order_by("lft")
+
+        mapped_root = None
+        # The topics the node being mapped is a descendant of, with the right values
+        # they are bounded by
+        ancestors = []
+        # The descendants of resources aren't mapped, so they are skipped until a node
+        # with a left value past this
+        skip_until = None
+        batch = []
+        for source in source_nodes.iterator(chunk_size=batch_size):
+            if skip_until is not None and source.lft < skip_until:
+                continue
+            while ancestors and ancestors[-1][0] < source.lft:
+                ancestors.pop()
+
+            node = self._map_node(source, [ancestor for _, ancestor in ancestors])
+            batch.append(node)
+            if mapped_root is None:
+                mapped_root = node
+
+            if source.kind == content_kinds.TOPIC:
+                ancestors.append((source.rght, self._ancestor(source)))
+            else:
+                skip_until = source.rght
+
+            if len(batch) >= batch_size:
+                self._bulk_create_nodes(batch, progress_tracker=progress_tracker)
+                batch = []
+        self._bulk_create_nodes(batch, progress_tracker=progress_tracker)
+
+        return mapped_root
+
+    def _bulk_create_nodes(self, nodes, progress_tracker=None):
         """
         :type progress_tracker: contentcuration.utils.celery.ProgressTracker|None
         """
-        if node.rght - node.lft < batch_size:
-            copied_nodes = self._deep_map(
-                node,
-                ancestors,
-            )
-            if progress_tracker:
-                progress_tracker.increment(len(copied_nodes))
-            return copied_nodes
-        node_copy = self._shallow_map(
-            node,
-            ancestors,
-        )
-        ancestors = self._extend_ancestors(ancestors, node)
+        if not nodes:
+            return
+        kolibri_public_models.ContentNode.objects.bulk_create(nodes)
+        self._copy_associated_objects([node.id for node in nodes])
         if progress_tracker:
-            progress_tracker.increment()
-        children = node.get_children().order_by("lft")
-        for child in children:
-            self._map(
-                child,
-                batch_size,
-                ancestors=ancestors,
-                progress_tracker=progress_tracker,
-            )
-        return [node_copy]
+            progress_tracker.increment(len(nodes))
 
     def _copy_tags(self, node_ids):
         initial_source_tag_mappings = (
@@ -230,56 +236,9 @@ class ChannelMapper(object):
 
         self._map_and_bulk_create_model(node_files, kolibri_public_models.File)
 
-    def _copy_associated_objects(self, nodes):
-        node_ids = [node.id for node in nodes]
-
+    def _copy_associated_objects(self, node_ids):
         self._copy_files(node_ids)
 
         self._copy_assessment_metadata(node_ids)
 
         self._copy_tags(node_ids)
-
-    def _shallow_map(
-        self,
-        node,
-        ancestors,
-    ):
-        mapped_node = self._map_node(node, ancestors)
-
-        mapped_node.save_base(raw=True)
-
-        self._copy_associated_objects([node])
-        return mapped_node
-
-    def _deep_map(
-        self,
-        node,
-        ancestors,
-    ):
-        source_nodes = node.get_descendants(include_self=True)
-
-        nodes_by_parent = {}
-        for source_node in source_nodes:
-            if source_node.parent_id not in nodes_by_parent:
-                nodes_by_parent[source_node.parent_id] = []
-            nodes_by_parent[source_node.parent_id].append(source_node)
-
-        nodes_to_create = self._recurse_to_create_tree(
-            node,
-            nodes_by_parent,
-            ancestors,
-        )
-
-        mapped_nodes = kolibri_public_models.ContentNode.objects.bulk_create(
-            nodes_to_create
-        )
-
-        # filter to only the nodes that were created, since some source nodes could have
-        # been problematic
-        self._copy_associated_objects(
-            source_nodes.filter(
-                id__in=[mapped_node.id for mapped_node in mapped_nodes],
-            )
-        )
-
-        return mapped_nodes
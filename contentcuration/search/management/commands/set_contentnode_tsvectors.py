@@ -5,10 +5,9 @@ import logging as logmodule
 import time
 
 from django.core.management.base import BaseCommand
-from django.db.models import Exists
-from django.db.models import OuterRef
-from search.models import ContentNodeFullTextSearch
-from search.utils import get_fts_annotated_contentnode_qs
+from search.utils import get_contentnode_ids_without_tsvectors
+from search.utils import TSVECTOR_BATCH_SIZE
+from search.utils import upsert_contentnode_tsvectors
 
 from contentcuration.models import Channel
 
@@ -16,7 +15,7 @@ from contentcuration.models import Channel
 logmodule.basicConfig(level=logmodule.INFO)
 logging = logmodule.getLogger(__name__)
 
-CHUNKSIZE = 10000
+CHUNKSIZE = TSVECTOR_BATCH_SIZE
 
 
 class Command(BaseCommand):
@@ -59,43 +58,20 @@ class Command(BaseCommand):
         total_tsvectors_inserted = 0
 
         for channel in generate_tsv_for_channels:
-            tsvector_not_already_inserted_query = ~Exists(
-                ContentNodeFullTextSearch.objects.filter(contentnode_id=OuterRef("id"))
-            )
-            tsvector_nodes_query = (
-                get_fts_annotated_contentnode_qs(channel["id"])
-                .filter(
-                    tsvector_not_already_inserted_query,
-                    tree_id=channel["main_tree__tree_id"],
-                    complete=True,
-                    **publish_filter_dict
-                )
-                .values("id", "channel_id", "keywords_tsvector", "author_tsvector")
-                .order_by()
+            node_ids = get_contentnode_ids_without_tsvectors(
+                channel["main_tree__tree_id"], **publish_filter_dict
             )
 
-            insertable_nodes_tsvector = list(tsvector_nodes_query[:CHUNKSIZE])
-
             logging.info(
                 "Inserting contentnode tsvectors of channel {}.".format(channel["id"])
             )
 
-            while insertable_nodes_tsvector:
-                insert_objs = list()
-                for node in insertable_nodes_tsvector:
-                    obj = ContentNodeFullTextSearch(
-                        contentnode_id=node["id"],
-                        channel_id=node["channel_id"],
-                        keywords_tsvector=node["keywords_tsvector"],
-                        author_tsvector=node["author_tsvector"],
-                    )
-                    insert_objs.append(obj)
-
-                inserted_objs_list = ContentNodeFullTextSearch.objects.bulk_create(
-                    insert_objs
+            for i in range(0, len(node_ids), CHUNKSIZE):
+                current_inserts_count, _ = upsert_contentnode_tsvectors(
+                    channel["id"],
+                    channel["main_tree__tree_id"],
+                    node_ids[i : i + CHUNKSIZE],
                 )
-
-                current_inserts_count = len(inserted_objs_list)
                 total_tsvectors_inserted = (
                     total_tsvectors_inserted + current_inserts_count
                 )
@@ -106,8 +82,6 @@ class Command(BaseCommand):
                     )
                 )
 
-                insertable_nodes_tsvector = list(tsvector_nodes_query[:CHUNKSIZE])
-
             logging.info("Insertion complete for channel {}.".format(channel["id"]))
 
         logging.info(
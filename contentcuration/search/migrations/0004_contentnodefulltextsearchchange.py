@@ -0,0 +1,40 @@
+# Generated by Django 3.2.24 on 2026-10-19 00:13
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+import contentcuration.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contentcuration", "0171_contentnodetreemetadata"),
+        ("search", "0003_fulltextsearch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentNodeFullTextSearchChange",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("contentnode_id", contentcuration.models.UUIDField(max_length=32)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="contentcuration.channel",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -63,3 +63,16 @@ class ChannelFullTextSearch(models.Model):
         indexes = [
             GinIndex(fields=["keywords_tsvector"], name="channel_keywords_tsv__gin_idx")
         ]
+
+
+class ContentNodeFullTextSearchChange(models.Model):
+    """
+    Logs the nodes of a channel's main tree that changed since it was last published, so
+    that only their tsvectors are updated once it's published.
+    """
+
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name="+")
+
+    # Not a foreign key, so that logging changes doesn't lock the nodes, and so that the
+    # log doesn't need to be cleared before nodes are deleted.
+    contentnode_id = StudioUUIDField()
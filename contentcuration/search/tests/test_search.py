@@ -1,9 +1,14 @@
 from django.urls import reverse
+from search.models import ContentNodeFullTextSearch
+from search.models import ContentNodeFullTextSearchChange
+from search.utils import get_fts_search_query
+from search.utils import log_contentnode_tsvector_changes
 
 from contentcuration.models import Channel
 from contentcuration.models import ContentNode
 from contentcuration.tests import testdata
 from contentcuration.tests.base import StudioAPITestCase
+from contentcuration.tests.base import StudioTestCase
 from contentcuration.utils.publish import sync_contentnode_and_channel_tsvectors
 
 
@@ -44,6 +49,27 @@ class SearchViewsetTestCase(StudioAPITestCase):
         self.assertEqual(response.status_code, 200, response.content)
         self.assertNotEqual(response.data["results"], [])
 
+    def test_keyset_pages(self):
+        self.client.force_authenticate(user=self.user)
+        query = {"channel_list": "edit", "page_size": 2, "cursor": ""}
+        pages = []
+        while query is not None:
+            response = self.client.get(
+                reverse("search-list"), data=query, format="json"
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append(response.data["results"])
+            query = response.data["more"]
+
+        self.assertGreater(len(pages), 1)
+        self.assertTrue(all(len(page) <= 2 for page in pages))
+        self.assertCountEqual(
+            [node["id"] for page in pages for node in page],
+            ContentNodeFullTextSearch.objects.filter(
+                channel=self.channel
+            ).values_list("contentnode_id", flat=True),
+        )
+
     def test_search(self):
         users = []
         channels = []
@@ -121,3 +147,67 @@ class SearchViewsetTestCase(StudioAPITestCase):
                 self.assertEqual(result["id"], editable_video_node.id)
             elif channel_list == "view":
                 self.assertEqual(result["id"], viewable_video_node.id)
+
+
+class SyncTsvectorsTestCase(StudioTestCase):
+    def setUp(self):
+        super().setUp()
+        self.channel = testdata.channel()
+        self.tree_id = self.channel.main_tree.tree_id
+
+    def _complete_node_count(self):
+        return ContentNode.objects.filter(tree_id=self.tree_id, complete=True).count()
+
+    def test_inserts_tsvectors_of_nodes_without_them(self):
+        counts = sync_contentnode_and_channel_tsvectors(channel_id=self.channel.id)
+        self.assertEqual(counts["inserted"], self._complete_node_count())
+        self.assertEqual(
+            ContentNodeFullTextSearch.objects.filter(channel=self.channel).count(),
+            self._complete_node_count(),
+        )
+
+        counts = sync_contentnode_and_channel_tsvectors(channel_id=self.channel.id)
+        self.assertEqual(counts, {"inserted": 0, "updated": 0, "deleted": 0})
+
+    def test_updates_tsvectors_of_logged_nodes(self):
+        sync_contentnode_and_channel_tsvectors(channel_id=self.channel.id)
+        node = ContentNode.objects.filter(tree_id=self.tree_id, complete=True).first()
+        unchanged_node = (
+            ContentNode.objects.filter(tree_id=self.tree_id, complete=True)
+            .exclude(pk=node.pk)
+            .first()
+        )
+        ContentNode.objects.filter(tree_id=self.tree_id).update(changed=False)
+        ContentNode.objects.filter(pk__in=[node.pk, unchanged_node.pk]).update(
+            changed=True
+        )
+        ContentNode.objects.filter(pk=node.pk).update(title="Zanzibar")
+
+        log_contentnode_tsvector_changes(self.channel.id, self.tree_id)
+        counts = sync_contentnode_and_channel_tsvectors(channel_id=self.channel.id)
+
+        self.assertEqual(counts, {"inserted": 0, "updated": 1, "deleted": 0})
+        self.assertTrue(
+            ContentNodeFullTextSearch.objects.filter(
+                contentnode=node, keywords_tsvector=get_fts_search_query("zanzibar")
+            ).exists()
+        )
+        self.assertFalse(
+            ContentNodeFullTextSearchChange.objects.filter(
+                channel=self.channel
+            ).exists()
+        )
+
+    def test_deletes_tsvectors_of_nodes_no_longer_in_tree(self):
+        sync_contentnode_and_channel_tsvectors(channel_id=self.channel.id)
+        node = ContentNode.objects.filter(
+            tree_id=self.tree_id, complete=True, kind_id="video"
+        ).first()
+        node.move_to(self.channel.trash_tree, "last-child")
+
+        counts = sync_contentnode_and_channel_tsvectors(channel_id=self.channel.id)
+
+        self.assertEqual(counts["deleted"], 1)
+        self.assertFalse(
+            ContentNodeFullTextSearch.objects.filter(contentnode=node).exists()
+        )
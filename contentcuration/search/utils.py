@@ -1,5 +1,8 @@
 from django.contrib.postgres.aggregates import StringAgg
 from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Exists
+from django.db.models import OuterRef
 from django.db.models import Value
 from search.constants import CHANNEL_KEYWORDS_TSVECTOR
 from search.constants import CONTENTNODE_AUTHOR_TSVECTOR
@@ -39,3 +42,97 @@ def get_fts_annotated_channel_qs():
         primary_channel_token=primary_token_subquery,
         keywords_tsvector=CHANNEL_KEYWORDS_TSVECTOR,
     )
+
+
+# The number of nodes whose tsvectors are inserted or updated by a single statement
+TSVECTOR_BATCH_SIZE = 5000
+
+
+def log_contentnode_tsvector_changes(channel_id, tree_id):
+    """
+    Logs the nodes of the tree that changed since it was last published, so that their
+    tsvectors can be updated after their changed flags are cleared.
+    """
+    from contentcuration.models import ContentNode
+    from search.models import ContentNodeFullTextSearchChange
+
+    changed_nodes_qs = (
+        ContentNode.objects.filter(tree_id=tree_id, changed=True)
+        .annotate(log_channel_id=Value(channel_id))
+        .values("log_channel_id", "id")
+        .order_by()
+    )
+    query, params = changed_nodes_qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} (channel_id, contentnode_id) "
+            "SELECT log_channel_id, id FROM ({query}) AS changed_nodes".format(
+                table=ContentNodeFullTextSearchChange._meta.db_table, query=query
+            ),
+            params,
+        )
+        return cursor.rowcount
+
+
+def get_contentnode_ids_without_tsvectors(tree_id, **filters):
+    """
+    Returns the ids of the complete nodes of the tree that don't have tsvectors yet.
+    """
+    from contentcuration.models import ContentNode
+    from search.models import ContentNodeFullTextSearch
+
+    return list(
+        ContentNode.objects.filter(
+            ~Exists(
+                ContentNodeFullTextSearch.objects.filter(contentnode_id=OuterRef("id"))
+            ),
+            tree_id=tree_id,
+            complete=True,
+            **filters
+        )
+        .order_by()
+        .values_list("id", flat=True)
+    )
+
+
+def upsert_contentnode_tsvectors(channel_id, tree_id, node_ids):
+    """
+    Inserts or updates the tsvectors of the complete nodes of node_ids that are in the tree,
+    with a single statement. Tsvectors that are unchanged are left as they are.
+
+    :return: A tuple of the number of tsvectors inserted, and the number updated
+    """
+    from search.models import ContentNodeFullTextSearch
+
+    if not node_ids:
+        return 0, 0
+
+    nodes_qs = (
+        get_fts_annotated_contentnode_qs(channel_id)
+        .filter(id__in=node_ids, tree_id=tree_id, complete=True)
+        .values("id", "channel_id", "keywords_tsvector", "author_tsvector")
+        .order_by()
+    )
+    query, params = nodes_qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        # New rows take the id of their node, which is unique as each node has a single row.
+        # Postgres sets xmax to 0 on rows that were inserted rather than updated.
+        cursor.execute(
+            "INSERT INTO {table} AS fts "
+            "(id, contentnode_id, channel_id, keywords_tsvector, author_tsvector) "
+            "SELECT id, id, channel_id, keywords_tsvector, author_tsvector "
+            "FROM ({query}) AS nodes "
+            "ON CONFLICT (contentnode_id) DO UPDATE SET "
+            "channel_id = EXCLUDED.channel_id, "
+            "keywords_tsvector = EXCLUDED.keywords_tsvector, "
+            "author_tsvector = EXCLUDED.author_tsvector "
+            "WHERE fts.channel_id IS DISTINCT FROM EXCLUDED.channel_id "
+            "OR fts.keywords_tsvector IS DISTINCT FROM EXCLUDED.keywords_tsvector "
+            "OR fts.author_tsvector IS DISTINCT FROM EXCLUDED.author_tsvector "
+            "RETURNING fts.xmax = 0".format(
+                table=ContentNodeFullTextSearch._meta.db_table, query=query
+            ),
+            params,
+        )
+        inserted = [row[0] for row in cursor.fetchall()]
+    return inserted.count(True), inserted.count(False)
@@ -16,14 +16,14 @@ from search.models import ContentNodeFullTextSearch
 from search.utils import get_fts_search_query
 
 from contentcuration.models import Channel
-from contentcuration.utils.pagination import ValuesViewsetPageNumberPagination
+from contentcuration.utils.pagination import ValuesViewsetKeysetPagination
 from contentcuration.viewsets.base import ReadOnlyValuesViewset
 from contentcuration.viewsets.base import RequiredFilterSet
 from contentcuration.viewsets.common import UUIDFilter
 from contentcuration.viewsets.common import UUIDInFilter
 
 
-class ListPagination(ValuesViewsetPageNumberPagination):
+class ListPagination(ValuesViewsetKeysetPagination):
     page_size = 25
     page_size_query_param = "page_size"
     max_page_size = 100